@@ -0,0 +1,71 @@
+import time
+import threading
+import traceback
+
+# ==============================================================================
+# AGENDADOR DE TAREFAS PERIÓDICAS
+# ==============================================================================
+
+class Agendador:
+    """Uma thread em segundo plano que corre funções a intervalos fixos.
+
+    Cada execução acontece dentro do app context e termina com
+    db.session.remove(), tal como as tarefas de geração de documentos.
+    Uma falha é registada e a tarefa volta a correr no intervalo seguinte.
+    """
+
+    def __init__(self, app, db):
+        self.app = app
+        self.db = db
+        self.tarefas = []
+        self.parar_evento = threading.Event()
+        self.thread = None
+
+    def registar(self, nome, intervalo, funcao, imediata=True):
+        proxima = time.monotonic() if imediata else time.monotonic() + intervalo
+        self.tarefas.append({'nome': nome, 'intervalo': intervalo, 'funcao': funcao, 'proxima': proxima, 'ultima_execucao': None, 'ultimo_erro': None})
+
+    def iniciar(self):
+        if self.thread is not None and self.thread.is_alive():
+            return
+        self.parar_evento.clear()
+        self.thread = threading.Thread(target=self._ciclo, name='agendador', daemon=True)
+        self.thread.start()
+
+    def parar(self):
+        self.parar_evento.set()
+        if self.thread is not None:
+            self.thread.join(timeout=10)
+
+    def _ciclo(self):
+        while not self.parar_evento.is_set():
+            agora = time.monotonic()
+            for tarefa in self.tarefas:
+                if agora >= tarefa['proxima']:
+                    self._executar(tarefa)
+                    tarefa['proxima'] = time.monotonic() + tarefa['intervalo']
+
+            espera = min((t['proxima'] for t in self.tarefas), default=agora + 60) - time.monotonic()
+            self.parar_evento.wait(max(0.5, espera))
+
+    def _executar(self, tarefa):
+        with self.app.app_context():
+            try:
+                tarefa['funcao']()
+                tarefa['ultimo_erro'] = None
+            except Exception as e:
+                self.db.session.rollback()
+                tarefa['ultimo_erro'] = str(e)
+                print(f"AGENDADOR: a tarefa '{tarefa['nome']}' falhou: {e}")
+                traceback.print_exc()
+            finally:
+                tarefa['ultima_execucao'] = time.time()
+                self.db.session.remove()
+
+    def estado(self):
+        return [{
+            'nome': t['nome'],
+            'intervalo': t['intervalo'],
+            'ultima_execucao': t['ultima_execucao'],
+            'ultimo_erro': t['ultimo_erro']
+        } for t in self.tarefas]
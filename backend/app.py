@@ -2,12 +2,18 @@ import os
 import io
 import csv
 import json
+import shutil
 import traceback
-import subprocess
-from datetime import datetime, timedelta
+import tempfile
+import click
+import socket
+import threading
+from datetime import datetime, date, timedelta
+from decimal import Decimal, InvalidOperation
+from concurrent.futures import ThreadPoolExecutor
 
 # Flask & Extensions
-from flask import Flask, jsonify, request, send_file
+from flask import Flask, jsonify, request, send_file, Response
 from flask_sqlalchemy import SQLAlchemy
 from flask_jwt_extended import (
     create_access_token, jwt_required, get_jwt_identity, 
@@ -18,24 +24,24 @@ from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 
 # SQLAlchemy
-from sqlalchemy import case, or_
+from sqlalchemy import case, or_, update, bindparam
+from sqlalchemy.exc import OperationalError, IntegrityError
 from sqlalchemy.orm import joinedload
 from sqlalchemy.sql import func
 
-# Data & Documents
-import pandas as pd
-from docx import Document
-from pypdf import PdfWriter
-import barcode
-from reportlab.lib import colors
-from reportlab.lib.pagesizes import letter, landscape
-from reportlab.lib.units import mm
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.enums import TA_CENTER
-from reportlab.platypus import (
-    SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
-)
-from reportlab.graphics.barcode import code128
+# Relatórios, etiquetas e documentos (pandas, ReportLab, python-docx, pypdf) são
+# importados dentro das funções que os usam: só pesam no primeiro pedido, não no
+# arranque (ver relatorios.py, etiquetas.py, modelo_documento.py e juncao_pdf.py).
+from conversor_pdf import obter_conversor
+from agendador import Agendador
+from metricas import instalar_metricas, medir_tarefa, tarefa_medida
+from diagnostico_sql import instalar_contador_queries
+from compressao import instalar_compressao
+from base_dados import configurar_base_dados, e_sqlite, bloquear_escrita
+from replica import SessaoRoteada, instalar_replica, somente_leitura
+from versoes import CanalInvalidacao, CacheLocal
+from eventos import LeitorEventos, consulta_ultimo_evento, inicio_pedido, gerar_eventos, CABECALHOS, ESPERA_LACUNA
+from armazenamento import obter_armazenamento, podar_cache_pdf, marcar_uso, PASTA_CACHE_PDF, CARENCIA_RECOLHA
 
 # ==============================================================================
 # CONFIGURAÇÃO INICIAL
@@ -47,17 +53,26 @@ app = Flask(__name__)
 app.config["JWT_SECRET_KEY"] = "senha_padrao_dev" 
 jwt = JWTManager(app)
 
-# Configuração Banco de Dados
-
-DB_USER = os.getenv('DB_USER', 'root')
-DB_PASS = os.getenv('DB_PASS', 'senha_padrao_dev') # Senha genérica
-DB_HOST = os.getenv('DB_HOST', 'localhost')        # Localhost para quem baixar
-DB_NAME = os.getenv('DB_NAME', 'estoque_db')
-
-app.config['SQLALCHEMY_DATABASE_URI'] = f'mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}'app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-
-db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+# Configuração Banco de Dados (DATABASE_URL ou MySQL a partir de DB_*; ver base_dados.py)
+URL_BASE_DADOS = configurar_base_dados(app)
+BASE_SQLITE = e_sqlite(URL_BASE_DADOS)
+app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+
+db = SQLAlchemy(app, session_options={'class_': SessaoRoteada})
+# Revisões em backend/migrations (flask db upgrade); o caminho é absoluto porque o
+# run.py do cliente desktop arranca o servidor a partir de outra pasta.
+PASTA_MIGRACOES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations')
+migrate = Migrate(app, db, directory=PASTA_MIGRACOES, render_as_batch=True)
+# Registada primeiro para correr por último (os after_request correm em ordem inversa)
+instalar_compressao(app)
+instalar_metricas(app, db)
+instalar_contador_queries(app)
+
+# Geração de documentos (LibreOffice + junção de PDFs) corre fora das threads do servidor
+executor_documentos = ThreadPoolExecutor(
+    max_workers=int(os.getenv('DOCUMENTOS_WORKERS', '2')),
+    thread_name_prefix='documentos'
+)
 
 # ==============================================================================
 # TABELAS DE ASSOCIAÇÃO
@@ -149,27 +164,289 @@ class DocumentosGerados(db.Model):
     versao = db.Column(db.Integer, nullable=False)
     dados_formulario = db.Column(db.JSON, nullable=False)
     caminho_pdf_final = db.Column(db.String(255), nullable=False)
+    # sha256 do PDF gerado a partir do template; None nos documentos antigos,
+    # em que caminho_pdf_final é a única cópia.
+    blob_corpo = db.Column(db.String(64), index=True)
+
+    __table_args__ = (db.UniqueConstraint('servico_id', 'versao', name='uq_documento_servico_versao'),)
     
     servico = db.relationship('Servico', back_populates='documentos')
     usuario = db.relationship('Usuario')
+    anexos = db.relationship('DocumentoAnexo', order_by='DocumentoAnexo.ordem', cascade="all, delete-orphan")
 
     def __repr__(self):
         return f'<Documento v{self.versao} para Serviço ID {self.servico_id}>'
 
+class DocumentoAnexo(db.Model):
+    __tablename__ = 'documento_anexo'
+    documento_id = db.Column(db.Integer, db.ForeignKey('documentos_gerados.id'), primary_key=True)
+    ordem = db.Column(db.Integer, primary_key=True)
+    blob_hash = db.Column(db.String(64), nullable=False, index=True)
+    nome = db.Column(db.String(255))
+
+    def __repr__(self):
+        return f'<Anexo {self.ordem} do Documento ID {self.documento_id}>'
+
+class TarefaDocumento(db.Model):
+    __tablename__ = 'tarefa_documento'
+    id = db.Column(db.Integer, primary_key=True)
+    servico_id = db.Column(db.Integer, db.ForeignKey('servico.id'), nullable=False)
+    usuario_id = db.Column(db.Integer, db.ForeignKey('usuario.id_usuario'), nullable=False)
+    status = db.Column(db.Enum("Pendente", "Processando", "Concluida", "Erro"), nullable=False, default='Pendente')
+    mensagem_erro = db.Column(db.Text)
+    documento_id = db.Column(db.Integer, db.ForeignKey('documentos_gerados.id', ondelete='SET NULL'))
+    data_criacao = db.Column(db.DateTime, nullable=False, default=datetime.now)
+    data_conclusao = db.Column(db.DateTime)
+    # 'anfitrião:pid' do processo em cuja fila (só em memória) a tarefa está.
+    processo = db.Column(db.String(100))
+
+    def __repr__(self):
+        return f'<Tarefa {self.id} ({self.status}) para Serviço ID {self.servico_id}>'
+
+class AgregadoEstoque(db.Model):
+    """Linha única com os KPIs do dashboard, mantida pelas rotas de escrita."""
+    __tablename__ = 'agregado_estoque'
+    id = db.Column(db.Integer, primary_key=True)
+    total_produtos = db.Column(db.Integer, nullable=False, default=0)
+    total_fornecedores = db.Column(db.Integer, nullable=False, default=0)
+    valor_total_estoque = db.Column(db.Numeric(16, 2), nullable=False, default=0)
+    data_atualizacao = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+class ResumoDiarioMov(db.Model):
+    """Movimentações somadas por dia, produto e tipo; fonte das séries do dashboard."""
+    __tablename__ = 'resumo_diario_mov'
+    data = db.Column(db.Date, primary_key=True)
+    id_produto = db.Column(db.Integer, db.ForeignKey('produto.Id_produto'), primary_key=True)
+    tipo = db.Column(db.Enum("Entrada", "Saida"), primary_key=True)
+    quantidade = db.Column(db.Integer, nullable=False, default=0)
+    num_movimentacoes = db.Column(db.Integer, nullable=False, default=0)
+
+class PulsacaoReplica(db.Model):
+    """Escrita periodicamente na base principal; o valor lido na réplica dá o atraso dela."""
+    __tablename__ = 'pulsacao_replica'
+    id = db.Column(db.Integer, primary_key=True)
+    data_hora = db.Column(db.DateTime, nullable=False)
+
+class MarcaProcessamento(db.Model):
+    """Último id já processado por cada rotina incremental."""
+    __tablename__ = 'marca_processamento'
+    nome = db.Column(db.String(50), primary_key=True)
+    ultimo_id = db.Column(db.Integer, nullable=False, default=0)
+    data_atualizacao = db.Column(db.DateTime, nullable=False, default=datetime.now)
+
+class VersaoCache(db.Model):
+    """Versão de cada grupo de caches locais; ver versoes.py."""
+    __tablename__ = 'versao_cache'
+    nome = db.Column(db.String(50), primary_key=True)
+    versao = db.Column(db.Integer, nullable=False, default=0)
+
+class EventoEstoque(db.Model):
+    """Alterações de saldo/produto (stream /api/eventos e /api/sync); o id é a versão."""
+    __tablename__ = 'evento_estoque'
+    id = db.Column(db.Integer, primary_key=True)
+    id_produto = db.Column(db.Integer, nullable=False)
+    novo_saldo = db.Column(db.Integer, nullable=False)
+    removido = db.Column(db.Boolean, nullable=False, default=False)
+    data_hora = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)
+
+class ChaveMovimentacao(db.Model):
+    """Chave de idempotência de uma entrada/saída: repetir o pedido devolve o resultado
+    do primeiro em vez de registar outra movimentação (fila offline dos terminais).
+    tipo e id_produto identificam o movimento: a mesma chave noutro movimento é recusada."""
+    __tablename__ = 'chave_movimentacao'
+    chave = db.Column(db.String(64), primary_key=True)
+    id_movimentacao = db.Column(db.Integer, db.ForeignKey('mov_estoque.id_movimentacao'), nullable=False)
+    tipo = db.Column(db.Enum("Entrada", "Saida"), nullable=False)
+    id_produto = db.Column(db.Integer, nullable=False)
+    novo_saldo = db.Column(db.Integer, nullable=False)
+    data_hora = db.Column(db.DateTime, nullable=False, default=datetime.now, index=True)
+
+guarda_replica = instalar_replica(app, db, PulsacaoReplica.__table__)
+
+# Com vários processos (run_server.py com WORKERS > 1) cada um tem as suas
+# caches; uma alteração num processo chega aos outros pela tabela versao_cache.
+canal_cache = CanalInvalidacao(db, VersaoCache.__table__)
+canal_cache.instalar(app)
+cache_codigos = CacheLocal()
+canal_cache.registar('produtos', cache_codigos.limpar)
+
 # ==============================================================================
 # FUNÇÕES AUXILIARES
 # ==============================================================================
 
-def calcular_saldo_produto(id_produto):
-    saldo = db.session.query(
+def consulta_saldo_produto(id_produto):
+    # Partilhada com o serviço assíncrono dos terminais (asgi_terminal.py).
+    return db.select(
         db.func.sum(
             case(
                 (MovimentacaoEstoque.tipo == 'Entrada', MovimentacaoEstoque.quantidade),
                 (MovimentacaoEstoque.tipo == 'Saida', -MovimentacaoEstoque.quantidade)
             )
         )
-    ).filter(MovimentacaoEstoque.id_produto == id_produto).scalar() or 0
-    return saldo
+    ).where(MovimentacaoEstoque.id_produto == id_produto)
+
+def consulta_produto_bloqueado(id_produto):
+    """Preço do produto, com a linha bloqueada até ao commit (SELECT ... FOR UPDATE).
+
+    Põe em série as entradas e saídas do mesmo produto: o saldo lido a seguir é
+    o da base no momento da escrita, e o novo saldo publicado no evento e a
+    verificação de estoque insuficiente não usam um valor já ultrapassado.
+    No SQLite, junto com bloquear_escrita.
+    """
+    return db.select(Produto.preco).where(Produto.id_produto == id_produto).with_for_update()
+
+def calcular_saldo_produto(id_produto):
+    # No MySQL o SUM devolve um Decimal.
+    return int(db.session.execute(consulta_saldo_produto(id_produto)).scalar() or 0)
+
+def subquery_saldos(antes_de=None):
+    """Saldo por produto numa única agregação (id_produto, saldo), para usar em joins."""
+    query = db.session.query(
+        MovimentacaoEstoque.id_produto,
+        func.sum(case(
+            (MovimentacaoEstoque.tipo == 'Entrada', MovimentacaoEstoque.quantidade),
+            (MovimentacaoEstoque.tipo == 'Saida', -MovimentacaoEstoque.quantidade)
+        )).label('saldo')
+    )
+    if antes_de is not None:
+        query = query.filter(MovimentacaoEstoque.data_hora < antes_de)
+    return query.group_by(MovimentacaoEstoque.id_produto).subquery()
+
+def converter_preco(valor):
+    try:
+        return Decimal(str(valor or 0).replace(',', '.')).quantize(Decimal('0.01'))
+    except InvalidOperation:
+        raise ValueError(f"Preço inválido: '{valor}'")
+
+def ajustar_agregado(produtos=0, fornecedores=0, valor=0):
+    """Soma os deltas aos KPIs dentro da transação atual (x = x + delta no próprio SQL).
+
+    Deve ser chamada antes do commit da rota que fez a escrita, para que o
+    agregado e os dados nunca fiquem separados.
+    """
+    db.session.execute(instrucao_agregado(produtos, fornecedores, valor))
+
+def instrucao_agregado(produtos=0, fornecedores=0, valor=0):
+    return update(AgregadoEstoque).where(AgregadoEstoque.id == 1).values(
+        total_produtos=AgregadoEstoque.total_produtos + produtos,
+        total_fornecedores=AgregadoEstoque.total_fornecedores + fornecedores,
+        valor_total_estoque=AgregadoEstoque.valor_total_estoque + Decimal(valor),
+        data_atualizacao=datetime.now()
+    )
+
+def registar_evento(id_produto, novo_saldo, removido=False):
+    """Regista o evento na transação da rota; só fica visível no stream após o commit."""
+    db.session.execute(instrucao_evento(id_produto, novo_saldo, removido))
+
+def registar_eventos_produtos(ids):
+    """Um evento por produto, com o saldo atual (ex.: alterações de fornecedores/naturezas)."""
+    ids = set(ids)
+    if not ids:
+        return
+    saldos = dict(db.session.execute(
+        db.select(MovimentacaoEstoque.id_produto, func.sum(case(
+            (MovimentacaoEstoque.tipo == 'Entrada', MovimentacaoEstoque.quantidade),
+            (MovimentacaoEstoque.tipo == 'Saida', -MovimentacaoEstoque.quantidade)
+        ))).where(MovimentacaoEstoque.id_produto.in_(ids)).group_by(MovimentacaoEstoque.id_produto)
+    ).all())
+    agora = datetime.now()
+    db.session.execute(EventoEstoque.__table__.insert(), [
+        {'id_produto': i, 'novo_saldo': int(saldos.get(i) or 0), 'removido': False, 'data_hora': agora} for i in sorted(ids)
+    ])
+
+def instrucao_evento(id_produto, novo_saldo, removido=False):
+    return EventoEstoque.__table__.insert().values(
+        id_produto=id_produto, novo_saldo=novo_saldo, removido=removido, data_hora=datetime.now()
+    )
+
+def chave_valida(chave):
+    return chave is None or (isinstance(chave, str) and 0 < len(chave) <= 64)
+
+def consulta_chave(chave):
+    return db.select(ChaveMovimentacao.novo_saldo, ChaveMovimentacao.tipo, ChaveMovimentacao.id_produto)\
+        .where(ChaveMovimentacao.chave == chave)
+
+def instrucao_chave(chave, id_movimentacao, tipo, id_produto, novo_saldo):
+    return ChaveMovimentacao.__table__.insert().values(
+        chave=chave, id_movimentacao=id_movimentacao, tipo=tipo, id_produto=id_produto,
+        novo_saldo=novo_saldo, data_hora=datetime.now()
+    )
+
+def resposta_movimentacao(tipo, id_produto, novo_saldo, repetido=False):
+    mensagem = 'Entrada registrada!' if tipo == 'Entrada' else 'Saída registrada!'
+    resposta = {'mensagem': mensagem, 'id_produto': id_produto, 'novo_saldo': novo_saldo}
+    if repetido:
+        resposta['repetido'] = True
+    return resposta
+
+def resposta_repetida(registo, tipo, id_produto):
+    """(status, corpo) para um pedido cuja chave já existe: a resposta do primeiro,
+    ou 409 se a chave foi usada noutro movimento (outro tipo ou outro produto)."""
+    novo_saldo, tipo_registado, produto_registado = registo
+    if tipo_registado != tipo or str(produto_registado) != str(id_produto):
+        return 409, {'erro': 'Chave de idempotência já usada noutro movimento.'}
+    return 201, resposta_movimentacao(tipo, produto_registado, novo_saldo, repetido=True)
+
+def linhas_catalogo(ids=None):
+    """Produtos com saldo, fornecedores e naturezas (formato do /api/sync); com ids, só esses."""
+    saldos = subquery_saldos()
+    query = db.session.query(Produto, saldos.c.saldo).outerjoin(saldos, Produto.id_produto == saldos.c.id_produto)
+    forn = db.session.query(produto_fornecedor.c.FK_PRODUTO_Id_produto, Fornecedor.nome)\
+        .join(Fornecedor, Fornecedor.id_fornecedor == produto_fornecedor.c.FK_FORNECEDOR_id_fornecedor)
+    nat = db.session.query(produto_natureza.c.fk_PRODUTO_Id_produto, Natureza.nome)\
+        .join(Natureza, Natureza.id_natureza == produto_natureza.c.fk_NATUREZA_id_natureza)
+    if ids is not None:
+        query = query.filter(Produto.id_produto.in_(ids))
+        forn = forn.filter(produto_fornecedor.c.FK_PRODUTO_Id_produto.in_(ids))
+        nat = nat.filter(produto_natureza.c.fk_PRODUTO_Id_produto.in_(ids))
+
+    fornecedores, naturezas = {}, {}
+    for id_produto, nome in forn:
+        fornecedores.setdefault(id_produto, []).append(nome)
+    for id_produto, nome in nat:
+        naturezas.setdefault(id_produto, []).append(nome)
+
+    return [{
+        'id_produto': p.id_produto,
+        'codigo': p.codigo.strip() if p.codigo else '',
+        'nome': p.nome,
+        'descricao': p.descricao,
+        'preco': str(p.preco),
+        'codigoB': p.codigoB.strip() if p.codigoB else '',
+        'codigoC': p.codigoC.strip() if p.codigoC else '',
+        'saldo_atual': int(saldo or 0),
+        'fornecedores': ", ".join(sorted(fornecedores.get(p.id_produto, []))),
+        'naturezas': ", ".join(sorted(naturezas.get(p.id_produto, [])))
+    } for p, saldo in query.all()]
+
+def calcular_kpis_completos():
+    total_produtos = db.session.query(func.count(Produto.id_produto)).scalar()
+    total_fornecedores = db.session.query(func.count(Fornecedor.id_fornecedor)).scalar()
+
+    saldos = subquery_saldos()
+    valor_total_estoque = db.session.query(
+        func.sum(Produto.preco * saldos.c.saldo)
+    ).join(saldos, Produto.id_produto == saldos.c.id_produto).scalar() or 0
+
+    return {
+        'total_produtos': total_produtos,
+        'total_fornecedores': total_fornecedores,
+        'valor_total_estoque': Decimal(valor_total_estoque).quantize(Decimal('0.01'))
+    }
+
+def obter_agregado():
+    agregado = db.session.get(AgregadoEstoque, 1)
+    if agregado is None:
+        # Primeira utilização: a linha é criada a partir dos dados existentes.
+        agregado = AgregadoEstoque(id=1, **calcular_kpis_completos())
+        db.session.add(agregado)
+        try:
+            db.session.commit()
+        except IntegrityError:
+            # Outro pedido (ou worker) criou a linha entretanto: vale a dele.
+            db.session.rollback()
+            agregado = db.session.get(AgregadoEstoque, 1)
+    return agregado
 
 # ==============================================================================
 # ROTAS: PRODUTOS
@@ -253,6 +530,9 @@ def add_novo_produto():
             codigoC=dados.get('codigoC')
         )
         db.session.add(novo_produto)
+        ajustar_agregado(produtos=1)
+        db.session.flush()
+        registar_evento(novo_produto.id_produto, 0)
         db.session.commit()
         
         return jsonify({
@@ -264,6 +544,11 @@ def add_novo_produto():
         db.session.rollback()
         return jsonify({'erro': str(e)}), 500
 
+# Tamanhos das colunas de produto, validados antes do lote (no MySQL estrito
+# um valor longo demais fazia falhar a importação inteira).
+LIMITES_IMPORTACAO = {campo: getattr(Produto, campo).type.length for campo in ('codigo', 'nome', 'descricao')}
+TAMANHO_LOTE_IMPORTACAO = 500
+
 @app.route('/api/produtos/importar', methods=['POST'])
 @jwt_required()
 def importar_produtos_csv():
@@ -292,55 +577,90 @@ def importar_produtos_csv():
 
         id_usuario_logado = get_jwt_identity()
 
+        # Códigos, fornecedores e naturezas carregados uma vez, em vez de uma consulta por linha.
+        codigos_existentes = {c.strip() for (c,) in db.session.query(Produto.codigo) if c}
+        fornecedores_por_nome = {f.nome: f.id_fornecedor for f in Fornecedor.query.all()}
+        naturezas_por_nome = {n.nome: n.id_natureza for n in Natureza.query.all()}
+
+        # 1.ª passagem: valida todas as linhas. Só as válidas entram no lote, e uma
+        # linha inválida fica na lista de erros em vez de falhar a importação.
+        validas = []
         for linha_num, linha in enumerate(csv_reader, start=2):
             try:
-                codigo = linha.get('codigo', '').strip()
-                nome = linha.get('nome', '').strip()
-                preco_str = linha.get('preco', '0').strip()
+                codigo = (linha.get('codigo') or '').strip()
+                nome = (linha.get('nome') or '').strip()
+                descricao = (linha.get('descricao') or '').strip()
 
                 if not codigo or not nome:
                     erros.append(f"Linha {linha_num}: Campos obrigatórios (codigo, nome) em falta.")
                     continue
-
-                if Produto.query.filter_by(codigo=codigo).first():
+                if codigo in codigos_existentes:
                     erros.append(f"Linha {linha_num}: Código '{codigo}' já existe.")
                     continue
+                excedidos = [campo for campo, valor in (('codigo', codigo), ('nome', nome), ('descricao', descricao))
+                             if len(valor) > LIMITES_IMPORTACAO[campo]]
+                if excedidos:
+                    erros.append(f"Linha {linha_num}: {', '.join(f'{c} com mais de {LIMITES_IMPORTACAO[c]} caracteres' for c in excedidos)}.")
+                    continue
 
-                novo_produto = Produto(
-                    codigo=codigo,
-                    nome=nome,
-                    preco=preco_str.replace(',', '.') if preco_str else '0.00',
-                    descricao=linha.get('descricao', '').strip()
-                )
-
-                fornecedores_nomes = [fn.strip() for fn in linha.get('fornecedores_nomes', '').split(',') if fn.strip()]
-                if fornecedores_nomes:
-                    novo_produto.fornecedores.extend(Fornecedor.query.filter(Fornecedor.nome.in_(fornecedores_nomes)).all())
-
-                naturezas_nomes = [nn.strip() for nn in linha.get('naturezas_nomes', '').split(',') if nn.strip()]
-                if naturezas_nomes:
-                    novo_produto.naturezas.extend(Natureza.query.filter(Natureza.nome.in_(naturezas_nomes)).all())
-
-                db.session.add(novo_produto)
-                db.session.flush()
-
-                qtd_inicial = linha.get('quantidade', '0').strip()
-                if qtd_inicial and int(qtd_inicial) > 0:
-                    mov_inicial = MovimentacaoEstoque(
-                        id_produto=novo_produto.id_produto,
-                        id_usuario=id_usuario_logado,
-                        quantidade=int(qtd_inicial),
-                        tipo='Entrada',
-                        motivo_saida='Balanço Inicial via Importação'
-                    )
-                    db.session.add(mov_inicial)
-                
-                sucesso_count += 1
+                try:
+                    qtd_inicial = int((linha.get('quantidade') or '0').strip() or 0)
+                except ValueError:
+                    erros.append(f"Linha {linha_num}: Quantidade inválida: '{linha.get('quantidade')}'.")
+                    continue
+                preco = converter_preco((linha.get('preco') or '0').strip())
 
+                fornecedores_nomes = {fn.strip() for fn in (linha.get('fornecedores_nomes') or '').split(',') if fn.strip()}
+                naturezas_nomes = {nn.strip() for nn in (linha.get('naturezas_nomes') or '').split(',') if nn.strip()}
             except Exception as e_interno:
                 erros.append(f"Linha {linha_num}: Erro ao processar - {e_interno}.")
                 continue
 
+            codigos_existentes.add(codigo)
+            validas.append({
+                'produto': {'codigo': codigo, 'nome': nome, 'preco': preco, 'descricao': descricao},
+                'quantidade': max(qtd_inicial, 0),
+                'fornecedores': sorted(fornecedores_por_nome[n] for n in fornecedores_nomes if n in fornecedores_por_nome),
+                'naturezas': sorted(naturezas_por_nome[n] for n in naturezas_nomes if n in naturezas_por_nome),
+            })
+
+        # 2.ª passagem: o lote entra em poucas instruções executemany, seja qual for o nº de linhas.
+        if validas:
+            db.session.execute(Produto.__table__.insert(), [
+                {'Nome': v['produto']['nome'], 'Codigo': v['produto']['codigo'],
+                 'Preco': v['produto']['preco'], 'Descricao': v['produto']['descricao']} for v in validas
+            ])
+            codigos = [v['produto']['codigo'] for v in validas]
+            ids = {}
+            for i in range(0, len(codigos), TAMANHO_LOTE_IMPORTACAO):
+                ids.update((c.strip(), id_produto) for c, id_produto in db.session.execute(
+                    db.select(Produto.codigo, Produto.id_produto).where(Produto.codigo.in_(codigos[i:i + TAMANHO_LOTE_IMPORTACAO]))))
+            for v in validas:
+                v['id_produto'] = ids[v['produto']['codigo']]
+
+            fornecedores = [{'FK_PRODUTO_Id_produto': v['id_produto'], 'FK_FORNECEDOR_id_fornecedor': f}
+                            for v in validas for f in v['fornecedores']]
+            if fornecedores:
+                db.session.execute(produto_fornecedor.insert(), fornecedores)
+            naturezas = [{'fk_PRODUTO_Id_produto': v['id_produto'], 'fk_NATUREZA_id_natureza': n}
+                         for v in validas for n in v['naturezas']]
+            if naturezas:
+                db.session.execute(produto_natureza.insert(), naturezas)
+
+            agora = datetime.now()
+            entradas = [{'id_produto': v['id_produto'], 'id_usuario': id_usuario_logado, 'quantidade': v['quantidade'],
+                         'tipo': 'Entrada', 'motivo_saida': 'Balanço Inicial via Importação', 'data_hora': agora}
+                        for v in validas if v['quantidade'] > 0]
+            if entradas:
+                db.session.execute(MovimentacaoEstoque.__table__.insert(), entradas)
+            db.session.execute(EventoEstoque.__table__.insert(), [
+                {'id_produto': v['id_produto'], 'novo_saldo': v['quantidade'], 'removido': False, 'data_hora': agora}
+                for v in validas
+            ])
+
+            sucesso_count = len(validas)
+            valor_importado = sum((v['produto']['preco'] * v['quantidade'] for v in validas), Decimal(0))
+            ajustar_agregado(produtos=sucesso_count, valor=valor_importado)
         db.session.commit()
         
         return jsonify({
@@ -349,6 +669,9 @@ def importar_produtos_csv():
             'erros': erros
         }), 200
 
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'erro': 'Um dos códigos foi criado por outro utilizador durante a importação. Importe o ficheiro de novo.'}), 409
     except Exception as e:
         db.session.rollback()
         return jsonify({'erro': f'Erro geral ao processar: {str(e)}'}), 500
@@ -408,6 +731,11 @@ def produto_por_id_endpoint(id_produto):
         
         elif request.method == 'PUT':
             dados = request.get_json()
+
+            preco_antigo = converter_preco(produto.preco)
+            preco_novo = converter_preco(dados['preco'])
+            if preco_novo != preco_antigo:
+                ajustar_agregado(valor=(preco_novo - preco_antigo) * calcular_saldo_produto(id_produto))
             
             produto.nome = dados['nome']
             produto.codigo = dados['codigo']
@@ -426,6 +754,8 @@ def produto_por_id_endpoint(id_produto):
                 if dados['naturezas_ids']:
                     produto.naturezas = Natureza.query.filter(Natureza.id_natureza.in_(dados['naturezas_ids'])).all()
 
+            registar_evento(id_produto, calcular_saldo_produto(id_produto))
+            canal_cache.publicar('produtos')
             db.session.commit()
 
             updated_product = Produto.query.options(joinedload(Produto.fornecedores), joinedload(Produto.naturezas)).get(id_produto)
@@ -446,6 +776,9 @@ def produto_por_id_endpoint(id_produto):
                 return jsonify({'erro': 'Produto possui histórico de movimentações e não pode ser excluído.'}), 400
 
             db.session.delete(produto)
+            ajustar_agregado(produtos=-1)
+            registar_evento(id_produto, 0, removido=True)
+            canal_cache.publicar('produtos')
             db.session.commit()
             return jsonify({'mensagem': 'Produto excluído com sucesso!'}), 200
     
@@ -457,16 +790,22 @@ def produto_por_id_endpoint(id_produto):
 @jwt_required()
 def get_produto_por_codigo(codigo):
     try:
-        produto = Produto.query.filter_by(codigo=codigo.strip()).first()
-        if produto:
-            return jsonify({
+        # Leitura do scanner: os produtos encontrados ficam em cache neste processo.
+        codigo = codigo.strip()
+        dados = cache_codigos.obter(codigo)
+        if dados is None:
+            produto = Produto.query.filter_by(codigo=codigo).first()
+            if not produto:
+                return jsonify({'erro': 'Produto não encontrado.'}), 404
+            dados = {
                 'id': produto.id_produto,
                 'nome': produto.nome,
                 'codigo': produto.codigo.strip(),
                 'descricao': produto.descricao,
                 'preco': str(produto.preco)
-            }), 200
-        return jsonify({'erro': 'Produto não encontrado.'}), 404
+            }
+            cache_codigos.guardar(codigo, dados)
+        return jsonify(dados), 200
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
@@ -492,6 +831,7 @@ def adicionar_fornecedor_ao_produto(id_produto):
 
         if fornecedor not in produto.fornecedores:
             produto.fornecedores.append(fornecedor)
+            registar_eventos_produtos([id_produto])
             db.session.commit()
         return jsonify({'mensagem': 'Associação realizada.'}), 200
 
@@ -512,6 +852,7 @@ def adicionar_natureza_ao_produto(id_produto):
 
         if natureza not in produto.naturezas:
             produto.naturezas.append(natureza)
+            registar_eventos_produtos([id_produto])
             db.session.commit()
         return jsonify({'mensagem': 'Associação realizada.'}), 200
 
@@ -528,6 +869,7 @@ def remover_fornecedor_do_produto(id_produto, id_fornecedor):
 
         if fornecedor in produto.fornecedores:
             produto.fornecedores.remove(fornecedor)
+            registar_eventos_produtos([id_produto])
             db.session.commit()
             return jsonify({'mensagem': 'Associação removida.'}), 200
         return jsonify({'erro': 'Associação não encontrada.'}), 404
@@ -545,6 +887,7 @@ def remover_natureza_do_produto(id_produto, id_natureza):
 
         if natureza in produto.naturezas:
             produto.naturezas.remove(natureza)
+            registar_eventos_produtos([id_produto])
             db.session.commit()
             return jsonify({'mensagem': 'Associação removida.'}), 200
         return jsonify({'erro': 'Associação não encontrada.'}), 404
@@ -557,6 +900,23 @@ def remover_natureza_do_produto(id_produto, id_natureza):
 # ROTAS: ESTOQUE
 # ==============================================================================
 
+def movimentacao_repetida(tipo, chave, id_produto):
+    """Resposta já dada a um pedido com esta chave, ou None se ela for nova."""
+    if chave is None:
+        return None
+    registo = db.session.execute(consulta_chave(chave)).first()
+    if registo is None:
+        return None
+    status, corpo = resposta_repetida(registo, tipo, id_produto)
+    return jsonify(corpo), status
+
+def guardar_chave(chave, movimentacao, novo_saldo):
+    if chave is not None:
+        db.session.flush()
+        db.session.execute(instrucao_chave(
+            chave, movimentacao.id_movimentacao, movimentacao.tipo, movimentacao.id_produto, novo_saldo
+        ))
+
 @app.route('/api/estoque/entrada', methods=['POST'])
 @jwt_required()
 def registrar_entrada():
@@ -564,10 +924,18 @@ def registrar_entrada():
         dados = request.get_json()
         if 'id_produto' not in dados or 'quantidade' not in dados:
             return jsonify({'erro': 'Campos obrigatórios em falta'}), 400
-
+        chave = dados.get('chave')
+        if not chave_valida(chave):
+            return jsonify({'erro': 'Chave de idempotência inválida.'}), 400
         id_produto = dados['id_produto']
+        repetida = movimentacao_repetida('Entrada', chave, id_produto)
+        if repetida:
+            return repetida
+
         qtd = dados['quantidade']
-        
+
+        bloquear_escrita(db.session)
+        preco = db.session.execute(consulta_produto_bloqueado(id_produto)).scalar()
         saldo_atual = calcular_saldo_produto(id_produto)
 
         nova_entrada = MovimentacaoEstoque(
@@ -577,9 +945,16 @@ def registrar_entrada():
             tipo='Entrada'
         )
         db.session.add(nova_entrada)
+        ajustar_agregado(valor=converter_preco(preco) * qtd)
+        registar_evento(id_produto, saldo_atual + qtd)
+        guardar_chave(chave, nova_entrada, saldo_atual + qtd)
         db.session.commit()
         
-        return jsonify({'mensagem': 'Entrada registrada!', 'novo_saldo': saldo_atual + qtd}), 201
+        return jsonify(resposta_movimentacao('Entrada', id_produto, saldo_atual + qtd)), 201
+    except IntegrityError as e:
+        # O mesmo pedido chegou duas vezes ao mesmo tempo: o outro já o registou.
+        db.session.rollback()
+        return movimentacao_repetida('Entrada', chave, id_produto) or (jsonify({'erro': str(e)}), 500)
     except Exception as e:
         db.session.rollback()
         return jsonify({'erro': str(e)}), 500
@@ -592,12 +967,21 @@ def registrar_saida():
         required = ['id_produto', 'quantidade', 'motivo_saida']
         if not all(k in dados for k in required):
             return jsonify({'erro': 'Campos obrigatórios em falta'}), 400
-
+        chave = dados.get('chave')
+        if not chave_valida(chave):
+            return jsonify({'erro': 'Chave de idempotência inválida.'}), 400
         id_produto = dados['id_produto']
+        repetida = movimentacao_repetida('Saida', chave, id_produto)
+        if repetida:
+            return repetida
+
         qtd = dados['quantidade']
-        
+
+        bloquear_escrita(db.session)
+        preco = db.session.execute(consulta_produto_bloqueado(id_produto)).scalar()
         saldo_atual = calcular_saldo_produto(id_produto)
         if saldo_atual < qtd:
+            db.session.rollback()
             return jsonify({'erro': f'Estoque insuficiente. Saldo atual: {saldo_atual}'}), 400
 
         nova_saida = MovimentacaoEstoque(
@@ -608,9 +992,15 @@ def registrar_saida():
             motivo_saida=dados.get('motivo_saida')
         )
         db.session.add(nova_saida)
+        ajustar_agregado(valor=-converter_preco(preco) * qtd)
+        registar_evento(id_produto, saldo_atual - qtd)
+        guardar_chave(chave, nova_saida, saldo_atual - qtd)
         db.session.commit()
         
-        return jsonify({'mensagem': 'Saída registrada!', 'novo_saldo': saldo_atual - qtd}), 201
+        return jsonify(resposta_movimentacao('Saida', id_produto, saldo_atual - qtd)), 201
+    except IntegrityError as e:
+        db.session.rollback()
+        return movimentacao_repetida('Saida', chave, id_produto) or (jsonify({'erro': str(e)}), 500)
     except Exception as e:
         db.session.rollback()
         return jsonify({'erro': str(e)}), 500
@@ -620,7 +1010,8 @@ def registrar_saida():
 def get_saldos_estoque():
     try:
         termo = request.args.get('search')
-        query = Produto.query
+        saldos = subquery_saldos()
+        query = db.session.query(Produto, saldos.c.saldo).outerjoin(saldos, Produto.id_produto == saldos.c.id_produto)
 
         if termo:
             query = query.filter(or_(
@@ -633,12 +1024,12 @@ def get_saldos_estoque():
         produtos = query.all()
         saldos_json = []
         
-        for p in produtos:
+        for p, saldo in produtos:
             saldos_json.append({
                 'id_produto': p.id_produto,
                 'codigo': p.codigo.strip() if p.codigo else '',
                 'nome': p.nome,
-                'saldo_atual': calcular_saldo_produto(p.id_produto),
+                'saldo_atual': int(saldo or 0),
                 'preco': str(p.preco),
                 'codigoB': p.codigoB.strip() if p.codigoB else '',
                 'codigoC': p.codigoC.strip() if p.codigoC else ''
@@ -678,6 +1069,84 @@ def get_todas_movimentacoes():
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
+# ==============================================================================
+# ROTAS: EVENTOS (Server-Sent Events)
+# ==============================================================================
+
+# Cada stream ocupa uma thread do waitress enquanto está aberto; para muitos
+# postos, servir /api/eventos a partir de asgi_terminal.py.
+limite_streams = threading.BoundedSemaphore(int(os.getenv(
+    'EVENTOS_MAX_LIGACOES', str(max(1, int(os.getenv('WAITRESS_THREADS', '4')) // 2)))))
+
+@app.route('/api/eventos', methods=['GET'])
+@jwt_required()
+def stream_eventos():
+    inicio = inicio_pedido(request.headers.get('Last-Event-ID'), request.args.get('desde'))
+    if inicio is None:
+        inicio = db.session.execute(consulta_ultimo_evento(EventoEstoque.__table__)).scalar()
+
+    if not limite_streams.acquire(blocking=False):
+        return jsonify({'erro': 'Demasiadas ligações ao stream de eventos.'}), 503, {'Retry-After': '30'}
+    leitor = LeitorEventos(EventoEstoque.__table__, inicio)
+    resposta = Response(gerar_eventos(db.engine, leitor), mimetype='text/event-stream', headers=CABECALHOS)
+    # call_on_close corre mesmo que o cliente desligue antes de o gerador começar.
+    resposta.call_on_close(limite_streams.release)
+    return resposta
+
+# Acima disto, uma resposta completa é mais barata do que filtrar por id.
+LIMITE_DELTA_SYNC = 5000
+
+@app.route('/api/sync', methods=['GET'])
+@jwt_required()
+def sincronizar_catalogo():
+    """Produtos alterados desde a sequência `since`; sem ela (ou muito antiga), o catálogo todo."""
+    try:
+        desde = request.args.get('since', type=int)
+        seq_min, seq_max = db.session.query(func.min(EventoEstoque.id), func.max(EventoEstoque.id)).one()
+        seq_max = seq_max or 0
+
+        # Não avançar a sequência sobre eventos muito recentes: com MySQL, um id menor pode
+        # ainda estar por confirmar. Esses eventos vêm outra vez no pedido seguinte.
+        recente = db.session.query(func.min(EventoEstoque.id)).filter(
+            EventoEstoque.id > (desde or 0),
+            EventoEstoque.data_hora > datetime.now() - timedelta(seconds=ESPERA_LACUNA)
+        ).scalar()
+        seq = recente - 1 if recente else seq_max
+
+        completo = desde is None or desde > seq_max or (seq_min is not None and desde < seq_min - 1)
+        ids = []
+        if not completo:
+            ids = [i for (i,) in db.session.query(EventoEstoque.id_produto).filter(EventoEstoque.id > desde).distinct()]
+            completo = len(ids) > LIMITE_DELTA_SYNC
+
+        if completo:
+            return jsonify({'seq': seq, 'completo': True, 'produtos': linhas_catalogo(), 'removidos': []}), 200
+
+        produtos = linhas_catalogo(ids) if ids else []
+        presentes = {p['id_produto'] for p in produtos}
+        return jsonify({
+            'seq': seq,
+            'completo': False,
+            'produtos': produtos,
+            'removidos': sorted(set(ids) - presentes)
+        }), 200
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+# ==============================================================================
+# ROTAS: SAÚDE DO SERVIDOR
+# ==============================================================================
+
+@app.route('/api/saude', methods=['GET'])
+def saude():
+    """Sem autenticação, para balanceadores e monitorização: processo e base de dados."""
+    try:
+        db.session.execute(db.select(1))
+        return jsonify({'estado': 'ok', 'pid': os.getpid(), 'conversor': obter_conversor().estado()}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'estado': 'erro', 'pid': os.getpid(), 'erro': str(e)}), 503
+
 # ==============================================================================
 # ROTAS: AUTENTICAÇÃO E USUÁRIOS
 # ==============================================================================
@@ -840,6 +1309,7 @@ def gerir_fornecedores():
         if not dados.get('nome'): return jsonify({'erro': 'Nome obrigatório'}), 400
         
         db.session.add(Fornecedor(nome=dados['nome']))
+        ajustar_agregado(fornecedores=1)
         db.session.commit()
         return jsonify({'mensagem': 'Fornecedor criado!'}), 201
     except Exception as e:
@@ -859,6 +1329,7 @@ def fornecedor_id_ops(id_fornecedor):
             dados = request.get_json()
             if not dados.get('nome'): return jsonify({'erro': 'Nome obrigatório'}), 400
             fornecedor.nome = dados['nome']
+            registar_eventos_produtos(p.id_produto for p in fornecedor.produtos)
             db.session.commit()
             return jsonify({'mensagem': 'Atualizado!'}), 200
             
@@ -866,6 +1337,7 @@ def fornecedor_id_ops(id_fornecedor):
             if fornecedor.produtos:
                 return jsonify({'erro': 'Possui associações. Não pode excluir.'}), 400
             db.session.delete(fornecedor)
+            ajustar_agregado(fornecedores=-1)
             db.session.commit()
             return jsonify({'mensagem': 'Excluído!'}), 200
     except Exception as e:
@@ -903,6 +1375,7 @@ def natureza_id_ops(id_natureza):
             dados = request.get_json()
             if not dados.get('nome'): return jsonify({'erro': 'Nome obrigatório'}), 400
             natureza.nome = dados['nome']
+            registar_eventos_produtos(p.id_produto for p in natureza.produtos)
             db.session.commit()
             return jsonify({'mensagem': 'Atualizado!'}), 200
             
@@ -924,29 +1397,185 @@ def natureza_id_ops(id_natureza):
 @jwt_required()
 def get_dashboard_kpis():
     try:
-        total_produtos = db.session.query(func.count(Produto.id_produto)).scalar()
-        total_fornecedores = db.session.query(func.count(Fornecedor.id_fornecedor)).scalar()
+        agregado = obter_agregado()
+        return jsonify({
+            'total_produtos': agregado.total_produtos,
+            'total_fornecedores': agregado.total_fornecedores,
+            'valor_total_estoque': float(agregado.valor_total_estoque)
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/api/dashboard/kpis/recalcular', methods=['POST'])
+@jwt_required()
+def recalcular_dashboard_kpis():
+    if get_jwt().get('permissao') != 'Administrador':
+        return jsonify({"erro": "Acesso negado."}), 403
+    try:
+        obter_agregado()
+        # A linha fica bloqueada até ao commit, para nenhuma escrita se perder entre o cálculo e a gravação.
+        bloquear_escrita(db.session)
+        agregado = db.session.query(AgregadoEstoque).filter_by(id=1).with_for_update().one()
+        reais = calcular_kpis_completos()
+
+        desvio = {
+            'total_produtos': reais['total_produtos'] - agregado.total_produtos,
+            'total_fornecedores': reais['total_fornecedores'] - agregado.total_fornecedores,
+            'valor_total_estoque': float(reais['valor_total_estoque'] - agregado.valor_total_estoque)
+        }
+
+        agregado.total_produtos = reais['total_produtos']
+        agregado.total_fornecedores = reais['total_fornecedores']
+        agregado.valor_total_estoque = reais['valor_total_estoque']
+        agregado.data_atualizacao = datetime.now()
+        db.session.commit()
 
-        subquery_saldos = db.session.query(
-            MovimentacaoEstoque.id_produto,
-            func.sum(case(
-                (MovimentacaoEstoque.tipo == 'Entrada', MovimentacaoEstoque.quantidade),
-                (MovimentacaoEstoque.tipo == 'Saida', -MovimentacaoEstoque.quantidade)
-            )).label('saldo')
-        ).group_by(MovimentacaoEstoque.id_produto).subquery()
+        return jsonify({
+            'mensagem': 'KPIs recalculados.',
+            'com_desvio': any(v != 0 for v in desvio.values()),
+            'desvio': desvio,
+            'valores': {
+                'total_produtos': reais['total_produtos'],
+                'total_fornecedores': reais['total_fornecedores'],
+                'valor_total_estoque': float(reais['valor_total_estoque'])
+            }
+        }), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 500
 
-        valor_total_estoque = db.session.query(
-            func.sum(Produto.preco * subquery_saldos.c.saldo)
-        ).join(subquery_saldos, Produto.id_produto == subquery_saldos.c.id_produto).scalar() or 0
+# As séries têm um ponto por dia: o período é limitado a cerca de 10 anos.
+MAX_DIAS_SERIES = 3660
+
+def _periodo_series():
+    fim = date.fromisoformat(request.args['fim']) if request.args.get('fim') else date.today()
+    if request.args.get('inicio'):
+        inicio = date.fromisoformat(request.args['inicio'])
+    else:
+        dias = request.args.get('dias', 365, type=int)
+        if not 1 <= dias <= MAX_DIAS_SERIES:
+            raise ValueError(f'dias deve estar entre 1 e {MAX_DIAS_SERIES}.')
+        inicio = fim - timedelta(days=dias - 1)
+    if inicio > fim:
+        raise ValueError('A data de início é posterior à data de fim.')
+    if (fim - inicio).days >= MAX_DIAS_SERIES:
+        raise ValueError(f'O período não pode passar de {MAX_DIAS_SERIES} dias.')
+    return inicio, fim
+
+def _dias(inicio, fim):
+    return [inicio + timedelta(days=n) for n in range((fim - inicio).days + 1)]
+
+@app.route('/api/dashboard/series/movimentacoes', methods=['GET'])
+@jwt_required()
+@somente_leitura
+def get_serie_movimentacoes():
+    try:
+        inicio, fim = _periodo_series()
+        agrupamento = request.args.get('agrupamento', 'dia')
+        if agrupamento not in ('dia', 'mes'):
+            return jsonify({'erro': "agrupamento deve ser 'dia' ou 'mes'."}), 400
+
+        linhas = db.session.query(
+            ResumoDiarioMov.data, ResumoDiarioMov.tipo, func.sum(ResumoDiarioMov.quantidade)
+        ).filter(ResumoDiarioMov.data.between(inicio, fim))\
+         .group_by(ResumoDiarioMov.data, ResumoDiarioMov.tipo).all()
+
+        chave = (lambda d: d.isoformat()) if agrupamento == 'dia' else (lambda d: d.strftime('%Y-%m'))
+        pontos = {}
+        for dia in _dias(inicio, fim):
+            pontos.setdefault(chave(dia), {'periodo': chave(dia), 'entradas': 0, 'saidas': 0})
+        for dia, tipo, qtd in linhas:
+            pontos[chave(dia)]['entradas' if tipo == 'Entrada' else 'saidas'] += int(qtd or 0)
+
+        return jsonify({'inicio': inicio.isoformat(), 'fim': fim.isoformat(), 'pontos': list(pontos.values())}), 200
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/api/dashboard/series/top-produtos', methods=['GET'])
+@jwt_required()
+@somente_leitura
+def get_serie_top_produtos():
+    try:
+        inicio, fim = _periodo_series()
+        tipo = request.args.get('tipo', 'Saida')
+        limite = min(request.args.get('limite', 10, type=int), 100)
+
+        query = db.session.query(
+            ResumoDiarioMov.id_produto,
+            func.sum(ResumoDiarioMov.quantidade).label('total'),
+            func.sum(ResumoDiarioMov.num_movimentacoes).label('num')
+        ).filter(ResumoDiarioMov.data.between(inicio, fim))
+        if tipo != 'Todos':
+            query = query.filter(ResumoDiarioMov.tipo == tipo)
+        top = query.group_by(ResumoDiarioMov.id_produto).order_by(func.sum(ResumoDiarioMov.quantidade).desc()).limit(limite).subquery()
+
+        linhas = db.session.query(Produto.id_produto, Produto.codigo, Produto.nome, top.c.total, top.c.num)\
+            .join(top, Produto.id_produto == top.c.id_produto)\
+            .order_by(top.c.total.desc()).all()
 
         return jsonify({
-            'total_produtos': total_produtos,
-            'total_fornecedores': total_fornecedores,
-            'valor_total_estoque': float(valor_total_estoque)
+            'inicio': inicio.isoformat(),
+            'fim': fim.isoformat(),
+            'produtos': [{
+                'id_produto': id_produto,
+                'codigo': codigo.strip() if codigo else '',
+                'nome': nome,
+                'quantidade': int(total or 0),
+                'num_movimentacoes': int(num or 0)
+            } for id_produto, codigo, nome, total, num in linhas]
         }), 200
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
+@app.route('/api/dashboard/series/valor-estoque', methods=['GET'])
+@jwt_required()
+@somente_leitura
+def get_serie_valor_estoque():
+    """Valor do estoque no fim de cada dia, aos preços atuais (o mesmo critério dos KPIs)."""
+    try:
+        inicio, fim = _periodo_series()
+        valor_liquido = func.sum(Produto.preco * case(
+            (ResumoDiarioMov.tipo == 'Entrada', ResumoDiarioMov.quantidade),
+            else_=-ResumoDiarioMov.quantidade
+        ))
+
+        base = db.session.query(valor_liquido).select_from(ResumoDiarioMov)\
+            .join(Produto, Produto.id_produto == ResumoDiarioMov.id_produto)\
+            .filter(ResumoDiarioMov.data < inicio).scalar() or 0
+        deltas = dict(db.session.query(ResumoDiarioMov.data, valor_liquido).select_from(ResumoDiarioMov)
+            .join(Produto, Produto.id_produto == ResumoDiarioMov.id_produto)
+            .filter(ResumoDiarioMov.data.between(inicio, fim))
+            .group_by(ResumoDiarioMov.data).all())
+
+        acumulado = Decimal(base)
+        pontos = []
+        for dia in _dias(inicio, fim):
+            acumulado += Decimal(deltas.get(dia) or 0)
+            pontos.append({'periodo': dia.isoformat(), 'valor': float(acumulado)})
+
+        return jsonify({'inicio': inicio.isoformat(), 'fim': fim.isoformat(), 'pontos': pontos}), 200
+    except ValueError as e:
+        return jsonify({'erro': str(e)}), 400
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/api/dashboard/series/reconstruir', methods=['POST'])
+@jwt_required()
+def reconstruir_series():
+    if get_jwt().get('permissao') != 'Administrador':
+        return jsonify({"erro": "Acesso negado."}), 403
+    try:
+        processadas = reconstruir_resumo_diario()
+        return jsonify({'mensagem': 'Resumo diário reconstruído.', 'movimentacoes_processadas': processadas}), 200
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'erro': str(e)}), 500
+
 @app.route('/api/servicos/<int:servico_id>/documentos', methods=['GET'])
 @jwt_required()
 def get_historico_documentos(servico_id):
@@ -959,7 +1588,7 @@ def get_historico_documentos(servico_id):
             'id': doc.id,
             'data_criacao': doc.data_criacao.strftime('%d/%m/%Y'),
             'versao': doc.versao,
-            'caminho_pdf': doc.caminho_pdf_final,
+            'url_pdf': f'/api/documentos/{doc.id}/pdf',
             'nome_usuario': doc.usuario.nome if doc.usuario else 'Desconhecido'
         } for doc in documentos]
         
@@ -976,11 +1605,17 @@ def gerir_documento_por_id(documento_id):
                 return jsonify({"erro": "Acesso negado."}), 403
 
             documento = DocumentosGerados.query.get_or_404(documento_id)
-            if os.path.exists(documento.caminho_pdf_final):
-                os.remove(documento.caminho_pdf_final)
+            blobs = {a.blob_hash for a in documento.anexos}
+            if documento.blob_corpo:
+                blobs.add(documento.blob_corpo)
+            caminho_pdf = documento.caminho_pdf_final
 
             db.session.delete(documento)
             db.session.commit()
+
+            if os.path.exists(caminho_pdf):
+                os.remove(caminho_pdf)
+            recolher_blobs(blobs)
             return jsonify({'mensagem': 'Documento excluído.'}), 200
 
         documento = DocumentosGerados.query.get_or_404(documento_id)
@@ -992,115 +1627,300 @@ def gerir_documento_por_id(documento_id):
 @app.route('/api/servicos/<int:servico_id>/documentos', methods=['POST'])
 @jwt_required()
 def gerar_novo_documento(servico_id):
-    dir_path = os.path.dirname(os.path.realpath(__file__))
-    temp_docx = os.path.join(dir_path, 'temp_documento.docx')
-    temp_pdf = os.path.join(dir_path, 'temp_documento.pdf')
-    output_folder = os.path.join(dir_path, 'documentos_gerados')
+    if 'dados_formulario' not in request.form:
+        return jsonify({'erro': 'Dados ausentes'}), 400
+    Servico.query.get_or_404(servico_id)
 
+    pasta_trabalho = tempfile.mkdtemp(prefix='pystock_tarefa_')
     try:
-        if 'dados_formulario' not in request.form:
-            return jsonify({'erro': 'Dados ausentes'}), 400
-        
-        dados_formulario_str = request.form.get('dados_formulario')
-        dados_formulario = json.loads(dados_formulario_str)
-        anexos = request.files.getlist('anexos')
-        id_usuario_logado = get_jwt_identity()
-        
-        versao_anterior = db.session.query(func.max(DocumentosGerados.versao)).filter_by(servico_id=servico_id).scalar()
-        nova_versao = (versao_anterior or 0) + 1
+        dados_formulario = json.loads(request.form.get('dados_formulario'))
 
-        doc = Document(os.path.join(dir_path, 'template.docx'))
-        
-        replacements = {}
-        replacements.update(dados_formulario.get('identificacao_projeto', {}))
-        replacements.update(dados_formulario.get('escopo_premissas', {}))
-        replacements.update(dados_formulario.get('diagramas_desenhos', {}))
-        replacements.update(dados_formulario.get('testes_comissionamento', {}))
-        replacements.update(dados_formulario.get('operacao_manutencao', {}))
-        replacements.update(dados_formulario.get('treinamento', {}))
-        replacements.update(dados_formulario.get('documentos_as_built', {}))
-        replacements.update(dados_formulario.get('anexos', {}))
-        
-        for p in doc.paragraphs:
-            for key, value in replacements.items():
-                if f'{{{{{key}}}}}' in p.text:
-                    for run in p.runs:
-                        run.text = run.text.replace(f'{{{{{key}}}}}', str(value))
-
-        for table in doc.tables:
-            for row in table.rows:
-                for cell in row.cells:
-                    for p in cell.paragraphs:
-                        for key, value in replacements.items():
-                            if f'{{{{{key}}}}}' in p.text:
-                                for run in p.runs:
-                                    run.text = run.text.replace(f'{{{{{key}}}}}', str(value))
-
-        try:
-            if 'lista_documentos_projeto' in dados_formulario:
-                tabela_docs = doc.tables[0]
-                for item in dados_formulario['lista_documentos_projeto']:
-                    celulas = tabela_docs.add_row().cells
-                    celulas[0].text, celulas[1].text, celulas[2].text, celulas[3].text, celulas[4].text, celulas[5].text = item.get('titulo', ''), item.get('codigo', ''), item.get('revisao', ''), item.get('data', ''), item.get('autor', ''), item.get('status', '')
-
-            if 'lista_instrumentos' in dados_formulario:
-                tabela_instrumentos = doc.tables[1]
-                for item in dados_formulario['lista_instrumentos']:
-                    celulas = tabela_instrumentos.add_row().cells
-                    celulas[0].text, celulas[1].text, celulas[2].text, celulas[3].text, celulas[4].text, celulas[5].text = item.get('tag', ''), item.get('descricao', ''), item.get('fabricante_modelo', ''), item.get('faixa', ''), item.get('sinal', ''), item.get('localizacao', '')
-
-            if 'programacao_logica' in dados_formulario:
-                tabela_programacao = doc.tables[2]
-                for item in dados_formulario['programacao_logica']:
-                    celulas = tabela_programacao.add_row().cells
-                    celulas[0].text, celulas[1].text = item.get('ficheiro', ''), item.get('descricao', '')
-
-            if 'treinamento' in dados_formulario and 'participantes' in dados_formulario['treinamento']:
-                tabela_participantes = doc.tables[3]
-                for item in dados_formulario['treinamento']['participantes']:
-                    celulas = tabela_participantes.add_row().cells
-                    celulas[0].text, celulas[1].text = item.get('nome', ''), item.get('certificado', '')
-
-            if 'documentos_as_built' in dados_formulario:
-                tabela_as_built = doc.tables[4]
-                for item in dados_formulario['documentos_as_built']:
-                    celulas = tabela_as_built.add_row().cells
-                    celulas[0].text, celulas[1].text = item.get('documento', ''), item.get('notas', '')
-        except IndexError:
-            print("AVISO: Tabelas insuficientes no template.")
-
-        doc.save(temp_docx)
-
-        subprocess.run(["soffice", "--headless", "--convert-to", "pdf", "--outdir", dir_path, temp_docx], check=True)
-        
-        merger = PdfWriter()
-        merger.append(temp_pdf)
-        for anexo in anexos:
-            merger.append(anexo.stream)
-        
-        filename = f"servico_{servico_id}_v{nova_versao}.pdf"
-        filepath = os.path.join(output_folder, filename)
-        with open(filepath, "wb") as f_out:
-            merger.write(f_out)
+        # Os anexos vão para o armazenamento antes de responder: o pedido termina
+        # aqui e a geração continua numa thread do executor.
+        armazenamento = obter_armazenamento()
+        anexos = [(armazenamento.guardar_stream(anexo.stream), anexo.filename) for anexo in request.files.getlist('anexos')]
 
-        db.session.add(DocumentosGerados(
-            servico_id=servico_id,
-            usuario_id=id_usuario_logado,
-            versao=nova_versao,
-            dados_formulario=dados_formulario,
-            caminho_pdf_final=filepath
-        ))
+        tarefa = TarefaDocumento(servico_id=servico_id, usuario_id=get_jwt_identity(), processo=identificador_processo())
+        db.session.add(tarefa)
         db.session.commit()
 
-        return jsonify({'mensagem': 'Gerado com sucesso', 'caminho_download': filepath}), 201
+        executor_documentos.submit(executar_tarefa_documento, tarefa.id, dados_formulario, anexos, pasta_trabalho)
+
+        return jsonify({
+            'mensagem': 'Geração iniciada.',
+            'id_tarefa': tarefa.id,
+            'url_estado': f'/api/tarefas/{tarefa.id}'
+        }), 202
 
     except Exception as e:
         db.session.rollback()
-        traceback.print_exc()
+        shutil.rmtree(pasta_trabalho, ignore_errors=True)
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/api/tarefas/<int:tarefa_id>', methods=['GET'])
+@jwt_required()
+def get_estado_tarefa(tarefa_id):
+    try:
+        tarefa = TarefaDocumento.query.get_or_404(tarefa_id)
+        resposta = {
+            'id': tarefa.id,
+            'servico_id': tarefa.servico_id,
+            'status': tarefa.status,
+            'erro': tarefa.mensagem_erro,
+            'data_criacao': tarefa.data_criacao.strftime('%d/%m/%Y %H:%M:%S'),
+            'documento_id': tarefa.documento_id
+        }
+        if tarefa.documento_id:
+            resposta['url_download'] = f'/api/documentos/{tarefa.documento_id}/pdf'
+        return jsonify(resposta), 200
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+@app.route('/api/documentos/<int:documento_id>/pdf', methods=['GET'])
+@jwt_required()
+def download_documento_pdf(documento_id):
+    documento = DocumentosGerados.query.get_or_404(documento_id)
+    try:
+        montar_pdf_final(documento)
+    except FileNotFoundError:
+        return jsonify({'erro': 'Ficheiro do documento não encontrado no servidor.'}), 404
+    except Exception as e:
         return jsonify({'erro': str(e)}), 500
-    finally:
-        if os.path.exists(temp_docx): os.remove(temp_docx)
-        if os.path.exists(temp_pdf): os.remove(temp_pdf)
+
+    # conditional=True trata Range, If-None-Match e If-Modified-Since e envia o
+    # ficheiro em blocos, sem o carregar em memória. ETag e Last-Modified vêm do
+    # registo e não do ficheiro da cache, que pode ser podado e montado de novo
+    # com o mesmo conteúdo.
+    resposta = send_file(
+        documento.caminho_pdf_final,
+        mimetype='application/pdf',
+        as_attachment=True,
+        download_name=f"servico_{documento.servico_id}_v{documento.versao}.pdf",
+        conditional=True,
+        etag=etag_documento(documento),
+        last_modified=documento.data_criacao.astimezone(),
+        max_age=86400
+    )
+    resposta.cache_control.public = False
+    resposta.cache_control.private = True
+    return resposta
+
+@app.route('/api/admin/armazenamento/recolher', methods=['POST'])
+@jwt_required()
+def recolher_armazenamento():
+    if get_jwt().get('permissao') != 'Administrador':
+        return jsonify({"erro": "Acesso negado."}), 403
+    try:
+        apagados = manter_armazenamento()
+        return jsonify({'mensagem': f'{apagados} blob(s) sem referência apagados.', 'apagados': apagados}), 200
+    except Exception as e:
+        return jsonify({'erro': str(e)}), 500
+
+def etag_documento(documento):
+    """Identifica o conteúdo de um documento gerado, que nunca muda depois de criado."""
+    return f"doc{documento.id}-v{documento.versao}-{int(documento.data_criacao.timestamp())}"
+
+def montar_pdf_final(documento):
+    """Garante que o PDF final está na cache, juntando os blobs se foi podado."""
+    if os.path.exists(documento.caminho_pdf_final):
+        marcar_uso(documento.caminho_pdf_final)
+        return documento.caminho_pdf_final
+    if not documento.blob_corpo:
+        raise FileNotFoundError(documento.caminho_pdf_final)
+
+    from juncao_pdf import juntar_pdfs
+    chaves = [documento.blob_corpo] + [a.blob_hash for a in documento.anexos]
+    with obter_armazenamento().caminhos_locais(chaves) as caminhos:
+        juntar_pdfs(caminhos, documento.caminho_pdf_final)
+    podar_cache_pdf(manter=documento.caminho_pdf_final)
+    return documento.caminho_pdf_final
+
+def recolher_blobs(candidatos=None):
+    """Apaga os blobs que já não são referidos por nenhum documento.
+
+    Sem `candidatos`, percorre o armazenamento inteiro. Blobs recentes ficam
+    sempre, porque podem pertencer a uma geração ainda sem registo na base.
+    """
+    armazenamento = obter_armazenamento()
+    if candidatos is None:
+        candidatos = {chave for chave, idade in armazenamento.listar() if idade > CARENCIA_RECOLHA}
+    if not candidatos:
+        return 0
+
+    usados = {h for (h,) in db.session.query(DocumentosGerados.blob_corpo).filter(DocumentosGerados.blob_corpo.in_(candidatos))}
+    usados |= {h for (h,) in db.session.query(DocumentoAnexo.blob_hash).filter(DocumentoAnexo.blob_hash.in_(candidatos))}
+
+    apagados = 0
+    for chave in candidatos - usados:
+        idade = armazenamento.idade(chave)
+        if idade is not None and idade > CARENCIA_RECOLHA:
+            armazenamento.apagar(chave)
+            apagados += 1
+    return apagados
+
+def manter_armazenamento():
+    """Tarefa diária: recolhe os blobs sem referência e poda as caches em disco."""
+    apagados = recolher_blobs()
+    podar_cache_pdf()
+    obter_armazenamento().podar_cache()
+    return apagados
+
+def identificador_processo():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+def _processo_vivo(identificador):
+    anfitriao, _, pid = identificador.rpartition(':')
+    if anfitriao != socket.gethostname():
+        # Tarefa de outro servidor com a mesma base: só ele a pode dar como perdida.
+        return True
+    if int(pid) == os.getpid():
+        return True
+    if os.name == 'nt':
+        # No Windows o servidor corre sempre num só processo.
+        return False
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+def recuperar_tarefas_interrompidas():
+    """Marca como Erro as tarefas por acabar cujo processo já não existe (servidor
+    reiniciado ou worker morto): a fila do executor só existe em memória, e sem
+    isto o cliente ficava a consultar /api/tarefas/<id> para sempre."""
+    with app.app_context():
+        pendentes = TarefaDocumento.query.filter(TarefaDocumento.status.in_(['Pendente', 'Processando'])).all()
+        interrompidas = [t for t in pendentes if t.processo is None or not _processo_vivo(t.processo)]
+        for tarefa in interrompidas:
+            tarefa.status = 'Erro'
+            tarefa.mensagem_erro = 'A geração foi interrompida por um reinício do servidor. Gere o documento de novo.'
+            tarefa.data_conclusao = datetime.now()
+        db.session.commit()
+        return len(interrompidas)
+
+def executar_tarefa_documento(tarefa_id, dados_formulario, anexos, pasta_trabalho):
+    with app.app_context():
+        try:
+            tarefa = TarefaDocumento.query.get(tarefa_id)
+            tarefa.status = 'Processando'
+            db.session.commit()
+
+            with medir_tarefa('documento'):
+                documento = gerar_pdf_documento(
+                    tarefa.servico_id, tarefa.usuario_id, dados_formulario, anexos, pasta_trabalho
+                )
+
+            tarefa.status = 'Concluida'
+            tarefa.documento_id = documento.id
+            tarefa.data_conclusao = datetime.now()
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            traceback.print_exc()
+            tarefa = TarefaDocumento.query.get(tarefa_id)
+            if tarefa:
+                tarefa.status = 'Erro'
+                tarefa.mensagem_erro = str(e)
+                tarefa.data_conclusao = datetime.now()
+                db.session.commit()
+        finally:
+            db.session.remove()
+            shutil.rmtree(pasta_trabalho, ignore_errors=True)
+
+TENTATIVAS_VERSAO = 5
+
+def gerar_pdf_documento(servico_id, usuario_id, dados_formulario, anexos, pasta_trabalho):
+    from modelo_documento import obter_modelo
+    dir_path = os.path.dirname(os.path.realpath(__file__))
+    temp_docx = os.path.join(pasta_trabalho, 'documento.docx')
+
+    modelo = obter_modelo(os.path.join(dir_path, 'template.docx'))
+    
+    replacements = {}
+    replacements.update(dados_formulario.get('identificacao_projeto', {}))
+    replacements.update(dados_formulario.get('escopo_premissas', {}))
+    replacements.update(dados_formulario.get('diagramas_desenhos', {}))
+    replacements.update(dados_formulario.get('testes_comissionamento', {}))
+    replacements.update(dados_formulario.get('operacao_manutencao', {}))
+    replacements.update(dados_formulario.get('treinamento', {}))
+    replacements.update(dados_formulario.get('documentos_as_built', {}))
+    replacements.update(dados_formulario.get('anexos', {}))
+    
+    doc = modelo.renderizar(replacements)
+
+    try:
+        if 'lista_documentos_projeto' in dados_formulario:
+            tabela_docs = doc.tables[0]
+            for item in dados_formulario['lista_documentos_projeto']:
+                celulas = tabela_docs.add_row().cells
+                celulas[0].text, celulas[1].text, celulas[2].text, celulas[3].text, celulas[4].text, celulas[5].text = item.get('titulo', ''), item.get('codigo', ''), item.get('revisao', ''), item.get('data', ''), item.get('autor', ''), item.get('status', '')
+
+        if 'lista_instrumentos' in dados_formulario:
+            tabela_instrumentos = doc.tables[1]
+            for item in dados_formulario['lista_instrumentos']:
+                celulas = tabela_instrumentos.add_row().cells
+                celulas[0].text, celulas[1].text, celulas[2].text, celulas[3].text, celulas[4].text, celulas[5].text = item.get('tag', ''), item.get('descricao', ''), item.get('fabricante_modelo', ''), item.get('faixa', ''), item.get('sinal', ''), item.get('localizacao', '')
+
+        if 'programacao_logica' in dados_formulario:
+            tabela_programacao = doc.tables[2]
+            for item in dados_formulario['programacao_logica']:
+                celulas = tabela_programacao.add_row().cells
+                celulas[0].text, celulas[1].text = item.get('ficheiro', ''), item.get('descricao', '')
+
+        if 'treinamento' in dados_formulario and 'participantes' in dados_formulario['treinamento']:
+            tabela_participantes = doc.tables[3]
+            for item in dados_formulario['treinamento']['participantes']:
+                celulas = tabela_participantes.add_row().cells
+                celulas[0].text, celulas[1].text = item.get('nome', ''), item.get('certificado', '')
+
+        if 'documentos_as_built' in dados_formulario:
+            tabela_as_built = doc.tables[4]
+            for item in dados_formulario['documentos_as_built']:
+                celulas = tabela_as_built.add_row().cells
+                celulas[0].text, celulas[1].text = item.get('documento', ''), item.get('notas', '')
+    except IndexError:
+        print("AVISO: Tabelas insuficientes no template.")
+
+    modelo.salvar(doc, temp_docx)
+
+    temp_pdf = obter_conversor().converter(temp_docx, pasta_trabalho)
+    blob_corpo = obter_armazenamento().guardar_ficheiro(temp_pdf)
+
+    # Com vários workers, duas gerações do mesmo serviço podem ler o mesmo
+    # máximo; a restrição única (servico_id, versao) recusa a segunda, que
+    # tenta o número seguinte.
+    for tentativa in range(TENTATIVAS_VERSAO):
+        versao_anterior = db.session.query(func.max(DocumentosGerados.versao)).filter_by(servico_id=servico_id).scalar()
+        nova_versao = (versao_anterior or 0) + 1
+        documento = DocumentosGerados(
+            servico_id=servico_id,
+            usuario_id=usuario_id,
+            versao=nova_versao,
+            dados_formulario=dados_formulario,
+            caminho_pdf_final=os.path.join(PASTA_CACHE_PDF, f"servico_{servico_id}_v{nova_versao}.pdf"),
+            blob_corpo=blob_corpo,
+            anexos=[DocumentoAnexo(ordem=i, blob_hash=h, nome=nome) for i, (h, nome) in enumerate(anexos)]
+        )
+        db.session.add(documento)
+        try:
+            db.session.flush()
+            break
+        except IntegrityError:
+            db.session.rollback()
+            if tentativa == TENTATIVAS_VERSAO - 1:
+                raise
+
+    # A versão já é desta geração: um PDF que esteja no caminho dela sobrou de
+    # uma tentativa falhada e não pode ser servido.
+    if os.path.exists(documento.caminho_pdf_final):
+        os.remove(documento.caminho_pdf_final)
+    # O PDF final fica já na cache, porque o download costuma vir logo a seguir.
+    montar_pdf_final(documento)
+
+    db.session.commit()
+    return documento
 
 @app.route('/api/versao', methods=['GET'])
 def get_versao_app():
@@ -1111,131 +1931,31 @@ def get_versao_app():
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
-# ==============================================================================
-# GERADORES DE PDF
-# ==============================================================================
-
-def gerar_pdf_etiquetas(produtos):
-    buffer = io.BytesIO()
-    w, h = 62 * mm, 100 * mm
-    doc = SimpleDocTemplate(buffer, pagesize=(w, h), leftMargin=5*mm, rightMargin=5*mm, topMargin=5*mm, bottomMargin=5*mm)
-    
-    styles = getSampleStyleSheet()
-    styles['Normal'].fontSize = 12
-    styles['Normal'].leading = 14
-    style_cod = ParagraphStyle(name='CodigoStyle', parent=styles['Normal'], alignment=TA_CENTER)
-    
-    elems = []
-    for p in produtos:
-        elems.append(Paragraph(f"<b>{p.nome}</b>", styles['Normal']))
-        elems.append(Spacer(1, 8*mm))
-        elems.append(code128.Code128(p.codigo, barHeight=20*mm, barWidth=0.4*mm))
-        elems.append(Spacer(1, 2*mm))
-        elems.append(Paragraph(p.codigo, style_cod))
-        elems.append(PageBreak())
-        
-    if elems: elems.pop()
-    doc.build(elems)
-    buffer.seek(0)
-    return buffer
-
-def gerar_inventario_pdf(dados):
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30)
-    elems = []
-    styles = getSampleStyleSheet()
-
-    elems.append(Paragraph("Relatório de Inventário Atual", styles['h1']))
-    elems.append(Spacer(1, 12))
-
-    table_data = [["Código", "Nome", "Saldo", "Preço Unit. (R$)", "Valor Total (R$)"]]
-    total_geral = 0
-    
-    for item in dados:
-        total_item = item['saldo_atual'] * item['preco']
-        total_geral += total_item
-        table_data.append([
-            item['codigo'], item['nome'], str(item['saldo_atual']),
-            f"{float(item['preco']):.2f}", f"{float(total_item):.2f}"
-        ])
-
-    t = Table(table_data)
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.grey),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0,0), (-1,-1), 1, colors.black)
-    ]))
-    elems.append(t)
-    elems.append(Spacer(1, 12))
-    elems.append(Paragraph(f"<b>Valor Total do Estoque:</b> R$ {float(total_geral):.2f}", styles['h3']))
-    
-    doc.build(elems)
-    buffer.seek(0)
-    return buffer
-
-def gerar_historico_pdf(dados):
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=landscape(letter))
-    elems = []
-    styles = getSampleStyleSheet()
-
-    elems.append(Paragraph("Relatório de Histórico de Movimentações", styles['h1']))
-    elems.append(Spacer(1, 12))
-    
-    table_data = [["Data/Hora", "Produto", "Tipo", "Qtd.", "Saldo Após", "Usuário", "Motivo"]]
-    for i in dados:
-        table_data.append([
-            i['data_hora'], f"{i['produto_codigo']} - {i['produto_nome']}",
-            i['tipo'], str(i['quantidade']), str(i['saldo_apos']),
-            i['usuario_nome'], i.get('motivo_saida', '')
-        ])
-
-    t = Table(table_data, colWidths=[110, 180, 50, 40, 60, 100, 130])
-    t.setStyle(TableStyle([
-        ('BACKGROUND', (0,0), (-1,0), colors.grey),
-        ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
-        ('ALIGN', (0,0), (-1,-1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0,0), (-1,-1), 1, colors.black)
-    ]))
-    elems.append(t)
-    doc.build(elems)
-    buffer.seek(0)
-    return buffer
-
 # ==============================================================================
 # ENDPOINTS RELATÓRIOS
 # ==============================================================================
 
 @app.route('/api/relatorios/inventario', methods=['GET'])
 @jwt_required()
+@somente_leitura
+@tarefa_medida('relatorio_inventario')
 def relatorio_inventario():
     formato = request.args.get('formato', 'pdf').lower()
-    produtos = Produto.query.all()
+    saldos = subquery_saldos()
+    produtos = db.session.query(Produto.codigo, Produto.nome, Produto.preco, saldos.c.saldo)\
+        .outerjoin(saldos, Produto.id_produto == saldos.c.id_produto).all()
     dados_relatorio = []
-    for produto in produtos:
-        saldo = calcular_saldo_produto(produto.id_produto)
+    for codigo, nome, preco, saldo in produtos:
         dados_relatorio.append({
-            'codigo': produto.codigo.strip(),
-            'nome': produto.nome,
-            'saldo_atual': saldo,
-            'preco': produto.preco
+            'codigo': codigo.strip(),
+            'nome': nome,
+            'saldo_atual': int(saldo or 0),
+            'preco': preco
         })
 
+    from relatorios import gerar_inventario_xlsx, gerar_inventario_pdf
     if formato == 'xlsx':
-        df = pd.DataFrame(dados_relatorio)
-        df['valor_total'] = df['saldo_atual'] * df['preco']
-        df = df.rename(columns={'codigo': 'Código', 'nome': 'Nome', 'saldo_atual': 'Saldo', 'preco': 'Preço Unitário (R$)', 'valor_total': 'Valor Total (R$)'})
-        
-        buffer = io.BytesIO()
-        df.to_excel(buffer, index=False, engine='openpyxl')
-        buffer.seek(0)
+        buffer = gerar_inventario_xlsx(dados_relatorio)
         return send_file(buffer, download_name="relatorio_inventario.xlsx", as_attachment=True)
     
     pdf_buffer = gerar_inventario_pdf(dados_relatorio)
@@ -1243,6 +1963,8 @@ def relatorio_inventario():
 
 @app.route('/api/relatorios/movimentacoes', methods=['GET'])
 @jwt_required()
+@somente_leitura
+@tarefa_medida('relatorio_movimentacoes')
 def relatorio_movimentacoes():
     formato = request.args.get('formato', 'json').lower()
     data_inicio_str = request.args.get('data_inicio')
@@ -1263,23 +1985,15 @@ def relatorio_movimentacoes():
     todas_movimentacoes = query.all()
 
     dados_relatorio = []
+    # Saldos de abertura de todos os produtos numa só consulta (zero sem data de início).
     saldos_atuais = {}
+    if data_inicio_str:
+        saldos_abertura = subquery_saldos(antes_de=datetime.strptime(data_inicio_str, '%Y-%m-%d'))
+        saldos_atuais = {id_p: int(saldo or 0) for id_p, saldo in db.session.query(saldos_abertura).all()}
 
     for mov in todas_movimentacoes:
         id_produto = mov.id_produto
-        
-        if id_produto not in saldos_atuais:
-            saldo_inicial_query = db.session.query(
-                func.sum(case(
-                    (MovimentacaoEstoque.tipo == 'Entrada', MovimentacaoEstoque.quantidade),
-                    (MovimentacaoEstoque.tipo == 'Saida', -MovimentacaoEstoque.quantidade)
-                ))
-            ).filter(
-                MovimentacaoEstoque.id_produto == id_produto,
-                MovimentacaoEstoque.data_hora < datetime.strptime(data_inicio_str, '%Y-%m-%d') if data_inicio_str else True
-            )
-            saldo_inicial = saldo_inicial_query.scalar() or 0
-            saldos_atuais[id_produto] = saldo_inicial
+        saldos_atuais.setdefault(id_produto, 0)
 
         if mov.tipo == 'Entrada':
             saldos_atuais[id_produto] += mov.quantidade
@@ -1305,15 +2019,9 @@ def relatorio_movimentacoes():
     if formato == 'json':
         return jsonify(dados_relatorio), 200
     
-    elif formato == 'xlsx':
-        df = pd.DataFrame(dados_relatorio)
-        df = df.rename(columns={
-            'data_hora': 'Data/Hora', 'produto_codigo': 'Cód. Produto', 'produto_nome': 'Nome Produto',
-            'tipo': 'Tipo', 'quantidade': 'Qtd. Mov.', 'saldo_apos': 'Saldo Após', 'usuario_nome': 'Usuário', 'motivo_saida': 'Motivo da Saída'
-        })
-        buffer = io.BytesIO()
-        df.to_excel(buffer, index=False, engine='openpyxl')
-        buffer.seek(0)
+    from relatorios import gerar_historico_xlsx, gerar_historico_pdf
+    if formato == 'xlsx':
+        buffer = gerar_historico_xlsx(dados_relatorio)
         return send_file(buffer, download_name="relatorio_movimentacoes.xlsx", as_attachment=True)
         
     pdf_buffer = gerar_historico_pdf(dados_relatorio)
@@ -1321,6 +2029,7 @@ def relatorio_movimentacoes():
 
 @app.route('/api/produtos/etiquetas', methods=['POST'])
 @jwt_required()
+@tarefa_medida('etiquetas')
 def gerar_etiquetas_produtos():
     try:
         dados = request.get_json()
@@ -1331,11 +2040,200 @@ def gerar_etiquetas_produtos():
         if not produtos:
             return jsonify({'erro': 'Nenhum produto encontrado.'}), 404
 
+        from etiquetas import gerar_pdf_etiquetas
         pdf_buffer = gerar_pdf_etiquetas(produtos)
         return send_file(pdf_buffer, as_attachment=True, download_name="etiquetas.pdf", mimetype='application/pdf')
 
     except Exception as e:
         return jsonify({'erro': str(e)}), 500
 
+# ==============================================================================
+# RESUMO DIÁRIO E TAREFAS PERIÓDICAS
+# ==============================================================================
+
+# Movimentações mais recentes do que isto ficam para a execução seguinte: um id
+# menor ainda pode estar numa transação por confirmar (ex.: importação grande).
+ATRASO_RESUMO = int(os.getenv('RESUMO_ATRASO', '120'))
+
+def _obter_marca(nome):
+    bloquear_escrita(db.session)
+    marca = db.session.query(MarcaProcessamento).filter_by(nome=nome).with_for_update().first()
+    if marca is None:
+        marca = MarcaProcessamento(nome=nome, ultimo_id=0)
+        db.session.add(marca)
+        db.session.flush()
+    return marca
+
+def atualizar_resumo_diario(tamanho_lote=5000):
+    """Soma ao resumo as movimentações com id acima da marca. Devolve quantas processou."""
+    total = 0
+    while True:
+        # O bloqueio da marca impede que dois processos somem o mesmo lote.
+        marca = _obter_marca('resumo_diario_mov')
+        limite = datetime.now() - timedelta(seconds=ATRASO_RESUMO)
+
+        movimentacoes = db.session.query(
+            MovimentacaoEstoque.id_movimentacao, MovimentacaoEstoque.data_hora,
+            MovimentacaoEstoque.id_produto, MovimentacaoEstoque.tipo, MovimentacaoEstoque.quantidade
+        ).filter(MovimentacaoEstoque.id_movimentacao > marca.ultimo_id)\
+         .order_by(MovimentacaoEstoque.id_movimentacao).limit(tamanho_lote).all()
+
+        somas = {}
+        ultimo_id = marca.ultimo_id
+        for id_mov, data_hora, id_produto, tipo, qtd in movimentacoes:
+            if data_hora > limite:
+                break
+            chave = (data_hora.date(), id_produto, tipo)
+            qtd_total, num = somas.get(chave, (0, 0))
+            somas[chave] = (qtd_total + qtd, num + 1)
+            ultimo_id = id_mov
+
+        existentes = set()
+        if somas:
+            dias = [dia for dia, _, _ in somas]
+            existentes = set(db.session.query(ResumoDiarioMov.data, ResumoDiarioMov.id_produto, ResumoDiarioMov.tipo).filter(
+                ResumoDiarioMov.data.between(min(dias), max(dias)),
+                ResumoDiarioMov.id_produto.in_({id_produto for _, id_produto, _ in somas})
+            ).all())
+
+        novas, somar = [], []
+        for (dia, id_produto, tipo), (qtd, num) in somas.items():
+            if (dia, id_produto, tipo) in existentes:
+                somar.append({'b_data': dia, 'b_id_produto': id_produto, 'b_tipo': tipo, 'b_qtd': qtd, 'b_num': num})
+            else:
+                novas.append({'data': dia, 'id_produto': id_produto, 'tipo': tipo, 'quantidade': qtd, 'num_movimentacoes': num})
+
+        # Um único UPDATE/INSERT executado em lote (executemany) para todas as linhas.
+        tabela = ResumoDiarioMov.__table__
+        if somar:
+            db.session.execute(
+                tabela.update()
+                .where(tabela.c.data == bindparam('b_data'), tabela.c.id_produto == bindparam('b_id_produto'), tabela.c.tipo == bindparam('b_tipo'))
+                .values(quantidade=tabela.c.quantidade + bindparam('b_qtd'), num_movimentacoes=tabela.c.num_movimentacoes + bindparam('b_num')),
+                somar
+            )
+        if novas:
+            db.session.execute(tabela.insert(), novas)
+
+        processadas = sum(num for _, num in somas.values())
+        marca.ultimo_id = ultimo_id
+        marca.data_atualizacao = datetime.now()
+        db.session.commit()
+
+        total += processadas
+        if len(movimentacoes) < tamanho_lote or processadas < len(movimentacoes):
+            return total
+
+def reconstruir_resumo_diario():
+    marca = _obter_marca('resumo_diario_mov')
+    db.session.query(ResumoDiarioMov).delete()
+    marca.ultimo_id = 0
+    db.session.commit()
+    return atualizar_resumo_diario()
+
+def limpar_eventos():
+    limite = datetime.now() - timedelta(days=int(os.getenv('EVENTOS_RETENCAO_DIAS', '7')))
+    # O último evento fica sempre, para o /api/sync distinguir "sem alterações" de "sequência apagada".
+    ultimo = db.session.query(func.max(EventoEstoque.id)).scalar() or 0
+    apagados = db.session.query(EventoEstoque).filter(
+        EventoEstoque.data_hora < limite, EventoEstoque.id < ultimo
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return apagados
+
+def limpar_chaves():
+    # Tem de cobrir o tempo máximo que um movimento pode ficar na fila offline de um terminal:
+    # uma chave apagada antes do reenvio volta a ser aceite como movimento novo.
+    limite = datetime.now() - timedelta(days=int(os.getenv('CHAVES_RETENCAO_DIAS', '30')))
+    apagadas = db.session.query(ChaveMovimentacao).filter(
+        ChaveMovimentacao.data_hora < limite
+    ).delete(synchronize_session=False)
+    db.session.commit()
+    return apagadas
+
+def registar_pulsacao():
+    pulsacao = db.session.get(PulsacaoReplica, 1)
+    if pulsacao is None:
+        db.session.add(PulsacaoReplica(id=1, data_hora=datetime.now()))
+    else:
+        pulsacao.data_hora = datetime.now()
+    db.session.commit()
+
+agendador = Agendador(app, db)
+agendador.registar('resumo_diario_mov', int(os.getenv('RESUMO_INTERVALO', '60')), tarefa_medida('resumo_diario_mov')(atualizar_resumo_diario))
+agendador.registar('recolha_blobs', 24 * 3600, tarefa_medida('recolha_blobs')(manter_armazenamento), imediata=False)
+agendador.registar('limpeza_eventos', 3600, limpar_eventos, imediata=False)
+agendador.registar('limpeza_chaves', 24 * 3600, limpar_chaves, imediata=False)
+if guarda_replica is not None:
+    agendador.registar('pulsacao_replica', int(os.getenv('REPLICA_PULSACAO', '5')), registar_pulsacao)
+
+def iniciar_agendador():
+    if os.getenv('AGENDADOR_ATIVO', '1') == '1':
+        agendador.iniciar()
+
+def aquecer_conversor():
+    """Arranca já as instâncias do LibreOffice deste processo, em segundo plano, para
+    o primeiro documento não esperar pelo arranque delas."""
+    if os.getenv('CONVERSOR_AQUECER', '1') == '1':
+        threading.Thread(target=obter_conversor().aquecer, name='aquecer-conversor', daemon=True).start()
+
+def preparar_processo():
+    """Arranque de cada processo servidor (incluindo um worker que substitui outro)."""
+    try:
+        interrompidas = recuperar_tarefas_interrompidas()
+        if interrompidas:
+            print(f"{interrompidas} geração(ões) de documentos interrompida(s) marcada(s) como erro.", flush=True)
+    except Exception as e:
+        print(f"AVISO: não foi possível verificar as tarefas interrompidas: {e}", flush=True)
+    aquecer_conversor()
+
+# ==============================================================================
+# INICIALIZAÇÃO DA BASE DE DADOS
+# ==============================================================================
+
+def inicializar_base(admin_login=None, admin_senha=None):
+    """Cria as tabelas em falta e, se não houver nenhum utilizador, o administrador indicado."""
+    with app.app_context():
+        try:
+            db.create_all()
+        except OperationalError:
+            # Outro processo (ex.: asgi_terminal.py) criou a mesma tabela ao mesmo tempo.
+            db.create_all()
+        if admin_login and not db.session.query(Usuario.id_usuario).first():
+            admin = Usuario(nome='Administrador', login=admin_login, permissao='Administrador')
+            admin.set_password(admin_senha)
+            db.session.add(admin)
+            db.session.commit()
+            return True
+    return False
+
+def atualizar_esquema():
+    """flask db upgrade a partir do código: aplica as revisões em falta (ver migrations/).
+
+    As revisões só criam o que ainda não existe, por isso também servem para uma
+    base acabada de criar com create_all.
+    """
+    from flask_migrate import upgrade
+    with app.app_context():
+        upgrade(directory=PASTA_MIGRACOES)
+
+@app.cli.command('init-db')
+@click.option('--admin-login', default='admin', help='Login do administrador criado numa base sem utilizadores.')
+@click.option('--admin-senha', prompt=True, hide_input=True, confirmation_prompt=True)
+def comando_init_db(admin_login, admin_senha):
+    """Cria as tabelas em falta, aplica as migrações e cria o primeiro administrador."""
+    atualizar_esquema()
+    if inicializar_base(admin_login, admin_senha):
+        click.echo(f"Administrador '{admin_login}' criado.")
+    click.echo(f"Base pronta: {db.engine.url.render_as_string(hide_password=True)}")
+
+# O SQLite não tem migrações nem um servidor onde criar a base: as tabelas são
+# criadas no arranque (create_all só cria as que faltam).
+if BASE_SQLITE:
+    inicializar_base()
+
 if __name__ == '__main__':
+    # Com o reloader do modo debug, só o processo filho corre o agendador.
+    if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        iniciar_agendador()
     app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
@@ -0,0 +1,285 @@
+import os
+import time
+import hashlib
+import tempfile
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+TAMANHO_BLOCO = 1024 * 1024
+PASTA_BASE = os.path.join(os.path.dirname(os.path.realpath(__file__)), 'documentos_gerados')
+
+# Um blob guardado (ou reutilizado) há menos tempo do que isto nunca é apagado
+# pela recolha: pode pertencer a uma geração que ainda não gravou o seu registo.
+CARENCIA_RECOLHA = int(os.getenv('ARMAZENAMENTO_CARENCIA', '3600'))
+
+# Limite da cópia local dos blobs de um armazenamento remoto (S3).
+CACHE_BLOBS_MAX_BYTES = int(os.getenv('CACHE_BLOBS_MAX_MB', '2048')) * 1024 * 1024
+
+# ==============================================================================
+# BACKENDS
+# ==============================================================================
+
+class ArmazenamentoLocal:
+    """Blobs imutáveis em disco, endereçados pelo sha256 do conteúdo."""
+
+    def __init__(self, raiz):
+        self.raiz = raiz
+        os.makedirs(os.path.join(raiz, 'tmp'), exist_ok=True)
+
+    def _caminho(self, chave):
+        return os.path.join(self.raiz, chave[:2], chave[2:4], chave)
+
+    def existe(self, chave):
+        return os.path.exists(self._caminho(chave))
+
+    def guardar_stream(self, stream):
+        fd, temp = tempfile.mkstemp(dir=os.path.join(self.raiz, 'tmp'))
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                chave = _copiar_com_hash(stream, f)
+            destino = self._caminho(chave)
+            if os.path.exists(destino):
+                os.remove(temp)
+                os.utime(destino)
+            else:
+                os.makedirs(os.path.dirname(destino), exist_ok=True)
+                os.replace(temp, destino)
+            return chave
+        except Exception:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+    def guardar_ficheiro(self, caminho):
+        with open(caminho, 'rb') as f:
+            return self.guardar_stream(f)
+
+    def caminho_local(self, chave):
+        caminho = self._caminho(chave)
+        if not os.path.exists(caminho):
+            raise FileNotFoundError(f'Blob {chave} não encontrado.')
+        return caminho
+
+    @contextmanager
+    def caminhos_locais(self, chaves):
+        yield [self.caminho_local(chave) for chave in chaves]
+
+    def podar_cache(self):
+        """Sem cache: os blobs já estão em disco."""
+
+    def idade(self, chave):
+        """Segundos desde que o blob foi guardado pela última vez, ou None se não existir."""
+        try:
+            return time.time() - os.path.getmtime(self._caminho(chave))
+        except OSError:
+            return None
+
+    def apagar(self, chave):
+        caminho = self._caminho(chave)
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+    def listar(self):
+        """Gera (chave, idade_em_segundos) de todos os blobs."""
+        agora = time.time()
+        for pasta, _, ficheiros in os.walk(self.raiz):
+            if os.path.basename(pasta) == 'tmp':
+                continue
+            for nome in ficheiros:
+                if len(nome) == 64:
+                    yield nome, agora - os.path.getmtime(os.path.join(pasta, nome))
+
+
+class ArmazenamentoS3:
+    """Blobs num bucket compatível com S3 (AWS, MinIO ou outro serviço local).
+
+    As leituras passam por uma cache em disco, porque a junção dos PDFs
+    precisa de ficheiros locais. A cache é podada pelos menos usados quando
+    passa de `maximo_cache` bytes; os blobs obtidos por `caminhos_locais`
+    ficam fora da poda até o bloco terminar.
+    """
+
+    def __init__(self, bucket, prefixo='', endpoint_url=None, pasta_cache=None, maximo_cache=CACHE_BLOBS_MAX_BYTES):
+        try:
+            import boto3
+        except ImportError:
+            raise RuntimeError("ARMAZENAMENTO=s3 requer o pacote 'boto3'.")
+
+        self.bucket = bucket
+        self.prefixo = prefixo.strip('/')
+        self.cliente = boto3.client('s3', endpoint_url=endpoint_url)
+        self.cache = pasta_cache or os.path.join(PASTA_BASE, 'cache', 'blobs')
+        self.maximo_cache = maximo_cache
+        self._fixos = Counter()
+        self._fixos_lock = threading.Lock()
+        os.makedirs(self.cache, exist_ok=True)
+
+    def _chave_s3(self, chave):
+        return f'{self.prefixo}/{chave}' if self.prefixo else chave
+
+    def existe(self, chave):
+        return self.idade(chave) is not None
+
+    def idade(self, chave):
+        from botocore.exceptions import ClientError
+        try:
+            obj = self.cliente.head_object(Bucket=self.bucket, Key=self._chave_s3(chave))
+        except ClientError:
+            return None
+        return time.time() - obj['LastModified'].timestamp()
+
+    def guardar_stream(self, stream):
+        fd, temp = tempfile.mkstemp(dir=self.cache)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                chave = _copiar_com_hash(stream, f)
+            if self.existe(chave):
+                # Renova o LastModified para a carência da recolha contar a partir de agora.
+                self.cliente.copy_object(
+                    Bucket=self.bucket, Key=self._chave_s3(chave),
+                    CopySource={'Bucket': self.bucket, 'Key': self._chave_s3(chave)},
+                    MetadataDirective='REPLACE'
+                )
+            else:
+                self.cliente.upload_file(temp, self.bucket, self._chave_s3(chave))
+            destino = os.path.join(self.cache, chave)
+            os.replace(temp, destino)
+            self.podar_cache(manter=destino)
+            return chave
+        except Exception:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+    def guardar_ficheiro(self, caminho):
+        with open(caminho, 'rb') as f:
+            return self.guardar_stream(f)
+
+    def caminho_local(self, chave):
+        caminho = os.path.join(self.cache, chave)
+        if os.path.exists(caminho):
+            marcar_uso(caminho)
+        else:
+            # Nome temporário único: dois pedidos podem descarregar o mesmo blob ao mesmo tempo.
+            fd, temp = tempfile.mkstemp(dir=self.cache, suffix='.parcial')
+            os.close(fd)
+            try:
+                self.cliente.download_file(self.bucket, self._chave_s3(chave), temp)
+                os.replace(temp, caminho)
+            except Exception:
+                if os.path.exists(temp):
+                    os.remove(temp)
+                raise
+            self.podar_cache(manter=caminho)
+        return caminho
+
+    @contextmanager
+    def caminhos_locais(self, chaves):
+        """Cópias locais de `chaves`, protegidas da poda enquanto o bloco corre."""
+        with self._fixos_lock:
+            self._fixos.update(chaves)
+        try:
+            yield [self.caminho_local(chave) for chave in chaves]
+        finally:
+            with self._fixos_lock:
+                self._fixos.subtract(chaves)
+                self._fixos += Counter()
+
+    def podar_cache(self, manter=None):
+        """Apaga as cópias locais menos usadas até a cache caber em maximo_cache."""
+        with self._fixos_lock:
+            fixos = set(self._fixos)
+        podar_pasta(self.cache, self.maximo_cache, lambda nome: len(nome) == 64 and nome not in fixos, manter)
+
+    def apagar(self, chave):
+        self.cliente.delete_object(Bucket=self.bucket, Key=self._chave_s3(chave))
+        caminho = os.path.join(self.cache, chave)
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+    def listar(self):
+        agora = time.time()
+        paginador = self.cliente.get_paginator('list_objects_v2')
+        for pagina in paginador.paginate(Bucket=self.bucket, Prefix=self.prefixo):
+            for obj in pagina.get('Contents', []):
+                nome = obj['Key'].rsplit('/', 1)[-1]
+                if len(nome) == 64:
+                    yield nome, agora - obj['LastModified'].timestamp()
+
+
+def _copiar_com_hash(origem, destino):
+    sha = hashlib.sha256()
+    while True:
+        bloco = origem.read(TAMANHO_BLOCO)
+        if not bloco:
+            break
+        sha.update(bloco)
+        destino.write(bloco)
+    return sha.hexdigest()
+
+# ==============================================================================
+# CACHES EM DISCO
+# ==============================================================================
+
+PASTA_CACHE_PDF = os.path.join(PASTA_BASE, 'cache')
+CACHE_PDF_MAX_BYTES = int(os.getenv('CACHE_PDF_MAX_MB', '2048')) * 1024 * 1024
+
+def marcar_uso(caminho):
+    """Regista o último uso de um ficheiro de cache no atime, que a poda ordena.
+
+    O mtime fica intacto: é a data do conteúdo, usada no Last-Modified e no ETag.
+    O atime é escrito explicitamente, por isso não depende de a montagem usar
+    noatime/relatime.
+    """
+    os.utime(caminho, (time.time(), os.stat(caminho).st_mtime))
+
+def podar_pasta(pasta, maximo_bytes, aceitar, manter=None):
+    """Apaga os ficheiros de `pasta` aceites por `aceitar(nome)`, do último uso
+    (atime) mais antigo para o mais recente, até o total caber em `maximo_bytes`."""
+    ficheiros = []
+    for nome in os.listdir(pasta):
+        caminho = os.path.join(pasta, nome)
+        if aceitar(nome) and caminho != manter and os.path.isfile(caminho):
+            stat = os.stat(caminho)
+            ficheiros.append((stat.st_atime, stat.st_size, caminho))
+
+    total = sum(tamanho for _, tamanho, _ in ficheiros)
+    if manter and os.path.exists(manter):
+        total += os.path.getsize(manter)
+
+    for _, tamanho, caminho in sorted(ficheiros):
+        if total <= maximo_bytes:
+            break
+        try:
+            os.remove(caminho)
+            total -= tamanho
+        except OSError:
+            pass
+
+def podar_cache_pdf(manter=None):
+    """Apaga os PDFs finais menos recentes até a cache caber no limite configurado."""
+    podar_pasta(PASTA_CACHE_PDF, CACHE_PDF_MAX_BYTES, lambda nome: nome.endswith('.pdf'), manter)
+
+# ==============================================================================
+# INSTÂNCIA CONFIGURADA
+# ==============================================================================
+
+_armazenamento = None
+_armazenamento_lock = threading.Lock()
+
+def obter_armazenamento():
+    global _armazenamento
+    with _armazenamento_lock:
+        if _armazenamento is None:
+            tipo = os.getenv('ARMAZENAMENTO', 'local').lower()
+            if tipo == 's3':
+                _armazenamento = ArmazenamentoS3(
+                    bucket=os.environ['S3_BUCKET'],
+                    prefixo=os.getenv('S3_PREFIXO', 'blobs'),
+                    endpoint_url=os.getenv('S3_ENDPOINT_URL')
+                )
+            else:
+                _armazenamento = ArmazenamentoLocal(os.getenv('ARMAZENAMENTO_PASTA', os.path.join(PASTA_BASE, 'blobs')))
+            os.makedirs(PASTA_CACHE_PDF, exist_ok=True)
+        return _armazenamento
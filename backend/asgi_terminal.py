@@ -0,0 +1,324 @@
+# Serviço ASGI para os terminais de código de barras: pesquisa por código,
+# saldo, entrada e saída com um driver assíncrono, sem ocupar uma thread por
+# pedido. As restantes rotas passam para a app Flask (via a2wsgi). Ver readme.
+import os
+import re
+import json
+import time
+import asyncio
+from urllib.parse import parse_qs
+from decimal import Decimal
+from datetime import datetime
+
+from sqlalchemy import select, insert
+from sqlalchemy.engine import make_url
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import create_async_engine
+from flask_jwt_extended import decode_token
+from jwt import ExpiredSignatureError, InvalidTokenError
+
+from app import (
+    app, Produto, MovimentacaoEstoque, EventoEstoque, converter_preco,
+    consulta_saldo_produto, consulta_produto_bloqueado, instrucao_agregado, instrucao_evento, URL_BASE_DADOS,
+    chave_valida, consulta_chave, instrucao_chave, resposta_movimentacao, resposta_repetida
+)
+from base_dados import opcoes_engine, e_sqlite, bloquear_escrita_async
+from eventos import (
+    LeitorEventos, consulta_ultimo_evento, inicio_pedido, formatar_eventos,
+    PREAMBULO, BATIMENTO, CABECALHOS, INTERVALO_EVENTOS, INTERVALO_BATIMENTO, DURACAO_MAXIMA
+)
+
+try:
+    from a2wsgi import WSGIMiddleware
+except ImportError:
+    WSGIMiddleware = None
+
+# ==============================================================================
+# BASE DE DADOS ASSÍNCRONA
+# ==============================================================================
+
+DRIVERS_ASYNC = {'mysql': 'mysql+aiomysql', 'sqlite': 'sqlite+aiosqlite'}
+TAMANHO_MAXIMO_CORPO = 64 * 1024
+
+def url_async(url):
+    url = make_url(url)
+    return url.set(drivername=DRIVERS_ASYNC[url.get_backend_name()])
+
+
+def criar_engine_async():
+    url = os.getenv('DATABASE_URL_ASYNC') or url_async(URL_BASE_DADOS)
+    opcoes = opcoes_engine(str(url)) if e_sqlite(str(url)) else {
+        'pool_size': int(os.getenv('TERMINAL_POOL', '20')),
+        'max_overflow': int(os.getenv('TERMINAL_POOL_EXTRA', '30')),
+        'pool_recycle': 3600,
+    }
+    return create_async_engine(url, **opcoes)
+
+engine = criar_engine_async()
+
+# ==============================================================================
+# PEDIDO, RESPOSTA E AUTENTICAÇÃO
+# ==============================================================================
+
+class ErroPedido(Exception):
+    def __init__(self, status, dados):
+        super().__init__(dados)
+        self.status = status
+        self.dados = dados
+
+
+def _cabecalho(scope, nome):
+    nome = nome.lower().encode()
+    for chave, valor in scope['headers']:
+        if chave == nome:
+            return valor.decode('latin-1')
+    return None
+
+
+def identidade_do_token(scope):
+    """Mesma validação do @jwt_required() do Flask; devolve a identidade (sub)."""
+    autorizacao = _cabecalho(scope, 'authorization')
+    if not autorizacao or not autorizacao.startswith('Bearer '):
+        raise ErroPedido(401, {'msg': 'Missing Authorization Header'})
+    try:
+        with app.app_context():
+            claims = decode_token(autorizacao[len('Bearer '):])
+    except ExpiredSignatureError:
+        raise ErroPedido(401, {'msg': 'Token has expired'})
+    except InvalidTokenError as e:
+        raise ErroPedido(422, {'msg': str(e)})
+    if claims.get('type') != 'access':
+        raise ErroPedido(422, {'msg': 'Only non-refresh tokens are allowed'})
+    return claims[app.config.get('JWT_IDENTITY_CLAIM', 'sub')]
+
+
+async def ler_json(receive):
+    corpo = b''
+    while True:
+        mensagem = await receive()
+        corpo += mensagem.get('body', b'')
+        if len(corpo) > TAMANHO_MAXIMO_CORPO:
+            raise ErroPedido(413, {'erro': 'Pedido demasiado grande.'})
+        if not mensagem.get('more_body'):
+            break
+    try:
+        dados = json.loads(corpo or b'null')
+    except ValueError:
+        raise ErroPedido(400, {'erro': 'JSON inválido.'})
+    if not isinstance(dados, dict):
+        raise ErroPedido(400, {'erro': 'Campos obrigatórios em falta'})
+    return dados
+
+
+def _json_padrao(valor):
+    # Como o jsonify do Flask: um Decimal que escape (ex.: SUM no MySQL) vai como texto.
+    if isinstance(valor, Decimal):
+        return str(valor)
+    raise TypeError(f'{type(valor).__name__} não é serializável em JSON')
+
+
+async def responder(send, status, dados):
+    corpo = json.dumps(dados, separators=(',', ':'), default=_json_padrao).encode('utf-8')
+    await send({'type': 'http.response.start', 'status': status, 'headers': [
+        (b'content-type', b'application/json'),
+        (b'content-length', str(len(corpo)).encode()),
+    ]})
+    await send({'type': 'http.response.body', 'body': corpo})
+
+# ==============================================================================
+# ROTAS DOS TERMINAIS
+# ==============================================================================
+
+async def produto_por_codigo(scope, receive, identidade, codigo):
+    async with engine.connect() as conn:
+        produto = (await conn.execute(
+            select(Produto.id_produto, Produto.nome, Produto.codigo, Produto.descricao, Produto.preco)
+            .where(Produto.codigo == codigo.strip()).limit(1)
+        )).first()
+    if produto is None:
+        return 404, {'erro': 'Produto não encontrado.'}
+    id_produto, nome, codigo, descricao, preco = produto
+    return 200, {
+        'id': id_produto,
+        'nome': nome,
+        'codigo': codigo.strip(),
+        'descricao': descricao,
+        'preco': str(preco)
+    }
+
+
+async def saldo_produto(scope, receive, identidade, id_produto):
+    id_produto = int(id_produto)
+    async with engine.connect() as conn:
+        existe = (await conn.execute(select(Produto.id_produto).where(Produto.id_produto == id_produto))).first()
+        if existe is None:
+            return 404, {'erro': 'Produto não encontrado.'}
+        # No MySQL o SUM devolve um Decimal.
+        saldo = int((await conn.execute(consulta_saldo_produto(id_produto))).scalar() or 0)
+    return 200, {'id_produto': id_produto, 'saldo_atual': saldo}
+
+
+async def _registar_movimentacao(receive, identidade, tipo):
+    dados = await ler_json(receive)
+    obrigatorios = ['id_produto', 'quantidade'] + (['motivo_saida'] if tipo == 'Saida' else [])
+    if not all(k in dados for k in obrigatorios):
+        return 400, {'erro': 'Campos obrigatórios em falta'}
+
+    chave = dados.get('chave')
+    if not chave_valida(chave):
+        return 400, {'erro': 'Chave de idempotência inválida.'}
+    repetida = await _movimentacao_repetida(tipo, chave, dados['id_produto'])
+    if repetida:
+        return repetida
+
+    try:
+        return await _inserir_movimentacao(dados, identidade, tipo, chave)
+    except IntegrityError:
+        # O mesmo pedido chegou duas vezes ao mesmo tempo: o outro já o registou.
+        repetida = await _movimentacao_repetida(tipo, chave, dados['id_produto'])
+        if repetida:
+            return repetida
+        raise
+
+
+async def _movimentacao_repetida(tipo, chave, id_produto):
+    if chave is None:
+        return None
+    async with engine.connect() as conn:
+        registo = (await conn.execute(consulta_chave(chave))).first()
+    if registo is None:
+        return None
+    return resposta_repetida(registo, tipo, id_produto)
+
+
+async def _inserir_movimentacao(dados, identidade, tipo, chave):
+    id_produto = dados['id_produto']
+    qtd = dados['quantidade']
+
+    async with engine.begin() as conn:
+        await bloquear_escrita_async(conn)
+        preco = (await conn.execute(consulta_produto_bloqueado(id_produto))).scalar()
+        saldo_atual = int((await conn.execute(consulta_saldo_produto(id_produto))).scalar() or 0)
+        if tipo == 'Saida' and saldo_atual < qtd:
+            return 400, {'erro': f'Estoque insuficiente. Saldo atual: {saldo_atual}'}
+
+        resultado = await conn.execute(insert(MovimentacaoEstoque.__table__).values(
+            id_produto=id_produto,
+            quantidade=qtd,
+            id_usuario=identidade,
+            data_hora=datetime.now(),
+            tipo=tipo,
+            motivo_saida=dados.get('motivo_saida') if tipo == 'Saida' else None
+        ))
+        sinal = 1 if tipo == 'Entrada' else -1
+        await conn.execute(instrucao_agregado(valor=sinal * converter_preco(preco) * qtd))
+        novo_saldo = saldo_atual + sinal * qtd
+        await conn.execute(instrucao_evento(id_produto, novo_saldo))
+        if chave is not None:
+            await conn.execute(instrucao_chave(chave, resultado.inserted_primary_key[0], tipo, id_produto, novo_saldo))
+
+    return 201, resposta_movimentacao(tipo, id_produto, novo_saldo)
+
+
+async def entrada(scope, receive, identidade):
+    return await _registar_movimentacao(receive, identidade, 'Entrada')
+
+
+async def saida(scope, receive, identidade):
+    return await _registar_movimentacao(receive, identidade, 'Saida')
+
+
+async def stream_eventos(scope, receive, send, identidade):
+    """/api/eventos sem ocupar uma thread por cliente; mesmo formato do Flask."""
+    desde = parse_qs(scope.get('query_string', b'').decode()).get('desde', [None])[0]
+    inicio = inicio_pedido(_cabecalho(scope, 'last-event-id'), desde)
+    if inicio is None:
+        async with engine.connect() as conn:
+            inicio = (await conn.execute(consulta_ultimo_evento(EventoEstoque.__table__))).scalar()
+    leitor = LeitorEventos(EventoEstoque.__table__, inicio)
+
+    cabecalhos = [(b'content-type', b'text/event-stream; charset=utf-8')]
+    cabecalhos += [(k.lower().encode(), v.encode()) for k, v in CABECALHOS.items()]
+    await send({'type': 'http.response.start', 'status': 200, 'headers': cabecalhos})
+
+    async def enviar(texto):
+        await send({'type': 'http.response.body', 'body': texto.encode('utf-8'), 'more_body': True})
+
+    await enviar(PREAMBULO)
+    fim = time.monotonic() + DURACAO_MAXIMA
+    ultimo_envio = time.monotonic()
+    while time.monotonic() < fim:
+        async with engine.connect() as conn:
+            linhas = leitor.processar((await conn.execute(leitor.consulta())).all())
+        if linhas:
+            await enviar(formatar_eventos(linhas, leitor))
+            ultimo_envio = time.monotonic()
+        elif time.monotonic() - ultimo_envio >= INTERVALO_BATIMENTO:
+            await enviar(BATIMENTO)
+            ultimo_envio = time.monotonic()
+        try:
+            mensagem = await asyncio.wait_for(receive(), INTERVALO_EVENTOS)
+            if mensagem['type'] == 'http.disconnect':
+                return
+        except asyncio.TimeoutError:
+            pass
+    await send({'type': 'http.response.body', 'body': b''})
+
+
+ROTAS = [
+    ('GET', re.compile(r'^/api/produtos/codigo/(?P<codigo>[^/]+)$'), produto_por_codigo),
+    ('GET', re.compile(r'^/api/produtos/(?P<id_produto>\d+)/estoque$'), saldo_produto),
+    ('POST', re.compile(r'^/api/estoque/entrada$'), entrada),
+    ('POST', re.compile(r'^/api/estoque/saida$'), saida),
+]
+
+# ==============================================================================
+# APLICAÇÃO ASGI
+# ==============================================================================
+
+_flask = WSGIMiddleware(app) if WSGIMiddleware is not None else None
+
+async def _ciclo_de_vida(receive, send):
+    while True:
+        mensagem = await receive()
+        if mensagem['type'] == 'lifespan.startup':
+            await send({'type': 'lifespan.startup.complete'})
+        elif mensagem['type'] == 'lifespan.shutdown':
+            await engine.dispose()
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+
+async def aplicacao(scope, receive, send):
+    if scope['type'] == 'lifespan':
+        return await _ciclo_de_vida(receive, send)
+
+    if scope['type'] == 'http':
+        if scope['path'] == '/api/eventos' and scope['method'] == 'GET':
+            try:
+                identidade = identidade_do_token(scope)
+            except ErroPedido as e:
+                return await responder(send, e.status, e.dados)
+            return await stream_eventos(scope, receive, send, identidade)
+
+        for metodo, padrao, funcao in ROTAS:
+            encontrado = padrao.match(scope['path'])
+            if encontrado and scope['method'] == metodo:
+                try:
+                    identidade = identidade_do_token(scope)
+                    status, dados = await funcao(scope, receive, identidade, **encontrado.groupdict())
+                except ErroPedido as e:
+                    status, dados = e.status, e.dados
+                except Exception as e:
+                    status, dados = 500, {'erro': str(e)}
+                return await responder(send, status, dados)
+
+    if _flask is None:
+        return await responder(send, 404, {'erro': 'Rota não disponível neste serviço (instale a2wsgi para servir também a app Flask).'})
+    return await _flask(scope, receive, send)
+
+
+if __name__ == '__main__':
+    import uvicorn
+    uvicorn.run(aplicacao, host='0.0.0.0', port=int(os.getenv('PORTA_TERMINAL', '5001')),
+                log_level='warning', access_log=False)
@@ -0,0 +1,88 @@
+import os
+import sqlite3
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.pool import StaticPool
+
+# ==============================================================================
+# URI E OPÇÕES DO ENGINE
+# ==============================================================================
+
+def url_base_dados():
+    """DATABASE_URL, se definido; senão o MySQL montado a partir de DB_*."""
+    url = os.getenv('DATABASE_URL')
+    if url:
+        return url
+
+    DB_USER = os.getenv('DB_USER', 'root')
+    DB_PASS = os.getenv('DB_PASS', 'senha_padrao_dev') # Senha genérica
+    DB_HOST = os.getenv('DB_HOST', 'localhost')        # Localhost para quem baixar
+    DB_NAME = os.getenv('DB_NAME', 'estoque_db')
+    return f'mysql+pymysql://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}'
+
+
+def e_sqlite(url):
+    return make_url(url).get_backend_name() == 'sqlite'
+
+
+def opcoes_engine(url):
+    if not e_sqlite(url):
+        return {}
+    opcoes = {'connect_args': {'check_same_thread': False, 'timeout': 30}}
+    if make_url(url).database in (None, '', ':memory:'):
+        # Base em memória: uma só ligação partilhada, senão cada thread veria uma base vazia.
+        opcoes['poolclass'] = StaticPool
+    return opcoes
+
+
+def configurar_base_dados(app):
+    url = url_base_dados()
+    app.config['SQLALCHEMY_DATABASE_URI'] = url
+    app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opcoes_engine(url)
+
+    # Réplica opcional para os relatórios e o dashboard (ver replica.py).
+    url_replica = os.getenv('DATABASE_URL_REPLICA')
+    if url_replica:
+        app.config['SQLALCHEMY_BINDS'] = {'replica': {'url': url_replica, **opcoes_engine(url_replica)}}
+    return url
+
+# ==============================================================================
+# PRAGMAS DO SQLITE
+# ==============================================================================
+
+SQLITE_CACHE_MB = int(os.getenv('SQLITE_CACHE_MB', '64'))
+SQLITE_MMAP_MB = int(os.getenv('SQLITE_MMAP_MB', '256'))
+
+@event.listens_for(Engine, 'connect')
+def _pragmas_sqlite(ligacao, registo):
+    # O adaptador do aiosqlite (asgi_terminal.py) também aceita cursor()/execute() síncronos.
+    if not (isinstance(ligacao, sqlite3.Connection) or type(ligacao).__name__ == 'AsyncAdapt_aiosqlite_connection'):
+        return
+    cursor = ligacao.cursor()
+    # WAL: leitores não bloqueiam o escritor nem são bloqueados por ele.
+    cursor.execute('PRAGMA journal_mode=WAL')
+    # Com WAL, NORMAL só perde as últimas transações numa falha de energia, nunca corrompe a base.
+    cursor.execute('PRAGMA synchronous=NORMAL')
+    cursor.execute('PRAGMA foreign_keys=ON')
+    cursor.execute('PRAGMA busy_timeout=30000')
+    cursor.execute(f'PRAGMA cache_size=-{SQLITE_CACHE_MB * 1024}')
+    cursor.execute(f'PRAGMA mmap_size={SQLITE_MMAP_MB * 1024 * 1024}')
+    cursor.execute('PRAGMA temp_store=MEMORY')
+    cursor.close()
+
+
+def bloquear_escrita(sessao):
+    """No SQLite o FOR UPDATE é ignorado; em vez dele toma-se já o bloqueio de
+    escrita da base (BEGIN IMMEDIATE), que dura até ao commit. Nos outros
+    motores não faz nada."""
+    ligacao = sessao.connection().connection.driver_connection
+    if isinstance(ligacao, sqlite3.Connection) and not ligacao.in_transaction:
+        ligacao.execute('BEGIN IMMEDIATE')
+
+
+async def bloquear_escrita_async(conn):
+    """O mesmo que bloquear_escrita, numa AsyncConnection (asgi_terminal.py)
+    ainda sem instruções na transação."""
+    if conn.dialect.name == 'sqlite':
+        await conn.exec_driver_sql('BEGIN IMMEDIATE')
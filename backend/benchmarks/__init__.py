@@ -0,0 +1,8 @@
+"""Benchmarks dos endpoints mais usados, com gerador de dados sintéticos.
+
+Correr a partir da pasta backend:
+
+    python -m benchmarks gerar --escala pequena
+    python -m benchmarks executar --saida antes.json
+    python -m benchmarks comparar antes.json depois.json
+"""
@@ -0,0 +1,151 @@
+import os
+import sys
+import argparse
+
+PASTA_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_RESULTADOS = os.path.join(PASTA_BACKEND, 'benchmarks', 'resultados')
+
+# ==============================================================================
+# PREPARAÇÃO
+# ==============================================================================
+
+def _criar_base_mysql(nome):
+    from sqlalchemy import create_engine, text
+    utilizador = os.getenv('DB_USER', 'root')
+    senha = os.getenv('DB_PASS', 'senha_padrao_dev')
+    host = os.getenv('DB_HOST', 'localhost')
+    engine = create_engine(f'mysql+pymysql://{utilizador}:{senha}@{host}/')
+    with engine.connect() as conn:
+        conn.execute(text(f'CREATE DATABASE IF NOT EXISTS `{nome}` CHARACTER SET utf8mb4'))
+    engine.dispose()
+
+
+def nome_base():
+    """Base usada: o DATABASE_URL (ex.: sqlite:///bench.db) ou DB_NAME no MySQL."""
+    if os.getenv('DATABASE_URL'):
+        from sqlalchemy.engine import make_url
+        return make_url(os.environ['DATABASE_URL']).database or ':memory:'
+    return os.getenv('DB_NAME', 'estoque_bench')
+
+
+def carregar_app():
+    # Por omissão os benchmarks usam uma base própria, nunca a base de trabalho.
+    os.environ.setdefault('DB_NAME', 'estoque_bench')
+    os.environ.setdefault('AGENDADOR_ATIVO', '0')
+    os.environ.setdefault('CONTAR_QUERIES', '0')
+    sys.path.insert(0, PASTA_BACKEND)
+
+    if not os.getenv('DATABASE_URL'):
+        _criar_base_mysql(os.environ['DB_NAME'])
+    import app as m
+    return m
+
+# ==============================================================================
+# COMANDOS
+# ==============================================================================
+
+def cmd_gerar(args):
+    from .dados_sinteticos import ESCALAS, gerar
+
+    if 'bench' not in nome_base() and not args.forcar:
+        sys.exit("A geração apaga todas as tabelas. Use uma base com 'bench' no nome (DB_NAME ou DATABASE_URL) ou --forcar.")
+
+    m = carregar_app()
+    escala = args.escala
+    if args.produtos or args.movimentacoes:
+        escala = dict(ESCALAS[args.escala])
+        escala['produtos'] = args.produtos or escala['produtos']
+        escala['movimentacoes'] = args.movimentacoes or escala['movimentacoes']
+
+    print(f"A gerar dados ({args.escala}) em {nome_base()}...")
+    with m.app.app_context():
+        contagens = gerar(m, escala, semente=args.semente)
+    print(contagens)
+
+
+def cmd_executar(args):
+    m = carregar_app()
+    from flask_jwt_extended import create_access_token
+    from .dados_sinteticos import LOGIN_BENCH
+    from .executar import executar, guardar
+
+    with m.app.app_context():
+        utilizador = m.Usuario.query.filter_by(login=LOGIN_BENCH).first()
+        if utilizador is None:
+            sys.exit("Sem dados de benchmark: corra primeiro 'python -m benchmarks gerar'.")
+        token = create_access_token(identity=str(utilizador.id_usuario), additional_claims={'permissao': 'Administrador'})
+
+    print("A executar benchmarks...")
+    resultado = executar(m, token, apenas=args.apenas, repeticoes=args.repeticoes, semente=args.semente)
+
+    caminho = args.saida
+    if not caminho:
+        os.makedirs(PASTA_RESULTADOS, exist_ok=True)
+        nome = f"{resultado['data'].replace(':', '').replace('-', '')}_{resultado['commit'] or 'sem_commit'}.json"
+        caminho = os.path.join(PASTA_RESULTADOS, nome)
+    guardar(resultado, caminho)
+    print(f"Resultados guardados em {caminho}")
+
+
+def cmd_comparar(args):
+    from .comparar import carregar, comparar, imprimir
+
+    base, novo = carregar(args.base), carregar(args.novo)
+    linhas, regressoes = comparar(base, novo, limiar=args.limiar / 100)
+    imprimir(base, novo, linhas, regressoes)
+    if regressoes and args.falhar:
+        sys.exit(1)
+
+
+def cmd_arranque(args):
+    from .arranque import executar
+
+    orcamentos = {'servidor': args.orcamento_servidor, 'cliente': args.orcamento_cliente}
+    try:
+        acima = executar(apenas=args.apenas, repeticoes=args.repeticoes, orcamentos=orcamentos, mostrar=args.mostrar)
+    except RuntimeError as e:
+        sys.exit(str(e))
+    if acima:
+        sys.exit(f"\nAcima do orçamento de arranque: {', '.join(acima)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(prog='python -m benchmarks', description='Benchmarks do backend do PyStock.')
+    sub = parser.add_subparsers(dest='comando', required=True)
+
+    p = sub.add_parser('gerar', help='Apaga a base de benchmark e preenche-a com dados sintéticos.')
+    p.add_argument('--escala', default='pequena', choices=['minima', 'pequena', 'media', 'grande'])
+    p.add_argument('--produtos', type=int, help='Substitui o nº de produtos da escala.')
+    p.add_argument('--movimentacoes', type=int, help='Substitui o nº de movimentações da escala.')
+    p.add_argument('--semente', type=int, default=42)
+    p.add_argument('--forcar', action='store_true', help="Permite usar uma base sem 'bench' no nome.")
+    p.set_defaults(funcao=cmd_gerar)
+
+    p = sub.add_parser('executar', help='Corre os benchmarks e grava o resultado em JSON.')
+    p.add_argument('--apenas', nargs='+', metavar='NOME', help='Corre só estes benchmarks.')
+    p.add_argument('--repeticoes', type=int, help='Repetições de cada benchmark (por omissão, a de cada um).')
+    p.add_argument('--semente', type=int, default=42)
+    p.add_argument('--saida', help='Ficheiro JSON de saída (por omissão, em benchmarks/resultados).')
+    p.set_defaults(funcao=cmd_executar)
+
+    p = sub.add_parser('comparar', help='Compara dois ficheiros de resultados.')
+    p.add_argument('base')
+    p.add_argument('novo')
+    p.add_argument('--limiar', type=float, default=10, help='Piora (em %%) da mediana a partir da qual há regressão.')
+    p.add_argument('--falhar', action='store_true', help='Termina com código 1 se houver regressões.')
+    p.set_defaults(funcao=cmd_comparar)
+
+    p = sub.add_parser('arranque', help='Mede o tempo de importação de run_server.py e run.py (python -X importtime).')
+    p.add_argument('--apenas', nargs='+', choices=['servidor', 'cliente'])
+    p.add_argument('--repeticoes', type=int, default=5)
+    p.add_argument('--orcamento-servidor', type=float, help='Segundos (padrão: ORCAMENTO_ARRANQUE_SERVIDOR ou 1.2).')
+    p.add_argument('--orcamento-cliente', type=float, help='Segundos (padrão: ORCAMENTO_ARRANQUE_CLIENTE ou 2.0).')
+    p.add_argument('--mostrar', type=int, default=10, help='Quantos módulos mais pesados listar.')
+    p.set_defaults(funcao=cmd_arranque)
+
+    args = parser.parse_args()
+    args.funcao(args)
+
+
+if __name__ == '__main__':
+    main()
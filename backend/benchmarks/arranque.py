@@ -0,0 +1,85 @@
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+PASTA_BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PASTA_FRONTEND = os.path.join(os.path.dirname(PASTA_BACKEND), 'frontend_desktop')
+
+# ==============================================================================
+# TEMPO DE ARRANQUE (python -X importtime)
+# ==============================================================================
+# Cada medição é um interpretador novo a importar o ponto de entrada, como no
+# arranque real. Conta o menor tempo das repetições: o ruído da máquina só
+# consegue aumentar o tempo, nunca diminuí-lo.
+
+# nome -> (pasta, módulo, orçamento em segundos)
+ALVOS = {
+    'servidor': (PASTA_BACKEND, 'run_server', float(os.getenv('ORCAMENTO_ARRANQUE_SERVIDOR', '1.2'))),
+    'cliente': (PASTA_FRONTEND, 'run', float(os.getenv('ORCAMENTO_ARRANQUE_CLIENTE', '2.0'))),
+}
+
+
+def ler_importtime(texto):
+    """Linhas do -X importtime -> [(profundidade, módulo, próprio_s, acumulado_s, pai)]."""
+    linhas = []
+    for linha in texto.splitlines():
+        if not linha.startswith('import time:') or 'imported package' in linha:
+            continue
+        proprio, acumulado, nome = linha[len('import time:'):].split('|')
+        # O nome vem indentado com dois espaços por nível, depois de um espaço fixo.
+        profundidade = (len(nome) - len(nome.lstrip(' ')) - 1) // 2
+        linhas.append([profundidade, nome.strip(), int(proprio) / 1e6, int(acumulado) / 1e6, None])
+
+    # O importtime escreve cada módulo depois dos que ele importou: o pai é a
+    # primeira linha seguinte com menos profundidade.
+    pais = {}
+    for linha in reversed(linhas):
+        linha[4] = pais.get(linha[0] - 1)
+        pais[linha[0]] = linha[1]
+    return [tuple(l) for l in linhas]
+
+
+def medir(pasta, modulo, base_dados):
+    ambiente = dict(os.environ)
+    ambiente.update({'DATABASE_URL': f'sqlite:///{base_dados}', 'AGENDADOR_ATIVO': '0'})
+    inicio = time.perf_counter()
+    processo = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {modulo}'],
+                              cwd=pasta, env=ambiente, capture_output=True, text=True)
+    duracao = time.perf_counter() - inicio
+    if processo.returncode != 0:
+        erro = [l for l in processo.stderr.splitlines() if not l.startswith('import time:')]
+        raise RuntimeError(f"'import {modulo}' falhou:\n" + '\n'.join(erro[-15:]))
+
+    linhas = ler_importtime(processo.stderr)
+    alvo = next(l for l in linhas if l[0] == 0 and l[1] == modulo)
+    # Dependências diretas e de segundo nível (ex.: app -> pandas), as mais pesadas primeiro.
+    pesados = sorted((l for l in linhas if 1 <= l[0] <= 2), key=lambda l: -l[3])
+    return {'importacao_s': alvo[3], 'processo_s': duracao, 'pesados': pesados}
+
+
+def executar(apenas=None, repeticoes=5, orcamentos=None, mostrar=10):
+    """Mede os alvos e devolve os nomes dos que ficaram acima do orçamento."""
+    acima = []
+    with tempfile.TemporaryDirectory(prefix='pystock_arranque_') as pasta_tmp:
+        for nome, (pasta, modulo, orcamento) in ALVOS.items():
+            if apenas and nome not in apenas:
+                continue
+            orcamento = (orcamentos or {}).get(nome) or orcamento
+            base_dados = os.path.join(pasta_tmp, f'{nome}.db').replace('\\', '/')
+
+            # A primeira execução compila os .pyc e não conta.
+            medir(pasta, modulo, base_dados)
+            medicoes = [medir(pasta, modulo, base_dados) for _ in range(repeticoes)]
+            melhor = min(medicoes, key=lambda m: m['importacao_s'])
+
+            estado = 'OK' if melhor['importacao_s'] <= orcamento else 'ACIMA DO ORÇAMENTO'
+            print(f"\n{nome} (import {modulo}): {melhor['importacao_s']:.3f} s de importação, "
+                  f"{melhor['processo_s']:.3f} s de processo; orçamento {orcamento:.2f} s -> {estado}")
+            for profundidade, modulo_pesado, _, acumulado, pai in melhor['pesados'][:mostrar]:
+                origem = f" (via {pai})" if profundidade > 1 else ''
+                print(f"  {acumulado * 1000:8.1f} ms  {modulo_pesado}{origem}")
+            if melhor['importacao_s'] > orcamento:
+                acima.append(nome)
+    return acima
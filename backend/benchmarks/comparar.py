@@ -0,0 +1,54 @@
+import json
+
+# ==============================================================================
+# COMPARAÇÃO ENTRE EXECUÇÕES
+# ==============================================================================
+
+def carregar(caminho):
+    with open(caminho, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def comparar(base, novo, limiar=0.10):
+    """Linhas de comparação por benchmark e a lista dos que pioraram mais do que `limiar`."""
+    linhas = []
+    regressoes = []
+    for nome in sorted(set(base['resultados']) | set(novo['resultados'])):
+        a = base['resultados'].get(nome)
+        b = novo['resultados'].get(nome)
+        if a is None or b is None:
+            linhas.append({'nome': nome, 'so_em': 'novo' if a is None else 'base'})
+            continue
+
+        variacao = (b['mediana_ms'] - a['mediana_ms']) / a['mediana_ms'] if a['mediana_ms'] else 0.0
+        linha = {
+            'nome': nome,
+            'base_ms': a['mediana_ms'],
+            'novo_ms': b['mediana_ms'],
+            'variacao': variacao,
+            'base_p95_ms': a['p95_ms'],
+            'novo_p95_ms': b['p95_ms'],
+            'base_queries': a['queries_mediana'],
+            'novo_queries': b['queries_mediana'],
+        }
+        linhas.append(linha)
+        if variacao > limiar or b['queries_mediana'] > a['queries_mediana']:
+            regressoes.append(nome)
+    return linhas, regressoes
+
+
+def imprimir(base, novo, linhas, regressoes):
+    print(f"base: {base.get('commit') or '?'} ({base.get('data')})   dados: {base.get('dados')}")
+    print(f"novo: {novo.get('commit') or '?'} ({novo.get('data')})   dados: {novo.get('dados')}")
+    if base.get('dados') != novo.get('dados'):
+        print("AVISO: as execuções usaram volumes de dados diferentes.")
+    print()
+    print(f"{'benchmark':<32} {'base (ms)':>10} {'novo (ms)':>10} {'variação':>9} {'p95 base':>9} {'p95 novo':>9} {'queries':>9}")
+    for l in linhas:
+        if 'so_em' in l:
+            print(f"{l['nome']:<32} (só na execução {l['so_em']})")
+            continue
+        marca = '  <-- regressão' if l['nome'] in regressoes else ''
+        queries = f"{l['base_queries']:g}->{l['novo_queries']:g}" if l['base_queries'] != l['novo_queries'] else f"{l['novo_queries']:g}"
+        print(f"{l['nome']:<32} {l['base_ms']:10.2f} {l['novo_ms']:10.2f} {l['variacao']:+8.1%} "
+              f"{l['base_p95_ms']:9.2f} {l['novo_p95_ms']:9.2f} {queries:>9}{marca}")
@@ -0,0 +1,133 @@
+import random
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+# ==============================================================================
+# ESCALAS
+# ==============================================================================
+
+ESCALAS = {
+    'minima':  {'produtos': 200,     'movimentacoes': 2_000,      'fornecedores': 10,  'naturezas': 5},
+    'pequena': {'produtos': 1_000,   'movimentacoes': 10_000,     'fornecedores': 50,  'naturezas': 20},
+    'media':   {'produtos': 10_000,  'movimentacoes': 1_000_000,  'fornecedores': 200, 'naturezas': 50},
+    'grande':  {'produtos': 100_000, 'movimentacoes': 10_000_000, 'fornecedores': 500, 'naturezas': 100},
+}
+
+TAMANHO_LOTE = 10_000
+DIAS_HISTORICO = 730
+
+LOGIN_BENCH = 'bench'
+SENHA_BENCH = 'bench'
+
+PALAVRAS = ('Parafuso', 'Porca', 'Arruela', 'Cabo', 'Conector', 'Sensor', 'Rele', 'Disjuntor',
+            'Fusivel', 'Motor', 'Valvula', 'Mangueira', 'Luva', 'Terminal', 'Placa', 'Fonte')
+ACABAMENTOS = ('Inox', 'Zincado', 'Latao', 'Nylon', 'Aco', 'PVC', 'Cobre', 'Aluminio')
+
+# ==============================================================================
+# GERAÇÃO
+# ==============================================================================
+
+def _inserir_em_lotes(db, tabela, linhas):
+    for inicio in range(0, len(linhas), TAMANHO_LOTE):
+        db.session.execute(tabela.insert(), linhas[inicio:inicio + TAMANHO_LOTE])
+    db.session.commit()
+
+
+def codigo_produto(i):
+    return f'{789000000000 + i:013d}'
+
+
+def gerar(m, escala, semente=42, progresso=print):
+    """Apaga e volta a criar todas as tabelas da base do app `m` e preenche-as.
+
+    `escala` é o nome de uma entrada de ESCALAS ou um dict com as mesmas chaves.
+    Devolve as contagens geradas.
+    """
+    db = m.db
+    config = dict(ESCALAS[escala]) if isinstance(escala, str) else dict(escala)
+    rnd = random.Random(semente)
+    inicio_total = time.perf_counter()
+
+    db.drop_all()
+    db.create_all()
+
+    admin = m.Usuario(nome='Benchmark', login=LOGIN_BENCH, permissao='Administrador')
+    admin.set_password(SENHA_BENCH)
+    db.session.add(admin)
+    db.session.commit()
+    id_usuario = admin.id_usuario
+
+    _inserir_em_lotes(db, m.Fornecedor.__table__,
+        [{'id_fornecedor': i + 1, 'Nome': f'Fornecedor {i + 1:04d}'} for i in range(config['fornecedores'])])
+    _inserir_em_lotes(db, m.Natureza.__table__,
+        [{'id_natureza': i + 1, 'nome': f'Natureza {i + 1:03d}'} for i in range(config['naturezas'])])
+
+    produtos = []
+    precos = {}
+    for i in range(config['produtos']):
+        preco = Decimal(rnd.randint(50, 500_00)) / 100
+        precos[i + 1] = preco
+        produtos.append({
+            'Id_produto': i + 1,
+            'Nome': f'{rnd.choice(PALAVRAS)} {rnd.choice(ACABAMENTOS)} {i + 1}',
+            'Codigo': codigo_produto(i + 1),
+            'Descricao': f'Item sintético {i + 1}',
+            'Preco': preco,
+            'CodigoB': f'B{i + 1:07d}' if rnd.random() < 0.3 else None,
+            'CodigoC': None,
+        })
+    _inserir_em_lotes(db, m.Produto.__table__, produtos)
+    progresso(f"  {config['produtos']} produtos")
+
+    assoc_forn, assoc_nat = [], []
+    for id_produto in range(1, config['produtos'] + 1):
+        for id_f in rnd.sample(range(1, config['fornecedores'] + 1), k=min(rnd.randint(1, 3), config['fornecedores'])):
+            assoc_forn.append({'FK_PRODUTO_Id_produto': id_produto, 'FK_FORNECEDOR_id_fornecedor': id_f})
+        for id_n in rnd.sample(range(1, config['naturezas'] + 1), k=min(rnd.randint(0, 2), config['naturezas'])):
+            assoc_nat.append({'fk_PRODUTO_Id_produto': id_produto, 'fk_NATUREZA_id_natureza': id_n})
+    _inserir_em_lotes(db, m.produto_fornecedor, assoc_forn)
+    _inserir_em_lotes(db, m.produto_natureza, assoc_nat)
+
+    # Movimentações por ordem cronológica (ids crescentes com a data), com
+    # entradas mais frequentes do que saídas para os saldos ficarem positivos.
+    total = config['movimentacoes']
+    agora = datetime.now() - timedelta(minutes=10)
+    passo = timedelta(days=DIAS_HISTORICO) / max(total, 1)
+    data = agora - timedelta(days=DIAS_HISTORICO)
+    lote = []
+    for n in range(total):
+        data += passo
+        tipo = 'Entrada' if rnd.random() < 0.6 else 'Saida'
+        lote.append({
+            'id_produto': rnd.randint(1, config['produtos']),
+            'id_usuario': id_usuario,
+            'data_hora': data,
+            'quantidade': rnd.randint(1, 20),
+            'tipo': tipo,
+            'motivo_saida': 'Consumo' if tipo == 'Saida' else None,
+        })
+        if len(lote) == TAMANHO_LOTE:
+            db.session.execute(m.MovimentacaoEstoque.__table__.insert(), lote)
+            db.session.commit()
+            lote = []
+            if (n + 1) % (TAMANHO_LOTE * 50) == 0:
+                progresso(f"  {n + 1}/{total} movimentações")
+    if lote:
+        db.session.execute(m.MovimentacaoEstoque.__table__.insert(), lote)
+        db.session.commit()
+    progresso(f"  {total} movimentações")
+
+    # Agregados derivados, para o dashboard partir de um estado consistente.
+    m.obter_agregado()
+    m.reconstruir_resumo_diario()
+
+    progresso(f"Dados gerados em {time.perf_counter() - inicio_total:.1f}s.")
+    return {
+        'produtos': config['produtos'],
+        'fornecedores': config['fornecedores'],
+        'naturezas': config['naturezas'],
+        'produto_fornecedor': len(assoc_forn),
+        'produto_natureza': len(assoc_nat),
+        'movimentacoes': total,
+    }
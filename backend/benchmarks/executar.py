@@ -0,0 +1,209 @@
+import io
+import gc
+import json
+import time
+import random
+import platform
+import statistics
+import subprocess
+from datetime import datetime, date, timedelta
+
+from sqlalchemy.engine import make_url
+
+from diagnostico_sql import contar_queries
+
+from .dados_sinteticos import codigo_produto
+
+# ==============================================================================
+# REGISTO DE BENCHMARKS
+# ==============================================================================
+
+BENCHMARKS = []
+
+def benchmark(nome, repeticoes=30, aquecimento=3):
+    def decorador(funcao):
+        BENCHMARKS.append({'nome': nome, 'funcao': funcao, 'repeticoes': repeticoes, 'aquecimento': aquecimento})
+        return funcao
+    return decorador
+
+
+class Contexto:
+    def __init__(self, m, cliente, headers, semente):
+        self.m = m
+        self.cliente = cliente
+        self.headers = headers
+        self.rnd = random.Random(semente)
+        self.sequencia = 0
+        with m.app.app_context():
+            self.ids_produtos = [i for (i,) in m.db.session.query(m.Produto.id_produto)]
+
+    def produto_aleatorio(self):
+        return self.rnd.choice(self.ids_produtos)
+
+    def proximo(self):
+        self.sequencia += 1
+        return self.sequencia
+
+    def get(self, url):
+        return self.cliente.get(url, headers=self.headers)
+
+    def post(self, url, **kwargs):
+        return self.cliente.post(url, headers=self.headers, **kwargs)
+
+# ==============================================================================
+# ENDPOINTS
+# ==============================================================================
+
+@benchmark('saldos')
+def _saldos(ctx):
+    return ctx.get('/api/estoque/saldos')
+
+@benchmark('saldos_pesquisa')
+def _saldos_pesquisa(ctx):
+    return ctx.get(f'/api/estoque/saldos?search=Sensor%20Inox%20{ctx.rnd.randint(1, 9)}')
+
+@benchmark('produtos_pesquisa')
+def _produtos_pesquisa(ctx):
+    return ctx.get(f'/api/produtos?search=Cabo%20{ctx.rnd.randint(1, 9)}')
+
+@benchmark('codigo_barras', repeticoes=200, aquecimento=10)
+def _codigo_barras(ctx):
+    return ctx.get(f'/api/produtos/codigo/{codigo_produto(ctx.produto_aleatorio())}')
+
+@benchmark('saldo_produto', repeticoes=200, aquecimento=10)
+def _saldo_produto(ctx):
+    return ctx.get(f'/api/produtos/{ctx.produto_aleatorio()}/estoque')
+
+@benchmark('entrada', repeticoes=200, aquecimento=10)
+def _entrada(ctx):
+    return ctx.post('/api/estoque/entrada', json={'id_produto': ctx.produto_aleatorio(), 'quantidade': 5})
+
+@benchmark('saida', repeticoes=200, aquecimento=10)
+def _saida(ctx):
+    return ctx.post('/api/estoque/saida', json={'id_produto': ctx.produto_aleatorio(), 'quantidade': 1, 'motivo_saida': 'Benchmark'})
+
+@benchmark('movimentacoes_ultimos_30_dias', repeticoes=10)
+def _movimentacoes(ctx):
+    inicio = (date.today() - timedelta(days=30)).isoformat()
+    return ctx.get(f'/api/relatorios/movimentacoes?formato=json&data_inicio={inicio}')
+
+@benchmark('relatorio_inventario_pdf', repeticoes=5, aquecimento=1)
+def _inventario_pdf(ctx):
+    return ctx.get('/api/relatorios/inventario?formato=pdf')
+
+@benchmark('relatorio_inventario_xlsx', repeticoes=5, aquecimento=1)
+def _inventario_xlsx(ctx):
+    return ctx.get('/api/relatorios/inventario?formato=xlsx')
+
+@benchmark('relatorio_movimentacoes_pdf', repeticoes=5, aquecimento=1)
+def _movimentacoes_pdf(ctx):
+    inicio = (date.today() - timedelta(days=30)).isoformat()
+    return ctx.get(f'/api/relatorios/movimentacoes?formato=pdf&data_inicio={inicio}')
+
+@benchmark('importacao_200_produtos', repeticoes=5, aquecimento=1)
+def _importacao(ctx):
+    lote = ctx.proximo()
+    linhas = ['codigo;nome;preco;quantidade;fornecedores_nomes;naturezas_nomes']
+    linhas += [f'IMP{lote:04d}{i:05d};Importado {lote}-{i};{i % 90 + 1},90;{i % 7};Fornecedor 0001;Natureza 001' for i in range(200)]
+    ficheiro = (io.BytesIO('\n'.join(linhas).encode('utf-8')), 'importacao.csv')
+    return ctx.post('/api/produtos/importar', data={'file': ficheiro}, content_type='multipart/form-data')
+
+@benchmark('etiquetas_50', repeticoes=10, aquecimento=1)
+def _etiquetas(ctx):
+    return ctx.post('/api/produtos/etiquetas', json={'product_ids': ctx.rnd.sample(ctx.ids_produtos, min(50, len(ctx.ids_produtos)))})
+
+@benchmark('dashboard_kpis', repeticoes=100)
+def _kpis(ctx):
+    return ctx.get('/api/dashboard/kpis')
+
+@benchmark('serie_movimentacoes_12_meses', repeticoes=30)
+def _serie_movimentacoes(ctx):
+    return ctx.get('/api/dashboard/series/movimentacoes?dias=365')
+
+@benchmark('serie_valor_estoque_12_meses', repeticoes=30)
+def _serie_valor(ctx):
+    return ctx.get('/api/dashboard/series/valor-estoque?dias=365')
+
+# ==============================================================================
+# EXECUÇÃO
+# ==============================================================================
+
+def _percentil(valores, p):
+    ordenados = sorted(valores)
+    k = (len(ordenados) - 1) * p
+    baixo = int(k)
+    alto = min(baixo + 1, len(ordenados) - 1)
+    return ordenados[baixo] + (ordenados[alto] - ordenados[baixo]) * (k - baixo)
+
+
+def _commit_atual():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=10).stdout.strip() or None
+    except Exception:
+        return None
+
+
+def contar_dados(m):
+    with m.app.app_context():
+        s = m.db.session
+        return {
+            'produtos': s.query(m.func.count(m.Produto.id_produto)).scalar(),
+            'fornecedores': s.query(m.func.count(m.Fornecedor.id_fornecedor)).scalar(),
+            'naturezas': s.query(m.func.count(m.Natureza.id_natureza)).scalar(),
+            'movimentacoes': s.query(m.func.count(m.MovimentacaoEstoque.id_movimentacao)).scalar(),
+        }
+
+
+def executar(m, token, apenas=None, repeticoes=None, semente=42, progresso=print):
+    """Corre os benchmarks pelo cliente de testes do Flask e devolve o resultado (dict)."""
+    cliente = m.app.test_client()
+    headers = {'Authorization': f'Bearer {token}'}
+    ctx = Contexto(m, cliente, headers, semente)
+
+    resultados = {}
+    for b in BENCHMARKS:
+        if apenas and b['nome'] not in apenas:
+            continue
+
+        for _ in range(b['aquecimento']):
+            b['funcao'](ctx)
+
+        tempos, consultas, status = [], [], {}
+        gc.collect()
+        for _ in range(repeticoes or b['repeticoes']):
+            with contar_queries() as contagem:
+                inicio = time.perf_counter()
+                resposta = b['funcao'](ctx)
+                _ = resposta.data
+                tempos.append(time.perf_counter() - inicio)
+            consultas.append(contagem.total)
+            status[resposta.status_code] = status.get(resposta.status_code, 0) + 1
+
+        resultados[b['nome']] = {
+            'repeticoes': len(tempos),
+            'min_ms': min(tempos) * 1000,
+            'mediana_ms': statistics.median(tempos) * 1000,
+            'media_ms': statistics.fmean(tempos) * 1000,
+            'p95_ms': _percentil(tempos, 0.95) * 1000,
+            'max_ms': max(tempos) * 1000,
+            'queries_mediana': statistics.median(consultas),
+            'queries_max': max(consultas),
+            'status': {str(k): v for k, v in sorted(status.items())},
+        }
+        r = resultados[b['nome']]
+        progresso(f"  {b['nome']:<32} mediana {r['mediana_ms']:9.2f} ms   p95 {r['p95_ms']:9.2f} ms   queries {r['queries_mediana']:g}")
+
+    return {
+        'commit': _commit_atual(),
+        'data': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'plataforma': platform.platform(),
+        'base_dados': make_url(m.app.config['SQLALCHEMY_DATABASE_URI']).render_as_string(hide_password=True),
+        'dados': contar_dados(m),
+        'resultados': resultados,
+    }
+
+
+def guardar(resultado, caminho):
+    with open(caminho, 'w', encoding='utf-8') as f:
+        json.dump(resultado, f, indent=2, ensure_ascii=False)
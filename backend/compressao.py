@@ -0,0 +1,40 @@
+import os
+import gzip
+
+from flask import request
+
+# ==============================================================================
+# COMPRESSÃO DAS RESPOSTAS (gzip)
+# ==============================================================================
+# As listagens (saldos, /api/sync, histórico) são JSON muito repetitivo: em
+# gzip ficam com 10-20% do tamanho, o que numa rede de loja pesa mais do que
+# o tempo de compressão. Ficheiros (PDF, xlsx) já vêm comprimidos e os fluxos
+# (SSE) não podem ser acumulados, por isso ficam de fora.
+
+TIPOS_COMPRESSIVEIS = {'application/json', 'text/csv', 'text/plain'}
+
+def instalar_compressao(app):
+    """COMPRESSAO_MINIMO (bytes, 1024 por omissão) é o tamanho a partir do qual
+    a resposta é comprimida; 0 desativa."""
+    minimo = int(os.getenv('COMPRESSAO_MINIMO', '1024'))
+    nivel = int(os.getenv('COMPRESSAO_NIVEL', '5'))
+
+    @app.after_request
+    def _comprimir(resposta):
+        if not minimo or resposta.direct_passthrough or resposta.is_streamed:
+            return resposta
+        if resposta.status_code < 200 or resposta.status_code in (204, 304):
+            return resposta
+        if resposta.mimetype not in TIPOS_COMPRESSIVEIS or 'Content-Encoding' in resposta.headers:
+            return resposta
+
+        resposta.vary.add('Accept-Encoding')
+        if 'gzip' not in request.accept_encodings:
+            return resposta
+        corpo = resposta.get_data()
+        if len(corpo) < minimo:
+            return resposta
+
+        resposta.set_data(gzip.compress(corpo, compresslevel=nivel))
+        resposta.headers['Content-Encoding'] = 'gzip'
+        return resposta
@@ -0,0 +1,258 @@
+import os
+import time
+import queue
+import atexit
+import shutil
+import socket
+import tempfile
+import threading
+import subprocess
+
+# ==============================================================================
+# CONFIGURAÇÃO
+# ==============================================================================
+
+SOFFICE_BIN = os.getenv('SOFFICE_BIN', 'soffice')
+NUM_INSTANCIAS = int(os.getenv('CONVERSOR_INSTANCIAS', '2'))
+TIMEOUT_CONVERSAO = float(os.getenv('CONVERSOR_TIMEOUT', '60'))
+TIMEOUT_FILA = float(os.getenv('CONVERSOR_TIMEOUT_FILA', '120'))
+TIMEOUT_ARRANQUE = 30
+
+# A ponte UNO só existe no Python que acompanha o LibreOffice (python3-uno).
+# Sem ela, cada instância do pool continua a limitar a concorrência e a manter
+# um perfil de utilizador já inicializado, mas a conversão volta a ser feita
+# por linha de comando.
+try:
+    import uno
+    from com.sun.star.beans import PropertyValue
+    from com.sun.star.connection import NoConnectException
+except ImportError:
+    uno = None
+
+
+class ErroConversao(Exception):
+    pass
+
+
+def _porta_livre():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def _url_ficheiro(caminho):
+    caminho = os.path.abspath(caminho).replace('\\', '/')
+    return 'file:///' + caminho.lstrip('/')
+
+
+def _propriedade(nome, valor):
+    p = PropertyValue()
+    p.Name = nome
+    p.Value = valor
+    return p
+
+# ==============================================================================
+# INSTÂNCIA DO LIBREOFFICE
+# ==============================================================================
+
+class InstanciaOffice:
+    """Um processo soffice headless de longa duração com perfil próprio."""
+
+    def __init__(self, indice):
+        self.indice = indice
+        self.perfil = tempfile.mkdtemp(prefix=f'pystock_soffice_{indice}_')
+        self.porta = None
+        self.processo = None
+        self.desktop = None
+        self.conversoes = 0
+
+    def ativa(self):
+        if uno is None:
+            return True
+        return self.processo is not None and self.processo.poll() is None and self.desktop is not None
+
+    def saudavel(self):
+        if not self.ativa():
+            return False
+        if uno is None:
+            return True
+        try:
+            self.desktop.getComponents()
+            return True
+        except Exception:
+            return False
+
+    def iniciar(self):
+        if uno is None:
+            return
+
+        self.porta = _porta_livre()
+        self.processo = subprocess.Popen([
+            SOFFICE_BIN, '--headless', '--invisible', '--nologo', '--nodefault',
+            '--norestore', '--nolockcheck',
+            f'-env:UserInstallation={_url_ficheiro(self.perfil)}',
+            f'--accept=socket,host=127.0.0.1,port={self.porta};urp;StarOffice.ComponentContext'
+        ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+        local = uno.getComponentContext()
+        resolver = local.ServiceManager.createInstanceWithContext('com.sun.star.bridge.UnoUrlResolver', local)
+        limite = time.monotonic() + TIMEOUT_ARRANQUE
+        while True:
+            if self.processo.poll() is not None:
+                raise ErroConversao(f'LibreOffice terminou durante o arranque (código {self.processo.returncode}).')
+            try:
+                ctx = resolver.resolve(f'uno:socket,host=127.0.0.1,port={self.porta};urp;StarOffice.ComponentContext')
+                break
+            except NoConnectException:
+                if time.monotonic() > limite:
+                    self.parar()
+                    raise ErroConversao('LibreOffice não respondeu dentro do tempo de arranque.')
+                time.sleep(0.25)
+
+        self.desktop = ctx.ServiceManager.createInstanceWithContext('com.sun.star.frame.Desktop', ctx)
+        self.conversoes = 0
+        print(f"Conversor PDF: instância {self.indice} ativa na porta {self.porta}.")
+
+    def parar(self):
+        self.desktop = None
+        if self.processo is not None:
+            if self.processo.poll() is None:
+                self.processo.terminate()
+                try:
+                    self.processo.wait(timeout=10)
+                except subprocess.TimeoutExpired:
+                    self.processo.kill()
+                    self.processo.wait()
+            self.processo = None
+
+    def reiniciar(self):
+        self.parar()
+        self.iniciar()
+
+    def converter(self, caminho_docx, pasta_saida, timeout):
+        if not self.saudavel():
+            print(f"Conversor PDF: instância {self.indice} indisponível, a reiniciar...")
+            self.reiniciar()
+
+        nome_pdf = os.path.splitext(os.path.basename(caminho_docx))[0] + '.pdf'
+        caminho_pdf = os.path.join(pasta_saida, nome_pdf)
+
+        if uno is None:
+            self._converter_linha_comando(caminho_docx, pasta_saida, timeout)
+        else:
+            self._converter_uno(caminho_docx, caminho_pdf, timeout)
+
+        if not os.path.exists(caminho_pdf):
+            raise ErroConversao('O LibreOffice não produziu o PDF.')
+        self.conversoes += 1
+        return caminho_pdf
+
+    def _converter_uno(self, caminho_docx, caminho_pdf, timeout):
+        resultado = {}
+
+        def executar():
+            try:
+                doc = self.desktop.loadComponentFromURL(
+                    _url_ficheiro(caminho_docx), '_blank', 0, (_propriedade('Hidden', True),)
+                )
+                try:
+                    doc.storeToURL(_url_ficheiro(caminho_pdf), (_propriedade('FilterName', 'writer_pdf_Export'),))
+                finally:
+                    doc.close(True)
+            except Exception as e:
+                resultado['erro'] = e
+
+        t = threading.Thread(target=executar, daemon=True)
+        t.start()
+        t.join(timeout)
+
+        if t.is_alive():
+            # Documento preso: mata o processo para libertar a chamada UNO e
+            # deixa a instância para ser reiniciada no próximo uso.
+            self.parar()
+            raise ErroConversao(f'Conversão excedeu o limite de {timeout:.0f}s.')
+        if 'erro' in resultado:
+            if not self.saudavel():
+                self.parar()
+            raise ErroConversao(f"Falha na conversão: {resultado['erro']}")
+
+    def _converter_linha_comando(self, caminho_docx, pasta_saida, timeout):
+        try:
+            subprocess.run([
+                SOFFICE_BIN, '--headless', '--norestore', '--nolockcheck',
+                f'-env:UserInstallation={_url_ficheiro(self.perfil)}',
+                '--convert-to', 'pdf', '--outdir', pasta_saida, caminho_docx
+            ], check=True, timeout=timeout, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except subprocess.TimeoutExpired:
+            raise ErroConversao(f'Conversão excedeu o limite de {timeout:.0f}s.')
+        except (subprocess.CalledProcessError, OSError) as e:
+            raise ErroConversao(f'Falha na conversão: {e}')
+
+    def descartar(self):
+        self.parar()
+        shutil.rmtree(self.perfil, ignore_errors=True)
+
+# ==============================================================================
+# POOL
+# ==============================================================================
+
+class PoolConversor:
+    """Distribui as conversões pelas instâncias livres, por ordem de chegada."""
+
+    def __init__(self, num_instancias=NUM_INSTANCIAS, timeout=TIMEOUT_CONVERSAO, timeout_fila=TIMEOUT_FILA):
+        self.timeout = timeout
+        self.timeout_fila = timeout_fila
+        self.instancias = [InstanciaOffice(i) for i in range(max(1, num_instancias))]
+        self.livres = queue.Queue()
+        for inst in self.instancias:
+            self.livres.put(inst)
+
+    def converter(self, caminho_docx, pasta_saida, timeout=None):
+        try:
+            inst = self.livres.get(timeout=self.timeout_fila)
+        except queue.Empty:
+            raise ErroConversao('Todas as instâncias do conversor estão ocupadas.')
+        try:
+            return inst.converter(caminho_docx, pasta_saida, timeout or self.timeout)
+        finally:
+            self.livres.put(inst)
+
+    def aquecer(self):
+        """Inicia as instâncias paradas. Cada uma sai da fila de livres enquanto
+        arranca, para não ser iniciada ao mesmo tempo por uma conversão."""
+        for _ in self.instancias:
+            try:
+                inst = self.livres.get(timeout=self.timeout_fila)
+            except queue.Empty:
+                return
+            try:
+                if not inst.ativa():
+                    inst.iniciar()
+            except Exception as e:
+                print(f"AVISO: não foi possível iniciar a instância {inst.indice} do conversor: {e}")
+            finally:
+                self.livres.put(inst)
+
+    def estado(self):
+        return [{
+            'indice': inst.indice,
+            'porta': inst.porta,
+            'ativa': inst.ativa(),
+            'conversoes': inst.conversoes
+        } for inst in self.instancias]
+
+    def encerrar(self):
+        for inst in self.instancias:
+            inst.descartar()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+def obter_conversor():
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = PoolConversor()
+            atexit.register(_pool.encerrar)
+        return _pool
@@ -0,0 +1,120 @@
+import os
+import re
+import threading
+from collections import Counter
+from contextlib import contextmanager
+
+from flask import g, request, has_request_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+# ==============================================================================
+# FORMA DAS INSTRUÇÕES
+# ==============================================================================
+
+_REGEX_LISTA = re.compile(r'\(\s*(?:\?|%\(\w+\)s|%s|:\w+)(?:\s*,\s*(?:\?|%\(\w+\)s|%s|:\w+))*\s*\)')
+_REGEX_NUMERO = re.compile(r'\b\d+\b')
+_REGEX_TEXTO = re.compile(r"'(?:[^']|'')*'")
+_REGEX_ESPACOS = re.compile(r'\s+')
+
+def forma_sql(sql):
+    """Normaliza uma instrução para que as repetições de um N+1 fiquem iguais.
+
+    Literais e listas de parâmetros (IN (...)) são reduzidos a '?', de forma
+    que a mesma consulta com ids diferentes conta como uma só forma.
+    """
+    sql = _REGEX_TEXTO.sub('?', sql)
+    sql = _REGEX_NUMERO.sub('?', sql)
+    sql = _REGEX_LISTA.sub('(?)', sql)
+    return _REGEX_ESPACOS.sub(' ', sql).strip()
+
+# ==============================================================================
+# CONTAGEM
+# ==============================================================================
+
+class ContagemQueries:
+    def __init__(self):
+        self.instrucoes = []
+
+    def registar(self, sql):
+        self.instrucoes.append(sql)
+
+    @property
+    def total(self):
+        return len(self.instrucoes)
+
+    @property
+    def formas(self):
+        return Counter(forma_sql(s) for s in self.instrucoes)
+
+    def repetidas(self, minimo=2):
+        return [(forma, n) for forma, n in self.formas.most_common() if n >= minimo]
+
+
+_ativas = threading.local()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _registar_instrucao(conn, cursor, statement, parameters, context, executemany):
+    for contagem in getattr(_ativas, 'pilha', ()):
+        contagem.registar(statement)
+    if has_request_context() and '_contagem_queries' in g:
+        g._contagem_queries.registar(statement)
+
+
+@contextmanager
+def contar_queries():
+    """Conta as instruções SQL executadas nesta thread dentro do bloco.
+
+        with contar_queries() as c:
+            cliente.get('/api/estoque/saldos', headers=h)
+        assert c.total <= 3, c.repetidas()
+
+    O cliente de testes do Flask atende o pedido na mesma thread, por isso as
+    consultas da rota entram na contagem.
+    """
+    contagem = ContagemQueries()
+    pilha = getattr(_ativas, 'pilha', None)
+    if pilha is None:
+        pilha = _ativas.pilha = []
+    pilha.append(contagem)
+    try:
+        yield contagem
+    finally:
+        pilha.remove(contagem)
+
+# ==============================================================================
+# MODO DE DESENVOLVIMENTO
+# ==============================================================================
+
+def instalar_contador_queries(app):
+    """Com CONTAR_QUERIES=1 (ou em modo debug), cada resposta leva X-Query-Count
+    e o log regista o total e as formas repetidas. QUERY_ORCAMENTO define o
+    máximo por pedido acima do qual o registo passa a aviso.
+    """
+    configurado = os.getenv('CONTAR_QUERIES')
+    orcamento = int(os.getenv('QUERY_ORCAMENTO', '0')) or None
+
+    @app.before_request
+    def _iniciar_contagem():
+        # app.debug só é conhecido depois do app.run(), por isso é lido a cada pedido.
+        if configurado == '1' or (configurado is None and app.debug):
+            g._contagem_queries = ContagemQueries()
+
+    @app.after_request
+    def _fechar_contagem(resposta):
+        contagem = g.pop('_contagem_queries', None)
+        if contagem is None:
+            return resposta
+
+        resposta.headers['X-Query-Count'] = str(contagem.total)
+        repetidas = contagem.repetidas()
+        excedido = orcamento is not None and contagem.total > orcamento
+
+        if excedido or repetidas:
+            linhas = [f'{request.method} {request.path}: {contagem.total} queries'
+                      + (f' (orçamento {orcamento})' if excedido else '')]
+            linhas += [f'  {n}x {forma[:200]}' for forma, n in repetidas[:10]]
+            app.logger.warning('\n'.join(linhas))
+        else:
+            app.logger.info(f'{request.method} {request.path}: {contagem.total} queries')
+        return resposta
@@ -0,0 +1,36 @@
+import io
+
+from reportlab.lib.units import mm
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.enums import TA_CENTER
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, PageBreak
+from reportlab.graphics.barcode import code128
+
+# ==============================================================================
+# ETIQUETAS COM CÓDIGO DE BARRAS
+# ==============================================================================
+# Importado só no primeiro pedido de etiquetas (ReportLab pesa no arranque).
+
+def gerar_pdf_etiquetas(produtos):
+    buffer = io.BytesIO()
+    w, h = 62 * mm, 100 * mm
+    doc = SimpleDocTemplate(buffer, pagesize=(w, h), leftMargin=5*mm, rightMargin=5*mm, topMargin=5*mm, bottomMargin=5*mm)
+
+    styles = getSampleStyleSheet()
+    styles['Normal'].fontSize = 12
+    styles['Normal'].leading = 14
+    style_cod = ParagraphStyle(name='CodigoStyle', parent=styles['Normal'], alignment=TA_CENTER)
+
+    elems = []
+    for p in produtos:
+        elems.append(Paragraph(f"<b>{p.nome}</b>", styles['Normal']))
+        elems.append(Spacer(1, 8*mm))
+        elems.append(code128.Code128(p.codigo, barHeight=20*mm, barWidth=0.4*mm))
+        elems.append(Spacer(1, 2*mm))
+        elems.append(Paragraph(p.codigo, style_cod))
+        elems.append(PageBreak())
+
+    if elems: elems.pop()
+    doc.build(elems)
+    buffer.seek(0)
+    return buffer
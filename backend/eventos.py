@@ -0,0 +1,94 @@
+import os
+import json
+import time
+
+from sqlalchemy import select, func, or_
+
+# ==============================================================================
+# EVENTOS DE ESTOQUE (Server-Sent Events)
+# ==============================================================================
+
+INTERVALO_EVENTOS = float(os.getenv('EVENTOS_INTERVALO', '1'))
+DURACAO_MAXIMA = int(os.getenv('EVENTOS_DURACAO', '300'))
+INTERVALO_BATIMENTO = 5
+ESPERA_LACUNA = 10
+MAXIMO_LACUNA = 100
+
+class LeitorEventos:
+    """Lê os eventos de uma ligação a partir de um id, por ordem.
+
+    Com MySQL, duas transações podem fazer commit pela ordem inversa à dos
+    seus ids: um id em falta fica pendente e é procurado de novo durante
+    ESPERA_LACUNA s (depois disso assume-se que foi um rollback).
+    """
+
+    def __init__(self, tabela, ultimo):
+        self.tabela = tabela
+        self.ultimo = ultimo
+        self.lacunas = {}
+
+    def consulta(self):
+        t = self.tabela
+        condicao = t.c.id > self.ultimo
+        if self.lacunas:
+            condicao = or_(condicao, t.c.id.in_(list(self.lacunas)))
+        return select(t.c.id, t.c.id_produto, t.c.novo_saldo, t.c.removido).where(condicao).order_by(t.c.id).limit(1000)
+
+    def processar(self, linhas):
+        agora = time.monotonic()
+        for linha in linhas:
+            self.lacunas.pop(linha.id, None)
+            if linha.id > self.ultimo:
+                if linha.id - self.ultimo <= MAXIMO_LACUNA:
+                    for em_falta in range(self.ultimo + 1, linha.id):
+                        self.lacunas[em_falta] = agora
+                self.ultimo = linha.id
+        self.lacunas = {i: t for i, t in self.lacunas.items() if agora - t < ESPERA_LACUNA}
+        return linhas
+
+
+def consulta_ultimo_evento(tabela):
+    return select(func.coalesce(func.max(tabela.c.id), 0))
+
+
+def inicio_pedido(cabecalho_ultimo, desde):
+    """Id a partir do qual enviar: Last-Event-ID (religação) ou ?desde=; None = só os novos."""
+    for valor in (cabecalho_ultimo, desde):
+        if valor is not None and str(valor).isdigit():
+            return int(valor)
+    return None
+
+
+def formatar_eventos(linhas, leitor):
+    partes = []
+    for linha in linhas:
+        evento = {'id_produto': linha.id_produto, 'novo_saldo': linha.novo_saldo, 'version': linha.id}
+        if linha.removido:
+            evento['removido'] = True
+        dados = json.dumps(evento, separators=(',', ':'))
+        # O id enviado é o cursor do leitor, para a religação continuar do ponto certo.
+        partes.append(f'id: {leitor.ultimo}\ndata: {dados}\n\n')
+    return ''.join(partes)
+
+
+PREAMBULO = 'retry: 2000\n\n'
+BATIMENTO = ': batimento\n\n'
+CABECALHOS = {'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+
+
+def gerar_eventos(engine, leitor):
+    """Stream síncrono (Flask/waitress); termina após DURACAO_MAXIMA s e o cliente volta a ligar."""
+    yield PREAMBULO
+    fim = time.monotonic() + DURACAO_MAXIMA
+    ultimo_envio = time.monotonic()
+    while time.monotonic() < fim:
+        with engine.connect() as conn:
+            linhas = leitor.processar(conn.execute(leitor.consulta()).all())
+        if linhas:
+            yield formatar_eventos(linhas, leitor)
+            ultimo_envio = time.monotonic()
+        elif time.monotonic() - ultimo_envio >= INTERVALO_BATIMENTO:
+            # Só ao escrever se descobre que o cliente desligou.
+            yield BATIMENTO
+            ultimo_envio = time.monotonic()
+        time.sleep(INTERVALO_EVENTOS)
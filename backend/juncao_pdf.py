@@ -0,0 +1,185 @@
+import io
+import os
+import hashlib
+import tempfile
+from collections import deque
+
+from pypdf import PdfReader
+from pypdf.generic import (
+    ArrayObject, DictionaryObject, IndirectObject, NameObject, NumberObject, StreamObject
+)
+
+# ==============================================================================
+# JUNÇÃO EM STREAMING
+# ==============================================================================
+
+class _JuncaoPdf:
+    """Escreve os objetos de cada PDF de origem diretamente no ficheiro de saída.
+
+    Ao contrário do PdfWriter, que mantém todas as páginas clonadas em memória
+    até ao write(), aqui cada objeto é escrito assim que é visitado e a cache do
+    leitor é limpa a cada página; a memória fica limitada ao maior objeto.
+    Streams sem referências (imagens, fontes) repetidos são escritos uma só vez.
+    """
+
+    OBJ_CATALOGO = 1
+    OBJ_PAGINAS = 2
+
+    def __init__(self, f):
+        self.f = f
+        self.offsets = {}
+        self.proximo = 3
+        self.paginas = []
+        self.unicos = {}
+        f.write(b'%PDF-1.7\n%\xe2\xe3\xcf\xd3\n')
+
+    def _reservar(self):
+        num = self.proximo
+        self.proximo += 1
+        return num
+
+    def _escrever(self, num, obj):
+        self.offsets[num] = self.f.tell()
+        self.f.write(f'{num} 0 obj\n'.encode())
+        obj.write_to_stream(self.f)
+        self.f.write(b'\nendobj\n')
+
+    def adicionar(self, caminho):
+        leitor = PdfReader(caminho, strict=False)
+        if leitor.is_encrypted:
+            leitor.decrypt('')
+
+        mapa = {}
+        pendentes = deque()
+
+        def referencia(ind):
+            chave = (ind.idnum, ind.generation)
+            if chave not in mapa:
+                obj = ind.get_object()
+                hash_obj = self._hash_stream_isolado(obj)
+                if hash_obj and hash_obj in self.unicos:
+                    mapa[chave] = self.unicos[hash_obj]
+                else:
+                    mapa[chave] = self._reservar()
+                    if hash_obj:
+                        self.unicos[hash_obj] = mapa[chave]
+                    pendentes.append(ind)
+            return IndirectObject(mapa[chave], 0, None)
+
+        def remapear(obj, pagina=False):
+            if isinstance(obj, IndirectObject):
+                return referencia(obj)
+            if isinstance(obj, StreamObject):
+                novo = StreamObject()
+                novo._data = obj._data
+                for k, v in obj.items():
+                    if k != '/Length':
+                        novo[NameObject(k)] = remapear(v)
+                return novo
+            if isinstance(obj, DictionaryObject):
+                novo = DictionaryObject()
+                for k, v in obj.items():
+                    if pagina and k == '/Parent':
+                        continue
+                    novo[NameObject(k)] = remapear(v)
+                return novo
+            if isinstance(obj, ArrayObject):
+                return ArrayObject(remapear(v) for v in obj)
+            return obj
+
+        # Os números das páginas são fixados antes, para que links entre páginas
+        # apontem para a página final e não para uma cópia solta.
+        numeros = []
+        for pagina in leitor.pages:
+            num = self._reservar()
+            numeros.append(num)
+            if pagina.indirect_reference is not None:
+                ref = pagina.indirect_reference
+                mapa[(ref.idnum, ref.generation)] = num
+
+        for pagina, num in zip(leitor.pages, numeros):
+            nova = remapear(pagina, pagina=True)
+            nova[NameObject('/Parent')] = IndirectObject(self.OBJ_PAGINAS, 0, None)
+            self._escrever(num, nova)
+            self.paginas.append(num)
+
+            while pendentes:
+                ind = pendentes.popleft()
+                obj = ind.get_object()
+                e_pagina = isinstance(obj, DictionaryObject) and obj.get('/Type') == '/Page'
+                self._escrever(mapa[(ind.idnum, ind.generation)], remapear(obj, pagina=e_pagina))
+
+            leitor.resolved_objects.clear()
+
+        if hasattr(leitor.stream, 'close'):
+            leitor.stream.close()
+
+    @staticmethod
+    def _hash_stream_isolado(obj):
+        if not isinstance(obj, StreamObject):
+            return None
+        dicionario = DictionaryObject()
+        for k, v in obj.items():
+            if k == '/Length':
+                continue
+            if _tem_referencias(v):
+                return None
+            dicionario[NameObject(k)] = v
+        buffer = io.BytesIO()
+        dicionario.write_to_stream(buffer)
+        return hashlib.sha256(buffer.getvalue() + b'\0' + obj._data).hexdigest()
+
+    def finalizar(self):
+        paginas = DictionaryObject({
+            NameObject('/Type'): NameObject('/Pages'),
+            NameObject('/Kids'): ArrayObject(IndirectObject(n, 0, None) for n in self.paginas),
+            NameObject('/Count'): NumberObject(len(self.paginas)),
+        })
+        catalogo = DictionaryObject({
+            NameObject('/Type'): NameObject('/Catalog'),
+            NameObject('/Pages'): IndirectObject(self.OBJ_PAGINAS, 0, None),
+        })
+        self._escrever(self.OBJ_PAGINAS, paginas)
+        self._escrever(self.OBJ_CATALOGO, catalogo)
+
+        inicio_xref = self.f.tell()
+        self.f.write(f'xref\n0 {self.proximo}\n'.encode())
+        self.f.write(b'0000000000 65535 f \n')
+        for num in range(1, self.proximo):
+            # Qualquer número reservado que não chegou a ser escrito fica marcado como livre.
+            if num in self.offsets:
+                self.f.write(f'{self.offsets[num]:010d} 00000 n \n'.encode())
+            else:
+                self.f.write(b'0000000000 65535 f \n')
+        self.f.write(
+            f'trailer\n<< /Size {self.proximo} /Root {self.OBJ_CATALOGO} 0 R >>\n'
+            f'startxref\n{inicio_xref}\n%%EOF\n'.encode()
+        )
+
+
+def _tem_referencias(obj):
+    if isinstance(obj, IndirectObject):
+        return True
+    if isinstance(obj, DictionaryObject):
+        return any(_tem_referencias(v) for v in obj.values())
+    if isinstance(obj, ArrayObject):
+        return any(_tem_referencias(v) for v in obj)
+    return False
+
+
+def juntar_pdfs(caminhos, destino):
+    """Junta os PDFs de `caminhos`, por ordem, em `destino`. Devolve o nº de páginas."""
+    # Nome temporário único: dois pedidos podem montar o mesmo documento ao mesmo tempo.
+    fd, temp = tempfile.mkstemp(dir=os.path.dirname(destino), suffix='.parcial')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            juncao = _JuncaoPdf(f)
+            for caminho in caminhos:
+                juncao.adicionar(caminho)
+            juncao.finalizar()
+        os.replace(temp, destino)
+        return len(juncao.paginas)
+    except Exception:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
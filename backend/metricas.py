@@ -0,0 +1,400 @@
+import os
+import json
+import time
+import tempfile
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+from flask import g, request, has_request_context, Response
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BUCKETS_TAREFA = (0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600)
+BUCKETS_QUANTIDADE = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# Com vários workers, de quantos em quantos segundos cada um grava as suas métricas.
+INTERVALO_PARTILHA = float(os.getenv('METRICAS_INTERVALO', '5'))
+
+# ==============================================================================
+# TIPOS DE MÉTRICA (formato de texto do Prometheus)
+# ==============================================================================
+
+def _escapar(valor):
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+def _rotulos(nomes, valores, extra=''):
+    pares = [f'{n}="{_escapar(v)}"' for n, v in zip(nomes, valores)]
+    if extra:
+        pares.append(extra)
+    return '{' + ','.join(pares) + '}' if pares else ''
+
+def _numero(valor):
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+class Contador:
+    tipo = 'counter'
+
+    def __init__(self, nome, ajuda, rotulos=()):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self.valores = {}
+        self.lock = threading.Lock()
+
+    def inc(self, *rotulos, valor=1):
+        with self.lock:
+            self.valores[rotulos] = self.valores.get(rotulos, 0) + valor
+
+    def estado(self):
+        with self.lock:
+            return dict(self.valores)
+
+    def juntar(self, estados):
+        """Soma os valores de vários processos."""
+        total = {}
+        for _, valores in estados:
+            for rot, valor in valores.items():
+                total[rot] = total.get(rot, 0) + valor
+        return total, self.rotulos
+
+    def linhas(self, valores=None, rotulos=None):
+        itens = sorted((self.estado() if valores is None else valores).items())
+        for rot, valor in itens:
+            yield f'{self.nome}{_rotulos(rotulos or self.rotulos, rot)} {_numero(valor)}'
+
+
+class Histograma:
+    tipo = 'histogram'
+
+    def __init__(self, nome, ajuda, rotulos=(), buckets=BUCKETS_LATENCIA):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self.buckets = tuple(buckets) + (float('inf'),)
+        self.series = {}
+        self.lock = threading.Lock()
+
+    def observar(self, valor, *rotulos):
+        with self.lock:
+            serie = self.series.get(rotulos)
+            if serie is None:
+                serie = self.series[rotulos] = [[0] * len(self.buckets), 0.0, 0]
+            for i, limite in enumerate(self.buckets):
+                if valor <= limite:
+                    serie[0][i] += 1
+                    break
+            serie[1] += valor
+            serie[2] += 1
+
+    @contextmanager
+    def medir(self, *rotulos):
+        inicio = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observar(time.perf_counter() - inicio, *rotulos)
+
+    def estado(self):
+        with self.lock:
+            return {rot: [[*s[0]], s[1], s[2]] for rot, s in self.series.items()}
+
+    def juntar(self, estados):
+        """Soma bucket a bucket as séries de vários processos."""
+        total = {}
+        for _, series in estados:
+            for rot, (contagens, soma, n) in series.items():
+                serie = total.setdefault(rot, [[0] * len(self.buckets), 0.0, 0])
+                serie[0] = [a + b for a, b in zip(serie[0], contagens)]
+                serie[1] += soma
+                serie[2] += n
+        return total, self.rotulos
+
+    def linhas(self, series=None, rotulos=None):
+        rotulos = rotulos or self.rotulos
+        itens = sorted((self.estado() if series is None else series).items())
+        for rot, (contagens, soma, total) in itens:
+            acumulado = 0
+            for limite, n in zip(self.buckets, contagens):
+                acumulado += n
+                le = 'le="' + _numero(limite) + '"'
+                yield f'{self.nome}_bucket{_rotulos(rotulos, rot, le)} {acumulado}'
+            yield f'{self.nome}_sum{_rotulos(rotulos, rot)} {_numero(soma)}'
+            yield f'{self.nome}_count{_rotulos(rotulos, rot)} {total}'
+
+
+class Medidor:
+    """Valor lido no momento da recolha, a partir de uma função."""
+    tipo = 'gauge'
+
+    def __init__(self, nome, ajuda, funcao, rotulos=()):
+        self.nome, self.ajuda, self.rotulos = nome, ajuda, tuple(rotulos)
+        self.funcao = funcao
+
+    def estado(self):
+        try:
+            resultado = self.funcao()
+        except Exception:
+            return {}
+        if not isinstance(resultado, dict):
+            resultado = {(): resultado}
+        return {rot: valor for rot, valor in resultado.items() if valor is not None}
+
+    def juntar(self, estados):
+        """Valores instantâneos não se somam: cada processo fica com o rótulo pid."""
+        valores = {}
+        for pid, resultado in estados:
+            for rot, valor in resultado.items():
+                valores[rot + (str(pid),)] = valor
+        return valores, self.rotulos + ('pid',)
+
+    def linhas(self, valores=None, rotulos=None):
+        for rot, valor in sorted((self.estado() if valores is None else valores).items()):
+            yield f'{self.nome}{_rotulos(rotulos or self.rotulos, rot)} {_numero(valor)}'
+
+
+class Registo:
+    """Conjunto das métricas expostas no /metrics.
+
+    Com vários workers, cada processo tem os seus valores em memória e o
+    /metrics é atendido por um processo qualquer. Depois de `partilhar(pasta)`,
+    o processo grava o seu estado em `pasta` a cada INTERVALO_PARTILHA s (e a
+    cada recolha), e o texto junta os de todos: contadores e histogramas
+    somados, incluindo os de workers que já terminaram, e medidores com o
+    rótulo `pid`, só dos processos que gravaram há pouco.
+    """
+
+    def __init__(self):
+        self.metricas = {}
+        self.lock = threading.Lock()
+        self.pasta = None
+        self.ficheiro = None
+
+    def adicionar(self, metrica):
+        with self.lock:
+            self.metricas[metrica.nome] = metrica
+        return metrica
+
+    def _lista(self):
+        with self.lock:
+            return list(self.metricas.values())
+
+    def partilhar(self, pasta):
+        self.pasta = pasta
+        # O instante de arranque no nome impede um pid reutilizado de apagar os contadores de outro processo.
+        self.ficheiro = os.path.join(pasta, f'{os.getpid()}-{time.time_ns()}.json')
+        self.gravar()
+
+        def _ciclo():
+            while True:
+                time.sleep(INTERVALO_PARTILHA)
+                try:
+                    self.gravar()
+                except OSError:
+                    pass
+
+        threading.Thread(target=_ciclo, name='metricas-partilha', daemon=True).start()
+
+    def gravar(self):
+        estado = {m.nome: [[list(rot), valor] for rot, valor in m.estado().items()] for m in self._lista()}
+        fd, temp = tempfile.mkstemp(dir=self.pasta, suffix='.parcial')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump({'pid': os.getpid(), 'metricas': estado}, f)
+            os.replace(temp, self.ficheiro)
+        except Exception:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+
+    def _ler_processos(self):
+        """Gera (pid, recente, estado) de cada ficheiro da pasta partilhada."""
+        limite = time.time() - 3 * INTERVALO_PARTILHA
+        for nome in os.listdir(self.pasta):
+            if not nome.endswith('.json'):
+                continue
+            caminho = os.path.join(self.pasta, nome)
+            try:
+                recente = os.path.getmtime(caminho) >= limite
+                with open(caminho) as f:
+                    dados = json.load(f)
+            except (OSError, ValueError):
+                continue
+            estado = {nome_m: {tuple(rot): valor for rot, valor in valores} for nome_m, valores in dados['metricas'].items()}
+            yield dados['pid'], recente, estado
+
+    def texto(self):
+        metricas = self._lista()
+        processos = None
+        if self.pasta:
+            self.gravar()
+            processos = list(self._ler_processos())
+        saida = []
+        for m in metricas:
+            saida.append(f'# HELP {m.nome} {m.ajuda}')
+            saida.append(f'# TYPE {m.nome} {m.tipo}')
+            if processos is None:
+                saida.extend(m.linhas())
+            else:
+                estados = [(pid, estado.get(m.nome, {})) for pid, recente, estado in processos
+                           if recente or m.tipo != 'gauge']
+                saida.extend(m.linhas(*m.juntar(estados)))
+        return '\n'.join(saida) + '\n'
+
+# ==============================================================================
+# MÉTRICAS DA APLICAÇÃO
+# ==============================================================================
+
+registo = Registo()
+
+pedidos_total = registo.adicionar(Contador(
+    'http_pedidos_total', 'Pedidos HTTP atendidos.', ('rota', 'metodo', 'status')))
+pedidos_duracao = registo.adicionar(Histograma(
+    'http_pedido_duracao_segundos', 'Duração dos pedidos HTTP por rota.', ('rota', 'metodo')))
+pedidos_sql_consultas = registo.adicionar(Histograma(
+    'http_pedido_sql_consultas', 'Instruções SQL executadas por pedido.', ('rota',), BUCKETS_QUANTIDADE))
+pedidos_sql_duracao = registo.adicionar(Histograma(
+    'http_pedido_sql_duracao_segundos', 'Tempo total em SQL por pedido.', ('rota',)))
+sql_duracao = registo.adicionar(Histograma(
+    'sql_instrucao_duracao_segundos', 'Duração de cada instrução SQL, por operação.', ('operacao',)))
+pool_espera = registo.adicionar(Histograma(
+    'db_pool_espera_segundos', 'Tempo à espera de uma ligação livre no pool.', (),
+    (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5, 30)))
+tarefas_duracao = registo.adicionar(Histograma(
+    'tarefa_duracao_segundos', 'Duração das tarefas de relatórios e documentos.', ('tipo', 'resultado'), BUCKETS_TAREFA))
+
+
+@contextmanager
+def medir_tarefa(tipo):
+    inicio = time.perf_counter()
+    resultado = 'erro'
+    try:
+        yield
+        resultado = 'ok'
+    finally:
+        tarefas_duracao.observar(time.perf_counter() - inicio, tipo, resultado)
+
+def tarefa_medida(tipo):
+    """Decorador: regista a duração de cada chamada em tarefa_duracao_segundos."""
+    def decorador(funcao):
+        @wraps(funcao)
+        def envolvida(*args, **kwargs):
+            with medir_tarefa(tipo):
+                return funcao(*args, **kwargs)
+        return envolvida
+    return decorador
+
+# ==============================================================================
+# LIGAÇÃO AO FLASK, SQLALCHEMY E WAITRESS
+# ==============================================================================
+
+def _operacao(sql):
+    palavra = sql.lstrip().split(None, 1)[0].upper() if sql.strip() else ''
+    return palavra if palavra in ('SELECT', 'INSERT', 'UPDATE', 'DELETE') else 'OUTRA'
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _antes_sql(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('_metricas_inicio', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _depois_sql(conn, cursor, statement, parameters, context, executemany):
+    inicios = conn.info.get('_metricas_inicio')
+    if not inicios:
+        return
+    duracao = time.perf_counter() - inicios.pop()
+    sql_duracao.observar(duracao, _operacao(statement))
+    if has_request_context() and '_metricas_inicio' in g:
+        g._metricas_sql_n += 1
+        g._metricas_sql_t += duracao
+
+@event.listens_for(Engine, 'handle_error')
+def _erro_sql(contexto):
+    # Sem after_cursor_execute, o início tem de sair da pilha aqui.
+    if contexto.connection is not None:
+        inicios = contexto.connection.info.get('_metricas_inicio')
+        if inicios:
+            inicios.pop()
+
+
+def _medir_pool(pool):
+    """Envolve o _do_get do pool: é aí que um checkout espera por uma ligação livre."""
+    original = pool._do_get
+
+    def _do_get():
+        inicio = time.perf_counter()
+        try:
+            return original()
+        finally:
+            pool_espera.observar(time.perf_counter() - inicio)
+
+    pool._do_get = _do_get
+
+
+def instalar_metricas(app, db):
+    @app.before_request
+    def _inicio_pedido():
+        g._metricas_inicio = time.perf_counter()
+        g._metricas_sql_n = 0
+        g._metricas_sql_t = 0.0
+
+    @app.after_request
+    def _fim_pedido(resposta):
+        if '_metricas_inicio' in g:
+            rota = request.url_rule.rule if request.url_rule else 'sem_rota'
+            pedidos_duracao.observar(time.perf_counter() - g._metricas_inicio, rota, request.method)
+            pedidos_total.inc(rota, request.method, str(resposta.status_code))
+            pedidos_sql_consultas.observar(g._metricas_sql_n, rota)
+            pedidos_sql_duracao.observar(g._metricas_sql_t, rota)
+        return resposta
+
+    with app.app_context():
+        engines = list(db.engines.values())
+    for engine in engines:
+        _medir_pool(engine.pool)
+
+    def _estado_pools():
+        estado = {}
+        for engine in engines:
+            if hasattr(engine.pool, 'checkedout'):
+                estado[(engine.url.render_as_string(hide_password=True),)] = engine.pool.checkedout()
+        return estado
+
+    registo.adicionar(Medidor(
+        'db_pool_ligacoes_em_uso', 'Ligações atualmente retiradas do pool.', _estado_pools, ('engine',)))
+
+    token = os.getenv('METRICAS_TOKEN')
+
+    @app.route('/metrics', methods=['GET'])
+    def metricas_endpoint():
+        if token and request.headers.get('Authorization') != f'Bearer {token}':
+            return Response('Acesso negado.\n', status=403, mimetype='text/plain')
+        return Response(registo.texto(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def preparar_pasta_partilhada():
+    """No supervisor, antes dos forks: pasta onde os workers juntam as métricas.
+    Começa vazia, para os contadores de uma execução anterior não contarem."""
+    pasta = os.getenv('METRICAS_PASTA')
+    if pasta:
+        os.makedirs(pasta, exist_ok=True)
+        for nome in os.listdir(pasta):
+            if nome.endswith(('.json', '.parcial')):
+                os.remove(os.path.join(pasta, nome))
+    else:
+        pasta = tempfile.mkdtemp(prefix='pystock_metricas_')
+    os.environ['METRICAS_PASTA'] = pasta
+    return pasta
+
+
+def registar_waitress(servidor):
+    """Expõe a fila do waitress: pedidos aceites à espera de uma thread livre."""
+    dispatcher = servidor.task_dispatcher
+    registo.adicionar(Medidor(
+        'waitress_fila_pedidos', 'Pedidos na fila do waitress à espera de uma thread.',
+        lambda: len(dispatcher.queue)))
+    registo.adicionar(Medidor(
+        'waitress_threads_ocupadas', 'Threads do waitress a processar pedidos.',
+        lambda: dispatcher.active_count))
+    registo.adicionar(Medidor(
+        'waitress_threads_total', 'Threads do waitress.',
+        lambda: len(dispatcher.threads)))
@@ -0,0 +1,27 @@
+import sqlalchemy as sa
+from alembic import op
+
+# ==============================================================================
+# VERIFICAÇÕES PARA REVISÕES IDEMPOTENTES
+# ==============================================================================
+# Uma base pode já ter parte do esquema (create_all no arranque com SQLite, ou
+# flask init-db), por isso as revisões perguntam antes de criar.
+
+def _inspetor():
+    return sa.inspect(op.get_bind())
+
+def tabela_existe(tabela):
+    return _inspetor().has_table(tabela)
+
+def coluna_existe(tabela, coluna):
+    return any(c['name'] == coluna for c in _inspetor().get_columns(tabela))
+
+def indice_existe(tabela, nome):
+    return any(i['name'] == nome for i in _inspetor().get_indexes(tabela))
+
+def restricao_unica_existe(tabela, nome, colunas):
+    # O MySQL mostra as restrições UNIQUE também como índices; o SQLite nem
+    # sempre devolve o nome da restrição, por isso também contam as colunas.
+    inspetor = _inspetor()
+    unicas = inspetor.get_unique_constraints(tabela) + [i for i in inspetor.get_indexes(tabela) if i['unique']]
+    return any(u['name'] == nome or sorted(u['column_names']) == sorted(colunas) for u in unicas)
@@ -0,0 +1,91 @@
+"""Esquema inicial (produtos, estoque, utilizadores, serviços e documentos)
+
+Revision ID: 0001_esquema_inicial
+Revises:
+Create Date: 2026-10-19
+
+As bases MySQL anteriores às migrações já têm estas tabelas; só são criadas
+numa base vazia.
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from auxiliar import tabela_existe
+
+revision = '0001_esquema_inicial'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not tabela_existe('produto'):
+        op.create_table('produto',
+            sa.Column('Id_produto', sa.Integer(), primary_key=True),
+            sa.Column('Nome', sa.String(100), nullable=False),
+            sa.Column('Codigo', sa.String(20), nullable=False, unique=True),
+            sa.Column('Descricao', sa.String(200)),
+            sa.Column('Preco', sa.Numeric(10, 2)),
+            sa.Column('CodigoB', sa.String(20)),
+            sa.Column('CodigoC', sa.String(20)),
+        )
+    if not tabela_existe('fornecedor'):
+        op.create_table('fornecedor',
+            sa.Column('id_fornecedor', sa.Integer(), primary_key=True),
+            sa.Column('Nome', sa.String(50), nullable=False, unique=True),
+        )
+    if not tabela_existe('natureza'):
+        op.create_table('natureza',
+            sa.Column('id_natureza', sa.Integer(), primary_key=True),
+            sa.Column('nome', sa.String(100), nullable=False, unique=True),
+        )
+    if not tabela_existe('usuario'):
+        op.create_table('usuario',
+            sa.Column('id_usuario', sa.Integer(), primary_key=True),
+            sa.Column('nome', sa.String(100), nullable=False),
+            sa.Column('login', sa.String(100), nullable=False, unique=True),
+            sa.Column('senha_hash', sa.String(255), nullable=False),
+            sa.Column('permissao', sa.String(100), nullable=False),
+            sa.Column('ativo', sa.Boolean(), nullable=False),
+        )
+    if not tabela_existe('produto_fornecedor'):
+        op.create_table('produto_fornecedor',
+            sa.Column('FK_PRODUTO_Id_produto', sa.Integer(), sa.ForeignKey('produto.Id_produto'), primary_key=True),
+            sa.Column('FK_FORNECEDOR_id_fornecedor', sa.Integer(), sa.ForeignKey('fornecedor.id_fornecedor'), primary_key=True),
+        )
+    if not tabela_existe('produto_natureza'):
+        op.create_table('produto_natureza',
+            sa.Column('fk_PRODUTO_Id_produto', sa.Integer(), sa.ForeignKey('produto.Id_produto'), primary_key=True),
+            sa.Column('fk_NATUREZA_id_natureza', sa.Integer(), sa.ForeignKey('natureza.id_natureza'), primary_key=True),
+        )
+    if not tabela_existe('mov_estoque'):
+        op.create_table('mov_estoque',
+            sa.Column('id_movimentacao', sa.Integer(), primary_key=True),
+            sa.Column('id_produto', sa.Integer(), sa.ForeignKey('produto.Id_produto'), nullable=False),
+            sa.Column('id_usuario', sa.Integer(), sa.ForeignKey('usuario.id_usuario'), nullable=False),
+            sa.Column('data_hora', sa.DateTime(), nullable=False),
+            sa.Column('quantidade', sa.Integer(), nullable=False),
+            sa.Column('tipo', sa.Enum('Entrada', 'Saida'), nullable=False),
+            sa.Column('motivo_saida', sa.String(200)),
+        )
+    if not tabela_existe('servico'):
+        op.create_table('servico',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('nome', sa.String(200), nullable=False, unique=True),
+            sa.Column('descricao', sa.Text()),
+        )
+    if not tabela_existe('documentos_gerados'):
+        op.create_table('documentos_gerados',
+            sa.Column('id', sa.Integer(), primary_key=True),
+            sa.Column('servico_id', sa.Integer(), sa.ForeignKey('servico.id'), nullable=False),
+            sa.Column('usuario_id', sa.Integer(), sa.ForeignKey('usuario.id_usuario'), nullable=False),
+            sa.Column('data_criacao', sa.DateTime(), nullable=False),
+            sa.Column('versao', sa.Integer(), nullable=False),
+            sa.Column('dados_formulario', sa.JSON(), nullable=False),
+            sa.Column('caminho_pdf_final', sa.String(255), nullable=False),
+        )
+
+
+def downgrade():
+    # Não se apaga o esquema de partida: numa base antiga estas tabelas têm os dados todos.
+    pass
@@ -0,0 +1,34 @@
+"""Fila de geração de documentos (tarefa_documento)
+
+Revision ID: 0002_tarefa_documento
+Revises: 0001_esquema_inicial
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from auxiliar import tabela_existe
+
+revision = '0002_tarefa_documento'
+down_revision = '0001_esquema_inicial'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if tabela_existe('tarefa_documento'):
+        return
+    op.create_table('tarefa_documento',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('servico_id', sa.Integer(), sa.ForeignKey('servico.id'), nullable=False),
+        sa.Column('usuario_id', sa.Integer(), sa.ForeignKey('usuario.id_usuario'), nullable=False),
+        sa.Column('status', sa.Enum('Pendente', 'Processando', 'Concluida', 'Erro'), nullable=False),
+        sa.Column('mensagem_erro', sa.Text()),
+        sa.Column('documento_id', sa.Integer(), sa.ForeignKey('documentos_gerados.id', ondelete='SET NULL')),
+        sa.Column('data_criacao', sa.DateTime(), nullable=False),
+        sa.Column('data_conclusao', sa.DateTime()),
+    )
+
+
+def downgrade():
+    op.drop_table('tarefa_documento')
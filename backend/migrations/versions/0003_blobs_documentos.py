@@ -0,0 +1,38 @@
+"""Corpo e anexos dos documentos guardados como blobs (documento_anexo, blob_corpo)
+
+Revision ID: 0003_blobs_documentos
+Revises: 0002_tarefa_documento
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from auxiliar import tabela_existe, coluna_existe, indice_existe
+
+revision = '0003_blobs_documentos'
+down_revision = '0002_tarefa_documento'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not coluna_existe('documentos_gerados', 'blob_corpo'):
+        op.add_column('documentos_gerados', sa.Column('blob_corpo', sa.String(64)))
+    if not indice_existe('documentos_gerados', 'ix_documentos_gerados_blob_corpo'):
+        op.create_index('ix_documentos_gerados_blob_corpo', 'documentos_gerados', ['blob_corpo'])
+
+    if not tabela_existe('documento_anexo'):
+        op.create_table('documento_anexo',
+            sa.Column('documento_id', sa.Integer(), sa.ForeignKey('documentos_gerados.id'), primary_key=True),
+            sa.Column('ordem', sa.Integer(), primary_key=True),
+            sa.Column('blob_hash', sa.String(64), nullable=False),
+            sa.Column('nome', sa.String(255)),
+        )
+        op.create_index('ix_documento_anexo_blob_hash', 'documento_anexo', ['blob_hash'])
+
+
+def downgrade():
+    op.drop_table('documento_anexo')
+    op.drop_index('ix_documentos_gerados_blob_corpo', table_name='documentos_gerados')
+    with op.batch_alter_table('documentos_gerados') as batch_op:
+        batch_op.drop_column('blob_corpo')
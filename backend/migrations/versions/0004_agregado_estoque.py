@@ -0,0 +1,32 @@
+"""KPIs do estoque mantidos incrementalmente (agregado_estoque)
+
+Revision ID: 0004_agregado_estoque
+Revises: 0003_blobs_documentos
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from auxiliar import tabela_existe
+
+revision = '0004_agregado_estoque'
+down_revision = '0003_blobs_documentos'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # A linha única (id = 1) é criada pela aplicação no primeiro pedido dos KPIs.
+    if tabela_existe('agregado_estoque'):
+        return
+    op.create_table('agregado_estoque',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('total_produtos', sa.Integer(), nullable=False),
+        sa.Column('total_fornecedores', sa.Integer(), nullable=False),
+        sa.Column('valor_total_estoque', sa.Numeric(16, 2), nullable=False),
+        sa.Column('data_atualizacao', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('agregado_estoque')
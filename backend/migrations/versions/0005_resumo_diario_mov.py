@@ -0,0 +1,38 @@
+"""Resumo diário de movimentações e marca de processamento
+
+Revision ID: 0005_resumo_diario_mov
+Revises: 0004_agregado_estoque
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from auxiliar import tabela_existe
+
+revision = '0005_resumo_diario_mov'
+down_revision = '0004_agregado_estoque'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # O agendador preenche o resumo a partir de mov_estoque na primeira passagem.
+    if not tabela_existe('resumo_diario_mov'):
+        op.create_table('resumo_diario_mov',
+            sa.Column('data', sa.Date(), primary_key=True),
+            sa.Column('id_produto', sa.Integer(), sa.ForeignKey('produto.Id_produto'), primary_key=True),
+            sa.Column('tipo', sa.Enum('Entrada', 'Saida'), primary_key=True),
+            sa.Column('quantidade', sa.Integer(), nullable=False),
+            sa.Column('num_movimentacoes', sa.Integer(), nullable=False),
+        )
+    if not tabela_existe('marca_processamento'):
+        op.create_table('marca_processamento',
+            sa.Column('nome', sa.String(50), primary_key=True),
+            sa.Column('ultimo_id', sa.Integer(), nullable=False),
+            sa.Column('data_atualizacao', sa.DateTime(), nullable=False),
+        )
+
+
+def downgrade():
+    op.drop_table('marca_processamento')
+    op.drop_table('resumo_diario_mov')
@@ -0,0 +1,28 @@
+"""Pulsação escrita na base principal para medir o atraso da réplica
+
+Revision ID: 0006_pulsacao_replica
+Revises: 0005_resumo_diario_mov
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from auxiliar import tabela_existe
+
+revision = '0006_pulsacao_replica'
+down_revision = '0005_resumo_diario_mov'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if tabela_existe('pulsacao_replica'):
+        return
+    op.create_table('pulsacao_replica',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('data_hora', sa.DateTime(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('pulsacao_replica')
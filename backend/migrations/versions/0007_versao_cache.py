@@ -0,0 +1,28 @@
+"""Versões das caches locais, para as invalidar entre processos
+
+Revision ID: 0007_versao_cache
+Revises: 0006_pulsacao_replica
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from auxiliar import tabela_existe
+
+revision = '0007_versao_cache'
+down_revision = '0006_pulsacao_replica'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if tabela_existe('versao_cache'):
+        return
+    op.create_table('versao_cache',
+        sa.Column('nome', sa.String(50), primary_key=True),
+        sa.Column('versao', sa.Integer(), nullable=False),
+    )
+
+
+def downgrade():
+    op.drop_table('versao_cache')
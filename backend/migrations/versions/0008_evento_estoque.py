@@ -0,0 +1,31 @@
+"""Eventos de alteração de saldo/produto (stream /api/eventos)
+
+Revision ID: 0008_evento_estoque
+Revises: 0007_versao_cache
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from auxiliar import tabela_existe
+
+revision = '0008_evento_estoque'
+down_revision = '0007_versao_cache'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if tabela_existe('evento_estoque'):
+        return
+    op.create_table('evento_estoque',
+        sa.Column('id', sa.Integer(), primary_key=True),
+        sa.Column('id_produto', sa.Integer(), nullable=False),
+        sa.Column('novo_saldo', sa.Integer(), nullable=False),
+        sa.Column('data_hora', sa.DateTime(), nullable=False),
+    )
+    op.create_index('ix_evento_estoque_data_hora', 'evento_estoque', ['data_hora'])
+
+
+def downgrade():
+    op.drop_table('evento_estoque')
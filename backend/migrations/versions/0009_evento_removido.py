@@ -0,0 +1,27 @@
+"""Marca de produto removido nos eventos (tombstones do /api/sync)
+
+Revision ID: 0009_evento_removido
+Revises: 0008_evento_estoque
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from auxiliar import coluna_existe
+
+revision = '0009_evento_removido'
+down_revision = '0008_evento_estoque'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if coluna_existe('evento_estoque', 'removido'):
+        return
+    # Os eventos já gravados são todos alterações de saldo, nenhum é uma remoção.
+    op.add_column('evento_estoque', sa.Column('removido', sa.Boolean(), nullable=False, server_default=sa.false()))
+
+
+def downgrade():
+    with op.batch_alter_table('evento_estoque') as batch_op:
+        batch_op.drop_column('removido')
@@ -0,0 +1,57 @@
+"""Versão de documento única por serviço (uq_documento_servico_versao)
+
+Revision ID: 0010_versao_documento_unica
+Revises: 0009_evento_removido
+Create Date: 2026-10-19
+"""
+import os
+
+from alembic import op
+import sqlalchemy as sa
+
+from auxiliar import restricao_unica_existe
+
+revision = '0010_versao_documento_unica'
+down_revision = '0009_evento_removido'
+branch_labels = None
+depends_on = None
+
+documentos = sa.table('documentos_gerados',
+    sa.column('id', sa.Integer), sa.column('servico_id', sa.Integer), sa.column('versao', sa.Integer),
+    sa.column('caminho_pdf_final', sa.String), sa.column('blob_corpo', sa.String),
+)
+
+
+def _renumerar_duplicados(conn):
+    """Gerações concorrentes podem ter gravado a mesma versão duas vezes: a mais
+    antiga fica com o número, as outras passam para o fim da lista do serviço."""
+    d = documentos
+    repetidos = conn.execute(
+        sa.select(d.c.servico_id, d.c.versao).group_by(d.c.servico_id, d.c.versao).having(sa.func.count() > 1)
+    ).all()
+    for servico_id, versao in repetidos:
+        linhas = conn.execute(
+            sa.select(d.c.id, d.c.caminho_pdf_final, d.c.blob_corpo)
+            .where(d.c.servico_id == servico_id, d.c.versao == versao).order_by(d.c.id)
+        ).all()
+        for id_documento, caminho, blob_corpo in linhas[1:]:
+            nova = conn.execute(sa.select(sa.func.max(d.c.versao)).where(d.c.servico_id == servico_id)).scalar() + 1
+            valores = {'versao': nova}
+            if blob_corpo:
+                # O PDF partilhado pode ser o da outra geração; este volta a ser montado dos blobs.
+                valores['caminho_pdf_final'] = os.path.join(os.path.dirname(caminho), f"servico_{servico_id}_v{nova}.pdf")
+            conn.execute(sa.update(d).where(d.c.id == id_documento).values(**valores))
+
+
+def upgrade():
+    if restricao_unica_existe('documentos_gerados', 'uq_documento_servico_versao', ['servico_id', 'versao']):
+        return
+    _renumerar_duplicados(op.get_bind())
+    # Um índice único em vez de ALTER TABLE ... ADD CONSTRAINT: no SQLite evita
+    # recriar a tabela (referida por documento_anexo e tarefa_documento), e no
+    # MySQL é a mesma coisa.
+    op.create_index('uq_documento_servico_versao', 'documentos_gerados', ['servico_id', 'versao'], unique=True)
+
+
+def downgrade():
+    op.drop_index('uq_documento_servico_versao', table_name='documentos_gerados')
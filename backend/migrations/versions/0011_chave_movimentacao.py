@@ -0,0 +1,48 @@
+"""Chaves de idempotência das entradas/saídas, com o movimento a que pertencem
+
+Revision ID: 0011_chave_movimentacao
+Revises: 0010_versao_documento_unica
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from auxiliar import tabela_existe, coluna_existe
+
+revision = '0011_chave_movimentacao'
+down_revision = '0010_versao_documento_unica'
+branch_labels = None
+depends_on = None
+
+TIPO = sa.Enum('Entrada', 'Saida')
+
+
+def upgrade():
+    if not tabela_existe('chave_movimentacao'):
+        op.create_table('chave_movimentacao',
+            sa.Column('chave', sa.String(64), primary_key=True),
+            sa.Column('id_movimentacao', sa.Integer(), sa.ForeignKey('mov_estoque.id_movimentacao'), nullable=False),
+            sa.Column('tipo', TIPO, nullable=False),
+            sa.Column('id_produto', sa.Integer(), nullable=False),
+            sa.Column('novo_saldo', sa.Integer(), nullable=False),
+            sa.Column('data_hora', sa.DateTime(), nullable=False),
+        )
+        return
+
+    if coluna_existe('chave_movimentacao', 'tipo'):
+        return
+    # Tabela criada por create_all antes destas colunas: preenche-as a partir da movimentação.
+    op.add_column('chave_movimentacao', sa.Column('tipo', TIPO))
+    op.add_column('chave_movimentacao', sa.Column('id_produto', sa.Integer()))
+    for coluna in ('tipo', 'id_produto'):
+        op.execute(
+            f"UPDATE chave_movimentacao SET {coluna} = (SELECT m.{coluna} FROM mov_estoque m "
+            f"WHERE m.id_movimentacao = chave_movimentacao.id_movimentacao)"
+        )
+    with op.batch_alter_table('chave_movimentacao') as batch_op:
+        batch_op.alter_column('tipo', existing_type=TIPO, nullable=False)
+        batch_op.alter_column('id_produto', existing_type=sa.Integer(), nullable=False)
+
+
+def downgrade():
+    op.drop_table('chave_movimentacao')
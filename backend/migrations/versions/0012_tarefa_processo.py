@@ -0,0 +1,25 @@
+"""Processo em cuja fila está cada tarefa de geração de documentos
+
+Revision ID: 0012_tarefa_processo
+Revises: 0011_chave_movimentacao
+Create Date: 2026-10-19
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from auxiliar import coluna_existe
+
+revision = '0012_tarefa_processo'
+down_revision = '0011_chave_movimentacao'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not coluna_existe('tarefa_documento', 'processo'):
+        op.add_column('tarefa_documento', sa.Column('processo', sa.String(100)))
+
+
+def downgrade():
+    with op.batch_alter_table('tarefa_documento') as batch_op:
+        batch_op.drop_column('processo')
@@ -0,0 +1,23 @@
+"""Índice por data nas chaves de idempotência, usado pela limpeza do agendador
+
+Revision ID: 0013_chave_data_hora
+Revises: 0012_tarefa_processo
+Create Date: 2026-10-19
+"""
+from alembic import op
+
+from auxiliar import indice_existe
+
+revision = '0013_chave_data_hora'
+down_revision = '0012_tarefa_processo'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    if not indice_existe('chave_movimentacao', 'ix_chave_movimentacao_data_hora'):
+        op.create_index('ix_chave_movimentacao_data_hora', 'chave_movimentacao', ['data_hora'])
+
+
+def downgrade():
+    op.drop_index('ix_chave_movimentacao_data_hora', table_name='chave_movimentacao')
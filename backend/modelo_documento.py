@@ -0,0 +1,148 @@
+import io
+import os
+import re
+import copy
+import zipfile
+import threading
+
+from docx import Document
+from docx.document import Document as DocumentoDocx
+from docx.oxml import OxmlElement
+from docx.oxml.ns import qn
+from lxml import etree
+
+REGEX_MARCADOR = re.compile(r'\{\{\s*([\w.-]+)\s*\}\}')
+ATRIBUTO_ESPACO = '{http://www.w3.org/XML/1998/namespace}space'
+REGEX_QUEBRA = re.compile(r'(\r\n|\r|\n|\t)')
+
+# ==============================================================================
+# MODELO
+# ==============================================================================
+
+class ModeloDocumento:
+    """Template DOCX lido uma única vez, com os marcadores {{chave}} já indexados.
+
+    O índice guarda, para cada marcador, os trechos de texto (w:t) que ele ocupa,
+    por isso um marcador partido em vários runs pelo Word também é encontrado.
+    """
+
+    def __init__(self, caminho):
+        self.caminho = caminho
+        self.mtime = os.path.getmtime(caminho)
+        with open(caminho, 'rb') as f:
+            self.dados = f.read()
+
+        self.documento = Document(io.BytesIO(self.dados))
+        self.nome_parte = self.documento.part.partname.lstrip('/')
+        self.marcadores = self._indexar(self.documento.element)
+
+    @staticmethod
+    def _indexar(elemento):
+        textos = list(elemento.iter(qn('w:t')))
+        posicoes = {t: i for i, t in enumerate(textos)}
+        marcadores = []
+
+        for p in elemento.iter(qn('w:p')):
+            trechos = [t for t in p.iter(qn('w:t')) if t.text]
+            if not trechos:
+                continue
+            texto = ''.join(t.text for t in trechos)
+            if '{{' not in texto:
+                continue
+
+            limites = []
+            inicio = 0
+            for t in trechos:
+                limites.append((posicoes[t], inicio, inicio + len(t.text)))
+                inicio += len(t.text)
+
+            for m in REGEX_MARCADOR.finditer(texto):
+                segmentos = []
+                for ordinal, ini_t, fim_t in limites:
+                    if fim_t <= m.start() or ini_t >= m.end():
+                        continue
+                    segmentos.append((ordinal, max(m.start(), ini_t) - ini_t, min(m.end(), fim_t) - ini_t))
+                marcadores.append((m.group(1), segmentos))
+
+        return marcadores
+
+    def renderizar(self, valores):
+        """Devolve um Document novo com todos os marcadores conhecidos substituídos.
+
+        O corpo é copiado do modelo em memória (cópia do lxml, sem voltar a ler
+        o ficheiro) e a substituição percorre só os marcadores indexados.
+        """
+        elemento = copy.deepcopy(self.documento.element)
+        textos = list(elemento.iter(qn('w:t')))
+
+        edicoes = []
+        for chave, segmentos in self.marcadores:
+            if chave not in valores:
+                continue
+            valor = str(valores[chave])
+            for n, (ordinal, ini, fim) in enumerate(segmentos):
+                edicoes.append((ordinal, ini, fim, valor if n == 0 else ''))
+
+        # Do fim para o início, para que os offsets do índice continuem válidos.
+        for ordinal, ini, fim, novo in sorted(edicoes, key=lambda e: (e[0], e[1]), reverse=True):
+            t = textos[ordinal]
+            t.text = t.text[:ini] + novo + t.text[fim:]
+            t.set(ATRIBUTO_ESPACO, 'preserve')
+
+        for ordinal in {e[0] for e in edicoes}:
+            _expandir_quebras(textos[ordinal])
+
+        return DocumentoDocx(elemento, self.documento.part)
+
+    def salvar(self, documento, destino):
+        xml = etree.tostring(documento.element, xml_declaration=True, encoding='UTF-8', standalone=True)
+        with zipfile.ZipFile(io.BytesIO(self.dados)) as origem, \
+             zipfile.ZipFile(destino, 'w', zipfile.ZIP_DEFLATED) as saida:
+            for info in origem.infolist():
+                if info.filename == self.nome_parte:
+                    saida.writestr(info, xml)
+                else:
+                    saida.writestr(info, origem.read(info.filename))
+
+def _expandir_quebras(t):
+    """Parte um w:t com quebras de linha ou tabulações em w:t, w:br e w:tab irmãos
+    no mesmo run, como faz o run.text do python-docx."""
+    partes = REGEX_QUEBRA.split(t.text)
+    if len(partes) == 1:
+        return
+    t.text = partes[0]
+    anterior = t
+    for parte in partes[1:]:
+        if parte == '\t':
+            novo = OxmlElement('w:tab')
+        elif parte in ('\r\n', '\r', '\n'):
+            novo = OxmlElement('w:br')
+        elif parte:
+            novo = OxmlElement('w:t')
+            novo.text = parte
+            novo.set(ATRIBUTO_ESPACO, 'preserve')
+        else:
+            continue
+        anterior.addnext(novo)
+        anterior = novo
+
+# ==============================================================================
+# CACHE
+# ==============================================================================
+
+_modelos = {}
+_modelos_lock = threading.Lock()
+
+def obter_modelo(caminho):
+    """Modelo em cache; volta a ser lido apenas se o ficheiro mudar no disco."""
+    mtime = os.path.getmtime(caminho)
+    with _modelos_lock:
+        modelo = _modelos.get(caminho)
+        if modelo is None or modelo.mtime != mtime:
+            modelo = ModeloDocumento(caminho)
+            _modelos[caminho] = modelo
+        return modelo
+
+def limpar_cache_modelos():
+    with _modelos_lock:
+        _modelos.clear()
@@ -0,0 +1,97 @@
+import io
+
+import pandas as pd
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter, landscape
+from reportlab.lib.styles import getSampleStyleSheet
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+# ==============================================================================
+# RELATÓRIOS (PDF E XLSX)
+# ==============================================================================
+# pandas e ReportLab só são precisos para exportar relatórios: este módulo é
+# importado no primeiro pedido de relatório, e não no arranque do servidor.
+
+ESTILO_TABELA = TableStyle([
+    ('BACKGROUND', (0,0), (-1,0), colors.grey),
+    ('TEXTCOLOR', (0,0), (-1,0), colors.whitesmoke),
+    ('ALIGN', (0,0), (-1,-1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+    ('GRID', (0,0), (-1,-1), 1, colors.black)
+])
+
+def _xlsx(df):
+    buffer = io.BytesIO()
+    df.to_excel(buffer, index=False, engine='openpyxl')
+    buffer.seek(0)
+    return buffer
+
+def gerar_inventario_xlsx(dados):
+    df = pd.DataFrame(dados)
+    df['valor_total'] = df['saldo_atual'] * df['preco']
+    df = df.rename(columns={'codigo': 'Código', 'nome': 'Nome', 'saldo_atual': 'Saldo', 'preco': 'Preço Unitário (R$)', 'valor_total': 'Valor Total (R$)'})
+    return _xlsx(df)
+
+def gerar_historico_xlsx(dados):
+    df = pd.DataFrame(dados)
+    df = df.rename(columns={
+        'data_hora': 'Data/Hora', 'produto_codigo': 'Cód. Produto', 'produto_nome': 'Nome Produto',
+        'tipo': 'Tipo', 'quantidade': 'Qtd. Mov.', 'saldo_apos': 'Saldo Após', 'usuario_nome': 'Usuário', 'motivo_saida': 'Motivo da Saída'
+    })
+    return _xlsx(df)
+
+def gerar_inventario_pdf(dados):
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=letter, rightMargin=30, leftMargin=30, topMargin=30, bottomMargin=30)
+    elems = []
+    styles = getSampleStyleSheet()
+
+    elems.append(Paragraph("Relatório de Inventário Atual", styles['h1']))
+    elems.append(Spacer(1, 12))
+
+    table_data = [["Código", "Nome", "Saldo", "Preço Unit. (R$)", "Valor Total (R$)"]]
+    total_geral = 0
+
+    for item in dados:
+        total_item = item['saldo_atual'] * item['preco']
+        total_geral += total_item
+        table_data.append([
+            item['codigo'], item['nome'], str(item['saldo_atual']),
+            f"{float(item['preco']):.2f}", f"{float(total_item):.2f}"
+        ])
+
+    t = Table(table_data)
+    t.setStyle(ESTILO_TABELA)
+    elems.append(t)
+    elems.append(Spacer(1, 12))
+    elems.append(Paragraph(f"<b>Valor Total do Estoque:</b> R$ {float(total_geral):.2f}", styles['h3']))
+
+    doc.build(elems)
+    buffer.seek(0)
+    return buffer
+
+def gerar_historico_pdf(dados):
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=landscape(letter))
+    elems = []
+    styles = getSampleStyleSheet()
+
+    elems.append(Paragraph("Relatório de Histórico de Movimentações", styles['h1']))
+    elems.append(Spacer(1, 12))
+
+    table_data = [["Data/Hora", "Produto", "Tipo", "Qtd.", "Saldo Após", "Usuário", "Motivo"]]
+    for i in dados:
+        table_data.append([
+            i['data_hora'], f"{i['produto_codigo']} - {i['produto_nome']}",
+            i['tipo'], str(i['quantidade']), str(i['saldo_apos']),
+            i['usuario_nome'], i.get('motivo_saida', '')
+        ])
+
+    t = Table(table_data, colWidths=[110, 180, 50, 40, 60, 100, 130])
+    t.setStyle(ESTILO_TABELA)
+    elems.append(t)
+    doc.build(elems)
+    buffer.seek(0)
+    return buffer
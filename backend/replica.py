@@ -0,0 +1,137 @@
+import os
+import time
+import threading
+from datetime import datetime
+from functools import wraps
+
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, select
+from sqlalchemy.exc import OperationalError
+
+from metricas import registo, Contador, Medidor
+
+# ==============================================================================
+# CONFIGURAÇÃO
+# ==============================================================================
+
+CHAVE_REPLICA = 'replica'
+
+# Acima deste atraso (segundos) as leituras voltam à base principal.
+ATRASO_MAXIMO = int(os.getenv('REPLICA_ATRASO_MAX', '30'))
+INTERVALO_VERIFICACAO = int(os.getenv('REPLICA_VERIFICACAO', '5'))
+PAUSA_APOS_FALHA = 30
+
+leituras_destino = registo.adicionar(Contador(
+    'db_leituras_destino_total', 'Pedidos só de leitura, por base que os atendeu.', ('destino',)))
+
+# ==============================================================================
+# SESSÃO COM ENCAMINHAMENTO
+# ==============================================================================
+
+class SessaoRoteada(Session):
+    """Durante um pedido marcado com @somente_leitura, as consultas vão para a
+    réplica. Um flush vai sempre para a base principal."""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and not self._flushing and has_app_context() and g.get('_usar_replica'):
+            return self._db.engines[CHAVE_REPLICA]
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+# ==============================================================================
+# ATRASO DA RÉPLICA
+# ==============================================================================
+
+class GuardaReplica:
+    """Lê na réplica a pulsação que a base principal escreve periodicamente.
+    A réplica só é usada se estiver acessível e com um atraso até ATRASO_MAXIMO."""
+
+    def __init__(self, app, db, tabela_pulsacao):
+        self.app = app
+        self.db = db
+        self.tabela = tabela_pulsacao
+        self.lock = threading.Lock()
+        self.disponivel_ = False
+        self.atraso = None
+        self.proxima_verificacao = 0.0
+
+    def _verificar(self):
+        try:
+            with self.db.engines[CHAVE_REPLICA].connect() as conn:
+                ultima = conn.execute(select(self.tabela.c.data_hora).where(self.tabela.c.id == 1)).scalar()
+        except Exception as e:
+            self.app.logger.warning(f"Réplica inacessível, leituras na base principal: {e}")
+            self.atraso = None
+            return False, PAUSA_APOS_FALHA
+
+        self.atraso = (datetime.now() - ultima).total_seconds() if ultima else None
+        return self.atraso is not None and self.atraso <= ATRASO_MAXIMO, INTERVALO_VERIFICACAO
+
+    def disponivel(self):
+        with self.lock:
+            agora = time.monotonic()
+            if agora >= self.proxima_verificacao:
+                self.disponivel_, espera = self._verificar()
+                self.proxima_verificacao = agora + espera
+            return self.disponivel_
+
+    def marcar_falha(self):
+        with self.lock:
+            self.disponivel_ = False
+            self.proxima_verificacao = time.monotonic() + PAUSA_APOS_FALHA
+
+
+guarda = None
+
+def instalar_replica(app, db, tabela_pulsacao):
+    global guarda
+    with app.app_context():
+        if CHAVE_REPLICA not in db.engines:
+            return None
+        engine = db.engines[CHAVE_REPLICA]
+
+    guarda = GuardaReplica(app, db, tabela_pulsacao)
+
+    @event.listens_for(engine, 'handle_error')
+    def _falha_replica(contexto):
+        if contexto.is_disconnect or isinstance(contexto.sqlalchemy_exception, OperationalError):
+            guarda.marcar_falha()
+            # As rotas apanham as exceções e respondem 500: o decorador sabe da falha por aqui.
+            if has_app_context() and g.get('_usar_replica'):
+                g._falha_replica = True
+
+    registo.adicionar(Medidor(
+        'db_replica_atraso_segundos', 'Atraso da réplica na última verificação.',
+        lambda: guarda.atraso))
+    return guarda
+
+
+def somente_leitura(funcao):
+    """Decorador de rotas que só leem: usam a réplica quando ela está em dia.
+
+    Se a réplica falhar a meio do pedido, a rota corre outra vez, uma só, na
+    base principal (a rota não escreve, por isso repeti-la não tem efeitos).
+    """
+    @wraps(funcao)
+    def envolvida(*args, **kwargs):
+        if guarda is None or not guarda.disponivel():
+            if guarda is not None:
+                leituras_destino.inc('principal')
+            return funcao(*args, **kwargs)
+
+        leituras_destino.inc('replica')
+        g._usar_replica = True
+        try:
+            resposta = funcao(*args, **kwargs)
+        except OperationalError:
+            if not g.get('_falha_replica'):
+                raise
+        finally:
+            g.pop('_usar_replica', None)
+
+        if not g.pop('_falha_replica', False):
+            return resposta
+        guarda.db.session.rollback()
+        leituras_destino.inc('principal_apos_falha')
+        return funcao(*args, **kwargs)
+    return envolvida
@@ -1,3 +1,81 @@
-from waitress import serve
-from app import app
-serve(app, host='0.0.0.0', port=5000)
\ No newline at end of file
+import os
+from waitress import create_server
+from app import app, db, iniciar_agendador, preparar_processo
+from metricas import registo, registar_waitress, preparar_pasta_partilhada
+
+HOST = '0.0.0.0'
+PORTA = int(os.getenv('PORTA', '5000'))
+THREADS = int(os.getenv('WAITRESS_THREADS', '4'))
+WORKERS = int(os.getenv('WORKERS', '1'))
+
+
+def servir_worker(sock, indice, pulsacao):
+    from supervisor import pulsar_no_ciclo, paragem_graciosa
+
+    # As ligações abertas antes do fork pertencem ao supervisor; cada worker abre as suas.
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+    servidor = create_server(app, sockets=[sock], threads=THREADS)
+    registar_waitress(servidor)
+    registo.partilhar(os.environ['METRICAS_PASTA'])
+    pulsar_no_ciclo(servidor, pulsacao)
+    paragem_graciosa(servidor)
+    # Só um worker corre as tarefas periódicas.
+    if indice == 0:
+        iniciar_agendador()
+    preparar_processo()
+    servidor.run()
+
+
+
+def servir_processo_filho(host=HOST, porta=PORTA):
+    """Servidor lançado por outro processo (o run.py do cliente desktop).
+
+    Termina, depois de acabar os pedidos em curso, quando o stdin fecha: o pai
+    fecha-o para parar o servidor, e o sistema fecha-o se o pai morrer, por isso
+    não ficam servidores órfãos a ocupar a porta.
+    """
+    import sys
+    import threading
+    from supervisor import paragem_graciosa
+
+    servidor = create_server(app, host=host, port=porta, threads=THREADS)
+    registar_waitress(servidor)
+    parar = paragem_graciosa(servidor)
+
+    def _vigiar_stdin():
+        try:
+            while sys.stdin.buffer.read(4096):
+                pass
+        except (OSError, ValueError):
+            pass
+        parar()
+
+    if sys.stdin is not None:
+        threading.Thread(target=_vigiar_stdin, name='vigia-stdin', daemon=True).start()
+    preparar_processo()
+    print(f"Servidor embutido a escutar em {host}:{porta} (pid {os.getpid()})", flush=True)
+    servidor.run()
+
+
+if __name__ == '__main__':
+    if WORKERS > 1 and hasattr(os, 'fork'):
+        import shutil
+        from supervisor import Supervisor
+        pasta_temporaria = not os.getenv('METRICAS_PASTA')
+        pasta_metricas = preparar_pasta_partilhada()
+        try:
+            Supervisor(servir_worker, WORKERS, HOST, PORTA).executar()
+        finally:
+            if pasta_temporaria:
+                shutil.rmtree(pasta_metricas, ignore_errors=True)
+    else:
+        # Um só processo (e sempre no Windows, que não tem fork).
+        iniciar_agendador()
+        preparar_processo()
+        # create_server em vez de serve() para o /metrics poder ler a fila do waitress.
+        servidor = create_server(app, host=HOST, port=PORTA, threads=THREADS)
+        registar_waitress(servidor)
+        servidor.run()
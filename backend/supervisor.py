@@ -0,0 +1,269 @@
+import os
+import sys
+import time
+import errno
+import select
+import signal
+import socket
+import threading
+
+# ==============================================================================
+# SUPERVISOR DE PROCESSOS (pré-fork, só em sistemas com os.fork)
+# ==============================================================================
+
+INTERVALO_PULSACAO = 2
+TIMEOUT_SAUDE = int(os.getenv('WORKER_TIMEOUT', '60'))
+TIMEOUT_PARAGEM = int(os.getenv('WORKER_TIMEOUT_PARAGEM', '30'))
+
+def log(mensagem):
+    print(f"[supervisor {os.getpid()}] {mensagem}", flush=True)
+
+
+def criar_socket(host, porta, backlog=1024):
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, porta))
+    sock.listen(backlog)
+    sock.setblocking(False)
+    return sock
+
+
+class Supervisor:
+    """Mantém N processos a servir o mesmo socket de escuta.
+
+    Cada processo filho corre `servir(sock, indice, pulsacao)`, que não deve
+    retornar, e escreve um byte em `pulsacao` a cada INTERVALO_PULSACAO s a
+    partir do ciclo principal do servidor. Um filho sem pulsação durante
+    TIMEOUT_SAUDE s é morto e substituído, tal como um que termine sozinho.
+
+    Sinais: SIGHUP reinicia os filhos um a um (o novo começa a aceitar antes
+    de o antigo parar); SIGTERM/SIGINT param todos, deixando terminar os
+    pedidos em curso até TIMEOUT_PARAGEM s.
+    """
+
+    def __init__(self, servir, num_workers, host, porta):
+        self.servir = servir
+        self.num_workers = num_workers
+        self.sock = criar_socket(host, porta)
+        self.workers = {}          # pid -> {'indice', 'pipe', 'ultima_pulsacao', 'inicio', 'fim_pipe', 'morto'}
+        self.a_parar = False
+        self.reiniciar = False
+
+    # --- Filhos ---
+
+    def _criar_worker(self, indice):
+        leitura, escrita = os.pipe()
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(leitura)
+                for w in self.workers.values():
+                    os.close(w['pipe'])
+                for sinal in (signal.SIGHUP, signal.SIGTERM, signal.SIGINT, signal.SIGCHLD):
+                    signal.signal(sinal, signal.SIG_DFL)
+                self.servir(self.sock, indice, escrita)
+            except BaseException:
+                import traceback
+                traceback.print_exc()
+            finally:
+                os._exit(1)
+
+        os.close(escrita)
+        os.set_blocking(leitura, False)
+        agora = time.monotonic()
+        self.workers[pid] = {'indice': indice, 'pipe': leitura, 'ultima_pulsacao': agora, 'inicio': agora,
+                             'fim_pipe': False, 'morto': False}
+        log(f"worker {indice} iniciado (pid {pid})")
+        return pid
+
+    def _remover(self, pid):
+        w = self.workers.pop(pid, None)
+        if w is not None:
+            os.close(w['pipe'])
+        return w
+
+    def _recolher_terminados(self):
+        while True:
+            try:
+                pid, estado = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            w = self._remover(pid)
+            if w is None:
+                continue
+            log(f"worker {w['indice']} (pid {pid}) terminou com estado {estado}")
+            if not self.a_parar:
+                # Um worker que morre logo ao arrancar não deve ser recriado em ciclo apertado.
+                if time.monotonic() - w['inicio'] < 5:
+                    time.sleep(1)
+                self._criar_worker(w['indice'])
+
+    def _ler_pulsacoes(self, timeout):
+        pipes = {w['pipe']: pid for pid, w in self.workers.items() if not w['fim_pipe']}
+        if not pipes:
+            time.sleep(timeout)
+            return
+        try:
+            prontos, _, _ = select.select(list(pipes), [], [], timeout)
+        except InterruptedError:
+            return
+        except OSError as e:
+            if e.errno == errno.EINTR:
+                return
+            raise
+        for fd in prontos:
+            try:
+                dados = os.read(fd, 4096)
+            except BlockingIOError:
+                continue
+            if pipes[fd] not in self.workers:
+                continue
+            if dados:
+                self.workers[pipes[fd]]['ultima_pulsacao'] = time.monotonic()
+            else:
+                # Fim do pipe: o processo saiu e só falta o waitpid recolhê-lo.
+                self.workers[pipes[fd]]['fim_pipe'] = True
+
+    def _verificar_saude(self):
+        agora = time.monotonic()
+        for pid, w in list(self.workers.items()):
+            if not w['morto'] and agora - w['ultima_pulsacao'] > TIMEOUT_SAUDE:
+                log(f"worker {w['indice']} (pid {pid}) sem resposta há {TIMEOUT_SAUDE}s; a terminar")
+                self._sinalizar(pid, signal.SIGKILL)
+                w['morto'] = True
+
+    def _sinalizar(self, pid, sinal):
+        try:
+            os.kill(pid, sinal)
+        except ProcessLookupError:
+            pass
+
+    def _aguardar_pulsacao(self, pid, timeout):
+        limite = time.monotonic() + timeout
+        inicio = self.workers[pid]['ultima_pulsacao']
+        while time.monotonic() < limite and pid in self.workers:
+            self._ler_pulsacoes(0.5)
+            if pid in self.workers and self.workers[pid]['ultima_pulsacao'] > inicio:
+                return True
+        return False
+
+    def _reinicio_gradual(self):
+        log("reinício gradual dos workers")
+        for pid_antigo, w in sorted(list(self.workers.items()), key=lambda item: item[1]['indice']):
+            novo = self._criar_worker(w['indice'])
+            if not self._aguardar_pulsacao(novo, TIMEOUT_SAUDE):
+                log(f"o novo worker {w['indice']} não arrancou; reinício interrompido")
+                return
+            self._sinalizar(pid_antigo, signal.SIGTERM)
+            # O antigo já não conta para o índice; o waitpid só o recolhe quando sair.
+            self._remover(pid_antigo)
+
+    def _parar_todos(self):
+        for pid in list(self.workers):
+            self._sinalizar(pid, signal.SIGTERM)
+        limite = time.monotonic() + TIMEOUT_PARAGEM + 5
+        while self.workers and time.monotonic() < limite:
+            self._recolher_terminados()
+            time.sleep(0.2)
+        for pid in list(self.workers):
+            self._sinalizar(pid, signal.SIGKILL)
+            self._remover(pid)
+
+    # --- Ciclo principal ---
+
+    def executar(self):
+        def _parar(sinal, frame):
+            self.a_parar = True
+
+        def _reiniciar(sinal, frame):
+            self.reiniciar = True
+
+        signal.signal(signal.SIGTERM, _parar)
+        signal.signal(signal.SIGINT, _parar)
+        signal.signal(signal.SIGHUP, _reiniciar)
+        # Só para interromper o select quando um filho termina.
+        signal.signal(signal.SIGCHLD, lambda sinal, frame: None)
+
+        for indice in range(self.num_workers):
+            self._criar_worker(indice)
+
+        while not self.a_parar:
+            self._ler_pulsacoes(1.0)
+            self._recolher_terminados()
+            if self.reiniciar:
+                self.reiniciar = False
+                self._reinicio_gradual()
+            self._verificar_saude()
+
+        log("a parar")
+        self._parar_todos()
+        self.sock.close()
+
+# ==============================================================================
+# LADO DO WORKER
+# ==============================================================================
+
+def pulsar_no_ciclo(servidor, pulsacao):
+    """Escreve a pulsação a partir do ciclo do waitress (readable() é chamado a
+    cada volta), para provar que o ciclo principal do processo está vivo."""
+    original = servidor.readable
+    estado = {'ultima': 0.0}
+
+    def readable():
+        agora = time.monotonic()
+        if agora - estado['ultima'] >= INTERVALO_PULSACAO:
+            estado['ultima'] = agora
+            try:
+                os.write(pulsacao, b'.')
+            except OSError:
+                # O supervisor desapareceu: não há quem substitua este processo.
+                os._exit(1)
+        return original()
+
+    servidor.readable = readable
+
+
+def paragem_graciosa(servidor):
+    """No SIGTERM, deixa de aceitar ligações e sai quando os pedidos em curso terminarem.
+    Devolve a função que inicia essa paragem, para outros gatilhos (ex.: o
+    processo pai fechar o stdin).
+
+    Os pedidos ainda por responder passam a levar 'Connection: close', para o
+    cliente não reutilizar a ligação, e as ligações keep-alive paradas há mais
+    de 1 s são fechadas. Tudo o que mexe nos canais corre no ciclo do waitress.
+    """
+    estado = {'a_parar': False}
+    original = servidor.readable
+
+    def readable():
+        if estado['a_parar']:
+            limite = time.time() - 1
+            for canal in list(servidor.active_channels.values()):
+                for pedido in list(canal.requests):
+                    pedido.headers['CONNECTION'] = 'close'
+                parado = not (canal.requests or canal.request is not None or canal.total_outbufs_len)
+                if parado and canal.last_activity < limite:
+                    canal.will_close = True
+        return original()
+
+    servidor.readable = readable
+
+    def _drenar():
+        limite = time.monotonic() + TIMEOUT_PARAGEM
+        while servidor.active_channels and time.monotonic() < limite:
+            servidor.pull_trigger()
+            time.sleep(0.2)
+        sys.stdout.flush()
+        os._exit(0)
+
+    def parar():
+        if estado['a_parar']:
+            return
+        estado['a_parar'] = True
+        servidor.accepting = False
+        threading.Thread(target=_drenar, name='paragem', daemon=True).start()
+
+    signal.signal(signal.SIGTERM, lambda sinal, frame: parar())
+    return parar
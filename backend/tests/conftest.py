@@ -0,0 +1,53 @@
+import os
+import sys
+import shutil
+import tempfile
+
+import pytest
+
+# ==============================================================================
+# APP SOBRE UMA BASE SQLITE TEMPORÁRIA
+# ==============================================================================
+# O app lê a configuração ao ser importado, por isso o ambiente é preparado
+# aqui, antes de qualquer teste o importar. Nunca toca na base de trabalho.
+
+PASTA_TESTES = tempfile.mkdtemp(prefix='pystock_testes_')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(PASTA_TESTES, 'estoque.db').replace('\\', '/')
+os.environ['ARMAZENAMENTO_PASTA'] = os.path.join(PASTA_TESTES, 'blobs')
+os.environ['AGENDADOR_ATIVO'] = '0'
+os.environ['CONTAR_QUERIES'] = '0'
+os.environ.pop('DATABASE_URL_REPLICA', None)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture(scope='session')
+def m():
+    import app as m
+    yield m
+    shutil.rmtree(PASTA_TESTES, ignore_errors=True)
+
+
+@pytest.fixture(scope='session')
+def admin(m):
+    with m.app.app_context():
+        utilizador = m.Usuario.query.filter_by(login='testes').first()
+        if utilizador is None:
+            utilizador = m.Usuario(nome='Testes', login='testes', permissao='Administrador')
+            utilizador.set_password('testes')
+            m.db.session.add(utilizador)
+            m.db.session.commit()
+        return utilizador.id_usuario
+
+
+@pytest.fixture
+def cliente(m):
+    return m.app.test_client()
+
+
+@pytest.fixture
+def headers(m, admin):
+    from flask_jwt_extended import create_access_token
+    with m.app.app_context():
+        token = create_access_token(identity=str(admin), additional_claims={'permissao': 'Administrador'})
+    return {'Authorization': f'Bearer {token}'}
@@ -0,0 +1,65 @@
+import os
+import sys
+from types import SimpleNamespace
+
+import pytest
+
+import armazenamento
+
+# ==============================================================================
+# CACHE LOCAL DO ARMAZENAMENTO S3
+# ==============================================================================
+# O bucket é um dicionário em memória: só interessa o comportamento da cache.
+
+
+class ClienteS3Falso:
+    def __init__(self):
+        self.objetos = {}
+        self.descargas = 0
+
+    def upload_file(self, caminho, bucket, chave):
+        with open(caminho, 'rb') as f:
+            self.objetos[chave] = f.read()
+
+    def download_file(self, bucket, chave, destino):
+        self.descargas += 1
+        with open(destino, 'wb') as f:
+            f.write(self.objetos[chave])
+
+
+@pytest.fixture
+def s3(monkeypatch, tmp_path):
+    cliente = ClienteS3Falso()
+    monkeypatch.setitem(sys.modules, 'boto3', SimpleNamespace(client=lambda *a, **k: cliente))
+    # Cabem dois blobs de 100 bytes na cache.
+    return armazenamento.ArmazenamentoS3('bucket', pasta_cache=str(tmp_path), maximo_cache=250)
+
+
+def blob(s3, n):
+    chave = f'{n:064x}'
+    s3.cliente.objetos[s3._chave_s3(chave)] = bytes([n]) * 100
+    return chave
+
+
+def test_descarga_sem_ficheiros_temporarios(s3):
+    chave = blob(s3, 1)
+
+    caminho = s3.caminho_local(chave)
+
+    assert open(caminho, 'rb').read() == bytes([1]) * 100
+    assert os.listdir(s3.cache) == [chave]
+    assert s3.caminho_local(chave) == caminho
+    assert s3.cliente.descargas == 1
+
+
+def test_blobs_de_uma_juncao_nao_sao_podados(s3):
+    chaves = [blob(s3, n) for n in (1, 2, 3)]
+
+    with s3.caminhos_locais(chaves) as caminhos:
+        # Três blobs não cabem na cache, mas os que a junção vai ler ficam todos.
+        assert all(os.path.exists(c) for c in caminhos)
+        s3.podar_cache()
+        assert all(os.path.exists(c) for c in caminhos)
+
+    s3.podar_cache()
+    assert len(os.listdir(s3.cache)) == 2
@@ -0,0 +1,96 @@
+import asyncio
+import json
+import time
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import Numeric, cast, select
+
+# ==============================================================================
+# SERVIÇO ASGI DOS TERMINAIS
+# ==============================================================================
+
+
+@pytest.fixture
+def asgi(m):
+    import asgi_terminal
+    return asgi_terminal
+
+
+@pytest.fixture
+def produto(m):
+    with m.app.app_context():
+        produto = m.Produto(nome='Produto terminal', codigo=f'A{time.monotonic_ns() % 10 ** 12}', preco=Decimal('2.00'))
+        m.db.session.add(produto)
+        m.db.session.commit()
+        return produto.id_produto
+
+
+async def pedido(asgi, headers, metodo, caminho, corpo=None):
+    enviadas = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': json.dumps(corpo).encode() if corpo is not None else b''}
+
+    async def send(mensagem):
+        enviadas.append(mensagem)
+
+    scope = {'type': 'http', 'method': metodo, 'path': caminho, 'query_string': b'',
+             'headers': [(b'authorization', headers['Authorization'].encode())]}
+    await asgi.aplicacao(scope, receive, send)
+    return enviadas[0]['status'], json.loads(enviadas[1]['body'])
+
+
+def correr(asgi, *corrotinas):
+    """Corre os pedidos em simultâneo num ciclo novo; devolve as respostas por ordem."""
+    async def _correr():
+        try:
+            return await asyncio.gather(*corrotinas)
+        finally:
+            # Cada asyncio.run tem o seu ciclo: as ligações não passam para o seguinte.
+            await asgi.engine.dispose()
+    return asyncio.run(_correr())
+
+
+def chamar(asgi, headers, metodo, caminho, corpo=None):
+    """Um pedido à aplicação ASGI; devolve (status, json)."""
+    return correr(asgi, pedido(asgi, headers, metodo, caminho, corpo))[0]
+
+
+def test_saldo_decimal_do_mysql(m, asgi, headers, produto, monkeypatch):
+    """No MySQL o SUM devolve um Decimal, que o json.dumps não serializa."""
+    original = asgi.consulta_saldo_produto
+    monkeypatch.setattr(asgi, 'consulta_saldo_produto',
+                        lambda id_produto: select(cast(original(id_produto).scalar_subquery(), Numeric(32, 0))))
+
+    status, dados = chamar(asgi, headers, 'POST', '/api/estoque/entrada', {'id_produto': produto, 'quantidade': 5})
+    assert (status, dados['novo_saldo']) == (201, 5)
+
+    status, dados = chamar(asgi, headers, 'POST', '/api/estoque/saida',
+                           {'id_produto': produto, 'quantidade': 2, 'motivo_saida': 'Teste'})
+    assert (status, dados['novo_saldo']) == (201, 3)
+
+    status, dados = chamar(asgi, headers, 'GET', f'/api/produtos/{produto}/estoque')
+    assert (status, dados) == (200, {'id_produto': produto, 'saldo_atual': 3})
+
+
+def test_resposta_com_decimal(asgi):
+    enviadas = []
+
+    async def send(mensagem):
+        enviadas.append(mensagem)
+
+    asyncio.run(asgi.responder(send, 200, {'preco': Decimal('2.50')}))
+    assert json.loads(enviadas[1]['body']) == {'preco': '2.50'}
+
+
+def test_entradas_concorrentes(m, asgi, headers, produto):
+    n = 20
+    respostas = correr(asgi, *(pedido(asgi, headers, 'POST', '/api/estoque/entrada', {'id_produto': produto, 'quantidade': 1})
+                               for _ in range(n)))
+
+    assert sorted(dados['novo_saldo'] for _, dados in respostas) == list(range(1, n + 1))
+    with m.app.app_context():
+        publicados = [s for (s,) in m.db.session.query(m.EventoEstoque.novo_saldo)
+                      .filter_by(id_produto=produto).order_by(m.EventoEstoque.id)]
+    assert publicados == list(range(1, n + 1))
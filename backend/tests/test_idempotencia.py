@@ -0,0 +1,99 @@
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+# ==============================================================================
+# CHAVES DE IDEMPOTÊNCIA DAS ENTRADAS E SAÍDAS
+# ==============================================================================
+# Os terminais reenviam a fila offline sempre com a mesma chave: o reenvio tem de
+# devolver a resposta do primeiro pedido sem registar outra movimentação.
+
+
+@pytest.fixture
+def produtos(m):
+    with m.app.app_context():
+        novos = [m.Produto(nome='Produto idempotência', codigo=f'I{time.monotonic_ns() % 10 ** 12}{n}', preco=Decimal('1.00'))
+                 for n in range(2)]
+        m.db.session.add_all(novos)
+        m.db.session.commit()
+        return [p.id_produto for p in novos]
+
+
+def nova_chave():
+    return f'teste-{time.monotonic_ns()}'
+
+
+def movimentacoes(m, id_produto):
+    with m.app.app_context():
+        return m.MovimentacaoEstoque.query.filter_by(id_produto=id_produto).count()
+
+
+def entrada(cliente, headers, id_produto, chave, quantidade=5):
+    return cliente.post('/api/estoque/entrada', headers=headers,
+                        json={'id_produto': id_produto, 'quantidade': quantidade, 'chave': chave})
+
+
+def test_reenvio_devolve_a_primeira_resposta(m, cliente, headers, produtos):
+    chave = nova_chave()
+    primeira = entrada(cliente, headers, produtos[0], chave)
+    assert primeira.status_code == 201
+    assert 'repetido' not in primeira.get_json()
+
+    # Outro movimento entretanto: o reenvio continua a devolver o saldo do primeiro.
+    assert entrada(cliente, headers, produtos[0], nova_chave(), quantidade=2).status_code == 201
+    segunda = entrada(cliente, headers, produtos[0], chave)
+    assert segunda.status_code == 201
+    assert segunda.get_json() == {**primeira.get_json(), 'repetido': True}
+    assert movimentacoes(m, produtos[0]) == 2
+
+
+def test_chave_noutro_movimento_recusada(m, cliente, headers, produtos):
+    chave = nova_chave()
+    assert entrada(cliente, headers, produtos[0], chave).status_code == 201
+
+    assert entrada(cliente, headers, produtos[1], chave).status_code == 409
+    saida = cliente.post('/api/estoque/saida', headers=headers,
+                         json={'id_produto': produtos[0], 'quantidade': 1, 'motivo_saida': 'Teste', 'chave': chave})
+    assert saida.status_code == 409
+    assert movimentacoes(m, produtos[0]) == 1
+    assert movimentacoes(m, produtos[1]) == 0
+
+
+def test_pedidos_repetidos_em_simultaneo(m, monkeypatch, cliente, headers, produtos):
+    chave = nova_chave()
+    primeira = entrada(cliente, headers, produtos[0], chave).get_json()
+
+    # O segundo pedido consulta a chave antes de o primeiro a gravar: só dá pelo
+    # repetido quando a chave primária recusa o insert.
+    consultar = m.movimentacao_repetida
+    consultas = []
+    def consulta_atrasada(*args):
+        consultas.append(args)
+        return None if len(consultas) == 1 else consultar(*args)
+    monkeypatch.setattr(m, 'movimentacao_repetida', consulta_atrasada)
+
+    resposta = entrada(cliente, headers, produtos[0], chave)
+    assert len(consultas) == 2
+    assert resposta.status_code == 201
+    assert resposta.get_json() == {**primeira, 'repetido': True}
+    assert movimentacoes(m, produtos[0]) == 1
+    with m.app.app_context():
+        assert m.calcular_saldo_produto(produtos[0]) == 5
+
+
+def test_limpeza_apaga_chaves_antigas(m, monkeypatch, cliente, headers, produtos):
+    antiga, recente = nova_chave(), nova_chave()
+    assert entrada(cliente, headers, produtos[0], antiga).status_code == 201
+    assert entrada(cliente, headers, produtos[0], recente).status_code == 201
+    monkeypatch.setenv('CHAVES_RETENCAO_DIAS', '30')
+    with m.app.app_context():
+        m.db.session.execute(m.db.update(m.ChaveMovimentacao).where(m.ChaveMovimentacao.chave == antiga)
+                             .values(data_hora=datetime.now() - timedelta(days=31)))
+        m.db.session.commit()
+
+        assert m.limpar_chaves() >= 1
+        restantes = {c for (c,) in m.db.session.query(m.ChaveMovimentacao.chave)
+                     .filter(m.ChaveMovimentacao.chave.in_([antiga, recente]))}
+    assert restantes == {recente}
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import NameObject, StreamObject
+
+from juncao_pdf import juntar_pdfs
+
+# ==============================================================================
+# JUNÇÃO DE PDFs
+# ==============================================================================
+# O resultado é sempre relido com o leitor estrito do pypdf: xref, /Count e
+# referências têm de estar certos, não basta o leitor tolerante conseguir abrir.
+
+CONTEUDO = b'BT /F1 12 Tf 72 720 Td (PyStock) Tj ET'
+
+
+def criar_pdf(caminho, larguras):
+    """PDF com uma página por largura, todas com o mesmo stream de conteúdo."""
+    escritor = PdfWriter()
+    for largura in larguras:
+        pagina = escritor.add_blank_page(width=largura, height=842)
+        conteudo = StreamObject()
+        conteudo.set_data(CONTEUDO)
+        pagina[NameObject('/Contents')] = escritor._add_object(conteudo)
+    with open(caminho, 'wb') as f:
+        escritor.write(f)
+    return str(caminho)
+
+
+def test_junta_paginas_por_ordem(tmp_path):
+    origens = [
+        criar_pdf(tmp_path / 'corpo.pdf', [500]),
+        criar_pdf(tmp_path / 'anexo1.pdf', [510, 520, 530]),
+        criar_pdf(tmp_path / 'anexo2.pdf', [540, 550]),
+    ]
+    destino = str(tmp_path / 'final.pdf')
+
+    assert juntar_pdfs(origens, destino) == 6
+
+    leitor = PdfReader(destino, strict=True)
+    assert len(leitor.pages) == 6
+    assert leitor.trailer['/Root']['/Pages']['/Count'] == 6
+    assert [int(p.mediabox.width) for p in leitor.pages] == [500, 510, 520, 530, 540, 550]
+    for pagina in leitor.pages:
+        assert pagina['/Parent'].get_object()['/Type'] == '/Pages'
+        assert CONTEUDO in pagina.get_contents().get_data()
+
+
+def test_streams_repetidos_escritos_uma_vez(tmp_path):
+    origem = criar_pdf(tmp_path / 'anexo.pdf', [500])
+    destino = str(tmp_path / 'final.pdf')
+
+    assert juntar_pdfs([origem, origem, origem], destino) == 3
+
+    leitor = PdfReader(destino, strict=True)
+    conteudos = {p.get('/Contents').idnum for p in leitor.pages}
+    assert len(conteudos) == 1
+
+
+def test_falha_nao_deixa_ficheiros(tmp_path):
+    origem = criar_pdf(tmp_path / 'corpo.pdf', [500])
+    (tmp_path / 'estragado.pdf').write_bytes(b'isto nao e um pdf')
+    destino = str(tmp_path / 'final.pdf')
+
+    with pytest.raises(Exception):
+        juntar_pdfs([origem, str(tmp_path / 'estragado.pdf')], destino)
+
+    assert sorted(os.listdir(tmp_path)) == ['corpo.pdf', 'estragado.pdf']
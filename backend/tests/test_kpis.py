@@ -0,0 +1,25 @@
+# ==============================================================================
+# KPIs DO DASHBOARD
+# ==============================================================================
+
+
+def test_primeira_utilizacao_concorrente(m, cliente, headers, monkeypatch):
+    """Dois pedidos a criar a linha dos KPIs ao mesmo tempo: o segundo usa a do primeiro."""
+    tabela = m.AgregadoEstoque.__table__
+    with m.app.app_context():
+        m.db.session.execute(tabela.delete())
+        m.db.session.commit()
+
+    calcular = m.calcular_kpis_completos
+
+    def calcular_e_perder_a_corrida():
+        kpis = calcular()
+        with m.db.engine.begin() as ligacao:
+            ligacao.execute(tabela.insert().values(id=1, total_produtos=7, total_fornecedores=3, valor_total_estoque=10))
+        return kpis
+
+    monkeypatch.setattr(m, 'calcular_kpis_completos', calcular_e_perder_a_corrida)
+
+    resposta = cliente.get('/api/dashboard/kpis', headers=headers)
+    assert resposta.status_code == 200
+    assert resposta.get_json() == {'total_produtos': 7, 'total_fornecedores': 3, 'valor_total_estoque': 10.0}
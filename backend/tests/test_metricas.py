@@ -0,0 +1,58 @@
+import os
+import time
+
+from metricas import Registo, Contador, Histograma, Medidor, INTERVALO_PARTILHA
+
+# ==============================================================================
+# MÉTRICAS COM VÁRIOS WORKERS
+# ==============================================================================
+# Cada Registo faz de um worker: todos gravam na mesma pasta partilhada.
+
+
+def criar_worker(pasta, pedidos, duracao, fila):
+    registo = Registo()
+    contador = registo.adicionar(Contador('pedidos_total', 'Pedidos.', ('rota',)))
+    histograma = registo.adicionar(Histograma('duracao_segundos', 'Duração.', (), (0.1, 1)))
+    registo.adicionar(Medidor('fila', 'Fila.', lambda: fila))
+    contador.inc('/a', valor=pedidos)
+    histograma.observar(duracao)
+    registo.partilhar(str(pasta))
+    return registo
+
+
+def test_contadores_somados_entre_workers(tmp_path):
+    criar_worker(tmp_path, 2, 0.05, 7)
+    atual = criar_worker(tmp_path, 3, 0.5, 1)
+
+    texto = atual.texto()
+
+    assert 'pedidos_total{rota="/a"} 5' in texto
+    assert 'duracao_segundos_bucket{le="0.1"} 1' in texto
+    assert 'duracao_segundos_bucket{le="1"} 2' in texto
+    assert 'duracao_segundos_count 2' in texto
+    assert f'fila{{pid="{os.getpid()}"}}' in texto
+
+
+def test_worker_terminado_mantem_contadores(tmp_path):
+    antigo = criar_worker(tmp_path, 2, 0.05, 7)
+    atual = criar_worker(tmp_path, 3, 0.5, 1)
+    # O worker antigo deixou de gravar: os medidores dele já não valem.
+    velho = time.time() - 10 * INTERVALO_PARTILHA
+    os.utime(antigo.ficheiro, (velho, velho))
+
+    texto = atual.texto()
+
+    assert 'pedidos_total{rota="/a"} 5' in texto
+    assert f'fila{{pid="{os.getpid()}"}} 1' in texto
+    assert ' 7\n' not in texto
+
+
+def test_sem_pasta_partilhada():
+    registo = Registo()
+    registo.adicionar(Contador('pedidos_total', 'Pedidos.', ('rota',))).inc('/a')
+    registo.adicionar(Medidor('fila', 'Fila.', lambda: 4))
+
+    texto = registo.texto()
+
+    assert 'pedidos_total{rota="/a"} 1' in texto
+    assert 'fila 4' in texto
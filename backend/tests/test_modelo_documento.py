@@ -0,0 +1,44 @@
+from docx import Document
+from docx.oxml.ns import qn
+
+from modelo_documento import ModeloDocumento
+
+# ==============================================================================
+# SUBSTITUIÇÃO DOS MARCADORES DO TEMPLATE
+# ==============================================================================
+
+
+def criar_template(caminho):
+    doc = Document()
+    # O Word parte muitas vezes um marcador em vários runs (ex.: ao corrigir a ortografia).
+    p = doc.add_paragraph()
+    for trecho in ('Cliente: {{', 'cli', 'ente}} (fim)'):
+        p.add_run(trecho)
+    doc.add_paragraph('Notas: {{notas}}')
+    doc.save(caminho)
+
+
+def renderizar(tmp_path, valores):
+    template = tmp_path / 'template.docx'
+    criar_template(template)
+    modelo = ModeloDocumento(str(template))
+    destino = tmp_path / 'documento.docx'
+    modelo.salvar(modelo.renderizar(valores), str(destino))
+    return Document(str(destino))
+
+
+def test_marcador_partido_em_runs(tmp_path):
+    doc = renderizar(tmp_path, {'cliente': 'ACME'})
+    assert doc.paragraphs[0].text == 'Cliente: ACME (fim)'
+    # Um marcador sem valor fica como está.
+    assert doc.paragraphs[1].text == 'Notas: {{notas}}'
+
+
+def test_valor_com_varias_linhas_e_tabulacoes(tmp_path):
+    doc = renderizar(tmp_path, {'notas': 'linha 1\nlinha 2\r\ncoluna\tvalor'})
+    p = doc.paragraphs[1]
+    assert p.text == 'Notas: linha 1\nlinha 2\ncoluna\tvalor'
+    assert len(p._p.findall('.//' + qn('w:br'))) == 2
+    assert len(p._p.findall('.//' + qn('w:tab'))) == 1
+    # Nenhuma quebra fica em bruto dentro do texto.
+    assert not any(c in (t.text or '') for t in p._p.iter(qn('w:t')) for c in '\r\n\t')
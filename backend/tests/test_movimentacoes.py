@@ -0,0 +1,61 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+
+import pytest
+
+# ==============================================================================
+# ENTRADAS E SAÍDAS CONCORRENTES
+# ==============================================================================
+# Cada movimento publica um evento com o saldo resultante; com movimentos em
+# simultâneo no mesmo produto, cada saldo tem de ser o da base no commit.
+
+MOVIMENTOS = 40
+
+
+@pytest.fixture
+def produto(m):
+    with m.app.app_context():
+        produto = m.Produto(nome='Produto concorrente', codigo=f'M{time.monotonic_ns() % 10 ** 12}', preco=Decimal('1.00'))
+        m.db.session.add(produto)
+        m.db.session.commit()
+        return produto.id_produto
+
+
+def saldos_publicados(m, id_produto):
+    with m.app.app_context():
+        return [s for (s,) in m.db.session.query(m.EventoEstoque.novo_saldo)
+                .filter_by(id_produto=id_produto).order_by(m.EventoEstoque.id)]
+
+
+def test_entradas_concorrentes(m, headers, produto):
+    def entrada(_):
+        resposta = m.app.test_client().post('/api/estoque/entrada', headers=headers,
+                                             json={'id_produto': produto, 'quantidade': 1})
+        assert resposta.status_code == 201
+        return resposta.get_json()['novo_saldo']
+
+    with ThreadPoolExecutor(8) as executor:
+        respostas = list(executor.map(entrada, range(MOVIMENTOS)))
+
+    assert sorted(respostas) == list(range(1, MOVIMENTOS + 1))
+    assert saldos_publicados(m, produto) == list(range(1, MOVIMENTOS + 1))
+
+
+def test_saidas_concorrentes_nao_passam_do_saldo(m, headers, produto):
+    cliente = m.app.test_client()
+    assert cliente.post('/api/estoque/entrada', headers=headers,
+                        json={'id_produto': produto, 'quantidade': MOVIMENTOS // 2}).status_code == 201
+
+    def saida(_):
+        return m.app.test_client().post('/api/estoque/saida', headers=headers,
+                                        json={'id_produto': produto, 'quantidade': 1, 'motivo_saida': 'Teste'}).status_code
+
+    with ThreadPoolExecutor(8) as executor:
+        estados = list(executor.map(saida, range(MOVIMENTOS)))
+
+    assert estados.count(201) == MOVIMENTOS // 2
+    assert estados.count(400) == MOVIMENTOS // 2
+    with m.app.app_context():
+        assert m.calcular_saldo_produto(produto) == 0
+    assert saldos_publicados(m, produto)[-1] == 0
@@ -0,0 +1,90 @@
+import io
+from decimal import Decimal
+
+import pytest
+
+from diagnostico_sql import contar_queries
+
+# ==============================================================================
+# ORÇAMENTO DE QUERIES POR ENDPOINT
+# ==============================================================================
+# O número de instruções de uma listagem não pode crescer com o número de
+# linhas (N+1). Cada teste mede o mesmo endpoint com dois tamanhos de catálogo.
+
+TAMANHOS = [5, 55]
+
+
+def semear_produtos(m, n, id_usuario):
+    """Substitui o catálogo por n produtos, cada um com fornecedor, natureza e uma entrada."""
+    db = m.db
+    with m.app.app_context():
+        for tabela in (m.ChaveMovimentacao.__table__, m.MovimentacaoEstoque.__table__, m.produto_fornecedor, m.produto_natureza,
+                       m.Produto.__table__, m.Fornecedor.__table__, m.Natureza.__table__):
+            db.session.execute(tabela.delete())
+        fornecedor = m.Fornecedor(nome='Fornecedor testes')
+        natureza = m.Natureza(nome='Natureza testes')
+        for i in range(1, n + 1):
+            produto = m.Produto(nome=f'Produto {i}', codigo=f'T{i:05d}', preco=Decimal('1.50'),
+                                fornecedores=[fornecedor], naturezas=[natureza])
+            db.session.add(produto)
+            db.session.flush()
+            db.session.add(m.MovimentacaoEstoque(id_produto=produto.id_produto, id_usuario=id_usuario,
+                                                 quantidade=i, tipo='Entrada'))
+        db.session.commit()
+
+
+@pytest.mark.parametrize('n', TAMANHOS)
+def test_saldos(m, cliente, headers, admin, n):
+    semear_produtos(m, n, admin)
+    with contar_queries() as c:
+        resposta = cliente.get('/api/estoque/saldos', headers=headers)
+    assert resposta.status_code == 200
+    assert len(resposta.get_json()) == n
+    assert c.total <= 3, c.repetidas()
+
+
+def csv_produtos(linhas):
+    cabecalho = 'codigo;nome;preco;quantidade;fornecedores_nomes;naturezas_nomes\n'
+    return io.BytesIO((cabecalho + ''.join(f'{";".join(map(str, l))}\n' for l in linhas)).encode())
+
+
+@pytest.mark.parametrize('n', TAMANHOS)
+def test_importar_csv(m, cliente, headers, admin, n):
+    # Um produto, para existirem o fornecedor e a natureza referidos no ficheiro.
+    semear_produtos(m, 1, admin)
+    linhas = [(f'I{i:05d}', f'Importado {i}', '2,50', i % 3, 'Fornecedor testes', 'Natureza testes') for i in range(n)]
+    with contar_queries() as c:
+        resposta = cliente.post('/api/produtos/importar', headers=headers,
+                                data={'file': (csv_produtos(linhas), 'produtos.csv')})
+    assert resposta.status_code == 200
+    assert resposta.get_json() == {'mensagem': 'Importação concluída!', 'produtos_importados': n, 'erros': []}
+    assert c.total <= 12, c.repetidas()
+
+    with m.app.app_context():
+        produto = m.Produto.query.filter_by(codigo='I00002').one()
+        assert [f.nome for f in produto.fornecedores] == ['Fornecedor testes']
+        assert [n.nome for n in produto.naturezas] == ['Natureza testes']
+        assert m.calcular_saldo_produto(produto.id_produto) == 2
+
+
+def test_importar_csv_linhas_invalidas(m, cliente, headers, admin):
+    semear_produtos(m, 1, admin)
+    linhas = [
+        ('I00001', 'Válido', '1', 1, '', ''),
+        ('', 'Sem código', '1', 1, '', ''),
+        ('T00001', 'Código existente', '1', 1, '', ''),
+        ('I00001', 'Repetido no ficheiro', '1', 1, '', ''),
+        ('I00002', 'X' * 101, '1', 1, '', ''),
+        ('I00003', 'Preço inválido', 'abc', 1, '', ''),
+        ('I00004', 'Quantidade inválida', '1', 'muitos', '', ''),
+        ('I00005', 'Também válido', '1', 0, '', ''),
+    ]
+    resposta = cliente.post('/api/produtos/importar', headers=headers,
+                            data={'file': (csv_produtos(linhas), 'produtos.csv')})
+
+    assert resposta.status_code == 200
+    dados = resposta.get_json()
+    assert dados['produtos_importados'] == 2
+    assert [e.split(':')[0] for e in dados['erros']] == [f'Linha {n}' for n in (3, 4, 5, 6, 7, 8)]
+    with m.app.app_context():
+        assert {p.codigo for p in m.Produto.query} == {'T00001', 'I00001', 'I00005'}
@@ -0,0 +1,67 @@
+import sqlite3
+from datetime import datetime
+
+import pytest
+from sqlalchemy import create_engine
+
+import replica
+from base_dados import opcoes_engine
+
+# ==============================================================================
+# LEITURAS NA RÉPLICA
+# ==============================================================================
+# A réplica é uma cópia SQLite da base dos testes, instalada só durante cada teste.
+
+
+@pytest.fixture
+def base_replica(m, tmp_path):
+    caminho = str(tmp_path / 'replica.db')
+    with m.app.app_context():
+        origem = sqlite3.connect(m.db.engine.url.database)
+    destino = sqlite3.connect(caminho)
+    origem.backup(destino)
+    destino.execute('DELETE FROM pulsacao_replica')
+    destino.execute('INSERT INTO pulsacao_replica (id, data_hora) VALUES (1, ?)', (datetime.now().isoformat(' '),))
+    destino.commit()
+    origem.close()
+
+    url = 'sqlite:///' + caminho
+    engine = create_engine(url, **opcoes_engine(url))
+    with m.app.app_context():
+        m.db.engines[replica.CHAVE_REPLICA] = engine
+    guarda = replica.instalar_replica(m.app, m.db, m.PulsacaoReplica.__table__)
+    yield destino, guarda
+
+    replica.guarda = None
+    with m.app.app_context():
+        del m.db.engines[replica.CHAVE_REPLICA]
+    engine.dispose()
+    destino.close()
+
+
+def leituras(destino):
+    return replica.leituras_destino.estado().get((destino,), 0)
+
+
+def test_leitura_na_replica(cliente, headers, base_replica):
+    antes = leituras('replica')
+
+    resposta = cliente.get('/api/dashboard/series/valor-estoque?dias=7', headers=headers)
+
+    assert resposta.status_code == 200
+    assert leituras('replica') == antes + 1
+
+
+def test_replica_falha_a_meio_do_pedido(cliente, headers, base_replica):
+    destino, guarda = base_replica
+    # A pulsação está em dia, mas a consulta da rota falha na réplica.
+    destino.execute('DROP TABLE resumo_diario_mov')
+    destino.commit()
+    antes = leituras('principal_apos_falha')
+
+    resposta = cliente.get('/api/dashboard/series/valor-estoque?dias=7', headers=headers)
+
+    assert resposta.status_code == 200
+    assert len(resposta.get_json()['pontos']) == 7
+    assert leituras('principal_apos_falha') == antes + 1
+    assert not guarda.disponivel()
@@ -0,0 +1,29 @@
+import pytest
+
+# ==============================================================================
+# PERÍODO DAS SÉRIES DO DASHBOARD
+# ==============================================================================
+
+SERIES = ['movimentacoes', 'top-produtos', 'valor-estoque']
+
+
+@pytest.mark.parametrize('serie', SERIES)
+@pytest.mark.parametrize('parametros', [
+    'dias=0',
+    'dias=3661',
+    'dias=999999999999',
+    'inicio=0001-01-01&fim=9999-12-31',
+    'inicio=2020-01-01&fim=2030-01-09',
+    'inicio=2024-02-01&fim=2024-01-01',
+])
+def test_periodo_invalido(cliente, headers, serie, parametros):
+    resposta = cliente.get(f'/api/dashboard/series/{serie}?{parametros}', headers=headers)
+    assert resposta.status_code == 400
+    assert 'erro' in resposta.get_json()
+
+
+@pytest.mark.parametrize('serie', SERIES)
+def test_periodo_maximo(m, cliente, headers, serie):
+    resposta = cliente.get(f'/api/dashboard/series/{serie}?dias={m.MAX_DIAS_SERIES}&fim=2024-12-31', headers=headers)
+    assert resposta.status_code == 200
+    assert resposta.get_json()['fim'] == '2024-12-31'
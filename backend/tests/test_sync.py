@@ -0,0 +1,112 @@
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+import pytest
+
+# ==============================================================================
+# SINCRONIZAÇÃO INCREMENTAL DO CATÁLOGO (/api/sync)
+# ==============================================================================
+# Os eventos dos outros testes são envelhecidos antes de cada caso, para que só
+# os criados aqui caiam dentro da ESPERA_LACUNA.
+
+
+@pytest.fixture
+def criar_produto(m):
+    def criar():
+        with m.app.app_context():
+            produto = m.Produto(nome='Produto sync', codigo=f'S{time.monotonic_ns() % 10 ** 12}', preco=Decimal('1.00'))
+            m.db.session.add(produto)
+            m.db.session.commit()
+            return produto.id_produto
+    return criar
+
+
+@pytest.fixture(autouse=True)
+def eventos_antigos(m):
+    envelhecer(m)
+
+
+def envelhecer(m):
+    """Põe todos os eventos fora da ESPERA_LACUNA."""
+    with m.app.app_context():
+        m.db.session.execute(m.db.update(m.EventoEstoque).values(
+            data_hora=datetime.now() - timedelta(seconds=m.ESPERA_LACUNA + 60)))
+        m.db.session.commit()
+
+
+def ultimo_evento(m, id_produto):
+    with m.app.app_context():
+        return m.db.session.query(m.func.max(m.EventoEstoque.id)).filter_by(id_produto=id_produto).scalar()
+
+
+def sync(cliente, headers, since=None):
+    resposta = cliente.get('/api/sync', headers=headers, query_string={} if since is None else {'since': since})
+    assert resposta.status_code == 200
+    return resposta.get_json()
+
+
+def entrada(cliente, headers, id_produto):
+    resposta = cliente.post('/api/estoque/entrada', headers=headers, json={'id_produto': id_produto, 'quantidade': 1})
+    assert resposta.status_code == 201
+
+
+def test_delta_com_produto_removido(m, cliente, headers, criar_produto):
+    alterado, removido = criar_produto(), criar_produto()
+    seq = sync(cliente, headers)['seq']
+
+    entrada(cliente, headers, alterado)
+    assert cliente.delete(f'/api/produtos/{removido}', headers=headers).status_code == 200
+    envelhecer(m)
+
+    delta = sync(cliente, headers, seq)
+    assert delta['completo'] is False
+    assert [p['id_produto'] for p in delta['produtos']] == [alterado]
+    assert delta['produtos'][0]['saldo_atual'] == 1
+    assert delta['removidos'] == [removido]
+    assert delta['seq'] == ultimo_evento(m, removido)
+
+
+def test_catalogo_completo_quando_since_ja_foi_limpo(m, cliente, headers, criar_produto):
+    id_produto = criar_produto()
+    entrada(cliente, headers, id_produto)
+    primeiro = ultimo_evento(m, id_produto)
+    entrada(cliente, headers, id_produto)
+    segundo = ultimo_evento(m, id_produto)
+    envelhecer(m)
+
+    # Como faz a limpeza de eventos: os anteriores ao segundo deixam de existir.
+    with m.app.app_context():
+        m.db.session.execute(m.db.delete(m.EventoEstoque).where(m.EventoEstoque.id < segundo))
+        m.db.session.commit()
+
+    antigo = sync(cliente, headers, primeiro - 1)
+    assert antigo['completo'] is True
+    assert antigo['removidos'] == []
+    assert id_produto in {p['id_produto'] for p in antigo['produtos']}
+
+    # Logo antes do evento mais antigo que resta ainda dá para responder com o delta.
+    delta = sync(cliente, headers, segundo - 1)
+    assert delta['completo'] is False
+    assert [p['id_produto'] for p in delta['produtos']] == [id_produto]
+
+    assert sync(cliente, headers, segundo + 1000)['completo'] is True
+
+
+def test_seq_nao_avanca_sobre_eventos_recentes(m, cliente, headers, criar_produto):
+    id_produto = criar_produto()
+    entrada(cliente, headers, id_produto)
+    antigo = ultimo_evento(m, id_produto)
+    envelhecer(m)
+    entrada(cliente, headers, id_produto)
+    recente = ultimo_evento(m, id_produto)
+
+    delta = sync(cliente, headers, antigo - 1)
+    # O produto já vai no delta, mas a sequência fica antes do evento recente,
+    # para o pedido seguinte o trazer outra vez.
+    assert delta['seq'] == recente - 1
+    assert [p['id_produto'] for p in delta['produtos']] == [id_produto]
+    assert sync(cliente, headers, delta['seq'])['produtos'][0]['id_produto'] == id_produto
+
+    envelhecer(m)
+    assert sync(cliente, headers, antigo - 1)['seq'] == recente
@@ -0,0 +1,152 @@
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+from types import SimpleNamespace
+
+import pytest
+from pypdf import PdfReader, PdfWriter
+
+import armazenamento
+import modelo_documento
+
+# ==============================================================================
+# CICLO DE VIDA DAS TAREFAS DE GERAÇÃO DE DOCUMENTOS
+# ==============================================================================
+# O LibreOffice e o template não fazem parte dos testes: o conversor escreve um
+# PDF de uma página e o modelo só toca no ficheiro de saída.
+
+
+class ConversorFalso:
+    def __init__(self, falhar=False):
+        self.falhar = falhar
+
+    def converter(self, caminho_docx, pasta_saida, timeout=None):
+        if self.falhar:
+            raise RuntimeError('conversor avariado')
+        caminho_pdf = os.path.join(pasta_saida, 'documento.pdf')
+        escritor = PdfWriter()
+        escritor.add_blank_page(width=595, height=842)
+        with open(caminho_pdf, 'wb') as f:
+            escritor.write(f)
+        return caminho_pdf
+
+
+def salvar_falso(doc, caminho):
+    open(caminho, 'wb').close()
+
+
+@pytest.fixture
+def geracao(m, monkeypatch, tmp_path):
+    """Conversor e modelo falsos, com a cache de PDFs numa pasta temporária."""
+    conversor = ConversorFalso()
+    monkeypatch.setattr(m, 'obter_conversor', lambda: conversor)
+    monkeypatch.setattr(modelo_documento, 'obter_modelo',
+                        lambda caminho: SimpleNamespace(renderizar=lambda valores: SimpleNamespace(tables=[]),
+                                                        salvar=salvar_falso))
+    monkeypatch.setattr(m, 'PASTA_CACHE_PDF', str(tmp_path))
+    monkeypatch.setattr(armazenamento, 'PASTA_CACHE_PDF', str(tmp_path))
+    return conversor
+
+
+@pytest.fixture
+def servico(m):
+    with m.app.app_context():
+        servico = m.Servico(nome=f'Serviço testes {time.monotonic_ns()}')
+        m.db.session.add(servico)
+        m.db.session.commit()
+        return servico.id
+
+
+def esperar_tarefa(cliente, headers, url_estado, limite=10):
+    fim = time.monotonic() + limite
+    while time.monotonic() < fim:
+        estado = cliente.get(url_estado, headers=headers).get_json()
+        if estado['status'] in ('Concluida', 'Erro'):
+            return estado
+        time.sleep(0.05)
+    pytest.fail(f'a tarefa não terminou: {estado}')
+
+
+def pedir_documento(cliente, headers, servico_id):
+    resposta = cliente.post(f'/api/servicos/{servico_id}/documentos', headers=headers,
+                            data={'dados_formulario': json.dumps({'identificacao_projeto': {'{{cliente}}': 'ACME'}})})
+    assert resposta.status_code == 202
+    return resposta.get_json()
+
+
+def test_tarefa_conclui_e_pdf_descarrega(m, cliente, headers, geracao, servico):
+    pedido = pedir_documento(cliente, headers, servico)
+
+    estado = esperar_tarefa(cliente, headers, pedido['url_estado'])
+    assert estado['status'] == 'Concluida'
+    assert estado['erro'] is None
+
+    resposta = cliente.get(estado['url_download'], headers=headers)
+    assert resposta.status_code == 200
+    assert resposta.mimetype == 'application/pdf'
+    assert len(PdfReader(io.BytesIO(resposta.data), strict=True).pages) == 1
+
+
+def test_tarefa_com_erro(m, cliente, headers, geracao, servico):
+    geracao.falhar = True
+    pedido = pedir_documento(cliente, headers, servico)
+
+    estado = esperar_tarefa(cliente, headers, pedido['url_estado'])
+    assert estado['status'] == 'Erro'
+    assert 'conversor avariado' in estado['erro']
+    assert 'url_download' not in estado
+
+
+def test_tarefas_de_processo_morto_ficam_em_erro(m, admin, servico):
+    filho = subprocess.Popen([sys.executable, '-c', 'pass'])
+    filho.wait()
+    anfitriao = socket.gethostname()
+    processos = {
+        'sem_processo': None,
+        'morto': f'{anfitriao}:{filho.pid}',
+        'proprio': m.identificador_processo(),
+        'outro_servidor': 'outro-servidor:1',
+    }
+    with m.app.app_context():
+        tarefas = {}
+        for nome, processo in processos.items():
+            tarefa = m.TarefaDocumento(servico_id=servico, usuario_id=admin, status='Processando', processo=processo)
+            m.db.session.add(tarefa)
+            m.db.session.flush()
+            tarefas[nome] = tarefa.id
+        m.db.session.commit()
+
+    assert m.recuperar_tarefas_interrompidas() == 2
+
+    with m.app.app_context():
+        estados = {nome: m.db.session.get(m.TarefaDocumento, i).status for nome, i in tarefas.items()}
+    assert estados == {'sem_processo': 'Erro', 'morto': 'Erro', 'proprio': 'Processando', 'outro_servidor': 'Processando'}
+
+
+def test_download_com_etag_estavel(m, cliente, headers, geracao, servico):
+    estado = esperar_tarefa(cliente, headers, pedir_documento(cliente, headers, servico)['url_estado'])
+    url = estado['url_download']
+
+    primeira = cliente.get(url, headers=headers)
+    etag, modificado = primeira.headers['ETag'], primeira.headers['Last-Modified']
+    with m.app.app_context():
+        caminho = m.db.session.get(m.DocumentosGerados, estado['documento_id']).caminho_pdf_final
+    mtime = os.stat(caminho).st_mtime
+    time.sleep(0.01)
+
+    # Usar o ficheiro da cache só mexe no atime, que a poda usa.
+    segunda = cliente.get(url, headers=headers)
+    assert (segunda.headers['ETag'], segunda.headers['Last-Modified']) == (etag, modificado)
+    assert os.stat(caminho).st_mtime == mtime
+    assert os.stat(caminho).st_atime > mtime
+
+    # Podado e montado de novo a partir dos blobs, continua a ser o mesmo documento.
+    os.remove(caminho)
+    terceira = cliente.get(url, headers=headers)
+    assert (terceira.headers['ETag'], terceira.headers['Last-Modified']) == (etag, modificado)
+
+    assert cliente.get(url, headers={**headers, 'If-None-Match': etag}).status_code == 304
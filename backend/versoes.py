@@ -0,0 +1,96 @@
+import os
+import time
+import threading
+
+from sqlalchemy import select, update, insert
+from sqlalchemy.exc import SQLAlchemyError
+
+# ==============================================================================
+# INVALIDAÇÃO DE CACHES ENTRE PROCESSOS
+# ==============================================================================
+
+INTERVALO_VERIFICACAO = float(os.getenv('CACHE_VERIFICACAO', '2'))
+
+class CanalInvalidacao:
+    """Caches locais de cada processo, invalidadas através de uma tabela de versões.
+
+    Quem altera os dados chama publicar(nome) dentro da transação da alteração;
+    cada processo lê a tabela no máximo a cada INTERVALO_VERIFICACAO segundos
+    (antes de um pedido) e limpa as caches cujo número de versão mudou. Se a
+    tabela não puder ser lida (ex.: base por migrar), o pedido segue sem
+    invalidação e o erro fica no log uma vez.
+    """
+
+    def __init__(self, db, tabela, intervalo=INTERVALO_VERIFICACAO):
+        self.db = db
+        self.tabela = tabela
+        self.intervalo = intervalo
+        self.limpezas = {}
+        self.vistas = {}
+        self.proxima_verificacao = 0.0
+        self.falha_registada = False
+        self.app = None
+        self.lock = threading.Lock()
+
+    def registar(self, nome, limpar):
+        self.limpezas.setdefault(nome, []).append(limpar)
+
+    def _limpar(self, nome):
+        for limpar in self.limpezas.get(nome, ()):
+            limpar()
+
+    def publicar(self, nome):
+        t = self.tabela
+        alteradas = self.db.session.execute(update(t).where(t.c.nome == nome).values(versao=t.c.versao + 1)).rowcount
+        if not alteradas:
+            self.db.session.execute(insert(t).values(nome=nome, versao=1))
+        self._limpar(nome)
+
+    def verificar(self):
+        if time.monotonic() < self.proxima_verificacao:
+            return
+        with self.lock:
+            if time.monotonic() < self.proxima_verificacao:
+                return
+            self.proxima_verificacao = time.monotonic() + self.intervalo
+            try:
+                with self.db.engine.connect() as conn:
+                    versoes = dict(conn.execute(select(self.tabela.c.nome, self.tabela.c.versao)).all())
+            except SQLAlchemyError as e:
+                if not self.falha_registada:
+                    self.falha_registada = True
+                    self.app.logger.error(f"Não foi possível ler {self.tabela.name}; caches sem invalidação "
+                                          f"entre processos (falta correr 'flask db upgrade'?): {e}")
+                return
+            self.falha_registada = False
+
+            for nome, versao in versoes.items():
+                if self.vistas.get(nome, 0) != versao:
+                    self._limpar(nome)
+            self.vistas = versoes
+
+    def instalar(self, app):
+        self.app = app
+        app.before_request(self.verificar)
+
+
+class CacheLocal:
+    """Dicionário com um limite de entradas; ao atingi-lo começa de novo."""
+
+    def __init__(self, maximo=50_000):
+        self.maximo = maximo
+        self.dados = {}
+        self.lock = threading.Lock()
+
+    def obter(self, chave):
+        return self.dados.get(chave)
+
+    def guardar(self, chave, valor):
+        with self.lock:
+            if len(self.dados) >= self.maximo:
+                self.dados.clear()
+            self.dados[chave] = valor
+
+    def limpar(self):
+        with self.lock:
+            self.dados.clear()
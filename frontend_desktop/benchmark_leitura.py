@@ -0,0 +1,71 @@
+import sys
+import time
+import argparse
+import statistics
+
+import requests
+
+from cliente_api import ClienteApi
+
+# ==============================================================================
+# BENCHMARK DA LEITURA NO TERMINAL
+# ==============================================================================
+# Mede o tempo de ida e volta de uma leitura de código de barras (o pedido do
+# SUPER TERMINAL) contra um servidor a correr: um requests.get por leitura
+# (ligação nova de cada vez, como o cliente fazia) contra a sessão partilhada
+# do ClienteApi. Ex.: python benchmark_leitura.py --servidor http://192.168.0.10:5000
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[min(len(ordenados) - 1, int(round(p / 100 * (len(ordenados) - 1))))]
+
+
+def medir(nome, ler, codigos, repeticoes, aquecimento):
+    for codigo in codigos[:aquecimento]:
+        ler(codigo)
+    tempos = []
+    for i in range(repeticoes):
+        inicio = time.perf_counter()
+        ler(codigos[i % len(codigos)])
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    print(f"{nome:<12} mediana {statistics.median(tempos):7.2f} ms   p95 {percentil(tempos, 95):7.2f} ms"
+          f"   máx {max(tempos):7.2f} ms")
+    return tempos
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latência da leitura no terminal: sem sessão vs. sessão partilhada.")
+    parser.add_argument('--servidor', default='http://127.0.0.1:5000')
+    parser.add_argument('--login', default='admin')
+    parser.add_argument('--senha', default='admin')
+    parser.add_argument('-n', '--repeticoes', type=int, default=200)
+    parser.add_argument('--aquecimento', type=int, default=10)
+    args = parser.parse_args()
+
+    cliente = ClienteApi(args.servidor)
+    r = cliente.pedido('post', '/api/login', json={'login': args.login, 'senha': args.senha})
+    if r.status_code != 200:
+        sys.exit(f"Login falhou ({r.status_code}): {r.text[:200]}")
+    token = r.json()['access_token']
+    cliente.definir_token(token)
+
+    # Códigos reais do catálogo, para a pesquisa encontrar sempre um produto.
+    produtos = cliente.pedido('get', '/api/produtos').json()
+    codigos = [p['codigo'] for p in produtos[:200] if p.get('codigo')] or ['0']
+    print(f"{args.repeticoes} leituras em {args.servidor} ({len(codigos)} códigos distintos)\n")
+
+    cabecalhos = {'Authorization': f'Bearer {token}'}
+    def sem_sessao(codigo):
+        requests.get(f"{args.servidor}/api/estoque/saldos", headers=cabecalhos,
+                     params={'search': codigo}, timeout=15).json()
+
+    def com_sessao(codigo):
+        cliente.pedido('get', '/api/estoque/saldos', params={'search': codigo}).json()
+
+    antes = medir('sem sessão', sem_sessao, codigos, args.repeticoes, args.aquecimento)
+    depois = medir('sessão', com_sessao, codigos, args.repeticoes, args.aquecimento)
+    print(f"\nGanho na mediana: {statistics.median(antes) - statistics.median(depois):.2f} ms por leitura")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,130 @@
+import os
+import sqlite3
+import threading
+
+# ==============================================================================
+# CACHE LOCAL DO CATÁLOGO (SQLite)
+# ==============================================================================
+# Produtos com saldo, fornecedores e naturezas guardados entre sessões, para o
+# cliente mostrar as tabelas logo ao abrir e depois pedir ao servidor só o que
+# mudou (/api/sync?since=<seq>).
+
+PASTA_DADOS = os.path.join(os.path.expanduser("~"), "PyStock")
+
+COLUNAS_PRODUTO = ['id_produto', 'codigo', 'nome', 'descricao', 'preco', 'codigoB', 'codigoC',
+                   'saldo_atual', 'fornecedores', 'naturezas']
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS meta (chave TEXT PRIMARY KEY, valor TEXT);
+CREATE TABLE IF NOT EXISTS produto (
+    id_produto INTEGER PRIMARY KEY, codigo TEXT, nome TEXT, descricao TEXT, preco TEXT,
+    codigoB TEXT, codigoC TEXT, saldo_atual INTEGER, fornecedores TEXT, naturezas TEXT
+);
+-- Leituras do terminal: o código lido pode ser qualquer um dos três.
+CREATE INDEX IF NOT EXISTS ix_produto_codigo ON produto (codigo);
+CREATE INDEX IF NOT EXISTS ix_produto_codigoB ON produto (codigoB);
+CREATE INDEX IF NOT EXISTS ix_produto_codigoC ON produto (codigoC);
+CREATE TABLE IF NOT EXISTS fornecedor (id INTEGER PRIMARY KEY, nome TEXT);
+CREATE TABLE IF NOT EXISTS natureza (id INTEGER PRIMARY KEY, nome TEXT);
+"""
+
+class CatalogoLocal:
+    """Cópia local do catálogo de um servidor; outro servidor começa uma cache nova.
+
+    Pode ser usado a partir de várias threads (a sincronização corre fora da
+    thread da interface); cada operação é uma transação.
+    """
+
+    def __init__(self, servidor, caminho=None):
+        if caminho is None:
+            os.makedirs(PASTA_DADOS, exist_ok=True)
+            caminho = os.path.join(PASTA_DADOS, "cache_catalogo.db")
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(caminho, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(ESQUEMA)
+        if self._meta('servidor') != servidor:
+            self.limpar()
+            self._guardar_meta('servidor', servidor)
+
+    def _meta(self, chave):
+        with self.lock:
+            linha = self.conn.execute("SELECT valor FROM meta WHERE chave = ?", (chave,)).fetchone()
+        return linha[0] if linha else None
+
+    def _guardar_meta(self, chave, valor):
+        with self.lock, self.conn:
+            self.conn.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES (?, ?)", (chave, str(valor)))
+
+    def limpar(self):
+        with self.lock, self.conn:
+            for tabela in ('produto', 'fornecedor', 'natureza'):
+                self.conn.execute(f"DELETE FROM {tabela}")
+            self.conn.execute("DELETE FROM meta WHERE chave = 'seq'")
+
+    # --- Leitura ---
+
+    def seq(self):
+        valor = self._meta('seq')
+        return int(valor) if valor is not None else None
+
+    def vazio(self):
+        return self.seq() is None
+
+    def produtos(self):
+        with self.lock:
+            cursor = self.conn.execute(f"SELECT {', '.join(COLUNAS_PRODUTO)} FROM produto ORDER BY id_produto")
+            return [dict(zip(COLUNAS_PRODUTO, linha)) for linha in cursor]
+
+    def produto_por_codigo(self, codigo):
+        """Produto cujo código principal, B ou C é exatamente este; None se não estiver na cache."""
+        codigo = codigo.strip()
+        if not codigo:
+            return None
+        with self.lock:
+            linha = self.conn.execute(
+                f"SELECT {', '.join(COLUNAS_PRODUTO)} FROM produto WHERE codigo = ? OR codigoB = ? OR codigoC = ? "
+                "ORDER BY codigo = ? DESC LIMIT 1", (codigo, codigo, codigo, codigo)
+            ).fetchone()
+        return dict(zip(COLUNAS_PRODUTO, linha)) if linha else None
+
+    def saldo(self, id_produto):
+        with self.lock:
+            linha = self.conn.execute("SELECT saldo_atual FROM produto WHERE id_produto = ?", (id_produto,)).fetchone()
+        return linha[0] if linha else None
+
+    def fornecedores(self):
+        with self.lock:
+            return [{'id': i, 'nome': n} for i, n in self.conn.execute("SELECT id, nome FROM fornecedor ORDER BY nome")]
+
+    def naturezas(self):
+        with self.lock:
+            return [{'id': i, 'nome': n} for i, n in self.conn.execute("SELECT id, nome FROM natureza ORDER BY nome")]
+
+    # --- Escrita ---
+
+    def aplicar_sync(self, resposta):
+        """Aplica uma resposta do /api/sync numa só transação e guarda o novo seq."""
+        linhas = [tuple(p.get(c) for c in COLUNAS_PRODUTO) for p in resposta.get('produtos', [])]
+        with self.lock, self.conn:
+            if resposta.get('completo'):
+                self.conn.execute("DELETE FROM produto")
+            self.conn.executemany(
+                f"INSERT OR REPLACE INTO produto ({', '.join(COLUNAS_PRODUTO)}) VALUES ({', '.join('?' * len(COLUNAS_PRODUTO))})",
+                linhas
+            )
+            self.conn.executemany("DELETE FROM produto WHERE id_produto = ?", [(i,) for i in resposta.get('removidos', [])])
+            self.conn.execute("INSERT OR REPLACE INTO meta (chave, valor) VALUES ('seq', ?)", (str(resposta['seq']),))
+        return len(linhas) + len(resposta.get('removidos', []))
+
+    def substituir_lista(self, tabela, itens):
+        """Fornecedores e naturezas são poucos: guardam-se sempre por inteiro."""
+        assert tabela in ('fornecedor', 'natureza')
+        with self.lock, self.conn:
+            self.conn.execute(f"DELETE FROM {tabela}")
+            self.conn.executemany(f"INSERT INTO {tabela} (id, nome) VALUES (?, ?)", [(i['id'], i['nome']) for i in itens])
+
+    def atualizar_saldo(self, id_produto, novo_saldo):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE produto SET saldo_atual = ? WHERE id_produto = ?", (novo_saldo, id_produto))
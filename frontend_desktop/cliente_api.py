@@ -0,0 +1,64 @@
+import os
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from executor_api import MAXIMO_PEDIDOS
+
+# ==============================================================================
+# CLIENTE HTTP DA API
+# ==============================================================================
+# Uma só requests.Session para toda a aplicação: as ligações ficam abertas
+# (keep-alive) e são reaproveitadas entre pedidos, em vez de um handshake TCP
+# por leitura no terminal. O pool tem o tamanho do executor, para que cada
+# pedido em simultâneo tenha a sua ligação.
+
+# (ligação, leitura) em segundos. A ligação é curta: com o servidor em baixo
+# o erro aparece logo, em vez de esperar o tempo de leitura inteiro.
+TEMPO_LIGACAO = float(os.getenv('CLIENTE_TEMPO_LIGACAO', '3.05'))
+TEMPO_LEITURA = float(os.getenv('CLIENTE_TEMPO_LEITURA', '15'))
+
+def politica_repeticao():
+    """Repete falhas de ligação em qualquer pedido (nada chegou ao servidor) e
+    erros de leitura / 502-504 só nos idempotentes; um POST de movimentação
+    nunca é reenviado."""
+    return Retry(
+        total=3,
+        connect=3,
+        read=2,
+        status=2,
+        backoff_factor=0.25,
+        status_forcelist=(502, 503, 504),
+        allowed_methods=frozenset({'GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'}),
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+
+
+class ClienteApi:
+    def __init__(self, base_url, maximo_ligacoes=MAXIMO_PEDIDOS):
+        self.base_url = base_url.rstrip('/')
+        self.sessao = requests.Session()
+        self.sessao.headers['Accept-Encoding'] = 'gzip, deflate'
+        adaptador = HTTPAdapter(pool_connections=1, pool_maxsize=maximo_ligacoes,
+                                max_retries=politica_repeticao())
+        self.sessao.mount('http://', adaptador)
+        self.sessao.mount('https://', adaptador)
+
+    def definir_token(self, token):
+        if token:
+            self.sessao.headers['Authorization'] = f'Bearer {token}'
+        else:
+            self.sessao.headers.pop('Authorization', None)
+
+    def pedido(self, metodo, endpoint, timeout=None, **opcoes):
+        """endpoint é um caminho (/api/...) ou um URL completo; timeout é o tempo
+        de leitura (a ligação usa sempre TEMPO_LIGACAO). Lança as exceções do requests."""
+        url = endpoint if endpoint.startswith('http') else f"{self.base_url}{endpoint}"
+        if not isinstance(timeout, tuple):
+            timeout = (TEMPO_LIGACAO, timeout or TEMPO_LEITURA)
+        return self.sessao.request(metodo, url, timeout=timeout, **opcoes)
+
+    def fechar(self):
+        self.sessao.close()
@@ -3,4 +3,9 @@
 # Para testar no mesmo computador, use "127.0.0.1".
 # Para testar em outra máquina na rede, use o IP da máquina servidora (ex: "192.168.0.10").
 
-SERVER_IP = '127.0.0.1'
\ No newline at end of file
+SERVER_IP = '127.0.0.1'
+# Instalação de um só posto: com BASE_EMBUTIDA = True o run.py usa uma base
+# SQLite local (em ~/PyStock/estoque.db) em vez do MySQL, e cria o utilizador
+# admin na primeira execução, com uma senha aleatória mostrada no ecrã. O
+# servidor local só aceita ligações deste computador (127.0.0.1).
+BASE_EMBUTIDA = False
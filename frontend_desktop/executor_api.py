@@ -0,0 +1,134 @@
+import os
+import threading
+import traceback
+
+from PySide6.QtCore import QObject, QRunnable, QThreadPool, Signal, Slot
+
+# ==============================================================================
+# EXECUTOR DE PEDIDOS EM SEGUNDO PLANO
+# ==============================================================================
+# Os pedidos de rede correm num QThreadPool partilhado, limitado a
+# MAXIMO_PEDIDOS em simultâneo (os restantes ficam em fila). O resultado volta
+# à thread da interface por sinal, por isso as funções ao_concluir/ao_falhar
+# podem mexer nos widgets.
+
+MAXIMO_PEDIDOS = int(os.getenv('CLIENTE_MAX_PEDIDOS', '6'))
+
+_local = threading.local()
+
+def pedido_atual():
+    """Pedido em execução nesta thread: tarefas longas usam-no para ver se foram
+    canceladas (pedido.cancelado) ou enviar progresso (pedido.progresso.emit)."""
+    return getattr(_local, 'pedido', None)
+
+
+class Pedido(QObject):
+    progresso = Signal(object)
+    _terminado = Signal(object, object)
+
+    def __init__(self, executor, ao_concluir, ao_falhar, ao_progresso):
+        super().__init__()
+        self.executor = executor
+        self.ao_concluir = ao_concluir
+        self.ao_falhar = ao_falhar
+        self.ao_progresso = ao_progresso
+        self.cancelado = False
+        self.concluido = False
+        self.tarefa = None
+        self._terminado.connect(self._entregar)
+        self.progresso.connect(self._relatar)
+
+    @Slot()
+    def cancelar(self):
+        """Um pedido ainda na fila não chega a correr; um em curso termina, mas o resultado é ignorado."""
+        if self.concluido or self.cancelado:
+            return
+        self.cancelado = True
+        if self.tarefa is not None and self.executor.pool.tryTake(self.tarefa):
+            self.concluido = True
+            self.executor._libertar(self)
+
+    @Slot(object)
+    def _relatar(self, valor):
+        if not self.cancelado and self.ao_progresso is not None:
+            self.ao_progresso(valor)
+
+    @Slot(object, object)
+    def _entregar(self, resultado, erro):
+        self.concluido = True
+        self.executor._libertar(self)
+        if self.cancelado:
+            return
+        if erro is None:
+            if self.ao_concluir is not None:
+                self.ao_concluir(resultado)
+        elif self.ao_falhar is not None:
+            self.ao_falhar(erro)
+        else:
+            print("Erro num pedido em segundo plano:")
+            traceback.print_exception(erro)
+
+
+class _Tarefa(QRunnable):
+    def __init__(self, pedido, funcao, args, kwargs):
+        super().__init__()
+        self.pedido = pedido
+        self.funcao = funcao
+        self.args = args
+        self.kwargs = kwargs
+
+    def run(self):
+        resultado, erro = None, None
+        if not self.pedido.cancelado:
+            _local.pedido = self.pedido
+            try:
+                resultado = self.funcao(*self.args, **self.kwargs)
+            except Exception as e:
+                erro = e
+            finally:
+                _local.pedido = None
+        self.pedido._terminado.emit(resultado, erro)
+
+
+class ExecutorApi:
+    def __init__(self, maximo=MAXIMO_PEDIDOS):
+        self.pool = QThreadPool()
+        self.pool.setMaxThreadCount(maximo)
+        self.ativos = set()
+
+    def executar(self, funcao, *args, ao_concluir=None, ao_falhar=None, ao_progresso=None, dono=None, **kwargs):
+        """Corre funcao(*args, **kwargs) no pool e devolve o Pedido (para cancelar).
+
+        Se ao_concluir for um método de um widget, o pedido é cancelado quando
+        esse widget for destruído (dono explícito para outros casos).
+        """
+        pedido = Pedido(self, ao_concluir, ao_falhar, ao_progresso)
+        if dono is None:
+            dono = getattr(ao_concluir, '__self__', None)
+        if isinstance(dono, QObject):
+            dono.destroyed.connect(pedido.cancelar)
+        self.ativos.add(pedido)
+        pedido.tarefa = _Tarefa(pedido, funcao, args, kwargs)
+        self.pool.start(pedido.tarefa)
+        return pedido
+
+    def _libertar(self, pedido):
+        self.ativos.discard(pedido)
+        pedido.tarefa = None
+
+    def cancelar_todos(self):
+        for pedido in list(self.ativos):
+            pedido.cancelar()
+
+
+_executor = None
+
+def obter_executor():
+    global _executor
+    if _executor is None:
+        _executor = ExecutorApi()
+    return _executor
+
+
+def executar(funcao, *args, **kwargs):
+    return obter_executor().executar(funcao, *args, **kwargs)
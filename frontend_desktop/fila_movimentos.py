@@ -0,0 +1,123 @@
+import os
+import time
+import uuid
+import sqlite3
+import threading
+
+# ==============================================================================
+# FILA OFFLINE DE MOVIMENTOS (SQLite)
+# ==============================================================================
+# Entradas e saídas feitas sem ligação ao servidor ficam aqui, pela ordem em
+# que foram feitas, até serem enviadas. Cada uma leva uma chave de
+# idempotência: se a ligação cair depois de o servidor registar o movimento
+# mas antes de a resposta chegar, o reenvio não o regista duas vezes.
+#
+# Fica num ficheiro próprio, e não na cache do catálogo: a cache pode ser
+# apagada a qualquer momento, a fila não.
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS movimento (
+    id INTEGER PRIMARY KEY, chave TEXT NOT NULL UNIQUE, servidor TEXT NOT NULL,
+    id_usuario INTEGER, tipo TEXT NOT NULL, id_produto INTEGER NOT NULL, codigo TEXT, nome TEXT,
+    quantidade INTEGER NOT NULL, motivo_saida TEXT, criado_em TEXT NOT NULL,
+    estado TEXT NOT NULL DEFAULT 'pendente', erro TEXT
+);
+"""
+
+COLUNAS = ['id', 'chave', 'tipo', 'id_produto', 'codigo', 'nome', 'quantidade', 'motivo_saida',
+           'criado_em', 'estado', 'erro']
+
+def nova_chave():
+    return uuid.uuid4().hex
+
+class FilaMovimentos:
+    """Movimentos por enviar a um servidor, por utilizador.
+
+    Estados: 'pendente' (por enviar) e 'conflito' (o servidor recusou-o, ex.:
+    estoque insuficiente; fica à espera de o utilizador o reenviar ou descartar).
+    Os enviados com sucesso são apagados.
+    """
+
+    def __init__(self, servidor, caminho=None):
+        if caminho is None:
+            pasta = os.path.join(os.path.expanduser("~"), "PyStock")
+            os.makedirs(pasta, exist_ok=True)
+            caminho = os.path.join(pasta, "fila_movimentos.db")
+        self.servidor = servidor
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(caminho, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        # Um movimento aceite pelo utilizador não se pode perder num corte de energia.
+        self.conn.execute("PRAGMA synchronous=FULL")
+        self.conn.executescript(ESQUEMA)
+
+    def _linhas(self, where, parametros):
+        with self.lock:
+            cursor = self.conn.execute(
+                f"SELECT {', '.join(COLUNAS)} FROM movimento WHERE servidor = ? AND {where} ORDER BY id",
+                (self.servidor, *parametros)
+            )
+            return [dict(zip(COLUNAS, linha)) for linha in cursor]
+
+    # --- Escrita ---
+
+    def adicionar(self, id_usuario, tipo, dados, codigo='', nome=''):
+        """Guarda o movimento (dados = corpo do POST) e devolve a sua chave."""
+        chave = dados.get('chave') or nova_chave()
+        with self.lock, self.conn:
+            self.conn.execute(
+                "INSERT INTO movimento (chave, servidor, id_usuario, tipo, id_produto, codigo, nome, quantidade, "
+                "motivo_saida, criado_em) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (chave, self.servidor, id_usuario, tipo, dados['id_produto'], codigo, nome, dados['quantidade'],
+                 dados.get('motivo_saida'), time.strftime('%d/%m/%Y %H:%M:%S'))
+            )
+        return chave
+
+    def concluir(self, id_movimento):
+        with self.lock, self.conn:
+            self.conn.execute("DELETE FROM movimento WHERE id = ?", (id_movimento,))
+
+    def marcar_conflito(self, id_movimento, erro):
+        with self.lock, self.conn:
+            self.conn.execute("UPDATE movimento SET estado = 'conflito', erro = ? WHERE id = ?", (erro, id_movimento))
+
+    def repor(self, id_movimento):
+        """Volta a pôr um conflito na fila, com a mesma chave (ex.: depois de uma entrada em falta)."""
+        with self.lock, self.conn:
+            # Vai para o fim da fila: os pendentes feitos entretanto já contavam sem ele.
+            self.conn.execute(
+                "UPDATE movimento SET estado = 'pendente', erro = NULL, id = (SELECT MAX(id) + 1 FROM movimento) "
+                "WHERE id = ?", (id_movimento,)
+            )
+
+    def descartar(self, id_movimento):
+        self.concluir(id_movimento)
+
+    # --- Leitura ---
+
+    def movimentos(self, id_usuario):
+        return self._linhas("id_usuario = ?", (id_usuario,))
+
+    def pendentes(self, id_usuario):
+        return self._linhas("estado = 'pendente' AND id_usuario = ?", (id_usuario,))
+
+    def conflitos(self, id_usuario):
+        return self._linhas("estado = 'conflito' AND id_usuario = ?", (id_usuario,))
+
+    def contagem(self, id_usuario):
+        """(pendentes, conflitos) deste utilizador."""
+        with self.lock:
+            linhas = dict(self.conn.execute(
+                "SELECT estado, COUNT(*) FROM movimento WHERE servidor = ? AND id_usuario = ? GROUP BY estado",
+                (self.servidor, id_usuario)
+            ).fetchall())
+        return linhas.get('pendente', 0), linhas.get('conflito', 0)
+
+    def delta_pendente(self, id_produto):
+        """Soma dos movimentos ainda por enviar deste produto (entradas - saídas), de qualquer utilizador."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COALESCE(SUM(CASE tipo WHEN 'Entrada' THEN quantidade ELSE -quantidade END), 0) "
+                "FROM movimento WHERE servidor = ? AND id_produto = ? AND estado = 'pendente'",
+                (self.servidor, id_produto)
+            ).fetchone()[0]
@@ -0,0 +1,51 @@
+import os
+import re
+import unicodedata
+
+# ==============================================================================
+# PESQUISA LOCAL NO CATÁLOGO
+# ==============================================================================
+# Com o catálogo em cache, a pesquisa do inventário é feita no cliente: o texto
+# de cada produto (nome e os três códigos) é normalizado uma vez e cada tecla
+# só percorre essas strings. Mesma regra do servidor (ILIKE '%termo%' em
+# qualquer um dos campos), sem distinguir maiúsculas nem acentos.
+
+# Acima disto o cliente não indexa e volta à pesquisa no servidor.
+LIMITE_PESQUISA_LOCAL = int(os.getenv('CLIENTE_LIMITE_PESQUISA_LOCAL', '200000'))
+
+_ACENTOS = re.compile('[\u0300-\u036f]')
+
+def normalizar(texto):
+    texto = texto.casefold()
+    if texto.isascii():
+        return texto
+    # Decompõe (á -> a + acento) e retira os acentos.
+    return _ACENTOS.sub('', unicodedata.normalize('NFKD', texto))
+
+
+class IndicePesquisa:
+    def __init__(self, produtos, chave_id='id_produto'):
+        self.ids = [p[chave_id] for p in produtos]
+        # Campos separados por \n para um termo não casar entre o fim de um e o início do outro.
+        self.textos = [normalizar(f"{p.get('nome') or ''}\n{p.get('codigo') or ''}\n{p.get('codigoB') or ''}\n{p.get('codigoC') or ''}")
+                       for p in produtos]
+        self._ultimo = ('', None)
+
+    def __len__(self):
+        return len(self.ids)
+
+    def procurar(self, termo):
+        """Ids dos produtos que contêm o termo; None para termo vazio (sem filtro)."""
+        termo = normalizar(termo.strip())
+        if not termo:
+            self._ultimo = ('', None)
+            return None
+
+        # Ao escrever, cada termo contém o anterior: basta procurar nos resultados anteriores.
+        anterior, posicoes = self._ultimo
+        if posicoes is None or anterior not in termo:
+            posicoes = range(len(self.textos))
+        textos = self.textos
+        posicoes = [i for i in posicoes if termo in textos[i]]
+        self._ultimo = (termo, posicoes)
+        return [self.ids[i] for i in posicoes]
@@ -10,6 +10,7 @@ import random
 import webbrowser
 import winsound
 import threading
+import time
 
 from PySide6.QtWidgets import (
     QApplication, QWidget, QLabel, QLineEdit, QPushButton, QVBoxLayout,
@@ -24,20 +25,26 @@ from PySide6.QtGui import (
     QPixmap, QAction, QDoubleValidator, QKeySequence, QIcon
 )
 from PySide6.QtCore import (
-    Qt, QTimer, Signal, QDate, QEvent, QObject, QThread, QUrl, QSettings
+    Qt, QTimer, Signal, QDate, QEvent, QObject, QUrl, QSettings
 )
 from PySide6.QtMultimedia import QSoundEffect
 from packaging.version import parse as parse_version
 
 from config import SERVER_IP
+from cache_local import CatalogoLocal
+from fila_movimentos import FilaMovimentos, nova_chave
+from modelo_tabela import TabelaDados, Coluna, ordem_numerica, ordem_data_hora
+from executor_api import executar, pedido_atual, obter_executor
+from cliente_api import ClienteApi
+from indice_pesquisa import IndicePesquisa, LIMITE_PESQUISA_LOCAL
 
 # ==============================================================================
 # 2. FUNÇÕES AUXILIARES E VARIÁVEIS GLOBAIS
 # ==============================================================================
-access_token = None
 API_BASE_URL = f"http://{SERVER_IP}:5000"
 APP_VERSION = "2.5"
 CURRENT_THEME = 'light'
+INICIO_APP = time.perf_counter()
 
 print("--- INICIANDO APLICAÇÃO ---")
 print(f"--- IP DO SERVIDOR: '{SERVER_IP}' ---")
@@ -45,8 +52,38 @@ print(f"--- IP DO SERVIDOR: '{SERVER_IP}' ---")
 class SignalHandler(QObject):
     fornecedores_atualizados = Signal()
     naturezas_atualizadas = Signal()
+    catalogo_sincronizado = Signal()
+    fila_alterada = Signal()
 
 signal_handler = SignalHandler()
+catalogo_local = None
+fila_movimentos = None
+cliente_api = None
+# Utilizador com sessão aberta: cada um só reenvia os seus movimentos da fila offline.
+id_usuario_atual = None
+
+def obter_cliente():
+    global cliente_api
+    if cliente_api is None:
+        cliente_api = ClienteApi(API_BASE_URL)
+    return cliente_api
+
+def obter_catalogo():
+    global catalogo_local
+    if catalogo_local is None:
+        catalogo_local = CatalogoLocal(API_BASE_URL)
+    return catalogo_local
+
+def obter_fila():
+    global fila_movimentos
+    if fila_movimentos is None:
+        fila_movimentos = FilaMovimentos(API_BASE_URL)
+    return fila_movimentos
+
+def registar_tempo(etapa, inicio=INICIO_APP):
+    """Registo de tempos do arranque (e da construção das telas) na consola;
+    por omissão conta a partir do carregamento deste módulo."""
+    print(f"[tempo] {etapa}: {(time.perf_counter() - inicio) * 1000:.0f} ms")
 
 def resource_path(relative_path):
     try:
@@ -78,97 +115,162 @@ def load_stylesheet(theme_name):
 
 def check_for_updates():
     print("A verificar atualizações...")
-    try:
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
-        response = requests.get(f"{API_BASE_URL}/api/versao", headers=headers, timeout=5)
-
-        if response.status_code == 200:
-            dados_versao = response.json()
-            versao_servidor = dados_versao.get("versao")
-            url_download = dados_versao.get("url_download")
-
-            if versao_servidor and parse_version(versao_servidor) > parse_version(APP_VERSION):
-                msg_box = QMessageBox()
-                msg_box.setIcon(QMessageBox.Icon.Information)
-                msg_box.setWindowTitle("Nova Versão Disponível!")
-                msg_box.setText(f"Versão {versao_servidor} disponível.")
-                msg_box.setInformativeText("Deseja ir para a página de download?")
-                msg_box.setStandardButtons(QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
-                msg_box.setDefaultButton(QMessageBox.StandardButton.Yes)
-                
-                if msg_box.exec() == QMessageBox.StandardButton.Yes:
-                    webbrowser.open(url_download)
-            else:
-                print("Aplicação atualizada.")
-    except Exception as e:
-        print(f"Erro ao verificar atualizações: {e}")
+    api('get', '/api/versao', mostrar_nova_versao, timeout=5)
+
+def mostrar_nova_versao(status, dados_versao):
+    if status != 200:
+        print(f"Erro ao verificar atualizações: {dados_versao.get('erro', status)}")
+        return
+
+    versao_servidor = dados_versao.get("versao")
+    url_download = dados_versao.get("url_download")
+
+    if versao_servidor and parse_version(versao_servidor) > parse_version(APP_VERSION):
+        msg_box = QMessageBox()
+        msg_box.setIcon(QMessageBox.Icon.Information)
+        msg_box.setWindowTitle("Nova Versão Disponível!")
+        msg_box.setText(f"Versão {versao_servidor} disponível.")
+        msg_box.setInformativeText("Deseja ir para a página de download?")
+        msg_box.setStandardButtons(QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No)
+        msg_box.setDefaultButton(QMessageBox.StandardButton.Yes)
+        
+        if msg_box.exec() == QMessageBox.StandardButton.Yes:
+            webbrowser.open(url_download)
+    else:
+        print("Aplicação atualizada.")
 
 # ==============================================================================
 # 3. JANELAS DE DIÁLOGO E WORKERS
 # ==============================================================================
 
-class ApiWorker(QObject):
-    finished = Signal(int, object)
-
-    def __init__(self, method, endpoint, params=None, json_data=None, files=None, form_data=None):
-        super().__init__()
-        self.method = method
-        self.endpoint = endpoint
-        self.params = params
-        self.json_data = json_data
-        self.files = files
-        self.form_data = form_data
-
-    def run(self):
-        global access_token, API_BASE_URL
-        headers = {'Authorization': f'Bearer {access_token}'}
-        url = f"{API_BASE_URL}{self.endpoint}"
-
-        try:
-            response = requests.request(
-                self.method, url, headers=headers, params=self.params, 
-                files=self.files, data=self.form_data, timeout=15
-            )
-            data = response.json() if response.content else {}
-            self.finished.emit(response.status_code, data)
-        except requests.exceptions.RequestException as e:
-            self.finished.emit(-1, {"erro": f"Erro de conexão: {e}"})
-        except Exception as e:
-            self.finished.emit(-2, {"erro": f"Erro inesperado: {e}"})
-
-class FormDataLoader(QObject):
-    finished = Signal(dict)
-
-    def __init__(self, produto_id):
-        super().__init__()
-        self.produto_id = produto_id
-
-    def run(self):
-        results = {'status': 'success'}
+def _pedido_http(metodo, endpoint, timeout, opcoes):
+    try:
+        r = obter_cliente().pedido(metodo, endpoint, timeout=timeout, **opcoes)
         try:
-            global access_token
-            headers = {'Authorization': f'Bearer {access_token}'}
-            params = {}
-            if self.produto_id:
-                params['produto_id'] = self.produto_id
-            
-            response = requests.get(f"{API_BASE_URL}/api/formularios/produto_data", headers=headers, params=params, timeout=10)
-            response.raise_for_status()
-            data = response.json()
-            
-            results['fornecedores'] = data.get('fornecedores', [])
-            results['naturezas'] = data.get('naturezas', [])
-            if data.get('produto'):
-                results['produto'] = data['produto']
-        except requests.exceptions.RequestException:
-            results['status'] = 'error'
-            results['message'] = "connection_error"
-        except Exception as e:
-            results['status'] = 'error'
-            results['message'] = f"Erro inesperado: {e}"
-        
-        self.finished.emit(results)
+            dados = r.json() if r.content else {}
+        except ValueError:
+            dados = {"erro": r.text}
+        return r.status_code, dados
+    except requests.exceptions.RequestException as e:
+        return -1, {"erro": f"Erro de conexão: {e}"}
+    except Exception as e:
+        return -2, {"erro": f"Erro inesperado: {e}"}
+
+def em_segundo_plano(funcao, *args, ao_concluir=None, dono=None, **kwargs):
+    """executar() para funções que devolvem (status, dados): chama ao_concluir(status, dados)."""
+    if dono is None:
+        dono = getattr(ao_concluir, '__self__', None)
+    callback = (lambda resultado: ao_concluir(*resultado)) if ao_concluir else None
+    return executar(funcao, *args, ao_concluir=callback, dono=dono, **kwargs)
+
+def api(metodo, endpoint, ao_concluir=None, timeout=15, dono=None, **opcoes):
+    """Pedido à API fora da thread da interface; ao_concluir(status, dados) corre na
+    thread da interface. status -1 = sem ligação ao servidor, -2 = erro inesperado."""
+    return em_segundo_plano(_pedido_http, metodo, endpoint, timeout, opcoes, ao_concluir=ao_concluir, dono=dono)
+
+def baixar_ficheiro(metodo, endpoint, destino, timeout=30, **opcoes):
+    """Grava a resposta em destino; devolve (status, destino ou mensagem de erro)."""
+    try:
+        r = obter_cliente().pedido(metodo, endpoint, timeout=timeout, stream=True, **opcoes)
+        if r.status_code != 200:
+            try:
+                return r.status_code, (r.json() if r.content else {}).get('erro', '')
+            except ValueError:
+                return r.status_code, r.text
+        with r, open(destino, 'wb') as f:
+            for chunk in r.iter_content(65536):
+                f.write(chunk)
+        return 200, destino
+    except requests.exceptions.RequestException as e:
+        return -1, str(e)
+
+def sincronizar_catalogo_local(catalogo):
+    """Traz do servidor só o que mudou desde a última sincronização e grava na cache local."""
+    try:
+        seq = catalogo.seq()
+        status, dados = _pedido_http('get', '/api/sync', 60, {'params': {'since': seq} if seq is not None else {}})
+        if status != 200:
+            return status, 0
+        alterados = catalogo.aplicar_sync(dados)
+
+        for tabela, endpoint in (('fornecedor', '/api/fornecedores'), ('natureza', '/api/naturezas')):
+            status, lista = _pedido_http('get', endpoint, 15, {})
+            if status == 200:
+                catalogo.substituir_lista(tabela, lista)
+        return 200, alterados
+    except Exception as e:
+        print(f"Erro na sincronização do catálogo: {e}")
+        return -2, 0
+
+ENDPOINTS_MOVIMENTO = {'Entrada': "/api/estoque/entrada", 'Saida': "/api/estoque/saida"}
+
+def atualizar_saldo_local(id_produto, resposta):
+    """Grava na cache o novo_saldo de uma entrada/saída aceite, se a resposta for deste produto."""
+    if str(resposta.get('id_produto')) == str(id_produto):
+        obter_catalogo().atualizar_saldo(id_produto, resposta['novo_saldo'])
+EM_FILA = 0  # status de registar_movimento: sem ligação, o movimento ficou na fila offline
+
+def registar_movimento(tipo, dados, codigo='', nome=''):
+    """Entrada ou saída com chave de idempotência; devolve (status, dados) como _pedido_http.
+
+    Sem ligação ao servidor o movimento fica na fila offline (status EM_FILA).
+    Também vai para a fila se o utilizador ainda lá tiver movimentos por
+    enviar, para não passar à frente deles.
+    """
+    fila = obter_fila()
+    dados = dict(dados, chave=nova_chave())
+    if not fila.contagem(id_usuario_atual)[0]:
+        status, resposta = _pedido_http('post', ENDPOINTS_MOVIMENTO[tipo], 15, {'json': dados})
+        if status == 201:
+            atualizar_saldo_local(dados['id_produto'], resposta)
+        # Mesmo que o pedido tenha chegado ao servidor, a chave impede que o reenvio o duplique.
+        if status != -1:
+            return status, resposta
+
+    if tipo == 'Saida':
+        saldo = obter_catalogo().saldo(dados['id_produto'])
+        if saldo is not None:
+            saldo += fila.delta_pendente(dados['id_produto'])
+            if saldo < dados['quantidade']:
+                return 400, {'erro': f"Estoque insuficiente. Saldo atual (sem ligação ao servidor): {saldo}"}
+    fila.adicionar(id_usuario_atual, tipo, dados, codigo, nome)
+    signal_handler.fila_alterada.emit()
+    return EM_FILA, {'mensagem': "Sem ligação ao servidor: o movimento será enviado quando a ligação voltar."}
+
+def enviar_fila(fila, id_usuario):
+    """Reenvia os movimentos pendentes pela ordem em que foram feitos.
+
+    Os que o servidor recusar (ex.: estoque insuficiente, ou 409 de uma chave
+    já usada noutro movimento) passam a conflito e o envio continua; sem
+    ligação ou com a sessão expirada pára, para tentar mais tarde pela mesma
+    ordem. Devolve (status, {'enviados': n, 'conflitos': [...]}).
+    """
+    enviados, conflitos = 0, []
+    for mov in fila.pendentes(id_usuario):
+        dados = {'id_produto': mov['id_produto'], 'quantidade': mov['quantidade'], 'chave': mov['chave']}
+        if mov['tipo'] == 'Saida':
+            dados['motivo_saida'] = mov['motivo_saida']
+        status, resposta = _pedido_http('post', ENDPOINTS_MOVIMENTO[mov['tipo']], 15, {'json': dados})
+        if status == 201:
+            fila.concluir(mov['id'])
+            atualizar_saldo_local(mov['id_produto'], resposta)
+            enviados += 1
+        elif status in (-1, 401, 422):
+            return status, {'enviados': enviados, 'conflitos': conflitos}
+        else:
+            erro = resposta.get('erro') or f"Erro {status}"
+            fila.marcar_conflito(mov['id'], erro)
+            conflitos.append(dict(mov, erro=erro))
+    return 200, {'enviados': enviados, 'conflitos': conflitos}
+
+def salvar_produto(produto_id, dados):
+    """Cria (POST e depois PUT, que grava as associações) ou atualiza um produto."""
+    if produto_id is not None:
+        return _pedido_http('put', f"/api/produtos/{produto_id}", 15, {'json': dados})
+    status, resposta = _pedido_http('post', '/api/produtos', 15, {'json': dados})
+    if status == 201:
+        _pedido_http('put', f"/api/produtos/{resposta.get('id_produto_criado')}", 15, {'json': dados})
+    return status, resposta
 
 class FormularioProdutoDialog(QDialog):
     produto_atualizado = Signal(int, dict)
@@ -182,6 +284,7 @@ class FormularioProdutoDialog(QDialog):
         
         self.layout = QFormLayout(self)
         self.dados_produto_carregados = None
+        self.pedido_codigo = None
         
         self.input_codigo = QLineEdit()
         self.input_nome = QLineEdit()
@@ -255,15 +358,8 @@ class FormularioProdutoDialog(QDialog):
 
     def iniciar_carregamento_assincrono(self):
         self.definir_estado_carregamento(True)
-        self.thread = QThread()
-        self.worker = FormDataLoader(self.produto_id)
-        self.worker.moveToThread(self.thread)
-        self.thread.started.connect(self.worker.run)
-        self.worker.finished.connect(self.preencher_dados_formulario)
-        self.worker.finished.connect(self.thread.quit)
-        self.worker.finished.connect(self.worker.deleteLater)
-        self.thread.finished.connect(self.thread.deleteLater)
-        self.thread.start()
+        params = {'produto_id': self.produto_id} if self.produto_id else {}
+        api('get', '/api/formularios/produto_data', self.preencher_dados_formulario, timeout=10, params=params)
 
     def definir_estado_carregamento(self, a_carregar):
         for widget in self.findChildren(QWidget):
@@ -277,13 +373,13 @@ class FormularioProdutoDialog(QDialog):
                 self.loading_label.hide()
                 self.loading_label.deleteLater()
 
-    def preencher_dados_formulario(self, resultados):
+    def preencher_dados_formulario(self, status, resultados):
         self.definir_estado_carregamento(False)
-        if resultados['status'] == 'error':
-            if resultados['message'] == 'connection_error':
+        if status != 200:
+            if status == -1:
                 show_connection_error_message(self)
             else:
-                QMessageBox.critical(self, "Erro de Carregamento", resultados['message'])
+                QMessageBox.critical(self, "Erro de Carregamento", resultados.get('erro') or f"Erro inesperado (HTTP {status})")
             self.reject()
             return
 
@@ -297,7 +393,7 @@ class FormularioProdutoDialog(QDialog):
             item.setData(Qt.UserRole, nat['id'])
             self.lista_naturezas.addItem(item)
 
-        if 'produto' in resultados:
+        if resultados.get('produto'):
             self.dados_produto_carregados = resultados['produto']
             dados = self.dados_produto_carregados
             self.input_codigo.setText(dados.get('codigo', ''))
@@ -327,21 +423,22 @@ class FormularioProdutoDialog(QDialog):
             self.label_status_codigo.setText("")
             return
         
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
-        try:
-            response = requests.get(f"{API_BASE_URL}/api/produtos/codigo/{codigo}", headers=headers)
-            if response and response.status_code == 404:
-                self.label_status_codigo.setText("✅ Disponível")
-                self.label_status_codigo.setStyleSheet("color: #28a745;")
-            elif response and response.status_code == 200:
-                self.label_status_codigo.setText("❌ Já existe!")
-                self.label_status_codigo.setStyleSheet("color: #dc3545;")
-            else:
-                self.label_status_codigo.setText("")
-        except requests.exceptions.RequestException:
+        if self.pedido_codigo is not None:
+            self.pedido_codigo.cancelar()
+        self.pedido_codigo = api('get', f"/api/produtos/codigo/{codigo}", self.pos_verificar_codigo)
+
+    def pos_verificar_codigo(self, status, dados):
+        if status == 404:
+            self.label_status_codigo.setText("✅ Disponível")
+            self.label_status_codigo.setStyleSheet("color: #28a745;")
+        elif status == 200:
+            self.label_status_codigo.setText("❌ Já existe!")
+            self.label_status_codigo.setStyleSheet("color: #dc3545;")
+        elif status == -1:
             self.label_status_codigo.setText("⚠️ Erro")
             self.label_status_codigo.setStyleSheet("color: #ffc107;")
+        else:
+            self.label_status_codigo.setText("")
 
     def adicionar_rapido_fornecedor(self):
         dialog = QuickAddDialog(self, "Adicionar Novo Fornecedor", "/api/fornecedores")
@@ -355,30 +452,25 @@ class FormularioProdutoDialog(QDialog):
 
     def carregar_listas_de_apoio_refreshed(self):
         self.carregar_listas_de_apoio()
-        if self.dados_produto_carregados:
-            self.selecionar_itens_nas_listas(self.dados_produto_carregados)
 
     def carregar_listas_de_apoio(self):
-        self.lista_fornecedores.clear()
-        self.lista_naturezas.clear()
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
-        try:
-            response_forn = requests.get(f"{API_BASE_URL}/api/fornecedores", headers=headers)
-            if response_forn and response_forn.status_code == 200:
-                for forn in response_forn.json():
-                    item = QListWidgetItem(forn['nome'])
-                    item.setData(Qt.UserRole, forn['id'])
-                    self.lista_fornecedores.addItem(item)
-            
-            response_nat = requests.get(f"{API_BASE_URL}/api/naturezas", headers=headers)
-            if response_nat and response_nat.status_code == 200:
-                for nat in response_nat.json():
-                    item = QListWidgetItem(nat['nome'])
-                    item.setData(Qt.UserRole, nat['id'])
-                    self.lista_naturezas.addItem(item)
-        except requests.exceptions.RequestException:
+        api('get', '/api/fornecedores', lambda status, dados: self.repor_lista(self.lista_fornecedores, status, dados), dono=self)
+        api('get', '/api/naturezas', lambda status, dados: self.repor_lista(self.lista_naturezas, status, dados), dono=self)
+
+    def repor_lista(self, lista, status, dados):
+        if status == -1:
             show_connection_error_message(self)
+            return
+        if status != 200:
+            return
+        # Mantém o que o utilizador já tinha selecionado.
+        selecionados = {lista.item(i).data(Qt.UserRole) for i in range(lista.count()) if lista.item(i).isSelected()}
+        lista.clear()
+        for registo in dados:
+            item = QListWidgetItem(registo['nome'])
+            item.setData(Qt.UserRole, registo['id'])
+            lista.addItem(item)
+            item.setSelected(registo['id'] in selecionados)
 
     def selecionar_itens_nas_listas(self, dados_produto):
         ids_fornecedores = {f['id'] for f in dados_produto.get('fornecedores', [])}
@@ -401,8 +493,6 @@ class FormularioProdutoDialog(QDialog):
             QMessageBox.warning(self, "Campos Obrigatórios", "Preencha Código e Nome.")
             return
 
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
         preco_str = self.input_preco.text().strip().replace(',', '.')
         
         dados_produto = {
@@ -417,27 +507,24 @@ class FormularioProdutoDialog(QDialog):
         dados_produto['fornecedores_ids'] = ids_forn
         dados_produto['naturezas_ids'] = ids_nat
 
-        try:
-            if self.produto_id is None:
-                response = requests.post(f"{API_BASE_URL}/api/produtos", headers=headers, json=dados_produto)
-                if response.status_code == 201:
-                    produto_salvo_id = response.json().get('id_produto_criado')
-                    requests.put(f"{API_BASE_URL}/api/produtos/{produto_salvo_id}", headers=headers, json=dados_produto)
-                    super().accept()
-                else:
-                    raise Exception(response.json().get('erro', 'Erro ao criar'))
-            else:
-                response = requests.put(f"{API_BASE_URL}/api/produtos/{self.produto_id}", headers=headers, json=dados_produto)
-                if response.status_code == 200:
-                    self.produto_atualizado.emit(self.row, response.json())
-                    QMessageBox.information(self, "Sucesso", "Produto atualizado!")
-                    super().accept()
-                else:
-                    raise Exception(response.json().get('erro', 'Erro ao atualizar'))
-        except requests.exceptions.RequestException:
+        self.botoes.setEnabled(False)
+        em_segundo_plano(salvar_produto, self.produto_id, dados_produto, ao_concluir=self.pos_salvar)
+
+    def pos_salvar(self, status, dados):
+        self.botoes.setEnabled(True)
+        if status == -1:
             show_connection_error_message(self)
-        except Exception as e:
-            QMessageBox.warning(self, "Erro", f"Falha ao salvar: {e}")
+        elif self.produto_id is None:
+            if status == 201:
+                super().accept()
+            else:
+                QMessageBox.warning(self, "Erro", f"Falha ao salvar: {dados.get('erro', 'Erro ao criar')}")
+        elif status == 200:
+            self.produto_atualizado.emit(self.row, dados)
+            QMessageBox.information(self, "Sucesso", "Produto atualizado!")
+            super().accept()
+        else:
+            QMessageBox.warning(self, "Erro", f"Falha ao salvar: {dados.get('erro', 'Erro ao atualizar')}")
 
 class FormularioFornecedorDialog(QDialog):
     def __init__(self, parent=None, fornecedor_id=None):
@@ -458,32 +545,31 @@ class FormularioFornecedorDialog(QDialog):
             self.carregar_dados()
 
     def carregar_dados(self):
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
-        try:
-            response = requests.get(f"{API_BASE_URL}/api/fornecedores/{self.fornecedor_id}", headers=headers)
-            if response.status_code == 200:
-                self.input_nome.setText(response.json().get('nome'))
-        except requests.exceptions.RequestException:
+        api('get', f"/api/fornecedores/{self.fornecedor_id}", self.pos_carregar)
+
+    def pos_carregar(self, status, dados):
+        if status == 200:
+            self.input_nome.setText(dados.get('nome'))
+        elif status == -1:
             show_connection_error_message(self)
 
     def accept(self):
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
         dados = {"nome": self.input_nome.text()}
-        try:
-            if self.fornecedor_id is None:
-                r = requests.post(f"{API_BASE_URL}/api/fornecedores", headers=headers, json=dados)
-            else:
-                r = requests.put(f"{API_BASE_URL}/api/fornecedores/{self.fornecedor_id}", headers=headers, json=dados)
-            
-            if r.status_code in [200, 201]:
-                QMessageBox.information(self, "Sucesso", "Salvo com sucesso!")
-                super().accept()
-            else:
-                QMessageBox.warning(self, "Erro", r.json().get('erro', 'Erro desconhecido'))
-        except requests.exceptions.RequestException:
+        self.botoes.setEnabled(False)
+        if self.fornecedor_id is None:
+            api('post', "/api/fornecedores", self.pos_salvar, json=dados)
+        else:
+            api('put', f"/api/fornecedores/{self.fornecedor_id}", self.pos_salvar, json=dados)
+
+    def pos_salvar(self, status, dados):
+        self.botoes.setEnabled(True)
+        if status in [200, 201]:
+            QMessageBox.information(self, "Sucesso", "Salvo com sucesso!")
+            super().accept()
+        elif status == -1:
             show_connection_error_message(self)
+        else:
+            QMessageBox.warning(self, "Erro", dados.get('erro', 'Erro desconhecido'))
 
 class FormularioNaturezaDialog(QDialog):
     def __init__(self, parent=None, natureza_id=None):
@@ -504,32 +590,31 @@ class FormularioNaturezaDialog(QDialog):
             self.carregar_dados()
 
     def carregar_dados(self):
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
-        try:
-            response = requests.get(f"{API_BASE_URL}/api/naturezas/{self.natureza_id}", headers=headers)
-            if response.status_code == 200:
-                self.input_nome.setText(response.json().get('nome'))
-        except requests.exceptions.RequestException:
+        api('get', f"/api/naturezas/{self.natureza_id}", self.pos_carregar)
+
+    def pos_carregar(self, status, dados):
+        if status == 200:
+            self.input_nome.setText(dados.get('nome'))
+        elif status == -1:
             show_connection_error_message(self)
 
     def accept(self):
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
         dados = {"nome": self.input_nome.text()}
-        try:
-            if self.natureza_id is None:
-                r = requests.post(f"{API_BASE_URL}/api/naturezas", headers=headers, json=dados)
-            else:
-                r = requests.put(f"{API_BASE_URL}/api/naturezas/{self.natureza_id}", headers=headers, json=dados)
-            
-            if r.status_code in [200, 201]:
-                QMessageBox.information(self, "Sucesso", "Salvo com sucesso!")
-                super().accept()
-            else:
-                QMessageBox.warning(self, "Erro", r.json().get('erro', 'Erro desconhecido'))
-        except requests.exceptions.RequestException:
+        self.botoes.setEnabled(False)
+        if self.natureza_id is None:
+            api('post', "/api/naturezas", self.pos_salvar, json=dados)
+        else:
+            api('put', f"/api/naturezas/{self.natureza_id}", self.pos_salvar, json=dados)
+
+    def pos_salvar(self, status, dados):
+        self.botoes.setEnabled(True)
+        if status in [200, 201]:
+            QMessageBox.information(self, "Sucesso", "Salvo com sucesso!")
+            super().accept()
+        elif status == -1:
             show_connection_error_message(self)
+        else:
+            QMessageBox.warning(self, "Erro", dados.get('erro', 'Erro desconhecido'))
 
 class QuickAddDialog(QDialog):
     item_adicionado = Signal()
@@ -557,22 +642,22 @@ class QuickAddDialog(QDialog):
         if not nome:
             return
 
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
-        dados = {"nome": nome}
-        try:
-            response = requests.post(f"{API_BASE_URL}{self.endpoint}", headers=headers, json=dados)
-            if response.status_code == 201:
-                self.item_adicionado.emit()
-                if self.endpoint == "/api/fornecedores":
-                    signal_handler.fornecedores_atualizados.emit()
-                elif self.endpoint == "/api/naturezas":
-                    signal_handler.naturezas_atualizadas.emit()
-                super().accept()
-            else:
-                QMessageBox.warning(self, "Erro", response.json().get('erro', 'Erro'))
-        except requests.exceptions.RequestException:
+        self.botoes.setEnabled(False)
+        api('post', self.endpoint, self.pos_salvar, json={"nome": nome})
+
+    def pos_salvar(self, status, dados):
+        self.botoes.setEnabled(True)
+        if status == 201:
+            self.item_adicionado.emit()
+            if self.endpoint == "/api/fornecedores":
+                signal_handler.fornecedores_atualizados.emit()
+            elif self.endpoint == "/api/naturezas":
+                signal_handler.naturezas_atualizadas.emit()
+            super().accept()
+        elif status == -1:
             show_connection_error_message(self)
+        else:
+            QMessageBox.warning(self, "Erro", dados.get('erro', 'Erro'))
 
 class FormularioUsuarioDialog(QDialog):
     def __init__(self, parent=None, usuario_id=None):
@@ -604,21 +689,18 @@ class FormularioUsuarioDialog(QDialog):
             self.carregar_dados()
 
     def carregar_dados(self):
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
-        try:
-            response = requests.get(f"{API_BASE_URL}/api/usuarios/{self.usuario_id}", headers=headers)
-            if response.status_code == 200:
-                dados = response.json()
-                self.input_nome.setText(dados.get('nome', ''))
-                self.input_login.setText(dados.get('login', ''))
-                self.input_permissao.setCurrentText(dados.get('permissao', 'Usuario'))
-        except requests.exceptions.RequestException:
+        api('get', f"/api/usuarios/{self.usuario_id}", self.pos_carregar)
+
+    def pos_carregar(self, status, dados):
+        if status == 200:
+            self.input_nome.setText(dados.get('nome', ''))
+            self.input_login.setText(dados.get('login', ''))
+            self.input_permissao.setCurrentText(dados.get('permissao', 'Usuario'))
+        elif status == -1:
             show_connection_error_message(self)
             self.reject()
 
     def accept(self):
-        global access_token
         if not self.input_nome.text().strip() or not self.input_login.text().strip():
             QMessageBox.warning(self, "Erro", "Nome e Login obrigatórios.")
             return
@@ -634,20 +716,21 @@ class FormularioUsuarioDialog(QDialog):
             QMessageBox.warning(self, "Erro", "Senha obrigatória para novos usuários.")
             return
 
-        headers = {'Authorization': f'Bearer {access_token}'}
-        try:
-            if self.usuario_id is None:
-                r = requests.post(f"{API_BASE_URL}/api/usuarios", headers=headers, json=dados)
-            else:
-                r = requests.put(f"{API_BASE_URL}/api/usuarios/{self.usuario_id}", headers=headers, json=dados)
-            
-            if r.status_code in [200, 201]:
-                QMessageBox.information(self, "Sucesso", "Usuário salvo!")
-                super().accept()
-            else:
-                QMessageBox.warning(self, "Erro", r.json().get('erro', 'Erro'))
-        except requests.exceptions.RequestException:
+        self.botoes.setEnabled(False)
+        if self.usuario_id is None:
+            api('post', "/api/usuarios", self.pos_salvar, json=dados)
+        else:
+            api('put', f"/api/usuarios/{self.usuario_id}", self.pos_salvar, json=dados)
+
+    def pos_salvar(self, status, dados):
+        self.botoes.setEnabled(True)
+        if status in [200, 201]:
+            QMessageBox.information(self, "Sucesso", "Usuário salvo!")
+            super().accept()
+        elif status == -1:
             show_connection_error_message(self)
+        else:
+            QMessageBox.warning(self, "Erro", dados.get('erro', 'Erro'))
 
 class MudarSenhaDialog(QDialog):
     def __init__(self, parent=None):
@@ -687,18 +770,19 @@ class MudarSenhaDialog(QDialog):
             QMessageBox.warning(self, "Erro", "As senhas não coincidem.")
             return
 
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
         dados = {"senha_atual": atual, "nova_senha": nova, "confirmacao_nova_senha": conf}
-        try:
-            r = requests.post(f"{API_BASE_URL}/api/usuario/mudar-senha", headers=headers, json=dados)
-            if r.status_code == 200:
-                QMessageBox.information(self, "Sucesso", "Senha alterada!")
-                super().accept()
-            else:
-                QMessageBox.warning(self, "Erro", r.json().get('erro', 'Erro'))
-        except requests.exceptions.RequestException:
+        self.botoes.setEnabled(False)
+        api('post', "/api/usuario/mudar-senha", self.pos_salvar, json=dados)
+
+    def pos_salvar(self, status, dados):
+        self.botoes.setEnabled(True)
+        if status == 200:
+            QMessageBox.information(self, "Sucesso", "Senha alterada!")
+            super().accept()
+        elif status == -1:
             show_connection_error_message(self)
+        else:
+            QMessageBox.warning(self, "Erro", dados.get('erro', 'Erro'))
 
 class QuantidadeDialog(QDialog):
     estoque_modificado = Signal(str)
@@ -706,6 +790,7 @@ class QuantidadeDialog(QDialog):
     def __init__(self, parent, produto_id, produto_nome, produto_codigo, operacao):
         super().__init__(parent)
         self.produto_id = produto_id
+        self.produto_nome = produto_nome
         self.produto_codigo = produto_codigo
         self.operacao = operacao
         
@@ -740,7 +825,6 @@ class QuantidadeDialog(QDialog):
             return
             
         dados = { "id_produto": self.produto_id, "quantidade": int(qtd_str) }
-        endpoint = "/api/estoque/entrada"
         
         if self.operacao == "Saida":
             motivo = self.input_motivo.text().strip()
@@ -748,24 +832,37 @@ class QuantidadeDialog(QDialog):
                 QMessageBox.warning(self, "Erro", "Motivo obrigatório.")
                 return
             dados["motivo_saida"] = motivo
-            endpoint = "/api/estoque/saida"
             
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
-        try:
-            r = requests.post(f"{API_BASE_URL}{endpoint}", headers=headers, json=dados)
-            if r.status_code == 201:
-                self.estoque_modificado.emit(self.produto_codigo)
-                super().accept()
-            else:
-                QMessageBox.warning(self, "Erro", r.json().get('erro', 'Erro'))
-        except requests.exceptions.RequestException:
+        self.botoes.setEnabled(False)
+        em_segundo_plano(registar_movimento, self.operacao, dados, self.produto_codigo, self.produto_nome,
+                         ao_concluir=self.pos_salvar)
+
+    def pos_salvar(self, status, dados):
+        self.botoes.setEnabled(True)
+        # Sem ligação o movimento fica na fila offline; a barra de estado mostra quantos faltam enviar.
+        if status in (201, EM_FILA):
+            self.estoque_modificado.emit(self.produto_codigo)
+            super().accept()
+        elif status == -1:
             show_connection_error_message(self)
+        else:
+            QMessageBox.warning(self, "Erro", dados.get('erro', 'Erro'))
 
 # ==============================================================================
 # 4. WIDGETS DE CONTEÚDO
 # ==============================================================================
 
+class CarregarAoMostrar:
+    """Telas com dados do servidor: o primeiro carregamento (carregar_ao_mostrar)
+    é pedido quando a tela aparece pela primeira vez, não no construtor."""
+    carregada = False
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        if not self.carregada:
+            self.carregada = True
+            self.carregar_ao_mostrar()
+
 class ImportacaoWidget(QWidget):
     produtos_importados_sucesso = Signal()
 
@@ -823,42 +920,46 @@ class ImportacaoWidget(QWidget):
         if not self.caminho_ficheiro:
             return
 
-        self.text_resultados.setText("A importar...")
-        QApplication.processEvents()
-        
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
         try:
             with open(self.caminho_ficheiro, 'rb') as f:
-                files = {'file': (os.path.basename(self.caminho_ficheiro), f, 'text/csv')}
-                response = requests.post(f"{API_BASE_URL}/api/produtos/importar", headers=headers, files=files)
-            
-            if response.status_code == 200:
-                dados = response.json()
-                texto = f"{dados.get('mensagem', '')}\n"
-                texto += f"Sucesso: {dados.get('produtos_importados', 0)}\n\n"
-                
-                if dados.get('erros'):
-                    texto += "Erros:\n" + "\n".join(dados['erros'])
-                
-                self.text_resultados.setText(texto)
-                if dados.get('produtos_importados', 0) > 0:
-                    self.produtos_importados_sucesso.emit()
-            else:
-                self.text_resultados.setText(f"Erro na API: {response.text}")
-        except requests.exceptions.RequestException:
-            show_connection_error_message(self)
-        except Exception as e:
+                conteudo = f.read()
+        except OSError as e:
             self.text_resultados.setText(f"Erro crítico: {e}")
-        
+            return
+
+        self.text_resultados.setText("A importar...")
         self.btn_importar.setEnabled(False)
+        files = {'file': (os.path.basename(self.caminho_ficheiro), conteudo, 'text/csv')}
+        api('post', "/api/produtos/importar", self.pos_importacao, timeout=300, files=files)
 
-class InventarioWidget(QWidget):
+    def pos_importacao(self, status, dados):
+        if status == 200:
+            texto = f"{dados.get('mensagem', '')}\n"
+            texto += f"Sucesso: {dados.get('produtos_importados', 0)}\n\n"
+            
+            if dados.get('erros'):
+                texto += "Erros:\n" + "\n".join(dados['erros'])
+            
+            self.text_resultados.setText(texto)
+            if dados.get('produtos_importados', 0) > 0:
+                self.produtos_importados_sucesso.emit()
+        elif status == -1:
+            self.text_resultados.clear()
+            show_connection_error_message(self)
+        else:
+            self.text_resultados.setText(f"Erro na API: {dados.get('erro', dados)}")
+
+class InventarioWidget(CarregarAoMostrar, QWidget):
     def __init__(self):
         super().__init__()
         self.layout = QVBoxLayout(self)
         self.dados_exibidos = []
         self.sort_qtd_desc = True
+        self.a_sincronizar = False
+        self.sincronizacao_pendente = False
+        self.pedido_pesquisa = None
+        # Com o catálogo em cache a pesquisa é local; sem índice vai ao servidor.
+        self.indice = None
         
         self.titulo = QLabel("Inventário Completo")
         self.titulo.setStyleSheet("font-size: 24px; font-weight: bold;")
@@ -889,12 +990,16 @@ class InventarioWidget(QWidget):
         controles_2.addWidget(self.btn_ordenar_nome)
         controles_2.addWidget(self.btn_ordenar_qtd)
         
-        self.tabela = QTableWidget()
+        self.tabela = TabelaDados([
+            Coluna("Código", 'codigo'),
+            Coluna("Nome", 'nome'),
+            Coluna("Descrição", 'descricao'),
+            Coluna("Saldo", 'saldo_atual', Qt.AlignmentFlag.AlignCenter),
+            Coluna("Preço", 'preco', Qt.AlignmentFlag.AlignRight, chave_ordem=ordem_numerica),
+            Coluna("Cód B", 'codigoB'),
+            Coluna("Cód C", 'codigoC'),
+        ], chave_id='id_produto')
         self.tabela.setSelectionMode(QAbstractItemView.SelectionMode.ExtendedSelection)
-        self.tabela.setColumnCount(7)
-        self.tabela.setHorizontalHeaderLabels(["Código", "Nome", "Descrição", "Saldo", "Preço", "Cód B", "Cód C"])
-        self.tabela.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
-        self.tabela.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
         self.tabela.setAlternatingRowColors(True)
         
         header = self.tabela.horizontalHeader()
@@ -916,112 +1021,146 @@ class InventarioWidget(QWidget):
         self.btn_etiquetas.clicked.connect(self.gerar_etiquetas_selecionadas)
         self.btn_ordenar_nome.clicked.connect(self.ordenar_por_nome)
         self.btn_ordenar_qtd.clicked.connect(self.ordenar_por_quantidade)
-        
+
+    def carregar_ao_mostrar(self):
+        # Primeiro o que ficou da última sessão; depois só as diferenças vindas do servidor.
+        self.mostrar_cache()
         self.carregar_dados_inventario()
 
     def iniciar_busca_timer(self):
+        if self.indice is not None:
+            self.filtrar_local()
+            return
         self.search_timer.stop()
         self.search_timer.start(300)
 
     def carregar_dados_inventario(self):
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
+        if self.input_pesquisa.text() and self.indice is None:
+            self.pesquisar_no_servidor()
+        else:
+            self.sincronizar_catalogo()
+
+    def mostrar_cache(self):
+        catalogo = obter_catalogo()
+        if catalogo.vazio():
+            return
+        produtos = catalogo.produtos()
+        self.indice = IndicePesquisa(produtos) if len(produtos) <= LIMITE_PESQUISA_LOCAL else None
+        if self.indice is None and self.input_pesquisa.text():
+            return  # a tabela mostra o resultado da pesquisa no servidor
+        self.dados_exibidos = produtos
+        self.popular_tabela(self.dados_exibidos)
+        self.filtrar_local()
+
+    def filtrar_local(self):
+        if self.indice is not None:
+            self.tabela.filtrar_ids(self.indice.procurar(self.input_pesquisa.text()))
+        else:
+            self.tabela.filtrar_ids(None)
+
+    def sincronizar_catalogo(self):
+        if self.a_sincronizar:
+            self.sincronizacao_pendente = True
+            return
+        self.a_sincronizar = True
+        em_segundo_plano(sincronizar_catalogo_local, obter_catalogo(), ao_concluir=self.pos_sincronizacao)
+
+    def pos_sincronizacao(self, status, alterados):
+        self.a_sincronizar = False
+        if self.sincronizacao_pendente:
+            self.sincronizacao_pendente = False
+            self.sincronizar_catalogo()
+            return
+        if status == 200:
+            if alterados or not self.dados_exibidos:
+                self.mostrar_cache()
+            signal_handler.catalogo_sincronizado.emit()
+        elif status == 404:
+            # Servidor antigo, sem /api/sync: lista completa como antes.
+            self.pesquisar_no_servidor()
+        elif status == -1 and not self.dados_exibidos:
+            show_connection_error_message(self)
+
+    def pesquisar_no_servidor(self):
         params = {}
         if self.input_pesquisa.text():
             params['search'] = self.input_pesquisa.text()
 
-        try:
-            response = requests.get(f"{API_BASE_URL}/api/estoque/saldos", headers=headers, params=params)
-            if response.status_code == 200:
-                self.dados_exibidos = response.json()
-                self.popular_tabela(self.dados_exibidos)
-        except requests.exceptions.RequestException:
+        # Só interessa a resposta da pesquisa mais recente.
+        if self.pedido_pesquisa is not None:
+            self.pedido_pesquisa.cancelar()
+        self.pedido_pesquisa = api('get', "/api/estoque/saldos", self.pos_pesquisa, params=params)
+
+    def pos_pesquisa(self, status, dados):
+        if status == 200:
+            self.dados_exibidos = dados
+            self.tabela.filtrar_ids(None)
+            self.popular_tabela(self.dados_exibidos)
+        elif status == -1:
             show_connection_error_message(self)
 
     def popular_tabela(self, dados):
-        self.tabela.setRowCount(len(dados))
-        for linha, item in enumerate(dados):
-            item_codigo = QTableWidgetItem(item['codigo'])
-            item_codigo.setData(Qt.UserRole, item['id_produto'])
-            
-            self.tabela.setItem(linha, 0, item_codigo)
-            self.tabela.setItem(linha, 1, QTableWidgetItem(item['nome']))
-            self.tabela.setItem(linha, 2, QTableWidgetItem(item.get('descricao', '')))
-            
-            saldo = QTableWidgetItem(str(item['saldo_atual']))
-            saldo.setTextAlignment(Qt.AlignmentFlag.AlignCenter)
-            self.tabela.setItem(linha, 3, saldo)
-            
-            preco = QTableWidgetItem(str(item.get('preco', '0.00')))
-            preco.setTextAlignment(Qt.AlignmentFlag.AlignRight)
-            self.tabela.setItem(linha, 4, preco)
-            
-            self.tabela.setItem(linha, 5, QTableWidgetItem(item.get('codigoB', '')))
-            self.tabela.setItem(linha, 6, QTableWidgetItem(item.get('codigoC', '')))
-        
-        self.tabela.resizeRowsToContents()
+        self.tabela.definir_dados(dados)
 
     def ordenar_por_nome(self):
-        self.dados_exibidos.sort(key=lambda x: x['nome'].lower())
-        self.popular_tabela(self.dados_exibidos)
+        self.tabela.sortByColumn(1, Qt.SortOrder.AscendingOrder)
 
     def ordenar_por_quantidade(self):
-        self.dados_exibidos.sort(key=lambda x: int(x['saldo_atual']), reverse=self.sort_qtd_desc)
+        ordem = Qt.SortOrder.DescendingOrder if self.sort_qtd_desc else Qt.SortOrder.AscendingOrder
+        self.tabela.sortByColumn(3, ordem)
         self.sort_qtd_desc = not self.sort_qtd_desc
-        self.popular_tabela(self.dados_exibidos)
 
     def abrir_formulario_adicionar(self):
         if FormularioProdutoDialog(self).exec():
             self.carregar_dados_inventario()
 
     def abrir_formulario_editar(self):
-        row = self.tabela.currentRow()
+        row = self.tabela.linha_atual()
         if row < 0:
             QMessageBox.warning(self, "Atenção", "Selecione um produto.")
             return
         
-        produto_id = self.tabela.item(row, 0).data(Qt.UserRole)
+        produto_id = self.tabela.id_atual()
         dialog = FormularioProdutoDialog(self, produto_id=produto_id, row=row)
         dialog.produto_atualizado.connect(self.carregar_dados_inventario)
         dialog.exec()
 
     def excluir_produto_selecionado(self):
-        row = self.tabela.currentRow()
-        if row < 0:
+        produto_id = self.tabela.id_atual()
+        if produto_id is None:
             return
             
-        produto_id = self.tabela.item(row, 0).data(Qt.UserRole)
-        nome = self.tabela.item(row, 1).text()
+        nome = self.tabela.valor_atual('nome')
         
         if QMessageBox.question(self, "Excluir", f"Excluir '{nome}'?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No) == QMessageBox.StandardButton.Yes:
-            global access_token
-            headers = {'Authorization': f'Bearer {access_token}'}
-            try:
-                requests.delete(f"{API_BASE_URL}/api/produtos/{produto_id}", headers=headers)
-                self.carregar_dados_inventario()
-            except requests.exceptions.RequestException:
-                show_connection_error_message(self)
+            api('delete', f"/api/produtos/{produto_id}", self.pos_excluir)
+
+    def pos_excluir(self, status, dados):
+        if status == -1:
+            show_connection_error_message(self)
+            return
+        self.carregar_dados_inventario()
 
     def gerar_etiquetas_selecionadas(self):
-        rows = self.tabela.selectionModel().selectedRows()
-        if not rows:
+        ids = self.tabela.ids_selecionados()
+        if not ids:
             return
             
-        ids = [self.tabela.item(r.row(), 0).data(Qt.UserRole) for r in rows]
         path, _ = QFileDialog.getSaveFileName(self, "Salvar Etiquetas", "etiquetas.pdf", "PDF (*.pdf)")
         
         if path:
-            global access_token
-            headers = {'Authorization': f'Bearer {access_token}'}
-            try:
-                response = requests.post(f"{API_BASE_URL}/api/produtos/etiquetas", headers=headers, json={'product_ids': ids}, stream=True)
-                if response.status_code == 200:
-                    with open(path, 'wb') as f:
-                        for chunk in response.iter_content(8192):
-                            f.write(chunk)
-                    QMessageBox.information(self, "Sucesso", "Etiquetas geradas!")
-            except requests.exceptions.RequestException:
-                show_connection_error_message(self)
+            self.btn_etiquetas.setEnabled(False)
+            em_segundo_plano(baixar_ficheiro, 'post', "/api/produtos/etiquetas", path, timeout=300,
+                             json={'product_ids': ids}, ao_concluir=self.pos_etiquetas)
+
+    def pos_etiquetas(self, status, detalhe):
+        self.btn_etiquetas.setEnabled(True)
+        if status == 200:
+            QMessageBox.information(self, "Sucesso", "Etiquetas geradas!")
+        elif status == -1:
+            show_connection_error_message(self)
+        else:
+            QMessageBox.warning(self, "Erro", f"Falha ao gerar etiquetas: {detalhe}")
 
 class GestaoEstoqueWidget(QWidget):
     def __init__(self):
@@ -1054,18 +1193,23 @@ class GestaoEstoqueWidget(QWidget):
         self.btn_ver_historico.clicked.connect(self.mostrar_historico)
 
     def mostrar_inventario(self):
+        # Na primeira vez quem carrega é o showEvent; depois o botão recarrega.
+        carregada = self.inventario_view.carregada
         self.stack.setCurrentWidget(self.inventario_view)
         self.btn_ver_inventario.setChecked(True)
         self.btn_ver_historico.setChecked(False)
-        self.inventario_view.carregar_dados_inventario()
+        if carregada:
+            self.inventario_view.carregar_dados_inventario()
 
     def mostrar_historico(self):
+        carregada = self.historico_view.carregada
         self.stack.setCurrentWidget(self.historico_view)
         self.btn_ver_inventario.setChecked(False)
         self.btn_ver_historico.setChecked(True)
-        self.historico_view.carregar_historico()
+        if carregada:
+            self.historico_view.carregar_historico()
 
-class HistoricoWidget(QWidget):
+class HistoricoWidget(CarregarAoMostrar, QWidget):
     def __init__(self):
         super().__init__()
         self.layout = QVBoxLayout(self)
@@ -1080,10 +1224,16 @@ class HistoricoWidget(QWidget):
         filtros.addStretch(1)
         filtros.addWidget(self.btn_recarregar)
         
-        self.tabela = QTableWidget()
-        self.tabela.setColumnCount(8)
-        self.tabela.setHorizontalHeaderLabels(["Data", "Cód", "Produto", "Tipo", "Qtd", "Saldo Após", "Usuário", "Motivo"])
-        self.tabela.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.tabela = TabelaDados([
+            Coluna("Data", 'data_hora', chave_ordem=ordem_data_hora),
+            Coluna("Cód", 'produto_codigo'),
+            Coluna("Produto", 'produto_nome'),
+            Coluna("Tipo", 'tipo'),
+            Coluna("Qtd", 'quantidade'),
+            Coluna("Saldo Após", 'saldo_apos'),
+            Coluna("Usuário", 'usuario_nome'),
+            Coluna("Motivo", 'motivo_saida'),
+        ])
         self.tabela.setAlternatingRowColors(True)
         self.tabela.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
         
@@ -1092,11 +1242,12 @@ class HistoricoWidget(QWidget):
         
         self.btn_recarregar.clicked.connect(self.carregar_historico)
         self.combo_tipo.currentIndexChanged.connect(self.carregar_historico)
+        self.pedido_historico = None
+
+    def carregar_ao_mostrar(self):
         self.carregar_historico()
 
     def carregar_historico(self):
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
         fim = QDate.currentDate()
         inicio = fim.addDays(-90)
         
@@ -1109,24 +1260,18 @@ class HistoricoWidget(QWidget):
         if self.combo_tipo.currentText() != "Todas":
             params['tipo'] = self.combo_tipo.currentText()
 
-        try:
-            response = requests.get(f"{API_BASE_URL}/api/relatorios/movimentacoes", headers=headers, params=params)
-            if response.status_code == 200:
-                self.popular_tabela(response.json())
-        except requests.exceptions.RequestException:
+        if self.pedido_historico is not None:
+            self.pedido_historico.cancelar()
+        self.pedido_historico = api('get', "/api/relatorios/movimentacoes", self.pos_historico, timeout=60, params=params)
+
+    def pos_historico(self, status, dados):
+        if status == 200:
+            self.popular_tabela(dados)
+        elif status == -1:
             show_connection_error_message(self)
 
     def popular_tabela(self, dados):
-        self.tabela.setRowCount(len(dados))
-        for linha, mov in enumerate(dados):
-            self.tabela.setItem(linha, 0, QTableWidgetItem(mov['data_hora']))
-            self.tabela.setItem(linha, 1, QTableWidgetItem(mov['produto_codigo']))
-            self.tabela.setItem(linha, 2, QTableWidgetItem(mov['produto_nome']))
-            self.tabela.setItem(linha, 3, QTableWidgetItem(mov['tipo']))
-            self.tabela.setItem(linha, 4, QTableWidgetItem(str(mov['quantidade'])))
-            self.tabela.setItem(linha, 5, QTableWidgetItem(str(mov.get('saldo_apos', ''))))
-            self.tabela.setItem(linha, 6, QTableWidgetItem(mov['usuario_nome']))
-            self.tabela.setItem(linha, 7, QTableWidgetItem(mov.get('motivo_saida', '')))
+        self.tabela.definir_dados(dados)
 
 class RelatoriosWidget(QWidget):
     def __init__(self):
@@ -1187,19 +1332,21 @@ class RelatoriosWidget(QWidget):
         
         path, _ = QFileDialog.getSaveFileName(self, "Salvar", f"relatorio.{ext}", f"Arquivos (*.{ext})")
         if path:
-            global access_token
-            headers = {'Authorization': f'Bearer {access_token}'}
-            try:
-                r = requests.get(f"{API_BASE_URL}{endpoint}", headers=headers, params=params, stream=True)
-                if r.status_code == 200:
-                    with open(path, 'wb') as f:
-                        for chunk in r.iter_content(8192):
-                            f.write(chunk)
-                    QMessageBox.information(self, "Sucesso", "Relatório salvo!")
-            except requests.exceptions.RequestException:
-                show_connection_error_message(self)
+            self.btn_pdf.setEnabled(False)
+            self.btn_excel.setEnabled(False)
+            em_segundo_plano(baixar_ficheiro, 'get', endpoint, path, timeout=300, params=params, ao_concluir=self.pos_gerar)
 
-class FornecedoresWidget(QWidget):
+    def pos_gerar(self, status, detalhe):
+        self.btn_pdf.setEnabled(True)
+        self.btn_excel.setEnabled(True)
+        if status == 200:
+            QMessageBox.information(self, "Sucesso", "Relatório salvo!")
+        elif status == -1:
+            show_connection_error_message(self)
+        else:
+            QMessageBox.warning(self, "Erro", f"Falha ao gerar o relatório: {detalhe}")
+
+class FornecedoresWidget(CarregarAoMostrar, QWidget):
     def __init__(self):
         super().__init__()
         self.layout = QVBoxLayout(self)
@@ -1215,11 +1362,8 @@ class FornecedoresWidget(QWidget):
         botoes.addWidget(self.btn_del)
         botoes.addStretch(1)
         
-        self.tabela = QTableWidget()
-        self.tabela.setColumnCount(1)
-        self.tabela.setHorizontalHeaderLabels(["Nome"])
+        self.tabela = TabelaDados([Coluna("Nome", 'nome')])
         self.tabela.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.tabela.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         
         self.layout.addWidget(self.titulo)
         self.layout.addLayout(botoes)
@@ -1228,45 +1372,45 @@ class FornecedoresWidget(QWidget):
         self.btn_add.clicked.connect(self.add)
         self.btn_edit.clicked.connect(self.edit)
         self.btn_del.clicked.connect(self.delete)
-        self.carregar()
+        signal_handler.catalogo_sincronizado.connect(self.mostrar_cache)
+
+    def carregar_ao_mostrar(self):
+        if obter_catalogo().vazio():
+            self.carregar()
+        else:
+            self.mostrar_cache()
+
+    def mostrar_cache(self):
+        self.popular(obter_catalogo().fornecedores())
 
     def carregar(self):
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
-        try:
-            r = requests.get(f"{API_BASE_URL}/api/fornecedores", headers=headers)
-            if r.status_code == 200:
-                dados = r.json()
-                self.tabela.setRowCount(len(dados))
-                for i, f in enumerate(dados):
-                    item = QTableWidgetItem(f['nome'])
-                    item.setData(Qt.UserRole, f['id'])
-                    self.tabela.setItem(i, 0, item)
-        except requests.exceptions.RequestException:
-            pass
+        api('get', "/api/fornecedores", self.pos_carregar)
+
+    def pos_carregar(self, status, dados):
+        if status == 200:
+            obter_catalogo().substituir_lista('fornecedor', dados)
+            self.popular(dados)
+
+    def popular(self, dados):
+        self.tabela.definir_dados(dados)
 
     def add(self):
         if FormularioFornecedorDialog(self).exec():
             self.carregar()
 
     def edit(self):
-        row = self.tabela.currentRow()
-        if row >= 0:
-            fid = self.tabela.item(row, 0).data(Qt.UserRole)
+        fid = self.tabela.id_atual()
+        if fid is not None:
             if FormularioFornecedorDialog(self, fid).exec():
                 self.carregar()
 
     def delete(self):
-        row = self.tabela.currentRow()
-        if row >= 0:
-            fid = self.tabela.item(row, 0).data(Qt.UserRole)
+        fid = self.tabela.id_atual()
+        if fid is not None:
             if QMessageBox.question(self, "Excluir", "Confirmar exclusão?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No) == QMessageBox.StandardButton.Yes:
-                global access_token
-                headers = {'Authorization': f'Bearer {access_token}'}
-                requests.delete(f"{API_BASE_URL}/api/fornecedores/{fid}", headers=headers)
-                self.carregar()
+                api('delete', f"/api/fornecedores/{fid}", lambda status, dados: self.carregar(), dono=self)
 
-class NaturezasWidget(QWidget):
+class NaturezasWidget(CarregarAoMostrar, QWidget):
     def __init__(self):
         super().__init__()
         self.layout = QVBoxLayout(self)
@@ -1282,11 +1426,8 @@ class NaturezasWidget(QWidget):
         botoes.addWidget(self.btn_del)
         botoes.addStretch(1)
         
-        self.tabela = QTableWidget()
-        self.tabela.setColumnCount(1)
-        self.tabela.setHorizontalHeaderLabels(["Nome"])
+        self.tabela = TabelaDados([Coluna("Nome", 'nome')])
         self.tabela.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.tabela.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         
         self.layout.addWidget(self.titulo)
         self.layout.addLayout(botoes)
@@ -1295,43 +1436,43 @@ class NaturezasWidget(QWidget):
         self.btn_add.clicked.connect(self.add)
         self.btn_edit.clicked.connect(self.edit)
         self.btn_del.clicked.connect(self.delete)
-        self.carregar_naturezas()
+        signal_handler.catalogo_sincronizado.connect(self.mostrar_cache)
+
+    def carregar_ao_mostrar(self):
+        if obter_catalogo().vazio():
+            self.carregar_naturezas()
+        else:
+            self.mostrar_cache()
+
+    def mostrar_cache(self):
+        self.popular(obter_catalogo().naturezas())
 
     def carregar_naturezas(self):
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
-        try:
-            r = requests.get(f"{API_BASE_URL}/api/naturezas", headers=headers)
-            if r.status_code == 200:
-                dados = r.json()
-                self.tabela.setRowCount(len(dados))
-                for i, n in enumerate(dados):
-                    item = QTableWidgetItem(n['nome'])
-                    item.setData(Qt.UserRole, n['id'])
-                    self.tabela.setItem(i, 0, item)
-        except requests.exceptions.RequestException:
-            pass
+        api('get', "/api/naturezas", self.pos_carregar)
+
+    def pos_carregar(self, status, dados):
+        if status == 200:
+            obter_catalogo().substituir_lista('natureza', dados)
+            self.popular(dados)
+
+    def popular(self, dados):
+        self.tabela.definir_dados(dados)
 
     def add(self):
         if FormularioNaturezaDialog(self).exec():
             self.carregar_naturezas()
 
     def edit(self):
-        row = self.tabela.currentRow()
-        if row >= 0:
-            nid = self.tabela.item(row, 0).data(Qt.UserRole)
+        nid = self.tabela.id_atual()
+        if nid is not None:
             if FormularioNaturezaDialog(self, nid).exec():
                 self.carregar_naturezas()
 
     def delete(self):
-        row = self.tabela.currentRow()
-        if row >= 0:
-            nid = self.tabela.item(row, 0).data(Qt.UserRole)
+        nid = self.tabela.id_atual()
+        if nid is not None:
             if QMessageBox.question(self, "Excluir", "Confirmar exclusão?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No) == QMessageBox.StandardButton.Yes:
-                global access_token
-                headers = {'Authorization': f'Bearer {access_token}'}
-                requests.delete(f"{API_BASE_URL}/api/naturezas/{nid}", headers=headers)
-                self.carregar_naturezas()
+                api('delete', f"/api/naturezas/{nid}", lambda status, dados: self.carregar_naturezas(), dono=self)
 
 class EntradaRapidaWidget(QWidget):
     estoque_atualizado = Signal()
@@ -1380,43 +1521,50 @@ class EntradaRapidaWidget(QWidget):
         cod = self.input_codigo.text().strip()
         if not cod: return
         
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
-        try:
-            r = requests.get(f"{API_BASE_URL}/api/produtos/codigo/{cod}", headers=headers)
-            if r.status_code == 200:
-                data = r.json()
-                self.produto_encontrado_id = data['id']
-                self.label_nome.setText(data['nome'])
-                self.label_nome.setStyleSheet("color: green; font-weight: bold;")
-                self.input_qtd.setEnabled(True)
-                self.btn_salvar.setEnabled(True)
-                self.input_qtd.setFocus()
-            else:
-                self.label_nome.setText("Não encontrado")
-                self.label_nome.setStyleSheet("color: red;")
-                self.produto_encontrado_id = None
-        except requests.exceptions.RequestException:
+        # O catálogo local responde sem ir ao servidor (e funciona sem ligação).
+        produto = obter_catalogo().produto_por_codigo(cod)
+        if produto is not None:
+            self.pos_verificar(200, {'id': produto['id_produto'], 'nome': produto['nome']})
+            return
+        self.label_nome.setText("Buscando...")
+        api('get', f"/api/produtos/codigo/{cod}", self.pos_verificar)
+
+    def pos_verificar(self, status, data):
+        if status == 200:
+            self.produto_encontrado_id = data['id']
+            self.label_nome.setText(data['nome'])
+            self.label_nome.setStyleSheet("color: green; font-weight: bold;")
+            self.input_qtd.setEnabled(True)
+            self.btn_salvar.setEnabled(True)
+            self.input_qtd.setFocus()
+        elif status == -1:
+            self.label_nome.setText("Aguardando...")
             show_connection_error_message(self)
+        else:
+            self.label_nome.setText("Não encontrado")
+            self.label_nome.setStyleSheet("color: red;")
+            self.produto_encontrado_id = None
 
     def salvar(self):
         qtd = self.input_qtd.text()
         if not self.produto_encontrado_id or not qtd: return
         
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
         dados = {"id_produto": self.produto_encontrado_id, "quantidade": int(qtd)}
-        
-        try:
-            r = requests.post(f"{API_BASE_URL}/api/estoque/entrada", headers=headers, json=dados)
-            if r.status_code == 201:
-                self.estoque_atualizado.emit()
-                QMessageBox.information(self, "Sucesso", "Entrada registrada!")
-                self.resetar()
-            else:
-                QMessageBox.warning(self, "Erro", r.json().get('erro'))
-        except requests.exceptions.RequestException:
+        self.btn_salvar.setEnabled(False)
+        em_segundo_plano(registar_movimento, 'Entrada', dados, self.input_codigo.text().strip(), self.label_nome.text(),
+                         ao_concluir=self.pos_salvar)
+
+    def pos_salvar(self, status, dados):
+        if status in (201, EM_FILA):
+            self.estoque_atualizado.emit()
+            QMessageBox.information(self, "Sucesso", "Entrada registrada!" if status == 201 else dados['mensagem'])
+            self.resetar()
+            return
+        self.btn_salvar.setEnabled(True)
+        if status == -1:
             show_connection_error_message(self)
+        else:
+            QMessageBox.warning(self, "Erro", dados.get('erro'))
 
     def resetar(self):
         self.produto_encontrado_id = None
@@ -1474,44 +1622,47 @@ class SaidaRapidaWidget(QWidget):
         cod = self.input_codigo.text().strip()
         if not cod: return
         
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
-        try:
-            r = requests.get(f"{API_BASE_URL}/api/produtos/codigo/{cod}", headers=headers)
-            if r.status_code == 200:
-                data = r.json()
-                self.produto_encontrado_id = data['id']
-                self.label_nome.setText(data['nome'])
-                self.label_nome.setStyleSheet("color: green; font-weight: bold;")
-                self.input_qtd.setEnabled(True)
-                self.input_motivo.setEnabled(True)
-                self.btn_salvar.setEnabled(True)
-                self.input_qtd.setFocus()
-            else:
-                self.label_nome.setText("Não encontrado")
-                self.produto_encontrado_id = None
-        except requests.exceptions.RequestException:
-            pass
+        produto = obter_catalogo().produto_por_codigo(cod)
+        if produto is not None:
+            self.pos_verificar(200, {'id': produto['id_produto'], 'nome': produto['nome']})
+            return
+        self.label_nome.setText("Buscando...")
+        api('get', f"/api/produtos/codigo/{cod}", self.pos_verificar)
+
+    def pos_verificar(self, status, data):
+        if status == 200:
+            self.produto_encontrado_id = data['id']
+            self.label_nome.setText(data['nome'])
+            self.label_nome.setStyleSheet("color: green; font-weight: bold;")
+            self.input_qtd.setEnabled(True)
+            self.input_motivo.setEnabled(True)
+            self.btn_salvar.setEnabled(True)
+            self.input_qtd.setFocus()
+        elif status == -1:
+            self.label_nome.setText("Aguardando...")
+        else:
+            self.label_nome.setText("Não encontrado")
+            self.produto_encontrado_id = None
 
     def salvar(self):
         qtd = self.input_qtd.text()
         motivo = self.input_motivo.text()
         if not self.produto_encontrado_id or not qtd or not motivo: return
         
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
         dados = {"id_produto": self.produto_encontrado_id, "quantidade": int(qtd), "motivo_saida": motivo}
-        
-        try:
-            r = requests.post(f"{API_BASE_URL}/api/estoque/saida", headers=headers, json=dados)
-            if r.status_code == 201:
-                self.estoque_atualizado.emit()
-                QMessageBox.information(self, "Sucesso", "Saída registrada!")
-                self.resetar()
-            else:
-                QMessageBox.warning(self, "Erro", r.json().get('erro'))
-        except requests.exceptions.RequestException:
-            pass
+        self.btn_salvar.setEnabled(False)
+        em_segundo_plano(registar_movimento, 'Saida', dados, self.input_codigo.text().strip(), self.label_nome.text(),
+                         ao_concluir=self.pos_salvar)
+
+    def pos_salvar(self, status, dados):
+        if status in (201, EM_FILA):
+            self.estoque_atualizado.emit()
+            QMessageBox.information(self, "Sucesso", "Saída registrada!" if status == 201 else dados['mensagem'])
+            self.resetar()
+            return
+        self.btn_salvar.setEnabled(True)
+        if status != -1:
+            QMessageBox.warning(self, "Erro", dados.get('erro'))
 
     def resetar(self):
         self.produto_encontrado_id = None
@@ -1524,7 +1675,7 @@ class SaidaRapidaWidget(QWidget):
         self.btn_salvar.setEnabled(False)
         self.input_codigo.setFocus()
 
-class UsuariosWidget(QWidget):
+class UsuariosWidget(CarregarAoMostrar, QWidget):
     def __init__(self):
         super().__init__()
         self.layout = QVBoxLayout(self)
@@ -1540,11 +1691,13 @@ class UsuariosWidget(QWidget):
         botoes.addWidget(self.btn_status)
         botoes.addStretch(1)
         
-        self.tabela = QTableWidget()
-        self.tabela.setColumnCount(4)
-        self.tabela.setHorizontalHeaderLabels(["Nome", "Login", "Permissão", "Status"])
+        self.tabela = TabelaDados([
+            Coluna("Nome", 'nome'),
+            Coluna("Login", 'login'),
+            Coluna("Permissão", 'permissao'),
+            Coluna("Status", 'ativo', formatar=lambda ativo: "Ativo" if ativo else "Inativo"),
+        ])
         self.tabela.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch)
-        self.tabela.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
         
         self.layout.addWidget(self.titulo)
         self.layout.addLayout(botoes)
@@ -1553,46 +1706,32 @@ class UsuariosWidget(QWidget):
         self.btn_add.clicked.connect(self.add)
         self.btn_edit.clicked.connect(self.edit)
         self.btn_status.clicked.connect(self.toggle_status)
+
+    def carregar_ao_mostrar(self):
         self.carregar()
 
     def carregar(self):
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
-        try:
-            r = requests.get(f"{API_BASE_URL}/api/usuarios", headers=headers)
-            if r.status_code == 200:
-                dados = r.json()
-                self.tabela.setRowCount(len(dados))
-                for i, u in enumerate(dados):
-                    item = QTableWidgetItem(u['nome'])
-                    item.setData(Qt.UserRole, u['id'])
-                    self.tabela.setItem(i, 0, item)
-                    self.tabela.setItem(i, 1, QTableWidgetItem(u['login']))
-                    self.tabela.setItem(i, 2, QTableWidgetItem(u['permissao']))
-                    self.tabela.setItem(i, 3, QTableWidgetItem("Ativo" if u['ativo'] else "Inativo"))
-        except requests.exceptions.RequestException:
-            pass
+        api('get', "/api/usuarios", self.pos_carregar)
+
+    def pos_carregar(self, status, dados):
+        if status == 200:
+            self.tabela.definir_dados(dados)
 
     def add(self):
         if FormularioUsuarioDialog(self).exec():
             self.carregar()
 
     def edit(self):
-        row = self.tabela.currentRow()
-        if row >= 0:
-            uid = self.tabela.item(row, 0).data(Qt.UserRole)
+        uid = self.tabela.id_atual()
+        if uid is not None:
             if FormularioUsuarioDialog(self, uid).exec():
                 self.carregar()
 
     def toggle_status(self):
-        row = self.tabela.currentRow()
-        if row >= 0:
-            uid = self.tabela.item(row, 0).data(Qt.UserRole)
+        uid = self.tabela.id_atual()
+        if uid is not None:
             if QMessageBox.question(self, "Confirmar", "Alterar status do usuário?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No) == QMessageBox.StandardButton.Yes:
-                global access_token
-                headers = {'Authorization': f'Bearer {access_token}'}
-                requests.delete(f"{API_BASE_URL}/api/usuarios/{uid}", headers=headers)
-                self.carregar()
+                api('delete', f"/api/usuarios/{uid}", lambda status, dados: self.carregar(), dono=self)
 
 class TerminalWidget(QWidget):
     ir_para_novo_produto = Signal()
@@ -1608,6 +1747,7 @@ class TerminalWidget(QWidget):
         self.barcode_timer.setSingleShot(True)
         self.barcode_timer.setInterval(200)
         self.produto_atual = None
+        self.pedido_busca = None
         
         header = QHBoxLayout()
         logo = QLabel()
@@ -1684,26 +1824,46 @@ class TerminalWidget(QWidget):
         self.barcode_buffer = ""
         if not cod: return
         
+        # Uma leitura nova substitui a anterior que ainda não tenha resposta.
+        if self.pedido_busca is not None:
+            self.pedido_busca.cancelar()
+
+        # Índice de códigos do catálogo local: a leitura aparece logo, mesmo sem
+        # ligação; com ligação o saldo é depois atualizado pelo do servidor.
+        produto = obter_catalogo().produto_por_codigo(cod)
+        if produto is not None:
+            self.produto_atual = produto
+            self.atualizar_display()
+            self.pedido_busca = api('get', f"/api/produtos/{produto['id_produto']}/estoque", self.pos_saldo)
+            return
+
         self.label_nome.setText("Buscando...")
-        QApplication.processEvents()
-        
-        global access_token
-        headers = {'Authorization': f'Bearer {access_token}'}
-        try:
-            r = requests.get(f"{API_BASE_URL}/api/estoque/saldos?search={cod}", headers=headers)
-            if r.status_code == 200 and r.json():
-                self.produto_atual = r.json()[0]
-                self.atualizar_display()
-            else:
-                self.produto_nao_encontrado()
-        except:
+        self.pedido_busca = api('get', "/api/estoque/saldos", self.pos_busca, params={'search': cod})
+
+    def pos_busca(self, status, dados):
+        if status == 200 and dados:
+            self.produto_atual = dados[0]
+            self.atualizar_display()
+        elif status == -1:
+            self.produto_atual = None
+            self.label_nome.setText("Sem ligação: código fora do catálogo local.")
+            self.resetar_tela(True)
+        else:
             self.produto_nao_encontrado()
 
+    def pos_saldo(self, status, dados):
+        p = self.produto_atual
+        if status == 200 and p is not None and p['id_produto'] == dados.get('id_produto'):
+            p['saldo_atual'] = dados['saldo_atual']
+            self.atualizar_display()
+
     def atualizar_display(self):
         p = self.produto_atual
+        # Os movimentos ainda na fila offline já contam no saldo mostrado.
+        saldo = p['saldo_atual'] + obter_fila().delta_pendente(p['id_produto'])
         self.label_nome.setText(p['nome'])
-        self.label_qtd.setText(str(p['saldo_atual']))
-        self.label_desc.setText(p.get('descricao', ''))
+        self.label_qtd.setText(str(saldo))
+        self.label_desc.setText(p.get('descricao') or '')
         self.label_code.setText(f"Código: {p['codigo']}")
         self.btn_add.setEnabled(True)
         self.btn_rem.setEnabled(True)
@@ -1735,7 +1895,7 @@ class TerminalWidget(QWidget):
 # CLASSES DE DOCUMENTOS 
 # ==============================================================================
 
-class DocumentacaoWidget(QWidget):
+class DocumentacaoWidget(CarregarAoMostrar, QWidget):
     def __init__(self, servico_id):
         super().__init__()
         self.servico_id = servico_id
@@ -1777,15 +1937,20 @@ class DocumentacaoWidget(QWidget):
         # Painel Lateral (Histórico)
         self.lista_hist = QListWidget()
         self.lista_hist.itemClicked.connect(self.ver_detalhes)
+        self.btn_baixar_hist = QPushButton("Baixar PDF")
+        self.btn_baixar_hist.clicked.connect(self.baixar_historico)
         self.btn_del_hist = QPushButton("Excluir Selecionado")
         self.btn_del_hist.clicked.connect(self.excluir_historico)
         
         l_dir = QVBoxLayout()
         l_dir.addWidget(self.lista_hist)
+        l_dir.addWidget(self.btn_baixar_hist)
         l_dir.addWidget(self.btn_del_hist)
         
         self.layout_princ.addWidget(self.stack, 2)
         self.layout_princ.addLayout(l_dir, 1)
+
+    def carregar_ao_mostrar(self):
         self.carregar_historico()
 
     # Métodos auxiliares de UI (simplificados)
@@ -1962,19 +2127,13 @@ class DocumentacaoWidget(QWidget):
 
     def gerar_final(self, files):
         dados_str = json.dumps(self.dados_form)
-        uploads = []
-        for p in files:
-            uploads.append(('anexos', (os.path.basename(p), open(p, 'rb'), 'application/pdf')))
+        self.widget_anexos.definir_estado("A enviar...")
             
-        self.thread_ger = QThread()
-        self.w_ger = GeracaoDocumentoWorker(self.servico_id, {'dados_formulario': dados_str}, uploads)
-        self.w_ger.moveToThread(self.thread_ger)
-        self.thread_ger.started.connect(self.w_ger.run)
-        self.w_ger.finished.connect(self.pos_geracao)
-        self.thread_ger.start()
+        em_segundo_plano(gerar_documento, self.servico_id, {'dados_formulario': dados_str}, list(files),
+                         ao_concluir=self.pos_geracao, ao_progresso=self.widget_anexos.definir_estado)
 
     def pos_geracao(self, status, data):
-        self.thread_ger.quit()
+        self.widget_anexos.definir_estado("")
         if status == 201:
             QMessageBox.information(self, "Sucesso", "Documento gerado!")
             self.carregar_historico()
@@ -1983,20 +2142,15 @@ class DocumentacaoWidget(QWidget):
             QMessageBox.critical(self, "Erro", f"Falha: {data.get('erro')}")
 
     def carregar_historico(self):
-        self.lista_hist.clear()
-        self.thread_h = QThread()
-        self.w_h = ApiWorker("get", f"/api/servicos/{self.servico_id}/documentos")
-        self.w_h.moveToThread(self.thread_h)
-        self.thread_h.started.connect(self.w_h.run)
-        self.w_h.finished.connect(self.pos_historico)
-        self.thread_h.start()
+        api('get', f"/api/servicos/{self.servico_id}/documentos", self.pos_historico)
 
     def pos_historico(self, status, data):
-        self.thread_h.quit()
+        self.lista_hist.clear()
         if status == 200:
             for doc in data:
                 i = QListWidgetItem(f"{doc['data_criacao']} - v{doc['versao']}")
                 i.setData(Qt.UserRole, doc['id'])
+                i.setData(Qt.UserRole + 1, f"servico_{self.servico_id}_v{doc['versao']}.pdf")
                 self.lista_hist.addItem(i)
 
     def ver_detalhes(self, item):
@@ -2004,18 +2158,31 @@ class DocumentacaoWidget(QWidget):
         # Implementar carregamento reverso para preencher campos se necessário
         pass
 
+    def baixar_historico(self):
+        item = self.lista_hist.currentItem()
+        if not item: return
+        did = item.data(Qt.UserRole)
+
+        path, _ = QFileDialog.getSaveFileName(self, "Salvar Documento", item.data(Qt.UserRole + 1), "PDF (*.pdf)")
+        if not path: return
+
+        self.btn_baixar_hist.setEnabled(False)
+        em_segundo_plano(baixar_ficheiro, 'get', f"/api/documentos/{did}/pdf", path, ao_concluir=self.pos_download)
+
+    def pos_download(self, status, detalhe):
+        self.btn_baixar_hist.setEnabled(True)
+        if status == 200:
+            QMessageBox.information(self, "Sucesso", "Documento salvo!")
+        else:
+            QMessageBox.warning(self, "Erro", f"Falha no download: {detalhe}")
+
     def excluir_historico(self):
         item = self.lista_hist.currentItem()
         if not item: return
         did = item.data(Qt.UserRole)
         
         if QMessageBox.question(self, "Excluir", "Apagar documento?", QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No) == QMessageBox.StandardButton.Yes:
-            self.thread_del = QThread()
-            self.w_del = ApiWorker("delete", f"/api/documentos/{did}")
-            self.w_del.moveToThread(self.thread_del)
-            self.thread_del.started.connect(self.w_del.run)
-            self.w_del.finished.connect(lambda s, d: self.carregar_historico())
-            self.thread_del.start()
+            api('delete', f"/api/documentos/{did}", lambda status, dados: self.carregar_historico(), dono=self)
 
 class DropArea(QLabel):
     filesDropped = Signal(list)
@@ -2032,19 +2199,39 @@ class DropArea(QLabel):
         urls = [u.toLocalFile() for u in e.mimeData().urls()]
         self.filesDropped.emit([u for u in urls if u.endswith('.pdf')])
 
-class GeracaoDocumentoWorker(QObject):
-    finished = Signal(int, dict)
-    def __init__(self, sid, data, files):
-        super().__init__()
-        self.sid, self.data, self.files = sid, data, files
-    
-    def run(self):
-        global access_token
+def gerar_documento(sid, data, caminhos):
+    """Envia o pedido de geração e acompanha a tarefa no servidor; o estado vai
+    sendo enviado como progresso do pedido."""
+    cliente = obter_cliente()
+    pedido = pedido_atual()
+    try:
+        ficheiros = [open(p, 'rb') for p in caminhos]
         try:
-            r = requests.post(f"{API_BASE_URL}/api/servicos/{self.sid}/documentos", headers={'Authorization': f'Bearer {access_token}'}, data=self.data, files=self.files, timeout=60)
-            self.finished.emit(r.status_code, r.json() if r.content else {})
-        except Exception as e:
-            self.finished.emit(-1, {"erro": str(e)})
+            uploads = [('anexos', (os.path.basename(p), f, 'application/pdf')) for p, f in zip(caminhos, ficheiros)]
+            r = cliente.pedido('post', f"/api/servicos/{sid}/documentos", data=data, files=uploads, timeout=300)
+        finally:
+            for f in ficheiros:
+                f.close()
+
+        if r.status_code != 202:
+            return r.status_code, r.json() if r.content else {}
+
+        url_estado = r.json()['url_estado']
+        limite = time.monotonic() + 30 * 60
+        while time.monotonic() < limite and not pedido.cancelado:
+            r = cliente.pedido('get', url_estado)
+            tarefa = r.json() if r.content else {}
+            if r.status_code != 200:
+                return r.status_code, tarefa
+            if tarefa.get('status') == 'Concluida':
+                return 201, tarefa
+            if tarefa.get('status') == 'Erro':
+                return 500, {"erro": tarefa.get('erro')}
+            pedido.progresso.emit(tarefa.get('status', ''))
+            time.sleep(1)
+        return -1, {"erro": "Tempo de espera pela geração esgotado."}
+    except Exception as e:
+        return -1, {"erro": str(e)}
 
 class AnexosWidget(QWidget):
     voltar_solicitado = Signal()
@@ -2059,19 +2246,26 @@ class AnexosWidget(QWidget):
         self.drop.filesDropped.connect(self.add_files)
         self.list = QListWidget()
         
+        self.label_estado = QLabel("")
+        
         btns = QHBoxLayout()
         b_voltar = QPushButton("Voltar")
-        b_gerar = QPushButton("Gerar Final")
+        self.b_gerar = QPushButton("Gerar Final")
         b_voltar.clicked.connect(self.voltar_solicitado.emit)
-        b_gerar.clicked.connect(lambda: self.gerar_documento_solicitado.emit(self.files))
+        self.b_gerar.clicked.connect(lambda: self.gerar_documento_solicitado.emit(self.files))
         
         btns.addWidget(b_voltar)
-        btns.addWidget(b_gerar)
+        btns.addWidget(self.b_gerar)
         
         l.addWidget(self.drop)
         l.addWidget(self.list)
+        l.addWidget(self.label_estado)
         l.addLayout(btns)
 
+    def definir_estado(self, texto):
+        self.label_estado.setText(f"Estado da geração: {texto}" if texto else "")
+        self.b_gerar.setEnabled(not texto)
+
     def add_files(self, fs):
         for f in fs:
             if f not in self.files:
@@ -2094,34 +2288,29 @@ class JanelaPrincipal(QMainWindow):
             
             self.stacked_widget = QStackedWidget()
             
-            self.tela_dash = DashboardWidget()
-            self.tela_estoque = GestaoEstoqueWidget()
-            self.tela_entrada = EntradaRapidaWidget()
-            self.tela_saida = SaidaRapidaWidget()
-            self.tela_rel = RelatoriosWidget()
-            self.tela_forn = FornecedoresWidget()
-            self.tela_nat = NaturezasWidget()
-            self.tela_user = None
-            self.tela_imp = ImportacaoWidget()
-            self.tela_term = TerminalWidget()
-            self.tela_doc = None
-            
-            self.stacked_widget.addWidget(self.tela_dash)
-            self.stacked_widget.addWidget(self.tela_estoque)
-            self.stacked_widget.addWidget(self.tela_entrada)
-            self.stacked_widget.addWidget(self.tela_saida)
-            self.stacked_widget.addWidget(self.tela_rel)
-            self.stacked_widget.addWidget(self.tela_forn)
-            self.stacked_widget.addWidget(self.tela_nat)
-            self.stacked_widget.addWidget(self.tela_imp)
-            self.stacked_widget.addWidget(self.tela_term)
+            # Cada tela só é construída (e só pede dados) na primeira navegação até ela.
+            self.fabricas = {
+                'tela_dash': DashboardWidget,
+                'tela_estoque': GestaoEstoqueWidget,
+                'tela_entrada': EntradaRapidaWidget,
+                'tela_saida': SaidaRapidaWidget,
+                'tela_rel': RelatoriosWidget,
+                'tela_forn': FornecedoresWidget,
+                'tela_nat': NaturezasWidget,
+                'tela_user': UsuariosWidget,
+                'tela_imp': ImportacaoWidget,
+                'tela_term': TerminalWidget,
+                'tela_doc': lambda: DocumentacaoWidget(1),
+            }
+            for atributo in self.fabricas:
+                setattr(self, atributo, None)
             
             # Menus
             bar = self.menuBar()
             m_arq = bar.addMenu("Arquivo")
             m_arq.addAction("Dashboard", self.mostrar_dash)
             self.act_tema = m_arq.addAction("Mudar Tema", self.trocar_tema)
-            m_arq.addAction("Mudar Senha", MudarSenhaDialog(self).exec)
+            m_arq.addAction("Mudar Senha", lambda: self.abrir_dialogo(MudarSenhaDialog))
             m_arq.addAction("Logoff", self.logoff_requested.emit)
             m_arq.addAction("Sair", self.close)
             
@@ -2137,12 +2326,13 @@ class JanelaPrincipal(QMainWindow):
             m_ops.addAction("Saída Rápida", self.mostrar_saida)
             m_ops.addAction("Terminal", self.mostrar_term)
             m_ops.addAction("Documentação", self.mostrar_doc)
+            m_ops.addAction("Movimentos por Enviar", lambda: self.abrir_dialogo(FilaMovimentosDialog))
             
             m_rel = bar.addMenu("Relatórios")
             m_rel.addAction("Gerar", self.mostrar_rel)
             
             m_ajuda = bar.addMenu("Ajuda")
-            m_ajuda.addAction("Sobre", SobreDialog(self).exec)
+            m_ajuda.addAction("Sobre", lambda: self.abrir_dialogo(SobreDialog))
             
             # Layout Principal
             central = QWidget()
@@ -2184,51 +2374,134 @@ class JanelaPrincipal(QMainWindow):
             layout.addWidget(sidebar)
             layout.addWidget(self.stacked_widget)
             
-            # Sinais cruzados
-            self.tela_dash.ir_para_produtos.connect(self.mostrar_estoque)
-            self.tela_dash.ir_para_entrada_rapida.connect(self.mostrar_entrada)
-            self.tela_term.ir_para_novo_produto.connect(self.novo_prod_estoque)
-            self.tela_entrada.estoque_atualizado.connect(self.tela_estoque.inventario_view.carregar_dados_inventario)
-            self.tela_saida.estoque_atualizado.connect(self.tela_estoque.inventario_view.carregar_dados_inventario)
-            self.tela_imp.produtos_importados_sucesso.connect(self.tela_estoque.inventario_view.carregar_dados_inventario)
-            
             self.statusBar().showMessage("Pronto.")
+            self.lbl_fila = QLabel()
+            self.statusBar().addPermanentWidget(self.lbl_fila)
+
+            # Fila offline: tenta reenviar enquanto houver movimentos pendentes.
+            self.a_enviar_fila = False
+            self.timer_fila = QTimer(self)
+            self.timer_fila.setInterval(15000)
+            self.timer_fila.timeout.connect(self.enviar_fila)
+            signal_handler.fila_alterada.connect(self.fila_alterada)
         except Exception:
             pass
 
+    def e_admin(self):
+        return self.dados_usuario.get('permissao') == 'Administrador'
+
     def carregar_dados_usuario(self, dados):
+        global id_usuario_atual
         self.dados_usuario = dados
-        if dados.get('permissao') == 'Administrador':
-            if not self.tela_user:
-                self.tela_user = UsuariosWidget()
-                self.stacked_widget.addWidget(self.tela_user)
-        else:
+        id_usuario_atual = dados.get('id')
+        # O terminal e as entradas/saídas rápidas leem os códigos do catálogo local,
+        # mesmo que o inventário (que também o sincroniza) nunca seja aberto.
+        em_segundo_plano(sincronizar_catalogo_local, obter_catalogo(), ao_concluir=self.pos_sincronizar_catalogo)
+        self.enviar_fila()
+        if self.tela_dash:
+            self.tela_dash.definir_admin(self.e_admin())
+        if not self.e_admin():
             self.btn_users.hide()
             self.act_users.setVisible(False)
 
+    def pos_sincronizar_catalogo(self, status, alterados):
+        if status == 200:
+            signal_handler.catalogo_sincronizado.emit()
+
+    # --- Fila offline de movimentos ---
+
+    def fila_alterada(self):
+        self.atualizar_estado_fila()
+        if not self.timer_fila.isActive():
+            self.timer_fila.start()
+
+    def atualizar_estado_fila(self):
+        pendentes, conflitos = obter_fila().contagem(id_usuario_atual)
+        partes = []
+        if pendentes:
+            partes.append(f"{pendentes} movimento(s) por enviar")
+        if conflitos:
+            partes.append(f"{conflitos} com conflito")
+        self.lbl_fila.setText(" | ".join(partes))
+        if not pendentes:
+            self.timer_fila.stop()
+        return pendentes
+
+    def enviar_fila(self):
+        if self.a_enviar_fila or not self.atualizar_estado_fila():
+            return
+        self.a_enviar_fila = True
+        em_segundo_plano(enviar_fila, obter_fila(), id_usuario_atual, ao_concluir=self.pos_enviar_fila)
+
+    def pos_enviar_fila(self, status, resultado):
+        self.a_enviar_fila = False
+        if self.atualizar_estado_fila() and not self.timer_fila.isActive():
+            self.timer_fila.start()
+        if resultado['enviados']:
+            self.statusBar().showMessage(f"{resultado['enviados']} movimento(s) offline enviados.", 10000)
+            self.estoque_alterado()
+        if resultado['conflitos']:
+            linhas = [f"• {m['tipo']} de {m['quantidade']} × {m['nome'] or m['codigo']} ({m['criado_em']}): {m['erro']}"
+                      for m in resultado['conflitos']]
+            QMessageBox.warning(self, "Movimentos Recusados",
+                "O servidor recusou movimentos feitos sem ligação:\n\n" + "\n".join(linhas) +
+                "\n\nReveja-os em Operações > Movimentos por Enviar.")
+
+    def obter_tela(self, atributo):
+        tela = getattr(self, atributo)
+        if tela is None:
+            inicio = time.perf_counter()
+            tela = self.fabricas[atributo]()
+            setattr(self, atributo, tela)
+            self.stacked_widget.addWidget(tela)
+            self._ligar_tela(atributo, tela)
+            registar_tempo(f"construção de {type(tela).__name__}", inicio)
+        return tela
+
+    def _ligar_tela(self, atributo, tela):
+        # Sinais cruzados
+        if atributo == 'tela_dash':
+            tela.ir_para_produtos.connect(self.mostrar_estoque)
+            tela.ir_para_entrada_rapida.connect(self.mostrar_entrada)
+            tela.definir_admin(self.e_admin())
+        elif atributo == 'tela_term':
+            tela.ir_para_novo_produto.connect(self.novo_prod_estoque)
+        elif atributo in ('tela_entrada', 'tela_saida'):
+            tela.estoque_atualizado.connect(self.estoque_alterado)
+        elif atributo == 'tela_imp':
+            tela.produtos_importados_sucesso.connect(self.estoque_alterado)
+
+    def estoque_alterado(self):
+        # Um inventário ainda por construir já carrega os dados atuais quando aparecer.
+        if self.tela_estoque and self.tela_estoque.inventario_view.carregada:
+            self.tela_estoque.inventario_view.carregar_dados_inventario()
+
+    def abrir_dialogo(self, classe):
+        dialogo = classe(self)
+        dialogo.exec()
+        dialogo.deleteLater()
+
+    def mostrar(self, atributo):
+        tela = self.obter_tela(atributo)
+        self.stacked_widget.setCurrentWidget(tela)
+        return tela
+
     def novo_prod_estoque(self):
-        self.mostrar_estoque()
-        self.tela_estoque.inventario_view.abrir_formulario_adicionar()
+        self.mostrar_estoque().inventario_view.abrir_formulario_adicionar()
 
     def mostrar_dash(self): 
-        self.tela_dash.carregar_dados_dashboard(self.dados_usuario.get('nome', ''))
-        self.stacked_widget.setCurrentWidget(self.tela_dash)
-    def mostrar_estoque(self): self.stacked_widget.setCurrentWidget(self.tela_estoque)
-    def mostrar_entrada(self): self.stacked_widget.setCurrentWidget(self.tela_entrada)
-    def mostrar_saida(self): self.stacked_widget.setCurrentWidget(self.tela_saida)
-    def mostrar_rel(self): self.stacked_widget.setCurrentWidget(self.tela_rel)
-    def mostrar_forn(self): self.stacked_widget.setCurrentWidget(self.tela_forn)
-    def mostrar_nat(self): self.stacked_widget.setCurrentWidget(self.tela_nat)
-    def mostrar_imp(self): self.stacked_widget.setCurrentWidget(self.tela_imp)
-    def mostrar_term(self): self.stacked_widget.setCurrentWidget(self.tela_term)
+        self.mostrar('tela_dash').carregar_dados_dashboard(self.dados_usuario.get('nome', ''))
+    def mostrar_estoque(self): return self.mostrar('tela_estoque')
+    def mostrar_entrada(self): self.mostrar('tela_entrada')
+    def mostrar_saida(self): self.mostrar('tela_saida')
+    def mostrar_rel(self): self.mostrar('tela_rel')
+    def mostrar_forn(self): self.mostrar('tela_forn')
+    def mostrar_nat(self): self.mostrar('tela_nat')
+    def mostrar_imp(self): self.mostrar('tela_imp')
+    def mostrar_term(self): self.mostrar('tela_term')
     def mostrar_user(self): 
-        if self.tela_user: self.stacked_widget.setCurrentWidget(self.tela_user)
-    
-    def mostrar_doc(self):
-        if not self.tela_doc:
-            self.tela_doc = DocumentacaoWidget(1)
-            self.stacked_widget.addWidget(self.tela_doc)
-        self.stacked_widget.setCurrentWidget(self.tela_doc)
+        if self.e_admin(): self.mostrar('tela_user')
+    def mostrar_doc(self): self.mostrar('tela_doc')
 
     def trocar_tema(self):
         global CURRENT_THEME
@@ -2238,6 +2511,76 @@ class JanelaPrincipal(QMainWindow):
         self.act_tema.setText("Tema Claro" if novo == "dark" else "Tema Escuro")
         QSettings("Empresa", "Estoque").setValue("theme", novo)
 
+class FilaMovimentosDialog(QDialog):
+    """Movimentos feitos sem ligação e ainda não aceites pelo servidor."""
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.janela = parent
+        self.setWindowTitle("Movimentos por Enviar")
+        self.setMinimumSize(760, 360)
+        l = QVBoxLayout(self)
+
+        self.tabela = QTableWidget(0, 6)
+        self.tabela.setHorizontalHeaderLabels(["Data/Hora", "Tipo", "Produto", "Qtd.", "Estado", "Erro"])
+        self.tabela.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.ResizeToContents)
+        self.tabela.horizontalHeader().setStretchLastSection(True)
+        self.tabela.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.tabela.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+
+        botoes = QHBoxLayout()
+        self.btn_repetir = QPushButton("Tentar de Novo")
+        self.btn_descartar = QPushButton("Descartar")
+        self.btn_descartar.setObjectName("btnNegative")
+        btn_fechar = QPushButton("Fechar")
+        botoes.addWidget(self.btn_repetir)
+        botoes.addWidget(self.btn_descartar)
+        botoes.addStretch(1)
+        botoes.addWidget(btn_fechar)
+
+        l.addWidget(QLabel("Os conflitos foram recusados pelo servidor (ex.: estoque insuficiente). "
+                           "Corrija o estoque e tente de novo, ou descarte o movimento."))
+        l.addWidget(self.tabela)
+        l.addLayout(botoes)
+
+        self.btn_repetir.clicked.connect(self.repetir)
+        self.btn_descartar.clicked.connect(self.descartar)
+        btn_fechar.clicked.connect(self.accept)
+        self.carregar()
+
+    def carregar(self):
+        self.movimentos = obter_fila().movimentos(id_usuario_atual)
+        self.tabela.setRowCount(len(self.movimentos))
+        for i, m in enumerate(self.movimentos):
+            valores = [m['criado_em'], m['tipo'], f"{m['codigo']} - {m['nome']}", str(m['quantidade']),
+                       "Conflito" if m['estado'] == 'conflito' else "Pendente", m['erro'] or '']
+            for j, valor in enumerate(valores):
+                self.tabela.setItem(i, j, QTableWidgetItem(valor))
+
+    def selecionados(self, estado=None):
+        linhas = {i.row() for i in self.tabela.selectedIndexes()}
+        return [self.movimentos[i] for i in sorted(linhas) if estado is None or self.movimentos[i]['estado'] == estado]
+
+    def repetir(self):
+        for m in self.selecionados('conflito'):
+            obter_fila().repor(m['id'])
+        self.carregar()
+        if self.janela is not None:
+            self.janela.enviar_fila()
+
+    def descartar(self):
+        movimentos = self.selecionados()
+        if not movimentos:
+            return
+        if QMessageBox.question(self, "Descartar", f"Descartar {len(movimentos)} movimento(s)? Não serão registados no servidor.",
+                                QMessageBox.StandardButton.Yes | QMessageBox.StandardButton.No) != QMessageBox.StandardButton.Yes:
+            return
+        for m in movimentos:
+            obter_fila().descartar(m['id'])
+        self.carregar()
+        if self.janela is not None:
+            self.janela.atualizar_estado_fila()
+
 class SobreDialog(QDialog):
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -2286,6 +2629,11 @@ class DashboardWidget(QWidget):
         b_ent = QPushButton("Entrada Rápida")
         b_ent.clicked.connect(self.ir_para_entrada_rapida.emit)
         acoes.addWidget(b_ent)
+        self.b_recalcular = QPushButton("Recalcular KPIs")
+        self.b_recalcular.setToolTip("Reconstrói os indicadores a partir dos dados e mostra eventuais diferenças.")
+        self.b_recalcular.clicked.connect(self.recalcular_kpis)
+        self.b_recalcular.hide()
+        acoes.addWidget(self.b_recalcular)
         
         l.addWidget(topo)
         l.addLayout(kpis)
@@ -2308,20 +2656,61 @@ class DashboardWidget(QWidget):
 
     def carregar_dados_dashboard(self, nome):
         self.lbl_nome.setText(f"Olá, {nome.split()[0]}!")
-        global access_token
+        api('get', "/api/dashboard/kpis", self.pos_kpis)
+
+    def pos_kpis(self, status, d):
+        if status == 200:
+            self.kpi_prod.lbl_val.setText(str(d.get('total_produtos', 0)))
+            self.kpi_forn.lbl_val.setText(str(d.get('total_fornecedores', 0)))
+            self.kpi_val.lbl_val.setText(f"R$ {d.get('valor_total_estoque', 0):.2f}")
+
+    def definir_admin(self, admin):
+        self.b_recalcular.setVisible(admin)
+
+    def recalcular_kpis(self):
+        self.b_recalcular.setEnabled(False)
+        api('post', "/api/dashboard/kpis/recalcular", self.pos_recalcular, timeout=120)
+
+    def pos_recalcular(self, status, d):
+        self.b_recalcular.setEnabled(True)
+        if status < 0:
+            QMessageBox.critical(self, "Erro", d.get('erro', ''))
+            return
+        if status != 200:
+            QMessageBox.warning(self, "Erro", d.get('erro', 'Falha ao recalcular.'))
+            return
         try:
-            r = requests.get(f"{API_BASE_URL}/api/dashboard/kpis", headers={'Authorization': f'Bearer {access_token}'})
-            if r.status_code == 200:
-                d = r.json()
-                self.kpi_prod.lbl_val.setText(str(d.get('total_produtos', 0)))
-                self.kpi_forn.lbl_val.setText(str(d.get('total_fornecedores', 0)))
-                self.kpi_val.lbl_val.setText(f"R$ {d.get('valor_total_estoque', 0):.2f}")
-        except: pass
+            v = d['valores']
+            self.kpi_prod.lbl_val.setText(str(v['total_produtos']))
+            self.kpi_forn.lbl_val.setText(str(v['total_fornecedores']))
+            self.kpi_val.lbl_val.setText(f"R$ {v['valor_total_estoque']:.2f}")
+
+            if d['com_desvio']:
+                dv = d['desvio']
+                QMessageBox.warning(self, "KPIs corrigidos",
+                    f"Foram encontradas diferenças nos valores incrementais:\n"
+                    f"Produtos: {dv['total_produtos']:+d}\n"
+                    f"Fornecedores: {dv['total_fornecedores']:+d}\n"
+                    f"Valor em estoque: R$ {dv['valor_total_estoque']:+.2f}")
+            else:
+                QMessageBox.information(self, "KPIs", "Os indicadores já estavam corretos.")
+        except Exception as e:
+            QMessageBox.critical(self, "Erro", str(e))
 
 # ==============================================================================
 # 6. LOGIN E EXECUÇÃO
 # ==============================================================================
 
+def autenticar(login, senha):
+    obter_cliente().definir_token(None)
+    status, dados = _pedido_http('post', '/api/login', 15, {'json': {"login": login, "senha": senha}})
+    if status != 200:
+        return status, dados
+    obter_cliente().definir_token(dados['access_token'])
+    # Pega dados do usuário
+    status, me = _pedido_http('get', '/api/usuario/me', 15, {})
+    return 200, me if status == 200 else {}
+
 class JanelaLogin(QMainWindow):
     login_successful = Signal(dict)
 
@@ -2350,37 +2739,37 @@ class JanelaLogin(QMainWindow):
         self.in_pass = QLineEdit()
         self.in_pass.setPlaceholderText("Senha")
         self.in_pass.setEchoMode(QLineEdit.EchoMode.Password)
-        btn = QPushButton("Entrar")
+        self.btn_entrar = QPushButton("Entrar")
         
         ld.addWidget(QLabel("<h2>Login</h2>"))
         ld.addWidget(self.in_user)
         ld.addWidget(self.in_pass)
-        ld.addWidget(btn)
+        ld.addWidget(self.btn_entrar)
         
         l.addWidget(esq, 1)
         l.addWidget(dir, 1)
         
-        btn.clicked.connect(self.logar)
+        self.btn_entrar.clicked.connect(self.logar)
         self.in_pass.returnPressed.connect(self.logar)
 
     def logar(self):
         u = self.in_user.text()
         p = self.in_pass.text()
-        if not u or not p: return
-        
-        global access_token
-        try:
-            r = requests.post(f"{API_BASE_URL}/api/login", json={"login": u, "senha": p})
-            if r.status_code == 200:
-                access_token = r.json()['access_token']
-                # Pega dados do usuário
-                me = requests.get(f"{API_BASE_URL}/api/usuario/me", headers={'Authorization': f'Bearer {access_token}'})
-                self.login_successful.emit(me.json() if me.status_code == 200 else {})
-                self.close()
-            else:
-                QMessageBox.warning(self, "Erro", "Login inválido")
-        except:
+        # O Enter na senha chega aqui mesmo com o botão desativado (ex.: servidor a arrancar).
+        if not u or not p or not self.btn_entrar.isEnabled(): return
+
+        self.btn_entrar.setEnabled(False)
+        em_segundo_plano(autenticar, u, p, ao_concluir=self.pos_login)
+
+    def pos_login(self, status, dados):
+        self.btn_entrar.setEnabled(True)
+        if status == 200:
+            self.login_successful.emit(dados)
+            self.close()
+        elif status < 0:
             show_connection_error_message(self)
+        else:
+            QMessageBox.warning(self, "Erro", "Login inválido")
 
 class AppManager:
     def __init__(self):
@@ -2391,16 +2780,25 @@ class AppManager:
         self.login = JanelaLogin()
         self.login.login_successful.connect(self.open_main)
         self.login.showMaximized()
+        QTimer.singleShot(0, lambda: registar_tempo("janela de login visível"))
     
     def open_main(self, user_data):
+        inicio = time.perf_counter()
         self.main = JanelaPrincipal()
         self.main.carregar_dados_usuario(user_data)
-        self.main.show()
         self.main.mostrar_dash()
+        self.main.show()
         self.main.logoff_requested.connect(self.logout)
+        # Corre quando o ciclo de eventos volta a ficar livre, ou seja, com a janela já desenhada.
+        QTimer.singleShot(0, lambda: registar_tempo("login -> janela principal visível", inicio))
         check_for_updates()
     
     def logout(self):
+        global id_usuario_atual
+        self.main.timer_fila.stop()
+        id_usuario_atual = None
+        obter_executor().cancelar_todos()
+        obter_cliente().definir_token(None)
         self.main.close()
         self.start()
 
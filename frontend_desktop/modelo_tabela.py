@@ -0,0 +1,197 @@
+from collections import namedtuple
+
+from PySide6.QtWidgets import QTableView, QAbstractItemView, QHeaderView
+from PySide6.QtCore import Qt, QAbstractTableModel, QSortFilterProxyModel, QModelIndex
+
+# ==============================================================================
+# MODELO DE TABELA (model/view)
+# ==============================================================================
+# Os dados ficam numa lista por coluna e o Qt só pede as células visíveis, em
+# vez de um QTableWidgetItem por célula. A ordenação reordena essas listas (em
+# Python, de uma vez) em vez de recriar a tabela. O filtro também fica no
+# modelo (uma lista das linhas visíveis): um QSortFilterProxyModel chamaria
+# filterAcceptsRow em Python para cada linha a cada tecla.
+
+# formatar: valor -> texto mostrado; chave_ordem: valor -> chave de ordenação.
+Coluna = namedtuple('Coluna', 'titulo chave alinhamento formatar chave_ordem', defaults=(None, None, None))
+
+
+def texto(valor):
+    return '' if valor is None else str(valor)
+
+
+def ordem_padrao(valor):
+    if valor is None:
+        return ''
+    if isinstance(valor, (int, float)):
+        return valor
+    return str(valor).lower()
+
+
+def ordem_numerica(valor):
+    try:
+        return float(valor)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def ordem_data_hora(valor):
+    # 'dd/mm/aaaa hh:mm:ss' (formato dos relatórios) -> 'aaaammdd hh:mm:ss'
+    valor = valor or ''
+    return valor[6:10] + valor[3:5] + valor[0:2] + valor[10:]
+
+
+class ModeloTabela(QAbstractTableModel):
+    def __init__(self, colunas, chave_id='id', parent=None):
+        super().__init__(parent)
+        self.colunas = colunas
+        self.chave_id = chave_id
+        self.ids = []
+        self.valores = [[] for _ in colunas]
+        self.ordem = (-1, Qt.SortOrder.AscendingOrder)
+        self.filtro = None
+        # Posições (em ids/valores) das linhas visíveis; None = todas.
+        self.linhas = None
+
+    def definir_dados(self, dados):
+        self.beginResetModel()
+        self.ids = [d.get(self.chave_id) for d in dados]
+        self.valores = [[d.get(c.chave) for d in dados] for c in self.colunas]
+        self._aplicar_filtro()
+        self.endResetModel()
+        if self.ordem[0] >= 0:
+            self.sort(*self.ordem)
+
+    def filtrar_ids(self, ids):
+        """Mostra só as linhas com estes ids; None mostra todas."""
+        self.beginResetModel()
+        self.filtro = None if ids is None else set(ids)
+        self._aplicar_filtro()
+        self.endResetModel()
+
+    def _aplicar_filtro(self):
+        if self.filtro is None:
+            self.linhas = None
+        else:
+            filtro = self.filtro
+            self.linhas = [i for i, id_ in enumerate(self.ids) if id_ in filtro]
+
+    def posicao(self, linha):
+        """Linha visível -> posição em ids/valores."""
+        return linha if self.linhas is None else self.linhas[linha]
+
+    def id_linha(self, linha):
+        return self.ids[self.posicao(linha)]
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.ids) if self.linhas is None else len(self.linhas)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.colunas)
+
+    def headerData(self, secao, orientacao, role=Qt.ItemDataRole.DisplayRole):
+        if orientacao == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return self.colunas[secao].titulo
+        return None
+
+    def data(self, index, role=Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        coluna = self.colunas[index.column()]
+        if role == Qt.ItemDataRole.DisplayRole:
+            valor = self.valores[index.column()][self.posicao(index.row())]
+            return (coluna.formatar or texto)(valor)
+        if role == Qt.ItemDataRole.UserRole:
+            return self.id_linha(index.row())
+        if role == Qt.ItemDataRole.TextAlignmentRole and coluna.alinhamento is not None:
+            return coluna.alinhamento | Qt.AlignmentFlag.AlignVCenter
+        return None
+
+    def valor(self, linha, chave):
+        for i, coluna in enumerate(self.colunas):
+            if coluna.chave == chave:
+                return self.valores[i][self.posicao(linha)]
+        return None
+
+    def sort(self, coluna, ordem=Qt.SortOrder.AscendingOrder):
+        self.ordem = (coluna, ordem)
+        if coluna < 0 or not self.ids:
+            return
+        chave = self.colunas[coluna].chave_ordem or ordem_padrao
+        valores = self.valores[coluna]
+        self.layoutAboutToBeChanged.emit()
+        permutacao = sorted(range(len(self.ids)), key=lambda i: chave(valores[i]),
+                            reverse=ordem == Qt.SortOrder.DescendingOrder)
+        self.ids = [self.ids[i] for i in permutacao]
+        self.valores = [[lista[i] for i in permutacao] for lista in self.valores]
+
+        nova_posicao = [0] * len(permutacao)
+        for nova, antiga in enumerate(permutacao):
+            nova_posicao[antiga] = nova
+        linhas_antigas = self.linhas
+        self._aplicar_filtro()
+        if self.linhas is None:
+            nova_linha = nova_posicao
+        else:
+            # posição antiga -> linha visível nova
+            visivel = {posicao: linha for linha, posicao in enumerate(self.linhas)}
+            nova_linha = [visivel[nova_posicao[p]] for p in linhas_antigas]
+        antigos = self.persistentIndexList()
+        self.changePersistentIndexList(antigos, [self.index(nova_linha[i.row()], i.column()) for i in antigos])
+        self.layoutChanged.emit()
+
+
+class ProxyTabela(QSortFilterProxyModel):
+    """Ordena no modelo de origem (listas por coluna) em vez de no proxy."""
+
+    def sort(self, coluna, ordem=Qt.SortOrder.AscendingOrder):
+        self.sourceModel().sort(coluna, ordem)
+
+
+class TabelaDados(QTableView):
+    """QTableView só de leitura com ModeloTabela + ProxyTabela; ordena ao clicar no cabeçalho."""
+
+    def __init__(self, colunas, chave_id='id', parent=None):
+        super().__init__(parent)
+        self.modelo = ModeloTabela(colunas, chave_id, self)
+        self.proxy = ProxyTabela(self)
+        self.proxy.setSourceModel(self.modelo)
+        self.setModel(self.proxy)
+
+        self.setEditTriggers(QAbstractItemView.EditTrigger.NoEditTriggers)
+        self.setSelectionBehavior(QAbstractItemView.SelectionBehavior.SelectRows)
+        self.setWordWrap(False)
+        # Altura fixa: medir o conteúdo obrigaria a percorrer todas as linhas.
+        self.verticalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Fixed)
+        self.verticalHeader().setDefaultSectionSize(self.fontMetrics().height() + 10)
+        self.horizontalHeader().setSortIndicator(-1, Qt.SortOrder.AscendingOrder)
+        self.setSortingEnabled(True)
+
+    def definir_dados(self, dados):
+        self.modelo.definir_dados(dados)
+
+    def filtrar_ids(self, ids):
+        self.modelo.filtrar_ids(ids)
+
+    def _linha_origem(self, index):
+        return self.proxy.mapToSource(index).row()
+
+    def linha_atual(self):
+        """Linha (no modelo de origem) do item atual, ou -1."""
+        index = self.currentIndex()
+        if not index.isValid():
+            return -1
+        return self._linha_origem(index)
+
+    def id_atual(self):
+        linha = self.linha_atual()
+        return self.modelo.id_linha(linha) if linha >= 0 else None
+
+    def valor_atual(self, chave):
+        linha = self.linha_atual()
+        return self.modelo.valor(linha, chave) if linha >= 0 else None
+
+    def ids_selecionados(self):
+        return [self.modelo.id_linha(self._linha_origem(i)) for i in self.selectionModel().selectedRows()]
@@ -1,46 +1,116 @@
 import sys
 import os
-import threading
+import secrets
 import traceback
-from waitress import serve
-from PySide6.QtWidgets import QApplication, QMessageBox
 
 # --- Configuração de Caminho ---
 backend_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'backend'))
 sys.path.insert(0, backend_path)
 
+# --- Base de Dados Embutida (SQLite) ---
+from config import BASE_EMBUTIDA
+caminho_base_embutida = None
+if BASE_EMBUTIDA and not os.getenv('DATABASE_URL'):
+    pasta_dados = os.path.join(os.path.expanduser("~"), "PyStock")
+    os.makedirs(pasta_dados, exist_ok=True)
+    caminho_base_embutida = os.path.join(pasta_dados, 'estoque.db')
+    os.environ['DATABASE_URL'] = 'sqlite:///' + caminho_base_embutida.replace('\\', '/')
+
+# --- Modo Servidor ---
+# O run.py relança-se com --servidor para correr o Flask noutro processo: assim
+# relatórios, JSON e hashing de senhas não disputam o GIL com a interface.
+# Este ramo não importa o PySide6, e a interface não importa o Flask.
+if '--servidor' in sys.argv:
+    from app import inicializar_base, atualizar_esquema, PASTA_MIGRACOES
+    from run_server import servir_processo_filho
+
+    if BASE_EMBUTIDA:
+        # Uma base embutida de uma versão anterior recebe aqui as colunas e restrições novas.
+        if os.path.isdir(PASTA_MIGRACOES):
+            atualizar_esquema()
+        # A senha do primeiro administrador é aleatória; a interface gerou-a e mostra-a.
+        senha = os.getenv('SENHA_ADMIN_INICIAL')
+        if senha:
+            if inicializar_base('admin', senha):
+                print("Base embutida criada com o utilizador admin.", flush=True)
+        else:
+            # Base sem utilizadores que não é nova (ex.: um arranque anterior falhou): a senha fica no log.
+            senha = secrets.token_urlsafe(9)
+            if inicializar_base('admin', senha):
+                print(f"Base embutida criada com o utilizador admin / {senha}. Altere a senha.", flush=True)
+        # Com a base embutida o servidor só serve esta interface: não fica exposto à rede.
+        servir_processo_filho('127.0.0.1', 5000)
+    else:
+        servir_processo_filho('0.0.0.0', 5000)
+    sys.exit(0)
+
 # --- Imports do Nosso Projeto ---
-from app import app
+from PySide6.QtCore import Qt
+from PySide6.QtWidgets import QApplication, QMessageBox
 from main_ui import AppManager, resource_path
+from servidor_embutido import ServidorEmbutido
 
-# --- Função para Rodar o Servidor ---
-def run_server():
-    """Inicia o servidor Flask usando Waitress em uma porta específica."""
-    print("Iniciando servidor Flask em segundo plano...")
-    serve(app, host='0.0.0.0', port=5000)
+def mostrar_senha_inicial(login, senha):
+    """Primeira execução com base embutida: mostra a senha gerada para o admin."""
+    login.in_user.setText('admin')
+    login.in_pass.setText(senha)
+    msg_box = QMessageBox(login)
+    msg_box.setIcon(QMessageBox.Icon.Information)
+    msg_box.setWindowTitle("Primeira execução")
+    msg_box.setText(f"Foi criado o utilizador administrador da base local.\n\nLogin: admin\nSenha: {senha}")
+    msg_box.setInformativeText("Guarde esta senha: não volta a ser mostrada. Pode alterá-la depois em Usuários.")
+    msg_box.setTextInteractionFlags(Qt.TextInteractionFlag.TextSelectableByMouse)
+    msg_box.exec()
 
 # --- Bloco de Execução Principal ---
 if __name__ == "__main__":
     # Bloco de depuração global para apanhar qualquer erro que impeça a aplicação de iniciar
     try:
-        # 1. Inicia o servidor em uma thread separada
-        server_thread = threading.Thread(target=run_server, daemon=True)
-        server_thread.start()
-        
+        app_qt = QApplication(sys.argv)
+
+        # 1. Inicia o servidor num processo filho; o login espera que ele responda.
+        # Numa base embutida nova, o filho cria o administrador com esta senha.
+        senha_inicial = None
+        if caminho_base_embutida and not os.path.exists(caminho_base_embutida):
+            senha_inicial = secrets.token_urlsafe(9)
+            os.environ['SENHA_ADMIN_INICIAL'] = senha_inicial
+        print("Iniciando servidor Flask num processo separado...")
+        servidor = ServidorEmbutido(porta=5000)
+        app_qt.aboutToQuit.connect(servidor.parar)
+        servidor.iniciar()
+
         # 2. Inicia a aplicação PySide6 (front-end)
         print("Iniciando a interface gráfica...")
-        app_qt = QApplication(sys.argv)
-        
         try:
             with open(resource_path("style.qss"), "r", encoding="utf-8") as f:
                 app_qt.setStyleSheet(f.read())
         except FileNotFoundError:
             print("AVISO: Arquivo de estilo (style.qss) não encontrado.")
-        
+
         # Cria o gestor e inicia a aplicação
         manager = AppManager()
         manager.start()
-        
+
+        btn_entrar = manager.login.btn_entrar
+        if not servidor.e_pronto:
+            btn_entrar.setEnabled(False)
+            btn_entrar.setText("A iniciar o servidor...")
+
+        def servidor_pronto():
+            btn_entrar.setText("Entrar")
+            btn_entrar.setEnabled(True)
+            if senha_inicial:
+                mostrar_senha_inicial(manager.login, senha_inicial)
+
+        def servidor_falhou(mensagem):
+            btn_entrar.setText("Servidor indisponível")
+            QMessageBox.critical(manager.login, "Erro no Servidor", mensagem)
+
+        servidor.pronto.connect(servidor_pronto)
+        servidor.falhou.connect(servidor_falhou)
+        if servidor.e_pronto:
+            servidor_pronto()
+
         sys.exit(app_qt.exec())
 
     except Exception as e:
@@ -50,8 +120,8 @@ if __name__ == "__main__":
             f.write(f"Ocorreu um erro fatal na aplicação:\n\n")
             f.write(f"{e}\n\n")
             f.write(traceback.format_exc())
-        
+
         # Mostra uma mensagem simples a avisar o utilizador
-        error_app = QApplication(sys.argv)
+        error_app = QApplication.instance() or QApplication(sys.argv)
         QMessageBox.critical(None, "Erro Crítico", f"A aplicação falhou ao iniciar. Verifique o ficheiro 'crash_log.txt' no seu Ambiente de Trabalho para mais detalhes.")
         sys.exit(1)
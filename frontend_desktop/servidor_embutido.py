@@ -0,0 +1,139 @@
+import os
+import sys
+import time
+import threading
+import subprocess
+
+import requests
+from PySide6.QtCore import QObject, Signal
+
+# ==============================================================================
+# SERVIDOR EMBUTIDO NUM PROCESSO FILHO
+# ==============================================================================
+# O run.py lança o servidor noutro processo (o próprio executável com
+# --servidor), para que relatórios, JSON e hashing de senhas não disputem o GIL
+# com a interface. Este módulo espera que ele responda no /api/saude, copia o
+# log dele para a consola e para ~/PyStock/servidor.log, volta a lançá-lo se
+# morrer e pára-o quando a interface fecha.
+
+PASTA_DADOS = os.path.join(os.path.expanduser("~"), "PyStock")
+TAMANHO_MAXIMO_LOG = 5 * 1024 * 1024
+TEMPO_ARRANQUE = float(os.getenv('SERVIDOR_TEMPO_ARRANQUE', '60'))
+TEMPO_PARAGEM = 10
+MAXIMO_REINICIOS = 5
+
+
+def comando_servidor():
+    if getattr(sys, 'frozen', False):
+        # Executável do PyInstaller: sys.executable é o próprio run.exe.
+        return [sys.executable, '--servidor']
+    return [sys.executable, os.path.abspath(sys.argv[0]), '--servidor']
+
+
+class ServidorEmbutido(QObject):
+    pronto = Signal()
+    falhou = Signal(str)
+
+    def __init__(self, porta=5000, comando=None):
+        super().__init__()
+        self.url_saude = f"http://127.0.0.1:{porta}/api/saude"
+        self.comando = comando or comando_servidor()
+        self.processo = None
+        self.a_parar = False
+        self.e_pronto = False
+        self.reinicios = 0
+        self.lock = threading.Lock()
+        self.log = self._abrir_log()
+
+    def _abrir_log(self):
+        os.makedirs(PASTA_DADOS, exist_ok=True)
+        caminho = os.path.join(PASTA_DADOS, "servidor.log")
+        if os.path.exists(caminho) and os.path.getsize(caminho) > TAMANHO_MAXIMO_LOG:
+            os.replace(caminho, caminho + ".1")
+        return open(caminho, "a", encoding="utf-8", buffering=1)
+
+    def _registar(self, linha):
+        linha = linha.rstrip()
+        if sys.stdout is not None:
+            print(f"[servidor] {linha}", flush=True)
+        self.log.write(f"{time.strftime('%Y-%m-%d %H:%M:%S')} {linha}\n")
+
+    # --- Arranque ---
+
+    def iniciar(self):
+        with self.lock:
+            if self.a_parar:
+                return
+            flags = subprocess.CREATE_NO_WINDOW if sys.platform == 'win32' else 0
+            ambiente = dict(os.environ, PYTHONUNBUFFERED='1', PYTHONIOENCODING='utf-8')
+            self.processo = subprocess.Popen(
+                self.comando, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                env=ambiente, creationflags=flags
+            )
+            processo = self.processo
+        self._registar(f"processo do servidor iniciado (pid {processo.pid})")
+        threading.Thread(target=self._reencaminhar_log, args=(processo,), name='log-servidor', daemon=True).start()
+        threading.Thread(target=self._aguardar_pronto, args=(processo,), name='saude-servidor', daemon=True).start()
+
+    def _responde(self):
+        try:
+            return requests.get(self.url_saude, timeout=1).status_code == 200
+        except requests.exceptions.RequestException:
+            return False
+
+    def _aguardar_pronto(self, processo):
+        limite = time.monotonic() + TEMPO_ARRANQUE
+        while time.monotonic() < limite and not self.a_parar:
+            if self._responde():
+                if processo.poll() is not None:
+                    # O filho saiu (porta ocupada) mas já há um servidor nesta porta.
+                    self._registar("a usar o servidor que já estava a correr nesta porta")
+                self._marcar_pronto()
+                return
+            if processo.poll() is not None:
+                if not self.e_pronto:
+                    self.falhou.emit(f"O servidor terminou ao arrancar (código {processo.returncode}). "
+                                     f"Veja {self.log.name}.")
+                return
+            time.sleep(0.2)
+        if not self.a_parar and not self.e_pronto:
+            self.falhou.emit(f"O servidor não respondeu em {TEMPO_ARRANQUE:.0f} s. Veja {self.log.name}.")
+
+    def _marcar_pronto(self):
+        if not self.e_pronto:
+            self.e_pronto = True
+            self.pronto.emit()
+
+    # --- Supervisão ---
+
+    def _reencaminhar_log(self, processo):
+        for linha in iter(processo.stdout.readline, b''):
+            self._registar(linha.decode('utf-8', errors='replace'))
+        codigo = processo.wait()
+        if self.a_parar:
+            return
+        self._registar(f"o servidor terminou inesperadamente (código {codigo})")
+        # Um filho que morre antes de ficar pronto é tratado em _aguardar_pronto.
+        if self.e_pronto and self.reinicios < MAXIMO_REINICIOS:
+            self.reinicios += 1
+            time.sleep(min(2 ** self.reinicios, 30))
+            self._registar(f"a reiniciar o servidor ({self.reinicios}/{MAXIMO_REINICIOS})")
+            self.iniciar()
+
+    # --- Paragem ---
+
+    def parar(self):
+        """Fecha o stdin do filho (ele acaba os pedidos em curso e sai); à força se demorar."""
+        with self.lock:
+            self.a_parar = True
+            processo = self.processo
+        if processo is None or processo.poll() is not None:
+            return
+        try:
+            processo.stdin.close()
+            processo.wait(TEMPO_PARAGEM)
+        except (OSError, subprocess.TimeoutExpired):
+            self._registar("o servidor não parou a tempo; a terminar o processo")
+            processo.kill()
+            processo.wait(5)
+        self._registar(f"servidor parado (código {processo.returncode})")